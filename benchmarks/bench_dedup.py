@@ -0,0 +1,51 @@
+"""Duplicate-check throughput and memory per remembered send.
+
+One window's worth of distinct sends goes through a cache with unbounded
+exact entries, with bounded entries, and with bounded entries plus Bloom
+filters; then each send is looked up again.
+
+Usage: python benchmarks/bench_dedup.py [sends] [max_entries]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sms_gateway.dedup import DedupCache, message_fingerprint
+
+
+def fill(keys, **options) -> DedupCache:
+    """Add ``keys`` spread evenly over one window."""
+    now = [0.0]
+    cache = DedupCache(window=3600, clock=lambda: now[0], **options)
+    step = 3600 / len(keys)
+    for i, key in enumerate(keys):
+        now[0] = i * step
+        cache.add(key, i)
+    return cache
+
+
+def run(name: str, sends: int, **options) -> None:
+    keys = [message_fingerprint(f"+1202{i:07d}", "Your order has shipped") for i in range(sends)]
+    start = time.perf_counter()
+    fill(keys, **options)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    cache = fill(keys, **options)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    remembered = sum(cache.get(key) is not None for key in keys)
+    lookup = time.perf_counter() - start
+    print(f"{name:<34} add {sends / elapsed:>9,.0f}/s  lookup {sends / lookup:>9,.0f}/s  "
+          f"{memory / sends:6.1f} bytes/send  remembered {remembered / sends:.1%}")
+
+
+if __name__ == "__main__":
+    sends = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    max_entries = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    run("exact (unbounded)", sends, max_entries=sends)
+    run(f"exact ({max_entries:,} entries)", sends, max_entries=max_entries)
+    run(f"bloom + {max_entries:,} entries", sends, max_entries=max_entries, bloom_capacity=sends)
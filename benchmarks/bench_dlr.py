@@ -0,0 +1,55 @@
+"""Delivery-receipt throughput: one store update per receipt vs batched ingestion.
+
+Usage: python benchmarks/bench_dlr.py [receipts]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sms_gateway.dlr import DLRIngestor, parse
+from sms_gateway.status import StatusStore, SENT
+
+
+def seeded_store(path: str, count: int) -> StatusStore:
+    store = StatusStore(path=path, max_entries=count * 2)
+    for i in range(count):
+        store.track(f"req-{i}")
+        store.update(f"req-{i}", SENT, provider="twilio", message_id=f"SM{i:08d}")
+    store.flush()
+    return store
+
+
+def receipts(count: int):
+    return [{"MessageSid": f"SM{i:08d}", "MessageStatus": "delivered", "To": "+15550001"} for i in range(count)]
+
+
+def main(count: int) -> None:
+    payloads = receipts(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = seeded_store(os.path.join(tmp, "unbatched.db"), count)
+        start = time.perf_counter()
+        for payload in payloads:
+            store.apply_events(parse("twilio", payload))
+        elapsed = time.perf_counter() - start
+        print(f"per receipt (one transaction each): {count / elapsed:,.0f} receipts/sec")
+        store.close()
+
+        store = seeded_store(os.path.join(tmp, "batched.db"), count)
+        ingestor = DLRIngestor(store, max_pending=count)
+        start = time.perf_counter()
+        for i, payload in enumerate(payloads):
+            ingestor.submit(parse("twilio", payload))
+            if (i + 1) % ingestor.batch_size == 0:
+                ingestor.flush()
+        ingestor.flush()
+        elapsed = time.perf_counter() - start
+        print(f"batched ({ingestor.batch_size}/flush):            {count / elapsed:,.0f} receipts/sec")
+        print(f"stats: {ingestor.stats}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,46 @@
+"""Per-call cost of hot-path instrumentation.
+
+Usage: python benchmarks/bench_metrics.py [iterations]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sms_gateway.metrics import Registry
+
+
+def main(n: int) -> None:
+    registry = Registry()
+    sends = registry.counter("sends_total", "Sends.", ["provider", "outcome"])
+    latency = registry.histogram("latency_seconds", "Latency.", ["provider"])
+    providers = ["twilio", "vonage", "telnyx", "messagebird"]
+
+    start = time.perf_counter()
+    for i in range(n):
+        sends.inc(providers[i & 3], "success")
+    per_inc = (time.perf_counter() - start) / n
+
+    start = time.perf_counter()
+    for i in range(n):
+        latency.observe(0.042, providers[i & 3])
+    per_observe = (time.perf_counter() - start) / n
+
+    start = time.perf_counter()
+    for i in range(n):
+        providers[i & 3]
+    loop = (time.perf_counter() - start) / n
+
+    start = time.perf_counter()
+    body = registry.render()
+    render = time.perf_counter() - start
+
+    print(f"counter inc:        {(per_inc - loop) * 1e9:6.0f} ns")
+    print(f"histogram observe:  {(per_observe - loop) * 1e9:6.0f} ns")
+    print(f"per send (both):    {(per_inc + per_observe - 2 * loop) * 1e9:6.0f} ns")
+    print(f"scrape render:      {render * 1e6:6.0f} us ({len(body)} bytes)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,65 @@
+"""Number pool assignment: legacy linear scans vs indexed heaps.
+
+Usage: python benchmarks/bench_number_pool.py [pool sizes...]
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sms_gateway.number_pool import NumberPool, NumberStatus
+
+
+async def legacy_assign_batch(pool: NumberPool, targets):
+    """NumberPool.assign_batch before indexing: two scans per target."""
+    assignments = {}
+    for target in targets:
+        found = None
+        for num in pool._numbers.values():
+            if num.assigned_target == target and num.status == NumberStatus.ASSIGNED:
+                found = num.number
+                break
+        if found is None:
+            for num in pool._numbers.values():
+                if num.status == NumberStatus.AVAILABLE and num.daily_send_count < pool.daily_limit:
+                    num.status = NumberStatus.ASSIGNED
+                    num.assigned_target = target
+                    num.last_used = datetime.utcnow()
+                    num.daily_send_count += 1
+                    found = num.number
+                    break
+        if found is None:
+            break
+        assignments[target] = found
+    return assignments
+
+
+def make_pool(size: int) -> NumberPool:
+    pool = NumberPool(daily_limit=20)
+    pool.add_numbers_bulk(
+        [{"number": f"+1437{i:07d}", "provider": ("telnyx", "twilio")[i % 2]} for i in range(size)]
+    )
+    return pool
+
+
+async def main(sizes):
+    for size in sizes:
+        targets = [f"+1202{i:07d}" for i in range(size)]
+        start = time.perf_counter()
+        await make_pool(size).assign_batch(targets)
+        indexed = time.perf_counter() - start
+        line = f"{size:>8,} numbers  indexed {indexed * 1e3:9.1f} ms  ({indexed / size * 1e6:5.2f} us/assign)"
+        if size <= 10_000:
+            start = time.perf_counter()
+            await legacy_assign_batch(make_pool(size), targets)
+            legacy = time.perf_counter() - start
+            line += f"  legacy {legacy * 1e3:9.1f} ms  speedup {legacy / indexed:7.1f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [1_000, 5_000, 10_000, 50_000]
+    asyncio.run(main(sizes))
@@ -0,0 +1,41 @@
+"""Number pool warm start: snapshot + change log load time.
+
+Usage: python benchmarks/bench_pool_store.py [numbers] [log records]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sms_gateway.number_pool import NumberPool
+
+
+async def main(size: int, changes: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "pool.snap")
+        pool = NumberPool(daily_limit=20, path=path, compact_after=10 ** 9)
+        start = time.perf_counter()
+        pool.add_numbers_bulk(
+            {"number": f"+1437{i:07d}", "provider": ("telnyx", "twilio")[i % 2]} for i in range(size)
+        )
+        pool.snapshot()
+        print(f"import {size:,} numbers + snapshot   {(time.perf_counter() - start) * 1e3:8.1f} ms"
+              f"  ({os.path.getsize(path) / size:.1f} bytes/number)")
+        await pool.assign_batch([f"+1202{i:07d}" for i in range(changes)], task_id="bench")
+        pool._store.flush()
+
+        start = time.perf_counter()
+        restored = NumberPool(daily_limit=20, path=path)
+        restored.load()
+        elapsed = time.perf_counter() - start
+        print(f"warm start ({changes:,} log records)  {elapsed * 1e3:8.1f} ms")
+        assert restored.available_count == size - changes
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    changes = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    asyncio.run(main(size, changes))
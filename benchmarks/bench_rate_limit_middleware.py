@@ -0,0 +1,61 @@
+"""Per-request cost of the API rate limiter: legacy list rebuild vs sliding window.
+
+Usage: python benchmarks/bench_rate_limit_middleware.py [ips] [requests_per_ip]
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sms_gateway.ratelimit import InMemorySlidingWindow
+
+MAX_REQUESTS = 100
+WINDOW = 60
+
+
+class LegacyLimiter:
+    """The per-IP datetime list algorithm RateLimitMiddleware used before."""
+
+    def __init__(self):
+        self._requests = defaultdict(list)
+
+    def check(self, client_ip: str, limit: int, window: int) -> bool:
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=window)
+        self._requests[client_ip] = [ts for ts in self._requests[client_ip] if ts > cutoff]
+        if len(self._requests[client_ip]) >= limit:
+            return False
+        self._requests[client_ip].append(now)
+        return True
+
+
+def run(name: str, factory, keys) -> None:
+    check = factory().check
+    start = time.perf_counter()
+    for key in keys:
+        check(key, MAX_REQUESTS, WINDOW)
+    elapsed = time.perf_counter() - start
+    # Memory is measured in a separate pass so tracing does not skew timing.
+    tracemalloc.start()
+    check = factory().check
+    for key in keys:
+        check(key, MAX_REQUESTS, WINDOW)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:16s} {elapsed / len(keys) * 1e6:8.2f} us/request   peak {peak / 1e6:7.1f} MB")
+
+
+if __name__ == "__main__":
+    ips = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    per_ip = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    addresses = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(ips)]
+    keys = addresses * per_ip
+    random.Random(42).shuffle(keys)
+    print(f"{ips:,} IPs, {len(keys):,} requests, limit {MAX_REQUESTS}/{WINDOW}s")
+    run("legacy list", LegacyLimiter, keys)
+    run("sliding window", InMemorySlidingWindow, keys)
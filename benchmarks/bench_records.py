@@ -0,0 +1,70 @@
+"""Memory per bulk result: dataclass results in a list vs slotted results in BulkResults.
+
+Usage: python benchmarks/bench_records.py [messages]
+"""
+import os
+import sys
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sms_gateway.bulk import BulkResults
+from sms_gateway.providers.base import SMSResult
+
+
+@dataclass
+class LegacyResult:
+    """SMSResult before it was slotted."""
+    success: bool
+    message_id: Optional[str] = None
+    provider: Optional[str] = None
+    error: Optional[str] = None
+    timestamp: datetime = field(default_factory=datetime.utcnow)
+    price: Optional[float] = None
+    status: str = "unknown"
+
+
+def provider_status(i: int) -> str:
+    # Parsed from JSON, so each status is a fresh string object.
+    return "".join(["que", "ued"])
+
+
+def measure(label: str, build, count: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = build(count)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    per = size / count
+    print(f"{label:32s} {size / 2 ** 20:8.1f} MiB  {per:6.0f} bytes/message")
+    del kept
+    return per
+
+
+def legacy(count: int):
+    return [LegacyResult(True, f"SM{i:032x}", "twilio", None, price=0.0075, status=provider_status(i))
+            for i in range(count)]
+
+
+def slotted(count: int):
+    return [SMSResult(True, f"SM{i:032x}", "twilio", None, price=0.0075, status=provider_status(i))
+            for i in range(count)]
+
+
+def columnar(count: int):
+    results = BulkResults(count)
+    for i in range(count):
+        results[i] = SMSResult(True, f"SM{i:032x}", "twilio", None, price=0.0075, status=provider_status(i))
+    return results
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    before = measure("dataclass results in a list", legacy, count)
+    middle = measure("slotted results in a list", slotted, count)
+    after = measure("BulkResults (columnar)", columnar, count)
+    print(f"reduction: {before / middle:.2f}x slotted, {before / after:.2f}x columnar")
@@ -0,0 +1,57 @@
+"""Enqueue/dequeue throughput of the durable send queue.
+
+Usage: python benchmarks/bench_send_queue.py [messages] [producers]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sms_gateway.send_queue import SendQueue
+
+
+async def bench(total: int, producers: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = SendQueue(os.path.join(tmp, "bench.db"), max_depth=total * 2)
+        await queue.open()
+
+        per_producer = total // producers
+
+        async def produce(p: int):
+            for i in range(per_producer):
+                await queue.enqueue(f"+1202{p:03d}{i:04d}", "benchmark message")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(produce(p) for p in range(producers)))
+        elapsed = time.perf_counter() - start
+        count = per_producer * producers
+        print(f"enqueue (single, {producers} producers): {count / elapsed:,.0f} msgs/sec")
+
+        start = time.perf_counter()
+        recipients = [f"+1303555{i:04d}" for i in range(1000)]
+        for _ in range(total // 1000):
+            await queue.enqueue_many(recipients, "bulk benchmark message")
+        elapsed = time.perf_counter() - start
+        print(f"enqueue_many (1000/request):      {(total // 1000) * 1000 / elapsed:,.0f} msgs/sec")
+
+        start = time.perf_counter()
+        drained = 0
+        while True:
+            batch = await queue.claim(500)
+            if not batch:
+                break
+            for message in batch:
+                queue.complete(message.id)
+            drained += len(batch)
+        await queue.close()
+        elapsed = time.perf_counter() - start
+        print(f"claim + complete:                 {drained / elapsed:,.0f} msgs/sec")
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    producers = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    asyncio.run(bench(total, producers))
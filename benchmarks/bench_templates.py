@@ -0,0 +1,43 @@
+"""Template rendering: legacy replace loop vs compiled render plan.
+
+Usage: python benchmarks/bench_templates.py [renders]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sms_gateway.templates import NotificationTemplate, TemplateRegistry, DEFAULT_TEMPLATES
+
+
+def legacy_render(tpl: NotificationTemplate, context: dict) -> str:
+    """NotificationTemplate.render before render plans were compiled."""
+    missing = set(tpl.VAR_PATTERN.findall(tpl.body)) - set(context.keys())
+    if missing:
+        raise ValueError(missing)
+    result = tpl.body
+    for key, value in context.items():
+        result = result.replace('{{' + key + '}}', str(value))
+    return result
+
+
+def timed(label: str, fn, count: int) -> float:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:28s} {count / elapsed:12,.0f} renders/sec  {elapsed / count * 1e9:7.0f} ns/render")
+    return elapsed
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    registry = TemplateRegistry()
+    registry.register("welcome", DEFAULT_TEMPLATES["welcome"])
+    tpl = registry.get("welcome")
+    contexts = [{"app_name": "Acme", "user_name": f"user{i % 1000}"} for i in range(count)]
+
+    legacy = timed("legacy replace loop", lambda: [legacy_render(tpl, c) for c in contexts], count)
+    compiled = timed("compiled render()", lambda: [tpl.render(c) for c in contexts], count)
+    batch = timed("render_many()", lambda: registry.render_many("welcome", contexts), count)
+    print(f"speedup: {legacy / compiled:.2f}x (render), {legacy / batch:.2f}x (render_many)")
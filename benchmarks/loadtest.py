@@ -0,0 +1,293 @@
+"""Reproducible load test of the send paths against the mock carrier.
+
+Scenarios:
+  single     gateway.send, ``--concurrency`` sends in flight
+  bulk       gateway.send_bulk of ``--bulk`` messages (10k by default; try 1000000 --inproc)
+  pool       NumberPool.assign_batch, 1000 targets per call
+  templates  TemplateRegistry.render_many, 1000 contexts per call
+  api        POST /api/v1/sms/send through the ASGI app, ``--concurrency`` requests in flight
+
+Sends go over local sockets to :mod:`mock_carrier` running in a child
+process, or with ``--inproc`` to the same carrier through an in-process
+transport. Each scenario
+reports ops/sec and p50/p95/p99 of one operation: a send, an API request,
+a provider call (bulk), or an assignment or render (pool, templates; timed
+per call of 1000 and divided).
+
+``--save`` stores the results as a baseline. Results are compared with
+``--baseline`` (benchmarks/baseline.json when present): the run exits 1 if
+a scenario run with the same parameters lost more than ``--tolerance`` of
+its throughput or its p99 grew by more than that. Baselines are only
+meaningful on the machine that recorded them.
+
+Usage: python benchmarks/loadtest.py [scenario ...] [--bulk N] [--latency S] [--save PATH]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_carrier import MockCarrier, base_url, spawn
+from sms_gateway import SMSGateway
+from sms_gateway.number_pool import NumberPool
+from sms_gateway.providers import MessageBirdProvider, TelnyxProvider, TwilioProvider, VonageProvider
+from sms_gateway.templates import DEFAULT_TEMPLATES, TemplateRegistry
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SCENARIOS = ["single", "bulk", "pool", "templates", "api"]
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def summarize(ops: int, elapsed: float, latencies: List[float], params: str) -> Dict:
+    ordered = sorted(latencies)
+    return {
+        "params": params,
+        "ops": ops,
+        "rate": round(ops / elapsed, 1),
+        "p50_us": round(percentile(ordered, 0.50) * 1e6, 2),
+        "p95_us": round(percentile(ordered, 0.95) * 1e6, 2),
+        "p99_us": round(percentile(ordered, 0.99) * 1e6, 2),
+    }
+
+
+class Carrier:
+    """Where providers send: a spawned mock carrier or an in-process one."""
+
+    def __init__(self, port: Optional[int] = None, local: Optional[MockCarrier] = None):
+        self.port = port
+        self.local = local
+
+    def providers(self) -> Dict:
+        """One instance of every carrier's provider, with default pool settings."""
+        options = {"transport": self.local.transport()} if self.local is not None else {}
+        return {
+            "twilio": TwilioProvider("ACmock", "token", base_url=base_url("twilio", self.port), **options),
+            "telnyx": TelnyxProvider("key", base_url=base_url("telnyx", self.port), **options),
+            "vonage": VonageProvider("key", "secret", base_url=base_url("vonage", self.port), **options),
+            "messagebird": MessageBirdProvider("key", base_url=base_url("messagebird", self.port), **options),
+        }
+
+    def register(self, gateway: SMSGateway) -> None:
+        for name, provider in self.providers().items():
+            gateway.register_provider(name, provider, primary=name == "twilio")
+
+
+def time_provider_calls(gateway: SMSGateway, latencies: List[float]) -> None:
+    """Record the duration of every provider ``send`` and ``send_batch``."""
+
+    def timed(call: Callable):
+        async def wrapper(*args):
+            start = time.perf_counter()
+            try:
+                return await call(*args)
+            finally:
+                latencies.append(time.perf_counter() - start)
+        return wrapper
+
+    for provider in gateway._providers.values():
+        provider.send = timed(provider.send)
+        provider.send_batch = timed(provider.send_batch)
+
+
+async def run_concurrently(count: int, concurrency: int, op: Callable[[int], "asyncio.Future"]) -> List[float]:
+    """Run ``op(i)`` for ``i < count`` with ``concurrency`` in flight; per-op latencies."""
+    latencies: List[float] = []
+    indexes = iter(range(count))
+
+    async def worker():
+        for i in indexes:
+            start = time.perf_counter()
+            await op(i)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+async def scenario_single(args, carrier: Carrier) -> Dict:
+    gateway = SMSGateway()
+    carrier.register(gateway)
+    async with gateway:
+        start = time.perf_counter()
+        latencies = await run_concurrently(
+            args.sends, args.concurrency,
+            lambda i: gateway.send(f"+1202{i:07d}", f"Your code is {i % 10000:04d}"))
+        elapsed = time.perf_counter() - start
+    return summarize(args.sends, elapsed, latencies, f"n={args.sends} c={args.concurrency}")
+
+
+async def scenario_bulk(args, carrier: Carrier) -> Dict:
+    # Campaign-style: one body per 100 recipients, so batch APIs are used.
+    messages = [{"to": f"+1303{i:07d}", "message": f"Sale {i // 100}: 20% off today"}
+                for i in range(args.bulk)]
+    gateway = SMSGateway()
+    carrier.register(gateway)
+    async with gateway:
+        latencies: List[float] = []
+        time_provider_calls(gateway, latencies)
+        start = time.perf_counter()
+        results = await gateway.send_bulk(messages, concurrency=args.concurrency)
+        elapsed = time.perf_counter() - start
+    if results.failed:
+        print(f"  bulk: {results.failed} of {len(results)} messages failed")
+    return summarize(args.bulk, elapsed, latencies, f"n={args.bulk} c={args.concurrency}")
+
+
+async def scenario_pool(args, carrier: Carrier) -> Dict:
+    size, per_call = args.pool, 1000
+    pool = NumberPool(daily_limit=20)
+    pool.add_numbers_bulk(
+        [{"number": f"+1437{i:07d}", "provider": ("telnyx", "twilio")[i % 2]} for i in range(size)])
+    latencies: List[float] = []
+    start = time.perf_counter()
+    for offset in range(0, size, per_call):
+        targets = [f"+1202{i:07d}" for i in range(offset, min(size, offset + per_call))]
+        call = time.perf_counter()
+        await pool.assign_batch(targets)
+        latencies.append((time.perf_counter() - call) / len(targets))
+    elapsed = time.perf_counter() - start
+    return summarize(size, elapsed, latencies, f"n={size}")
+
+
+async def scenario_templates(args, carrier: Carrier) -> Dict:
+    registry = TemplateRegistry()
+    registry.register("welcome", DEFAULT_TEMPLATES["welcome"])
+    contexts = [{"app_name": "Acme", "user_name": f"user{i}"} for i in range(1000)]
+    calls = max(1, args.renders // len(contexts))
+    latencies: List[float] = []
+    start = time.perf_counter()
+    for _ in range(calls):
+        call = time.perf_counter()
+        registry.render_many("welcome", contexts)
+        latencies.append((time.perf_counter() - call) / len(contexts))
+    elapsed = time.perf_counter() - start
+    return summarize(calls * len(contexts), elapsed, latencies, f"n={calls * len(contexts)}")
+
+
+async def scenario_api(args, carrier: Carrier) -> Dict:
+    import httpx
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The API module reads its configuration on import.
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'queue.db')}"
+        os.environ.pop("STATUS_STORE_PATH", None)
+        os.environ.pop("NUMBER_POOL_PATH", None)
+        from sms_gateway import api
+
+        carrier.register(api.gateway)
+        transport = httpx.ASGITransport(app=api.app)
+        async with api.lifespan(api.app), httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+
+            async def post(i: int):
+                response = await client.post("/api/v1/sms/send", json={
+                    "phone_number": f"+1404{i:07d}", "message": f"Order {i} has shipped"})
+                response.raise_for_status()
+
+            start = time.perf_counter()
+            latencies = await run_concurrently(args.requests, args.concurrency, post)
+            elapsed = time.perf_counter() - start
+    return summarize(args.requests, elapsed, latencies, f"n={args.requests} c={args.concurrency}")
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Regressions of ``results`` against ``baseline``, as printable lines."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if base["params"] != result["params"]:
+            print(f"  {name}: baseline ran with {base['params']}, not compared")
+            continue
+        rate_change = result["rate"] / base["rate"] - 1
+        p99_change = result["p99_us"] / base["p99_us"] - 1 if base["p99_us"] else 0.0
+        print(f"  {name:10s} rate {rate_change:+7.1%}  p99 {p99_change:+7.1%}")
+        if rate_change < -tolerance:
+            regressions.append(f"{name}: {result['rate']:,.0f} ops/sec vs {base['rate']:,.0f} baseline")
+        if p99_change > tolerance:
+            regressions.append(f"{name}: p99 {result['p99_us']} us vs {base['p99_us']} us baseline")
+    return regressions
+
+
+async def main(args) -> int:
+    options = {"latency": args.latency, "error_rate": args.error_rate,
+               "throttle_rate": args.throttle_rate, "seed": args.seed}
+    process = None
+    if args.inproc:
+        carrier = Carrier(local=MockCarrier(**options))
+    else:
+        process, port = spawn(**options)
+        carrier = Carrier(port=port)
+    suffix = f" latency={args.latency} errors={args.error_rate} throttle={args.throttle_rate}"
+    suffix += " inproc" if args.inproc else " http"
+    results: Dict[str, Dict] = {}
+    try:
+        print(f"{'scenario':10s} {'ops':>9s} {'ops/sec':>11s} {'p50 us':>10s} {'p95 us':>10s} {'p99 us':>10s}")
+        for name in args.scenarios:
+            result = await globals()[f"scenario_{name}"](args, carrier)
+            if name in ("single", "bulk", "api"):
+                result["params"] += suffix
+            results[name] = result
+            print(f"{name:10s} {result['ops']:9,d} {result['rate']:11,.0f} "
+                  f"{result['p50_us']:10.1f} {result['p95_us']:10.1f} {result['p99_us']:10.1f}")
+    finally:
+        if process is not None:
+            process.terminate()
+
+    status = 0
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"compared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        status = 1 if regressions else 0
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"saved baseline to {args.save}")
+    return status
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Load test against a local mock carrier.")
+    parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                        help=f"scenarios to run ({', '.join(SCENARIOS)}; default all)")
+    parser.add_argument("--sends", type=int, default=2000, help="messages in the single scenario")
+    parser.add_argument("--bulk", type=int, default=10_000, help="messages in the bulk scenario")
+    parser.add_argument("--pool", type=int, default=100_000, help="numbers in the pool scenario")
+    parser.add_argument("--renders", type=int, default=200_000, help="renders in the templates scenario")
+    parser.add_argument("--requests", type=int, default=2000, help="requests in the api scenario")
+    parser.add_argument("--concurrency", type=int, default=50, help="sends or requests in flight")
+    parser.add_argument("--latency", type=float, default=0.02, help="median carrier latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of carrier 500s")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of carrier 429s")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--inproc", action="store_true", help="serve the carrier in-process, without sockets")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a new baseline")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(sorted(unknown))}")
+    args.scenarios = args.scenarios or SCENARIOS
+    return args
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,240 @@
+"""Local stand-in for the Twilio, Telnyx, Vonage and MessageBird HTTP APIs.
+
+Each carrier is mounted under its own path prefix; point a provider at it
+with the ``base_url`` kwarg (see :meth:`MockCarrier.base_url`). Responses
+have the shape the provider classes parse. Every request waits a sampled
+latency and may fail with a 500 (``error_rate``) or be throttled with a
+429 and ``Retry-After`` (``throttle_rate``); Vonage reports throttling as
+its per-message status 1, as the real API does. A fixed ``seed`` makes
+runs reproducible.
+
+The same carrier serves real sockets (:meth:`MockCarrier.start`, a
+minimal HTTP/1.1 keep-alive server on asyncio streams; :func:`spawn` runs
+it in a child process so it does not compete with the code under test)
+or, to take the kernel out of the measurement, an in-process ``httpx``
+transport (:meth:`MockCarrier.transport`).
+
+Usage: python benchmarks/mock_carrier.py [port] [latency] [error_rate] [throttle_rate]
+"""
+import asyncio
+import itertools
+import json
+import multiprocessing
+import random
+import sys
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import httpx
+
+Reply = Tuple[int, Dict[str, str], bytes]
+
+CARRIERS = {
+    "twilio": "/twilio/2010-04-01",
+    "telnyx": "/telnyx/v2",
+    "vonage": "/vonage",
+    "messagebird": "/messagebird",
+}
+
+_REASONS = {200: "OK", 201: "Created", 404: "Not Found", 429: "Too Many Requests",
+            500: "Internal Server Error"}
+
+
+def base_url(carrier: str, port: Optional[int] = None) -> str:
+    """``base_url`` for ``carrier`` served on ``port``, or in-process without one."""
+    host = f"http://127.0.0.1:{port}" if port else "http://carrier.mock"
+    return host + CARRIERS[carrier]
+
+
+def _json(status: int, data, headers: Optional[Dict[str, str]] = None) -> Reply:
+    return status, {"Content-Type": "application/json", **(headers or {})}, json.dumps(data).encode()
+
+
+class MockCarrier:
+    """Fake carrier APIs with configurable latency, errors and throttling.
+
+    ``latency`` is the median response time in seconds; samples are
+    log-normal with shape ``jitter``, so tails look like a real network.
+    """
+
+    def __init__(self, latency: float = 0.02, jitter: float = 0.5, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, seed: int = 42):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.port: Optional[int] = None
+        self.stats = {"requests": 0, "messages": 0, "errors": 0, "throttled": 0}
+
+    def base_url(self, carrier: str) -> str:
+        return base_url(carrier, self.port)
+
+    def transport(self) -> httpx.AsyncBaseTransport:
+        """An httpx transport answering from this carrier without sockets."""
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            status, headers, body = await self.handle(request.method, request.url.raw_path.decode(),
+                                                      await request.aread())
+            return httpx.Response(status, headers=headers, content=body)
+
+        return httpx.MockTransport(handler)
+
+    async def handle(self, method: str, target: str, body: bytes) -> Reply:
+        self.stats["requests"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * self._random.lognormvariate(0.0, self.jitter))
+        path, _, _ = target.partition("?")
+        for carrier, prefix in CARRIERS.items():
+            if path.startswith(prefix + "/"):
+                return getattr(self, f"_{carrier}")(method, path[len(prefix):], body)
+        return _json(404, {"error": "not found"})
+
+    def _fault(self) -> Optional[str]:
+        """``"error"``, ``"throttled"`` or None for this request."""
+        roll = self._random.random()
+        if roll < self.error_rate:
+            self.stats["errors"] += 1
+            return "error"
+        if roll < self.error_rate + self.throttle_rate:
+            self.stats["throttled"] += 1
+            return "throttled"
+        return None
+
+    def _next_id(self) -> str:
+        return f"{next(self._ids):012x}"
+
+    def _http_fault(self, fault: str) -> Reply:
+        if fault == "throttled":
+            return _json(429, {"message": "Too Many Requests", "code": 20429}, {"Retry-After": "1"})
+        return _json(500, {"message": "Internal Server Error"})
+
+    def _twilio(self, method: str, path: str, body: bytes) -> Reply:
+        if method == "POST" and path.endswith("/Messages.json"):
+            fault = self._fault()
+            if fault:
+                return self._http_fault(fault)
+            self.stats["messages"] += 1
+            form = dict(parse_qsl(body.decode()))
+            return _json(201, {"sid": "SM" + self._next_id(), "to": form.get("To"),
+                               "status": "queued", "price": None})
+        if path.endswith("/Balance.json"):
+            return _json(200, {"balance": "100.00", "currency": "USD"})
+        return _json(200, {"status": "delivered", "messages": [], "next_page_uri": None})
+
+    def _telnyx(self, method: str, path: str, body: bytes) -> Reply:
+        if method == "POST" and path == "/messages":
+            fault = self._fault()
+            if fault == "error":
+                return 500, {}, b"Internal Server Error"
+            if fault:
+                return _json(429, {"errors": [{"code": "10011", "detail": "Too many requests"}]},
+                             {"Retry-After": "1"})
+            self.stats["messages"] += 1
+            to = json.loads(body)["to"]
+            return _json(200, {"data": {"id": self._next_id(), "to": [{"phone_number": to, "status": "queued"}]}})
+        if path == "/balance":
+            return _json(200, {"data": {"balance": "100.00"}})
+        return _json(200, {"data": {"to": [{"status": "delivered"}]}})
+
+    def _vonage(self, method: str, path: str, body: bytes) -> Reply:
+        if method == "POST" and path == "/sms/json":
+            fault = self._fault()
+            if fault == "error":
+                return self._http_fault(fault)
+            if fault:
+                return _json(200, {"message-count": "1", "messages": [{"status": "1", "error-text": "Throughput Rate Exceeded"}]})
+            self.stats["messages"] += 1
+            return _json(200, {"message-count": "1", "messages": [{
+                "status": "0", "message-id": self._next_id(), "message-price": "0.0075"}]})
+        return _json(200, {"value": 100.0})
+
+    def _messagebird(self, method: str, path: str, body: bytes) -> Reply:
+        if method == "POST" and path == "/messages":
+            fault = self._fault()
+            if fault:
+                return self._http_fault(fault)
+            recipients = json.loads(body)["recipients"]
+            self.stats["messages"] += len(recipients)
+            items = [{"recipient": int(str(r).lstrip("+")), "status": "sent"} for r in recipients]
+            return _json(201, {"id": self._next_id(), "recipients": {"totalCount": len(items), "items": items}})
+        if path == "/balance":
+            return _json(200, {"amount": 100.0})
+        return _json(200, {"status": "delivered", "items": []})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        """Listen on ``host:port`` (0 picks a free port, stored in :attr:`port`)."""
+        self._server = await asyncio.start_server(self._serve, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            self.port = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                    lines = head.decode("latin-1").split("\r\n")
+                    method, target, _ = lines[0].split(" ", 2)
+                    headers = {}
+                    for line in lines[1:]:
+                        name, _, value = line.partition(":")
+                        headers[name.strip().lower()] = value.strip()
+                    body = await reader.readexactly(int(headers.get("content-length", 0)))
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    # Client went away, possibly mid-request.
+                    break
+                status, reply_headers, reply = await self.handle(method, target, body)
+                out = [f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}", f"Content-Length: {len(reply)}"]
+                out += [f"{k}: {v}" for k, v in reply_headers.items()]
+                writer.write(("\r\n".join(out) + "\r\n\r\n").encode("latin-1") + reply)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        finally:
+            writer.close()
+
+
+async def _serve_forever(port: int, options: Dict, ready: Optional[Callable[[int], None]] = None) -> None:
+    carrier = MockCarrier(**options)
+    await carrier.start(port=port)
+    if ready is not None:
+        ready(carrier.port)
+    await asyncio.Event().wait()
+
+
+def _run(conn, options: Dict) -> None:
+    try:
+        asyncio.run(_serve_forever(0, options, conn.send))
+    except KeyboardInterrupt:
+        pass
+
+
+def spawn(**options) -> Tuple[multiprocessing.Process, int]:
+    """Serve a :class:`MockCarrier` from a child process; returns it and its port."""
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_run, args=(child, options), daemon=True)
+    process.start()
+    return process, parent.recv()
+
+
+def _print_urls(port: int) -> None:
+    for name in CARRIERS:
+        print(f"{name:12s} {base_url(name, port)}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:] + [None] * 4
+    options = {"latency": float(args[1] or 0.02), "error_rate": float(args[2] or 0.0),
+               "throttle_rate": float(args[3] or 0.0)}
+    try:
+        asyncio.run(_serve_forever(int(args[0] or 8099), options, _print_urls))
+    except KeyboardInterrupt:
+        pass
@@ -15,7 +15,15 @@ setup(
         "httpx>=0.24.0",
         "pydantic>=2.0",
         "tenacity>=8.0",
+        "tomli>=1.1; python_version < '3.11'",
     ],
+    extras_require={
+        "http2": ["h2>=4.0"],
+        # Telnyx receipt signatures (ed25519).
+        "telnyx": ["cryptography>=41.0"],
+        # The REST API and its multi-worker launcher (python -m sms_gateway.cluster).
+        "server": ["fastapi>=0.100", "uvicorn>=0.23"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
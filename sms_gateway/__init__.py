@@ -3,7 +3,9 @@ __version__ = "1.2.0"
 __author__ = "Wu Xie"
 
 from .gateway import SMSGateway
-from .providers import TwilioProvider, TelnyxProvider, VonageProvider, MessageBirdProvider
+from .providers import (
+    AliyunProvider, DeliveryStatus, TwilioProvider, TelnyxProvider, VonageProvider, MessageBirdProvider,
+)
 
 __all__ = [
     "SMSGateway",
@@ -11,4 +13,6 @@ __all__ = [
     "TelnyxProvider", 
     "VonageProvider",
     "MessageBirdProvider",
+    "AliyunProvider",
+    "DeliveryStatus",
 ]
\ No newline at end of file
@@ -1,20 +1,122 @@
 """REST API endpoints for the SMS Cloud Gateway service."""
 
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field, validator
 from typing import Optional, List
+from urllib.parse import parse_qsl
+import hashlib
+import json
 import re
 import uuid
 from datetime import datetime
 
+from .config import GatewayConfig
+from .dedup import Deduplicator, DedupConfig, UNKNOWN
+from .dlr import DLRIngestor, PARSERS, parse as parse_dlr
 from .gateway import SMSGateway
+from .metrics import CONTENT_TYPE, REGISTRY
+from .middleware import RateLimitMiddleware, RequestLoggingMiddleware
 from .number_pool import NumberPool
+from .send_queue import SendQueue, QueueConsumer, QueueFullError
+from .signatures import ReceiptVerifier, WebhookRequest
+from .status import StatusStore
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
+
+config = GatewayConfig.from_env()
+if config.coordinator_socket:
+    # One of several workers started by sms_gateway.cluster: share state through its coordinator.
+    from .cluster import WorkerState
+
+    shared = WorkerState(config.coordinator_socket, config.rate_limit_config)
+    status_store, rate_limiter, deduplicator = shared.status, shared.rate_limiter, shared.deduplicator
+    number_pool = shared.number_pool
+else:
+    shared = None
+    status_store = StatusStore(ttl=config.status_ttl_seconds, path=config.status_store_path)
+    rate_limiter = RateLimiter.from_toml(config.rate_limit_config)
+    deduplicator = Deduplicator(DedupConfig.from_toml(config.rate_limit_config))
+    number_pool = NumberPool(path=config.number_pool_path)
+gateway = SMSGateway(
+    status_store=status_store,
+    rate_limiter=rate_limiter,
+    retry_policy=RetryPolicy.from_toml(config.rate_limit_config),
+)
+send_queue = SendQueue.from_url(config.database_url, shared=shared is not None)
+dlr_ingestor = DLRIngestor(gateway.status)
+receipt_verifier = ReceiptVerifier(config.dlr_secrets, config.dlr_tokens)
+reconciler = gateway.enable_reconciliation()
+consumer: Optional[QueueConsumer] = None
+
+_BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def _scheduler_levels(field: str):
+    levels = consumer.stats["scheduler"]["levels"] if consumer is not None else {}
+    return {(str(priority),): level[field] for priority, level in levels.items()}
+
+
+def _pool_utilization():
+    stats = number_pool.stats
+    busy = stats.get("assigned", 0) + stats.get("cooldown", 0)
+    return {(): busy / stats["total"] if stats["total"] else 0.0}
+
+
+REGISTRY.gauge("sms_queue_depth", "Queued messages not yet completed, by priority.", ["priority"],
+               lambda: {(str(p),): n for p, n in send_queue.depth_by_priority.items()})
+REGISTRY.gauge("sms_scheduler_queued", "Claimed messages waiting for a worker, by priority.", ["priority"],
+               lambda: _scheduler_levels("queued"))
+REGISTRY.gauge("sms_scheduler_wait_p99_seconds", "Recent p99 queue wait, by priority.", ["priority"],
+               lambda: _scheduler_levels("wait_p99"))
+REGISTRY.gauge("sms_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open).", ["provider"],
+               lambda: {(name,): _BREAKER_STATES[b["state"]] for name, b in gateway.stats["breakers"].items()})
+REGISTRY.gauge("sms_number_pool_numbers", "Pooled sender numbers by status.", ["status"],
+               lambda: {(k,): v for k, v in number_pool.stats.items() if k not in ("total", "daily_limit")})
+REGISTRY.gauge("sms_number_pool_utilization", "Share of pooled numbers assigned or cooling down.", [],
+               _pool_utilization)
+REGISTRY.gauge("sms_dlr_pending", "Delivery receipts waiting to be applied.", [],
+               lambda: {(): dlr_ingestor.stats["pending"]})
+REGISTRY.gauge("sms_reconcile_pending", "Sent messages awaiting a status poll.", [],
+               lambda: {(): len(reconciler)})
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global consumer
+    # The cluster launcher recovers in-flight messages once, before starting workers.
+    await send_queue.open(recover_inflight=shared is None)
+    if shared is not None:
+        await shared.start()
+    number_pool.load()
+    number_pool.start()
+    await gateway.start()
+    await dlr_ingestor.start()
+    await reconciler.start()
+    consumer = QueueConsumer(send_queue, gateway, concurrency=config.max_concurrent_sends,
+                             deduplicator=deduplicator)
+    await consumer.start()
+    try:
+        yield
+    finally:
+        await consumer.stop()
+        await reconciler.stop()
+        await send_queue.close()
+        await gateway.aclose()
+        await dlr_ingestor.stop()
+        gateway.status.flush()
+        await number_pool.stop()
+        number_pool.close()
+        if shared is not None:
+            await shared.stop()
+
 
 app = FastAPI(
     title="SMS Cloud Gateway API",
     description="High-performance SMS sending and management service",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -24,8 +126,15 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-gateway = SMSGateway()
+if config.api_rate_limit_per_minute:
+    # Per-client API quota; workers of a cluster count in the coordinator's windows.
+    app.add_middleware(
+        RateLimitMiddleware,
+        max_requests=config.api_rate_limit_per_minute,
+        window_seconds=60,
+        backend=shared.window if shared is not None else None,
+    )
+app.add_middleware(RequestLoggingMiddleware)
 
 
 class SendSMSRequest(BaseModel):
@@ -46,6 +155,7 @@ class BulkSMSRequest(BaseModel):
     phone_numbers: List[str] = Field(..., min_items=1, max_items=1000)
     message: str = Field(..., min_length=1, max_length=1600)
     provider: Optional[str] = None
+    priority: int = Field(default=0, ge=0, le=9)
 
 
 class SMSResponse(BaseModel):
@@ -60,42 +170,174 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
 
+def _client_id(http_request: Request) -> Optional[str]:
+    """Stable identifier of the calling API key.
+
+    Used for fair scheduling and to scope idempotency keys; only a digest
+    is stored, never the key itself.
+    """
+    api_key = http_request.headers.get("X-API-Key")
+    if not api_key:
+        return None
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def _duplicate(earlier) -> HTTPException:
+    detail = "Identical message already sent to this number recently"
+    if earlier is not UNKNOWN:
+        detail += f" (request {earlier})"
+    return HTTPException(status_code=409, detail=detail)
+
+
+def _withdraw(request_id: str, recipients: List[str], message: str, client_id: Optional[str],
+              idempotency_key: Optional[str]) -> None:
+    """Undo what accepting a request claimed, after it failed to be queued.
+
+    Otherwise a retry would be answered from the idempotency cache or
+    rejected as a duplicate of a message that was never sent.
+    """
+    gateway.status.discard(request_id)
+    for number in recipients:
+        deduplicator.release_message(number, message)
+    if idempotency_key:
+        deduplicator.release_key(client_id, idempotency_key)
+
+
 @app.post("/api/v1/sms/send", response_model=SMSResponse)
-async def send_sms(request: SendSMSRequest, background_tasks: BackgroundTasks):
+async def send_sms(request: SendSMSRequest, http_request: Request):
+    """Queue one SMS.
+
+    A retry carrying the same ``Idempotency-Key`` header gets the original
+    response; the same text to the same number within
+    ``duplicate_check_window`` is rejected with 409.
+    """
     request_id = str(uuid.uuid4())
-    background_tasks.add_task(
-        gateway.send_async, request.phone_number, request.message, request.provider
-    )
-    return SMSResponse(
+    client_id = _client_id(http_request)
+    idempotency_key = http_request.headers.get("Idempotency-Key")
+    response = SMSResponse(
         request_id=request_id,
         status="queued",
         timestamp=datetime.utcnow().isoformat(),
         message="SMS queued for delivery",
     )
+    if idempotency_key:
+        earlier = await deduplicator.claim(client_id, idempotency_key, response)
+        if earlier is not None:
+            return earlier
+    [earlier] = await deduplicator.check([request.phone_number], request.message, request_id)
+    if earlier is not None:
+        if idempotency_key:
+            deduplicator.release_key(client_id, idempotency_key)
+        raise _duplicate(earlier)
+    gateway.status.track(request_id)
+    try:
+        await send_queue.enqueue(
+            request.phone_number, request.message, provider=request.provider,
+            priority=request.priority, request_id=request_id, client_id=client_id,
+        )
+    except QueueFullError:
+        _withdraw(request_id, [request.phone_number], request.message, client_id, idempotency_key)
+        raise HTTPException(status_code=503, detail="Send queue is full, retry later")
+    except BaseException:
+        _withdraw(request_id, [request.phone_number], request.message, client_id, idempotency_key)
+        raise
+    return response
 
 
 @app.post("/api/v1/sms/bulk", response_model=SMSResponse)
-async def send_bulk_sms(request: BulkSMSRequest, background_tasks: BackgroundTasks):
+async def send_bulk_sms(request: BulkSMSRequest, http_request: Request):
+    """Queue one SMS per recipient; recipients that would get a duplicate are skipped."""
     request_id = str(uuid.uuid4())
-    background_tasks.add_task(
-        gateway.send_bulk_async, request.phone_numbers, request.message, request.provider
-    )
-    return SMSResponse(
+    client_id = _client_id(http_request)
+    idempotency_key = http_request.headers.get("Idempotency-Key")
+    response = SMSResponse(
         request_id=request_id,
         status="bulk_queued",
         timestamp=datetime.utcnow().isoformat(),
-        message=f"{len(request.phone_numbers)} messages queued",
     )
+    if idempotency_key:
+        earlier = await deduplicator.claim(client_id, idempotency_key, response)
+        if earlier is not None:
+            return earlier
+    checks = await deduplicator.check(request.phone_numbers, request.message, request_id)
+    recipients = [number for number, earlier in zip(request.phone_numbers, checks) if earlier is None]
+    skipped = len(request.phone_numbers) - len(recipients)
+    if not recipients:
+        if idempotency_key:
+            deduplicator.release_key(client_id, idempotency_key)
+        raise _duplicate(UNKNOWN)
+    response.message = f"{len(recipients)} messages queued"
+    if skipped:
+        response.message += f", {skipped} duplicates skipped"
+    gateway.status.track_bulk(request_id, len(recipients))
+    try:
+        await send_queue.enqueue_many(
+            recipients, request.message, provider=request.provider,
+            priority=request.priority, request_id=request_id, bulk=True, client_id=client_id,
+        )
+    except QueueFullError:
+        _withdraw(request_id, recipients, request.message, client_id, idempotency_key)
+        raise HTTPException(status_code=503, detail="Send queue is full, retry later")
+    except BaseException:
+        _withdraw(request_id, recipients, request.message, client_id, idempotency_key)
+        raise
+    return response
 
 
 @app.get("/api/v1/sms/status/{request_id}")
 async def get_sms_status(request_id: str):
-    status = gateway.get_status(request_id)
+    status = await gateway.fetch_status(request_id)
     if not status:
         raise HTTPException(status_code=404, detail="Request not found")
     return status
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint."""
+    merged = await shared.merged_metrics() if shared is not None else None
+    return Response(REGISTRY.render(merged), media_type=CONTENT_TYPE)
+
+
 @app.get("/api/v1/providers")
 async def list_providers():
-    return {"providers": gateway.list_providers()}
\ No newline at end of file
+    return {"providers": gateway.list_providers()}
+
+
+async def _dlr_request(request: Request) -> WebhookRequest:
+    url = str(request.url)
+    if config.public_url:
+        query = request.url.query
+        url = config.public_url.rstrip("/") + request.url.path + (f"?{query}" if query else "")
+    headers = {name.lower(): value for name, value in request.headers.items()}
+    if request.method == "GET":
+        return WebhookRequest(url, headers, payload=dict(request.query_params))
+    body = await request.body()
+    if "json" in request.headers.get("content-type", ""):
+        return WebhookRequest(url, headers, body, json.loads(body))
+    return WebhookRequest(url, headers, body, dict(parse_qsl(body.decode("utf-8"))), form=True)
+
+
+@app.api_route("/api/v1/dlr/{provider}", methods=["GET", "POST"])
+@app.api_route("/api/v1/dlr/{provider}/{token}", methods=["GET", "POST"])
+async def receive_dlr(provider: str, request: Request, token: Optional[str] = None):
+    """Delivery receipt webhook; receipts are applied in the background.
+
+    Each receipt must carry the carrier's signature and/or the provider's
+    URL token, as configured in ``dlr_secrets`` and ``dlr_tokens``.
+    """
+    if provider not in PARSERS:
+        raise HTTPException(status_code=404, detail="Unknown provider")
+    try:
+        webhook = await _dlr_request(request)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not receipt_verifier.verify(provider, webhook, token):
+        raise HTTPException(status_code=401, detail="Invalid receipt signature")
+    try:
+        events = parse_dlr(provider, webhook.payload)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not dlr_ingestor.submit(events):
+        raise HTTPException(status_code=503, detail="Receipt buffer is full, retry later")
+    return {"accepted": len(events)}
@@ -0,0 +1,251 @@
+"""Streaming bulk send helpers: bounded worker pools over (async) iterables."""
+import asyncio
+import math
+import time
+from array import array
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from typing import (
+    Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple,
+    TypeVar, Union,
+)
+
+from .providers.base import SMSResult
+
+T = TypeVar("T")
+
+MessageSource = Union[Iterable[T], AsyncIterable[T]]
+
+_NO_ERROR = (None, None, None, None)
+
+
+@dataclass
+class BulkProgress:
+    """Live counters of a streaming bulk send."""
+    submitted: int = 0
+    completed: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def in_flight(self) -> int:
+        return self.submitted - self.completed
+
+    @property
+    def rate(self) -> float:
+        """Completed messages per second since the start."""
+        elapsed = time.monotonic() - self.started_at
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+            "rate": round(self.rate, 1),
+        }
+
+
+class BulkResults(Sequence):
+    """Results of a bulk send stored column by column.
+
+    Behaves like a list of :class:`SMSResult` in input order, but keeps one
+    compact column per field (flags in a bytearray, numbers in arrays,
+    providers and statuses as 16-bit codes into one name table, errors only
+    for the messages that failed) and materialises an ``SMSResult`` on
+    access. Compares equal to a list of the same results.
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+        self._success = bytearray(size)
+        self._message_ids: List[Optional[str]] = [None] * size
+        self._providers = array("H", [0]) * size
+        self._statuses = array("H", [0]) * size
+        self._names: List[Optional[str]] = [None]
+        self._codes: Dict[Optional[str], int] = {None: 0}
+        # index -> (error, status_code, retryable, retry_after), failures only
+        self._errors: Dict[int, Tuple[str, Optional[int], Optional[bool], Optional[float]]] = {}
+        self._prices = array("d", [math.nan]) * size
+        self._created = array("d", [0.0]) * size
+        self._segments = array("H", [0]) * size
+
+    def _code(self, name: Optional[str]) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self._names)
+            self._names.append(name)
+        return code
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (BulkResults, list)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __setitem__(self, index: int, result: SMSResult) -> None:
+        self._success[index] = result.success
+        self._message_ids[index] = result.message_id
+        self._providers[index] = self._code(result.provider)
+        self._statuses[index] = self._code(result.status)
+        if result.error is not None or result.status_code is not None or result.retryable is not None:
+            self._errors[index] = (result.error, result.status_code, result.retryable, result.retry_after)
+        else:
+            self._errors.pop(index, None)
+        self._prices[index] = math.nan if result.price is None else result.price
+        self._created[index] = result.created
+        self._segments[index] = result.segments
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("BulkResults index out of range")
+        price = self._prices[index]
+        error, status_code, retryable, retry_after = self._errors.get(index, _NO_ERROR)
+        return SMSResult(
+            success=bool(self._success[index]),
+            message_id=self._message_ids[index],
+            provider=self._names[self._providers[index]],
+            error=error,
+            timestamp=self._created[index],
+            price=None if math.isnan(price) else price,
+            status=self._names[self._statuses[index]] or "unknown",
+            segments=self._segments[index],
+            status_code=status_code,
+            retryable=retryable,
+            retry_after=retry_after,
+        )
+
+    @property
+    def succeeded(self) -> int:
+        return self._success.count(1)
+
+    @property
+    def failed(self) -> int:
+        return self._size - self.succeeded
+
+    def failed_indexes(self) -> List[int]:
+        """Input positions of the messages that were not sent."""
+        return [i for i, ok in enumerate(self._success) if not ok]
+
+    @property
+    def message_ids(self) -> List[Optional[str]]:
+        return list(self._message_ids)
+
+
+async def aiterate(source: MessageSource) -> AsyncIterator:
+    """Iterate a sync or async iterable asynchronously."""
+    if hasattr(source, "__aiter__"):
+        async for item in source:
+            yield item
+    else:
+        for item in source:
+            yield item
+
+
+async def bounded_map(
+    source: MessageSource,
+    fn: Callable[[Any], Awaitable[T]],
+    concurrency: int,
+) -> AsyncIterator[Tuple[int, T]]:
+    """Apply ``fn`` to every item with at most ``concurrency`` calls in flight.
+
+    Yields ``(index, result)`` in completion order. Only ``concurrency``
+    workers and two small bounded queues exist at any time, so memory use is
+    independent of the number of items. Closing the generator early cancels
+    the workers.
+    """
+    inbox: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    outbox: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    done = object()
+
+    async def feed():
+        index = 0
+        try:
+            async for item in aiterate(source):
+                await inbox.put((index, item))
+                index += 1
+        finally:
+            # Also on a failing source, so workers drain and exit; the
+            # source's exception is re-raised by ``await feeder`` below.
+            for _ in range(concurrency):
+                await inbox.put(done)
+
+    async def work():
+        while True:
+            job = await inbox.get()
+            if job is done:
+                await outbox.put(done)
+                return
+            index, item = job
+            try:
+                result = await fn(item)
+            except Exception as e:
+                result = e
+            await outbox.put((index, result))
+
+    feeder = asyncio.create_task(feed())
+    workers = [asyncio.create_task(work()) for _ in range(concurrency)]
+    try:
+        remaining = concurrency
+        while remaining:
+            item = await outbox.get()
+            if item is done:
+                remaining -= 1
+                continue
+            yield item
+        await feeder
+    finally:
+        for task in [feeder, *workers]:
+            task.cancel()
+        await asyncio.gather(feeder, *workers, return_exceptions=True)
+
+
+async def group_by_key(
+    source: MessageSource,
+    key: Callable[[Any], Any],
+    max_size: int,
+    window: int = 1000,
+) -> AsyncIterator[list]:
+    """Group items with equal ``key`` into lists of ``(index, item)``.
+
+    Groups are emitted when they reach ``max_size`` or when ``window`` items
+    are buffered, so grouping never holds more than ``window`` items. Items
+    whose key is None are emitted alone immediately.
+    """
+    groups: dict = {}
+    buffered = 0
+    index = 0
+    async for item in aiterate(source):
+        k = key(item) if max_size > 1 else None
+        if k is None:
+            yield [(index, item)]
+            index += 1
+            continue
+        group = groups.get(k)
+        if group is None:
+            group = groups[k] = []
+        group.append((index, item))
+        index += 1
+        buffered += 1
+        if len(group) >= max_size:
+            del groups[k]
+            buffered -= len(group)
+            yield group
+        elif buffered >= window:
+            for group in groups.values():
+                yield group
+            groups.clear()
+            buffered = 0
+    for group in groups.values():
+        yield group
@@ -0,0 +1,180 @@
+"""Per-provider circuit breakers with rolling error-rate and latency windows."""
+import logging
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass
+class BreakerConfig:
+    failure_rate: float = 0.5
+    min_requests: int = 10
+    window_seconds: int = 30
+    slow_call_seconds: Optional[float] = None
+    slow_call_rate: float = 0.8
+    open_seconds: float = 30.0
+    max_open_seconds: float = 300.0
+    half_open_probes: int = 1
+    probe_interval: float = 1.0
+    close_after_successes: int = 3
+
+
+class RollingWindow:
+    """Request outcomes bucketed per second over the last ``size`` seconds."""
+
+    __slots__ = ("size", "_slots", "_calls", "_errors", "_slow", "_latency")
+
+    def __init__(self, size: int):
+        self.size = size
+        self._slots = [-1] * size
+        self._calls = [0] * size
+        self._errors = [0] * size
+        self._slow = [0] * size
+        self._latency = [0.0] * size
+
+    def add(self, now: float, ok: bool, latency: float, slow: bool) -> None:
+        second = int(now)
+        i = second % self.size
+        if self._slots[i] != second:
+            self._slots[i] = second
+            self._calls[i] = self._errors[i] = self._slow[i] = 0
+            self._latency[i] = 0.0
+        self._calls[i] += 1
+        self._latency[i] += latency
+        if not ok:
+            self._errors[i] += 1
+        if slow:
+            self._slow[i] += 1
+
+    def totals(self, now: float):
+        """Return (calls, errors, slow calls, latency sum) inside the window."""
+        oldest = int(now) - self.size
+        calls = errors = slow = 0
+        latency = 0.0
+        for i, second in enumerate(self._slots):
+            if second > oldest:
+                calls += self._calls[i]
+                errors += self._errors[i]
+                slow += self._slow[i]
+                latency += self._latency[i]
+        return calls, errors, slow, latency
+
+    def reset(self) -> None:
+        self._slots = [-1] * self.size
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker guarding one provider.
+
+    The breaker opens when, over the rolling window and with at least
+    ``min_requests`` calls, the error rate or slow-call rate crosses its
+    threshold. While open, calls are rejected immediately. After
+    ``open_seconds`` it admits at most ``half_open_probes`` concurrent probes,
+    one per ``probe_interval``; enough consecutive successful probes close it
+    again, while a failed probe re-opens it with a doubled open period.
+    """
+
+    def __init__(self, name: str, config: Optional[BreakerConfig] = None, clock=time.monotonic):
+        self.name = name
+        self.config = config or BreakerConfig()
+        self._clock = clock
+        self._window = RollingWindow(self.config.window_seconds)
+        self.state = BreakerState.CLOSED
+        self._opened_at = 0.0
+        self._open_for = self.config.open_seconds
+        self._probes = 0
+        self._next_probe = 0.0
+        self._probe_successes = 0
+        self._rejected = 0
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now; reserves a probe when half-open."""
+        if self.state is BreakerState.CLOSED:
+            return True
+        now = self._clock()
+        if self.state is BreakerState.OPEN:
+            if now - self._opened_at < self._open_for:
+                self._rejected += 1
+                return False
+            self._transition(BreakerState.HALF_OPEN)
+            self._probe_successes = 0
+        if self._probes >= self.config.half_open_probes or now < self._next_probe:
+            self._rejected += 1
+            return False
+        self._probes += 1
+        self._next_probe = now + self.config.probe_interval
+        return True
+
+    def record(self, ok: bool, latency: float) -> None:
+        """Record the outcome of a call admitted by :meth:`allow`."""
+        now = self._clock()
+        cfg = self.config
+        slow = cfg.slow_call_seconds is not None and latency >= cfg.slow_call_seconds
+        if self.state is BreakerState.HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            if not ok or slow:
+                self._open(now, self._open_for * 2)
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= cfg.close_after_successes:
+                self._window.reset()
+                self._open_for = cfg.open_seconds
+                self._transition(BreakerState.CLOSED)
+            return
+        self._window.add(now, ok, latency, slow)
+        if self.state is BreakerState.CLOSED and (not ok or slow):
+            calls, errors, slow_calls, _ = self._window.totals(now)
+            if calls >= cfg.min_requests and (
+                errors / calls >= cfg.failure_rate or slow_calls / calls >= cfg.slow_call_rate
+            ):
+                self._open(now, cfg.open_seconds)
+
+    def release(self) -> None:
+        """Give back a probe slot for a call that was cancelled."""
+        if self.state is BreakerState.HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+
+    def _open(self, now: float, duration: float) -> None:
+        self._opened_at = now
+        self._open_for = min(duration, self.config.max_open_seconds)
+        self._probes = 0
+        self._next_probe = 0.0
+        self._transition(BreakerState.OPEN)
+
+    def _transition(self, state: BreakerState) -> None:
+        if state is not self.state:
+            logger.warning(f"Circuit for {self.name}: {self.state.value} -> {state.value}")
+            self.state = state
+
+    @property
+    def health(self) -> float:
+        """Score in [0, 1]: 0 when open, degraded by error and slow-call rates."""
+        if self.state is BreakerState.OPEN:
+            return 0.0
+        calls, errors, slow, _ = self._window.totals(self._clock())
+        score = 1.0
+        if calls:
+            score = (1.0 - errors / calls) * (1.0 - 0.5 * slow / calls)
+        return score * 0.5 if self.state is BreakerState.HALF_OPEN else score
+
+    @property
+    def stats(self) -> Dict:
+        calls, errors, slow, latency = self._window.totals(self._clock())
+        return {
+            "state": self.state.value,
+            "health": round(self.health, 3),
+            "calls": calls,
+            "error_rate": errors / calls if calls else 0.0,
+            "slow_rate": slow / calls if calls else 0.0,
+            "avg_latency": latency / calls if calls else 0.0,
+            "rejected": self._rejected,
+        }
@@ -0,0 +1,781 @@
+"""Multi-process API workers with shared gateway state.
+
+``python -m sms_gateway.cluster --workers 4`` serves the API from several
+uvicorn worker processes accepting on one listening socket. State that
+must hold across workers lives in the launcher process, the
+:class:`Coordinator`: the send rate-limit buckets from
+``rate_limiter.toml``, API client windows, request status, duplicate
+suppression, the number pool and metrics. Workers reach it over a local
+Unix socket. Each worker runs its own queue consumer on the shared SQLite
+send queue, so sending scales with the workers while every limit is
+enforced once for all of them.
+
+Workers never block on the coordinator. :class:`CoordinatorClient` is an
+asyncio connection that pipelines calls, and writes nobody waits for
+(status updates) are sent without a reply. The global and per-provider
+send limits, which every send is charged against, are leased to workers
+in chunks of tokens, so most sends are admitted without a round trip (see
+:class:`SharedRateLimiter`). The ``Shared*`` classes offer the awaitable
+methods the API, gateway and background tasks use.
+
+What a worker observes itself stays per worker: circuit breakers, routing
+latencies and the hedging budget.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from .config import GatewayConfig
+from .dedup import UNKNOWN, DedupConfig, Deduplicator
+from .dlr import StatusEvent
+from .metrics import REGISTRY, merge_snapshots
+from .number_pool import NumberPool
+from .ratelimit import (
+    InMemorySlidingWindow, RateLimitConfig, RateLimiter, RateLimitExceeded, SlidingWindowBackend,
+)
+from .send_queue import SendQueue
+from .status import StatusStore
+
+logger = logging.getLogger(__name__)
+
+COORDINATOR_ENV = "SMS_GATEWAY_COORDINATOR"
+
+# Longest accepted frame (a batch of delivery receipts or a metrics snapshot).
+_MAX_FRAME = 16 * 1024 * 1024
+# Notifications kept while the coordinator is unreachable; the oldest are dropped.
+_MAX_BACKLOG = 100_000
+# Stands for UNKNOWN inside a list result.
+_UNKNOWN_ITEM = {"unknown": True}
+
+
+class CoordinatorError(Exception):
+    """The coordinator could not handle a call."""
+
+
+def _encode(frame) -> bytes:
+    return json.dumps(frame, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def _event_row(event: StatusEvent) -> list:
+    return [getattr(event, name) for name in StatusEvent.__slots__]
+
+
+def _discard_result(fn: Callable) -> Callable:
+    def call(**args) -> None:
+        fn(**args)
+    return call
+
+
+def _log_connect_error(task: "asyncio.Task") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Cannot reach the coordinator: {task.exception()}")
+
+
+class CoordinatorClient:
+    """Pipelined asyncio connection from a worker to the coordinator.
+
+    :meth:`call` writes its request straight away, without waiting for the
+    replies to earlier calls; the coordinator answers each connection in
+    order, so a reader task hands replies to the waiting calls first in,
+    first out. :meth:`notify` only writes. The connection is opened on
+    first use and reopened after an error, and calls waiting when it fails
+    raise :class:`ConnectionError`. A client belongs to one event loop.
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Deque[asyncio.Future] = deque()
+        self._backlog: Deque[bytes] = deque(maxlen=_MAX_BACKLOG)
+        self._connecting: Optional[asyncio.Task] = None
+        self._receiver: Optional[asyncio.Task] = None
+
+    async def call(self, op: str, **args) -> Any:
+        """Run ``op`` in the coordinator and return its result."""
+        writer = self._writer or await self._connect()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(future)
+        writer.write(_encode([op, args]))
+        await writer.drain()
+        try:
+            line = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            raise CoordinatorError(f"{op}: no reply within {self.timeout}s") from None
+        reply = json.loads(line)
+        error = reply.get("error")
+        if error is None:
+            return UNKNOWN if reply.get("unknown") else reply.get("ok")
+        if error == "rate_limited":
+            raise RateLimitExceeded(reply["scope"], reply["wait"])
+        raise CoordinatorError(f"{op}: {reply.get('detail')}")
+
+    def notify(self, op: str, **args) -> None:
+        """Run ``op`` in the coordinator without waiting for it.
+
+        Notifications made while the coordinator is unreachable are sent
+        once the connection is back.
+        """
+        frame = _encode([op, args, False])
+        if self._writer is not None:
+            self._writer.write(frame)
+            return
+        if len(self._backlog) == self._backlog.maxlen:
+            logger.warning("Coordinator backlog full, dropping the oldest notification")
+        self._backlog.append(frame)
+        self._start_connecting()
+
+    def _start_connecting(self) -> "asyncio.Task":
+        if self._connecting is None:
+            self._connecting = asyncio.ensure_future(self._open())
+            self._connecting.add_done_callback(_log_connect_error)
+        return self._connecting
+
+    async def _connect(self) -> asyncio.StreamWriter:
+        while self._writer is None:
+            await asyncio.shield(self._start_connecting())
+        return self._writer
+
+    async def _open(self) -> None:
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_unix_connection(self.path, limit=_MAX_FRAME), self.timeout)
+        finally:
+            self._connecting = None
+        self._writer = writer
+        self._receiver = asyncio.ensure_future(self._receive(reader, writer))
+        while self._backlog:
+            writer.write(self._backlog.popleft())
+
+    async def _receive(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        error = ConnectionError("Coordinator closed the connection")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_result(line)
+        except (OSError, ValueError) as e:
+            error = ConnectionError(f"Coordinator connection failed: {e}")
+        finally:
+            if self._writer is writer:
+                self._writer = None
+            writer.close()
+            pending, self._pending = self._pending, deque()
+            for future in pending:
+                if not future.done():
+                    future.set_exception(error)
+
+    async def close(self) -> None:
+        """Send what is buffered, then close the connection."""
+        if self._connecting is not None:
+            self._connecting.cancel()
+        writer, receiver = self._writer, self._receiver
+        self._writer = self._receiver = None
+        if writer is not None:
+            try:
+                await writer.drain()
+            except OSError:
+                pass
+            writer.close()
+        if receiver is not None:
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+
+
+class _Lease:
+    """Tokens of the global or one provider's buckets set aside for a worker."""
+
+    __slots__ = ("level", "provider", "chunk", "tokens", "ready_at", "expires", "fetching")
+
+    def __init__(self, level: str, provider: Optional[str], chunk: float):
+        self.level = level
+        self.provider = provider
+        self.chunk = chunk
+        self.tokens = 0.0
+        self.ready_at = 0.0
+        self.expires = 0.0
+        self.fetching: Optional[asyncio.Future] = None
+
+
+class SharedRateLimiter(RateLimiter):
+    """Rate limiter whose buckets live in the coordinator.
+
+    Every send is charged to the global buckets and to those of its
+    provider, so the worker leases tokens from them in chunks
+    (``LEASE_SHARE`` of the smallest bucket) and spends them locally: most
+    sends need no round trip. Tokens not spent within ``LEASE_TTL`` seconds
+    are handed back. Sender and destination buckets differ from send to
+    send and are reserved in the coordinator each time. ``config`` must
+    match the coordinator's (both read ``rate_limiter.toml``); it sizes the
+    chunks and skips levels without limits.
+
+    Only the awaitable :meth:`acquire` and :meth:`acquire_many` are
+    supported. ``stats`` counts this worker's sends.
+    """
+
+    LEASE_SHARE = 0.1
+    LEASE_TTL = 1.0
+
+    def __init__(self, client: CoordinatorClient, config: Optional[RateLimitConfig] = None,
+                 clock=time.monotonic):
+        super().__init__(config, clock)
+        self.client = client
+        self._leases: Dict[Tuple[str, Optional[str]], _Lease] = {}
+
+    def reserve(self, *args, **kwargs) -> float:
+        raise NotImplementedError("SharedRateLimiter is awaitable only; use acquire()")
+
+    def reserve_many(self, *args, **kwargs) -> float:
+        raise NotImplementedError("SharedRateLimiter is awaitable only; use acquire_many()")
+
+    async def acquire(self, to: Optional[str] = None, from_number: Optional[str] = None,
+                      provider: Optional[str] = None, cost: float = 1.0, segments: int = 1,
+                      max_wait: Optional[float] = None) -> float:
+        scope = provider or to or "global"
+        taken: List[_Lease] = []
+        wait = 0.0
+        try:
+            for lease in (self._lease("global", None), self._lease("provider", provider)):
+                if lease is not None:
+                    wait = max(wait, await self._take(lease, cost, scope, max_wait))
+                    taken.append(lease)
+            if (from_number and self.config.per_number) or (to and self.config.per_destination):
+                wait = max(wait, await self.client.call(
+                    "limiter.reserve", to=to, from_number=from_number, cost=cost, segments=segments,
+                    max_wait=max_wait, levels=["sender", "destination"]))
+        except BaseException:
+            for lease in taken:
+                lease.tokens += cost
+            raise
+        self._admitted(wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    async def acquire_many(self, requests: Sequence[Dict[str, Any]], max_wait: Optional[float] = None) -> float:
+        wait = await self.client.call("limiter.reserve_many", requests=list(requests), max_wait=max_wait)
+        self._admitted(wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def _admitted(self, wait: float) -> None:
+        self._stats["acquired"] += 1
+        if wait:
+            self._stats["delayed"] += 1
+            self._stats["delay_seconds"] += wait
+
+    def _lease(self, level: str, provider: Optional[str]) -> Optional[_Lease]:
+        lease = self._leases.get((level, provider))
+        if lease is None:
+            if level == "provider":
+                if not provider:
+                    return None
+                limits = self.config.provider_overrides.get(provider, self.config.per_provider)
+            else:
+                limits = self.config.global_limits
+            if not limits:
+                return None
+            chunk = max(1.0, min(limit.capacity for limit in limits) * self.LEASE_SHARE)
+            lease = self._leases[(level, provider)] = _Lease(level, provider, chunk)
+        return lease
+
+    async def _take(self, lease: _Lease, cost: float, scope: str, max_wait: Optional[float]) -> float:
+        """Spend ``cost`` leased tokens, leasing more when short; returns the wait."""
+        while True:
+            now = self._clock()
+            if lease.expires <= now:
+                self._hand_back(lease)
+            if lease.tokens >= cost:
+                wait = max(0.0, lease.ready_at - now)
+                if max_wait is not None and wait > max_wait:
+                    self._stats["deferred"] += 1
+                    raise RateLimitExceeded(scope, wait)
+                lease.tokens -= cost
+                return wait
+            if lease.fetching is not None:
+                # Another send is leasing already; share its chunk.
+                await asyncio.shield(lease.fetching)
+                continue
+            await self._fetch(lease, cost - lease.tokens, max_wait)
+
+    async def _fetch(self, lease: _Lease, needed: float, max_wait: Optional[float]) -> None:
+        lease.fetching = asyncio.get_running_loop().create_future()
+        try:
+            amount = max(lease.chunk, needed)
+            try:
+                wait = await self._lease_call(lease, amount, max_wait)
+            except RateLimitExceeded:
+                if amount <= needed:
+                    raise
+                # A whole chunk would wait too long; lease just what this send needs.
+                amount = needed
+                wait = await self._lease_call(lease, amount, max_wait)
+            lease.tokens += amount
+            lease.ready_at = max(lease.ready_at, self._clock() + wait)
+            lease.expires = lease.ready_at + self.LEASE_TTL
+        finally:
+            lease.fetching.set_result(None)
+            lease.fetching = None
+
+    def _lease_call(self, lease: _Lease, amount: float, max_wait: Optional[float]) -> Awaitable[float]:
+        return self.client.call("limiter.reserve", provider=lease.provider, cost=amount,
+                                max_wait=max_wait, levels=[lease.level])
+
+    def _hand_back(self, lease: _Lease) -> None:
+        if lease.tokens > 0:
+            self.client.notify("limiter.refund", cost=lease.tokens, provider=lease.provider, level=lease.level)
+            lease.tokens = 0.0
+
+    def return_leases(self, expired_only: bool = False) -> None:
+        """Hand unspent leased tokens back to the coordinator (all, or only expired leases)."""
+        now = self._clock()
+        for lease in self._leases.values():
+            if not expired_only or lease.expires <= now:
+                self._hand_back(lease)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        return 0
+
+
+class SharedSlidingWindow(SlidingWindowBackend):
+    """API client windows kept in the coordinator, for ``RateLimitMiddleware``."""
+
+    def __init__(self, client: CoordinatorClient):
+        self.client = client
+
+    async def hit(self, key: str, limit: int, window: float) -> bool:
+        return await self.client.call("window.hit", key=key, limit=limit, window=window)
+
+
+class SharedStatusStore:
+    """Stand-in for :class:`StatusStore` that keeps records in the coordinator.
+
+    Writes are sent without waiting for them; reads are the awaitable
+    ``fetch``, ``apply`` and ``message_states``. ``track`` and
+    ``track_bulk`` return None rather than the new record.
+    """
+
+    def __init__(self, client: CoordinatorClient):
+        self.client = client
+
+    def track(self, request_id: str) -> None:
+        self.client.notify("status.track", request_id=request_id)
+
+    def track_bulk(self, request_id: str, total: int) -> None:
+        self.client.notify("status.track_bulk", request_id=request_id, total=total)
+
+    def discard(self, request_id: str) -> None:
+        self.client.notify("status.discard", request_id=request_id)
+
+    def update(self, request_id: str, state: str, provider: Optional[str] = None,
+               message_id: Optional[str] = None, error: Optional[str] = None,
+               index: Optional[int] = None, recipient: Optional[str] = None) -> None:
+        self.client.notify("status.update", request_id=request_id, state=state, provider=provider,
+                           message_id=message_id, error=error, index=index, recipient=recipient)
+
+    async def fetch(self, request_id: str) -> Optional[Dict]:
+        return await self.client.call("status.fetch", request_id=request_id)
+
+    async def apply(self, events: Iterable[StatusEvent]) -> List[StatusEvent]:
+        rows = await self.client.call("status.apply", events=[_event_row(e) for e in events])
+        return [StatusEvent(*row) for row in rows]
+
+    async def message_states(self, messages: Sequence[Sequence[Optional[str]]]) -> List[Optional[str]]:
+        return await self.client.call("status.message_states", messages=[list(m) for m in messages])
+
+    def purge_expired(self) -> None:
+        self.client.notify("status.purge_expired")
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class SharedDeduplicator:
+    """Stand-in for :class:`Deduplicator` backed by the coordinator's caches.
+
+    Stored responses cross the socket as JSON, so a replayed response is
+    the dict of the original model.
+    """
+
+    def __init__(self, client: CoordinatorClient):
+        self.client = client
+
+    async def claim(self, client_id: Optional[str], idempotency_key: str, response: Any) -> Any:
+        dump = getattr(response, "model_dump", None)
+        return await self.client.call("dedup.claim_key", client_id=client_id, idempotency_key=idempotency_key,
+                                      response=dump() if dump is not None else response)
+
+    def release_key(self, client_id: Optional[str], idempotency_key: str) -> None:
+        self.client.notify("dedup.release_key", client_id=client_id, idempotency_key=idempotency_key)
+
+    async def check(self, recipients: Sequence[str], body: str, request_id: str,
+                    from_number: Optional[str] = None) -> List[Any]:
+        earlier = await self.client.call("dedup.check", recipients=list(recipients), body=body,
+                                         request_id=request_id, from_number=from_number)
+        return [UNKNOWN if e == _UNKNOWN_ITEM else e for e in earlier]
+
+    def release_message(self, to: str, body: str, from_number: Optional[str] = None) -> None:
+        self.client.notify("dedup.release_message", to=to, body=body, from_number=from_number)
+
+
+class SharedNumberPool:
+    """Stand-in for :class:`NumberPool` served (and persisted) by the coordinator.
+
+    ``stats`` is the coordinator's as of the last :meth:`refresh`, which
+    :class:`WorkerState` runs with every metrics push. Loading, expiry and
+    closing are the coordinator's job, so those methods do nothing here.
+    """
+
+    def __init__(self, client: CoordinatorClient):
+        self.client = client
+        self._stats: Dict = {"total": 0, "daily_limit": 0}
+
+    def add_number(self, number: str, provider: str) -> None:
+        self.client.notify("pool.add_number", number=number, provider=provider)
+
+    async def assign_number(self, target: str, task_id: str = None,
+                            provider: Optional[str] = None) -> Optional[str]:
+        return await self.client.call("pool.assign_number", target=target, task_id=task_id, provider=provider)
+
+    async def release_number(self, number: str, cooldown: bool = True) -> None:
+        await self.client.call("pool.release_number", number=number, cooldown=cooldown)
+
+    async def assign_batch(self, targets: List[str], task_id: str = None,
+                           provider: Optional[str] = None) -> Dict[str, str]:
+        return await self.client.call("pool.assign_batch", targets=list(targets), task_id=task_id,
+                                      provider=provider)
+
+    async def refresh(self) -> Dict:
+        self._stats = await self.client.call("pool.stats")
+        return self._stats
+
+    @property
+    def stats(self) -> Dict:
+        return self._stats
+
+    def load(self) -> int:
+        return 0
+
+    def start(self, interval: float = 60.0) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class Coordinator:
+    """Owner of the state shared by all workers, served on a Unix socket.
+
+    Components default to the ones a single-process API would build from
+    ``config``. Metrics snapshots are kept per worker pid, including those
+    of exited workers, so merged counters never go backwards.
+    """
+
+    def __init__(self, config: Optional[GatewayConfig] = None, rate_limiter: Optional[RateLimiter] = None,
+                 status: Optional[StatusStore] = None, deduplicator: Optional[Deduplicator] = None,
+                 number_pool: Optional[NumberPool] = None):
+        config = config or GatewayConfig()
+        self.rate_limiter = rate_limiter or RateLimiter.from_toml(config.rate_limit_config)
+        self.window = InMemorySlidingWindow()
+        self.status = status or StatusStore(ttl=config.status_ttl_seconds, path=config.status_store_path)
+        self.deduplicator = deduplicator or Deduplicator(DedupConfig.from_toml(config.rate_limit_config))
+        self.number_pool = number_pool or NumberPool(path=config.number_pool_path)
+        self.path: Optional[str] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._snapshots: Dict[int, Dict] = {}
+        self._tasks: Set[asyncio.Future] = set()
+        limiter, store, dedup, pool = self.rate_limiter, self.status, self.deduplicator, self.number_pool
+        self._ops: Dict[str, Callable[..., Any]] = {
+            "limiter.reserve": limiter.reserve,
+            "limiter.reserve_many": limiter.reserve_many,
+            "limiter.refund": limiter.refund,
+            "limiter.stats": lambda: limiter.stats,
+            "window.hit": self.window.check,
+            "status.track": _discard_result(store.track),
+            "status.track_bulk": _discard_result(store.track_bulk),
+            "status.discard": store.discard,
+            "status.update": store.update,
+            "status.fetch": store.fetch,
+            "status.apply": self._apply_events,
+            "status.message_states": store.message_states,
+            "status.purge_expired": store.purge_expired,
+            "dedup.claim_key": dedup.claim_key,
+            "dedup.release_key": dedup.release_key,
+            "dedup.check": self._check_messages,
+            "dedup.release_message": dedup.release_message,
+            "dedup.stats": lambda: dedup.stats,
+            "pool.add_number": pool.add_number,
+            "pool.assign_number": pool.assign_number,
+            "pool.release_number": pool.release_number,
+            "pool.assign_batch": pool.assign_batch,
+            "pool.stats": lambda: pool.stats,
+            "metrics.push": self._push_metrics,
+            "metrics.exchange": self._exchange_metrics,
+        }
+
+    def dispatch(self, op: str, args: Dict[str, Any]) -> Union[Dict[str, Any], Awaitable[Dict[str, Any]]]:
+        """Run one call and build its reply (an awaitable one for async handlers)."""
+        handler = self._ops.get(op)
+        if handler is None:
+            return {"error": "unknown_op", "detail": op}
+        try:
+            result = handler(**args)
+        except Exception as e:
+            return self._failure(op, e)
+        if asyncio.iscoroutine(result):
+            return self._finish(op, result)
+        return self._success(result)
+
+    async def _finish(self, op: str, pending: Awaitable) -> Dict[str, Any]:
+        try:
+            result = await pending
+        except Exception as e:
+            return self._failure(op, e)
+        return self._success(result)
+
+    @staticmethod
+    def _success(result: Any) -> Dict[str, Any]:
+        if result is UNKNOWN:
+            return {"unknown": True}
+        return {"ok": result}
+
+    @staticmethod
+    def _failure(op: str, error: Exception) -> Dict[str, Any]:
+        if isinstance(error, RateLimitExceeded):
+            return {"error": "rate_limited", "scope": error.scope, "wait": error.wait}
+        logger.error(f"Coordinator call {op} failed: {error}")
+        return {"error": "failed", "detail": str(error)}
+
+    async def _apply_events(self, events: List[list]) -> List[list]:
+        applied = await self.status.apply(StatusEvent(*row) for row in events)
+        return [_event_row(e) for e in applied]
+
+    def _check_messages(self, recipients: List[str], body: str, request_id: str,
+                        from_number: Optional[str] = None) -> List[Any]:
+        earlier = [self.deduplicator.check_message(to, body, request_id, from_number) for to in recipients]
+        return [_UNKNOWN_ITEM if e is UNKNOWN else e for e in earlier]
+
+    def _push_metrics(self, pid: int, snapshot: Dict) -> None:
+        self._snapshots[pid] = snapshot
+
+    def _exchange_metrics(self, pid: int, snapshot: Dict) -> Dict:
+        """Store a worker's snapshot and return the sum over all processes."""
+        self._snapshots[pid] = snapshot
+        merged = merge_snapshots([REGISTRY.snapshot(), *self._snapshots.values()])
+        return {name: [[list(labels), value] for labels, value in totals.items()]
+                for name, totals in merged.items()}
+
+    async def start(self, path: str) -> None:
+        self.number_pool.load()
+        self.number_pool.start()
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = await asyncio.start_unix_server(self._serve, path, limit=_MAX_FRAME)
+        self.path = path
+        logger.info(f"Coordinator listening on {path}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.number_pool.stop()
+        self.number_pool.close()
+        self.status.close()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # Replies go out in request order; async handlers run concurrently meanwhile.
+        replies: asyncio.Queue = asyncio.Queue()
+        sender = asyncio.ensure_future(self._send_replies(replies, writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                frame = json.loads(line)
+                reply = self.dispatch(frame[0], frame[1])
+                if not isinstance(reply, dict):
+                    reply = asyncio.ensure_future(reply)
+                if len(frame) < 3 or frame[2]:
+                    replies.put_nowait(reply)
+                elif not isinstance(reply, dict):
+                    self._tasks.add(reply)
+                    reply.add_done_callback(self._tasks.discard)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            replies.put_nowait(None)
+            await asyncio.gather(sender, return_exceptions=True)
+            writer.close()
+
+    @staticmethod
+    async def _send_replies(replies: asyncio.Queue, writer: asyncio.StreamWriter) -> None:
+        while True:
+            reply = await replies.get()
+            if reply is None:
+                return
+            if not isinstance(reply, dict):
+                reply = await reply
+            writer.write(_encode(reply))
+            if replies.empty():
+                await writer.drain()
+
+    @property
+    def stats(self) -> Dict:
+        return {"workers_seen": len(self._snapshots), "status_records": len(self.status)}
+
+
+class WorkerState:
+    """Coordinator-backed state of one API worker.
+
+    ``sms_gateway.api`` builds its gateway from these when started by the
+    launcher. Between :meth:`start` and :meth:`stop`, every
+    ``push_interval`` seconds metrics are pushed to the coordinator,
+    expired rate-limit leases handed back and number pool stats refreshed.
+    """
+
+    def __init__(self, path: str, rate_limit_config: Optional[str] = None, push_interval: float = 1.0):
+        self.client = CoordinatorClient(path)
+        self.status = SharedStatusStore(self.client)
+        self.rate_limiter = SharedRateLimiter(self.client, RateLimitConfig.from_toml(rate_limit_config))
+        self.deduplicator = SharedDeduplicator(self.client)
+        self.window = SharedSlidingWindow(self.client)
+        self.number_pool = SharedNumberPool(self.client)
+        self.push_interval = push_interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            await self._refresh_pool()
+            self._task = asyncio.create_task(self._push_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.rate_limiter.return_leases()
+        self.push_metrics()
+        await self.client.close()
+
+    def push_metrics(self) -> None:
+        self.client.notify("metrics.push", pid=os.getpid(), snapshot=REGISTRY.snapshot())
+
+    async def merged_metrics(self) -> Dict:
+        """Counter and histogram totals of all workers, for ``Registry.render``."""
+        merged = await self.client.call("metrics.exchange", pid=os.getpid(), snapshot=REGISTRY.snapshot())
+        return merge_snapshots([merged])
+
+    async def _refresh_pool(self) -> None:
+        try:
+            await self.number_pool.refresh()
+        except (OSError, CoordinatorError) as e:
+            logger.warning(f"Number pool stats from coordinator unavailable: {e}")
+
+    async def _push_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.push_interval)
+            self.rate_limiter.return_leases(expired_only=True)
+            self.push_metrics()
+            await self._refresh_pool()
+
+
+def _serve_worker(listener: socket.socket, app: str, log_level: str) -> None:
+    import uvicorn  # optional: only needed to serve the API
+
+    uvicorn.Server(uvicorn.Config(app, log_level=log_level)).run(sockets=[listener])
+
+
+async def serve(workers: int, host: str = "0.0.0.0", port: int = 8000, app: str = "sms_gateway.api:app",
+                socket_path: Optional[str] = None, log_level: str = "info") -> None:
+    """Run the coordinator and ``workers`` API processes until SIGINT or SIGTERM.
+
+    Workers that exit are restarted; their in-flight messages become
+    claimable again when their leases expire.
+    """
+    config = GatewayConfig.from_env()
+    path = socket_path or os.path.join(tempfile.mkdtemp(prefix="sms-gateway-"), "coordinator.sock")
+    # Workers never reset in-flight rows (they would take each other's), so do it once here.
+    queue = SendQueue.from_url(config.database_url)
+    await queue.open(recover_inflight=True)
+    await queue.close()
+    coordinator = Coordinator(config)
+    await coordinator.start(path)
+    os.environ[COORDINATOR_ENV] = path
+
+    listener = socket.create_server((host, port))
+    context = multiprocessing.get_context("spawn")
+
+    def start_worker():
+        process = context.Process(target=_serve_worker, args=(listener, app, log_level), daemon=True)
+        process.start()
+        logger.info(f"Started worker {process.pid}")
+        return process
+
+    processes = [start_worker() for _ in range(workers)]
+    loop = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    try:
+        while not stopping.is_set():
+            for i, process in enumerate(processes):
+                if not process.is_alive():
+                    logger.warning(f"Worker {process.pid} exited with {process.exitcode}, restarting")
+                    processes[i] = start_worker()
+            try:
+                await asyncio.wait_for(stopping.wait(), 0.5)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        logger.info("Stopping workers")
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            await loop.run_in_executor(None, process.join, 30)
+        listener.close()
+        await coordinator.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m sms_gateway.cluster",
+                                     description="Serve the SMS gateway API from several worker processes.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--app", default="sms_gateway.api:app")
+    parser.add_argument("--socket", help="coordinator socket path (default: a private temp dir)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper())
+    asyncio.run(serve(args.workers, args.host, args.port, args.app, args.socket, args.log_level))
+
+
+if __name__ == "__main__":
+    main()
@@ -30,8 +30,22 @@ class GatewayConfig:
     max_concurrent_sends: int = 50
     default_provider: Optional[str] = None
     rate_limit_per_second: int = 10
+    # Per-client HTTP API quota; None leaves the API unlimited.
+    api_rate_limit_per_minute: Optional[int] = None
     redis_url: str = "redis://localhost:6379/0"
     database_url: str = "sqlite:///sms_gateway.db"
+    status_store_path: Optional[str] = None
+    status_ttl_seconds: int = 86400
+    rate_limit_config: Optional[str] = None
+    number_pool_path: Optional[str] = None
+    # Set by sms_gateway.cluster in the workers it starts.
+    coordinator_socket: Optional[str] = None
+    # Receipt webhook signing secrets and callback URL tokens by provider
+    # (see sms_gateway.signatures); receipts from other providers are rejected.
+    dlr_secrets: Dict[str, str] = field(default_factory=dict)
+    dlr_tokens: Dict[str, str] = field(default_factory=dict)
+    # Base URL carriers call, when a proxy makes it differ from the one we see.
+    public_url: Optional[str] = None
     providers: Dict[str, ProviderConfig] = field(default_factory=dict)
 
     @classmethod
@@ -43,8 +57,18 @@ class GatewayConfig:
             max_concurrent_sends=int(os.getenv("MAX_CONCURRENT_SENDS", "50")),
             default_provider=os.getenv("DEFAULT_PROVIDER"),
             rate_limit_per_second=int(os.getenv("RATE_LIMIT_PER_SECOND", "10")),
+            api_rate_limit_per_minute=int(os.environ["API_RATE_LIMIT_PER_MINUTE"])
+            if os.getenv("API_RATE_LIMIT_PER_MINUTE") else None,
             redis_url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
             database_url=os.getenv("DATABASE_URL", "sqlite:///sms_gateway.db"),
+            status_store_path=os.getenv("STATUS_STORE_PATH"),
+            status_ttl_seconds=int(os.getenv("STATUS_TTL_SECONDS", "86400")),
+            rate_limit_config=os.getenv("RATE_LIMIT_CONFIG"),
+            number_pool_path=os.getenv("NUMBER_POOL_PATH"),
+            coordinator_socket=os.getenv("SMS_GATEWAY_COORDINATOR"),
+            dlr_secrets=json.loads(os.getenv("DLR_SECRETS", "{}")),
+            dlr_tokens=json.loads(os.getenv("DLR_TOKENS", "{}")),
+            public_url=os.getenv("PUBLIC_URL"),
         )
         logger.info(f"Loaded config for environment: {config.environment}")
         return config
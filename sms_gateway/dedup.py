@@ -0,0 +1,275 @@
+"""Duplicate suppression for accepted messages.
+
+Two kinds of duplicates are caught before a message is queued:
+
+* Client retries that carry the same ``Idempotency-Key`` header get the
+  original response back instead of queueing the message again.
+* The same body sent to the same number within
+  ``[per_destination] duplicate_check_window`` seconds is rejected.
+
+Both are backed by :class:`DedupCache`, which keys entries by a 64-bit
+fingerprint and expires them by time slice, so memory is bounded and
+expiry needs no per-entry timers.
+"""
+import hashlib
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
+
+from .ratelimit import DEFAULT_RATE_LIMIT_PATH, _load_toml
+
+# Returned for a key whose value was evicted but which the Bloom filter still knows.
+UNKNOWN: Any = object()
+
+_MISSING = object()
+
+
+def fingerprint(*parts: str) -> int:
+    """Stable 64-bit hash of ``parts``."""
+    h = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return int.from_bytes(h.digest(), "big")
+
+
+def message_fingerprint(to: str, body: str, from_number: Optional[str] = None) -> int:
+    return fingerprint(to.lstrip("+"), body, from_number or "")
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 64-bit fingerprints.
+
+    Bit positions come from the two 32-bit halves of the fingerprint
+    (Kirsch-Mitzenmacher double hashing), so no extra hashing is needed.
+    """
+
+    __slots__ = ("size", "hashes", "bits")
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, key: int) -> List[int]:
+        h1, h2 = key & 0xFFFFFFFF, (key >> 32) | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add_positions(self, positions: List[int]) -> None:
+        bits = self.bits
+        for p in positions:
+            bits[p >> 3] |= 1 << (p & 7)
+
+    def has_positions(self, positions: List[int]) -> bool:
+        bits = self.bits
+        for p in positions:
+            if not bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+    def add(self, key: int) -> None:
+        self.add_positions(self.positions(key))
+
+    def __contains__(self, key: int) -> bool:
+        return self.has_positions(self.positions(key))
+
+
+class _Slice:
+    """Entries added during one time slice of the window."""
+
+    __slots__ = ("slot", "entries", "bloom", "complete")
+
+    def __init__(self, slot: int, bloom: Optional[BloomFilter]):
+        self.slot = slot
+        self.entries: Dict[int, Any] = {}
+        self.bloom = bloom
+        # False once entries were evicted; the Bloom filter is then authoritative.
+        self.complete = True
+
+
+class DedupCache:
+    """Time-sliced, memory-bounded map of recently seen fingerprints.
+
+    The window is split into ``slices``; a key lives in the slice it was
+    added in and expires with it. At most ``max_entries`` values are kept,
+    evicting the oldest slices first. With ``bloom_capacity`` (expected keys
+    per window) every slice also gets a Bloom filter: lookups of new keys
+    touch only the filters, and keys whose values were evicted are still
+    recognised, at under two bytes per key (for a 0.1% error rate).
+    """
+
+    def __init__(self, window: float = 3600.0, slices: int = 12, max_entries: int = 100_000,
+                 bloom_capacity: int = 0, error_rate: float = 0.001,
+                 clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.slices = slices
+        self.max_entries = max_entries
+        self.bloom_capacity = bloom_capacity
+        self.error_rate = error_rate
+        self._clock = clock
+        self._width = window / slices
+        self._slices: Deque[_Slice] = deque()
+        self._size = 0
+        self._stats = {"added": 0, "hits": 0, "bloom_hits": 0, "evicted": 0}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _current(self) -> _Slice:
+        slot = int(self._clock() // self._width)
+        slices = self._slices
+        while slices and slices[0].slot <= slot - self.slices:
+            self._size -= len(slices.popleft().entries)
+        if not slices or slices[-1].slot != slot:
+            bloom = None
+            if self.bloom_capacity:
+                bloom = BloomFilter(math.ceil(self.bloom_capacity / self.slices), self.error_rate)
+            slices.append(_Slice(slot, bloom))
+        return slices[-1]
+
+    def _lookup(self, key: int, positions: Optional[List[int]]) -> Any:
+        for s in reversed(self._slices):
+            if positions is not None and not s.bloom.has_positions(positions):
+                continue
+            value = s.entries.get(key, _MISSING)
+            if value is not _MISSING:
+                self._stats["hits"] += 1
+                return value
+            if positions is not None and not s.complete:
+                self._stats["bloom_hits"] += 1
+                return UNKNOWN
+        return None
+
+    def get(self, key: int) -> Any:
+        """The value stored for ``key`` in the window, :data:`UNKNOWN` or None."""
+        current = self._current()
+        # Every slice's filter has the same shape, so positions are computed once.
+        positions = current.bloom.positions(key) if current.bloom is not None else None
+        return self._lookup(key, positions)
+
+    def add(self, key: int, value: Any) -> Any:
+        """Store ``value`` unless ``key`` was seen; return the earlier value or None."""
+        current = self._current()
+        positions = current.bloom.positions(key) if current.bloom is not None else None
+        earlier = self._lookup(key, positions)
+        if earlier is not None:
+            return earlier
+        current.entries[key] = value
+        if positions is not None:
+            current.bloom.add_positions(positions)
+        self._size += 1
+        self._stats["added"] += 1
+        if self._size > self.max_entries:
+            self._evict()
+        return None
+
+    def discard(self, key: int) -> None:
+        """Forget ``key`` (e.g. when the request it belonged to failed)."""
+        for s in self._slices:
+            if s.entries.pop(key, _MISSING) is not _MISSING:
+                self._size -= 1
+
+    def _evict(self) -> None:
+        for s in self._slices:
+            if s.entries:
+                self._size -= len(s.entries)
+                self._stats["evicted"] += len(s.entries)
+                s.entries = {}
+                s.complete = False
+                return
+
+    @property
+    def stats(self) -> Dict:
+        bloom_bytes = sum(len(s.bloom.bits) for s in self._slices if s.bloom is not None)
+        return {**self._stats, "entries": self._size, "slices": len(self._slices), "bloom_bytes": bloom_bytes}
+
+
+@dataclass
+class DedupConfig:
+    """Windows and memory bounds for duplicate suppression.
+
+    ``window`` is ``[per_destination] duplicate_check_window`` (0 disables
+    content checks); the other fields come from the ``[dedup]`` section.
+    """
+    window: float = 3600.0
+    idempotency_ttl: float = 86400.0
+    max_idempotency_keys: int = 100_000
+    max_entries: int = 1_000_000
+    bloom_capacity: int = 0
+    error_rate: float = 0.001
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DedupConfig":
+        config = cls()
+        window = data.get("per_destination", {}).get("duplicate_check_window")
+        if window is not None:
+            config.window = float(window)
+        section = data.get("dedup", {})
+        for name in ("idempotency_ttl", "max_idempotency_keys", "max_entries", "bloom_capacity", "error_rate"):
+            if name in section:
+                setattr(config, name, type(getattr(config, name))(section[name]))
+        return config
+
+    @classmethod
+    def from_toml(cls, path: Optional[Path] = None) -> "DedupConfig":
+        return cls.from_dict(_load_toml(Path(path or DEFAULT_RATE_LIMIT_PATH)))
+
+
+class Deduplicator:
+    """Idempotency keys and content fingerprints of accepted messages."""
+
+    def __init__(self, config: Optional[DedupConfig] = None, clock: Callable[[], float] = time.monotonic):
+        self.config = config or DedupConfig()
+        cfg = self.config
+        self.keys = DedupCache(cfg.idempotency_ttl, max_entries=cfg.max_idempotency_keys, clock=clock)
+        self.messages: Optional[DedupCache] = None
+        if cfg.window > 0:
+            self.messages = DedupCache(cfg.window, max_entries=cfg.max_entries,
+                                       bloom_capacity=cfg.bloom_capacity, error_rate=cfg.error_rate,
+                                       clock=clock)
+
+    @staticmethod
+    def _key(client_id: Optional[str], idempotency_key: str) -> int:
+        return fingerprint(client_id or "", idempotency_key)
+
+    def claim_key(self, client_id: Optional[str], idempotency_key: str, response: Any) -> Any:
+        """Reserve ``idempotency_key`` for ``response``; the earlier response if it was used."""
+        return self.keys.add(self._key(client_id, idempotency_key), response)
+
+    def release_key(self, client_id: Optional[str], idempotency_key: str) -> None:
+        self.keys.discard(self._key(client_id, idempotency_key))
+
+    def check_message(self, to: str, body: str, request_id: str,
+                      from_number: Optional[str] = None) -> Any:
+        """Record a message; the request id (or :data:`UNKNOWN`) of an earlier identical one."""
+        if self.messages is None:
+            return None
+        return self.messages.add(message_fingerprint(to, body, from_number), request_id)
+
+    def release_message(self, to: str, body: str, from_number: Optional[str] = None) -> None:
+        if self.messages is not None:
+            self.messages.discard(message_fingerprint(to, body, from_number))
+
+    # Awaitable forms for API handlers, so a shared deduplicator
+    # (sms_gateway.cluster) can answer without blocking the event loop.
+
+    async def claim(self, client_id: Optional[str], idempotency_key: str, response: Any) -> Any:
+        """:meth:`claim_key`, awaitable."""
+        return self.claim_key(client_id, idempotency_key, response)
+
+    async def check(self, recipients: Sequence[str], body: str, request_id: str,
+                    from_number: Optional[str] = None) -> List[Any]:
+        """:meth:`check_message` for each recipient, awaitable."""
+        return [self.check_message(to, body, request_id, from_number) for to in recipients]
+
+    @property
+    def stats(self) -> Dict:
+        return {
+            "idempotency": self.keys.stats,
+            "messages": self.messages.stats if self.messages is not None else None,
+        }
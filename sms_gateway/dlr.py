@@ -0,0 +1,218 @@
+"""Delivery-receipt (DLR) webhook parsing and micro-batched ingestion.
+
+Carriers push delivery receipts to ``/api/v1/dlr/{provider}``. Each
+provider's payload is normalised into :class:`StatusEvent` objects by a
+parser in :data:`PARSERS`; the :class:`DLRIngestor` buffers events and
+applies them to the :class:`~sms_gateway.status.StatusStore` in batches, so
+a burst of receipts costs one store pass (and one SQLite transaction) per
+batch rather than per receipt.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional
+
+from .providers.base import DeliveryStatus
+from .records import SlotRecord
+from .status import StatusStore
+
+logger = logging.getLogger(__name__)
+
+
+class DLRParseError(ValueError):
+    """Raised when a webhook payload is not a receipt we understand."""
+
+
+class StatusEvent(SlotRecord):
+    """One normalised delivery receipt."""
+
+    __slots__ = ("provider", "message_id", "state", "recipient", "error", "raw_status", "received_at")
+
+    def __init__(self, provider: str, message_id: str, state: str, recipient: Optional[str] = None,
+                 error: Optional[str] = None, raw_status: Optional[str] = None,
+                 received_at: Optional[float] = None):
+        self.provider = provider
+        self.message_id = message_id
+        self.state = state
+        self.recipient = recipient
+        self.error = error
+        self.raw_status = raw_status
+        self.received_at = received_at or time.time()
+
+
+def _event(provider: str, message_id: Any, raw_status: Any, recipient: Any = None,
+           error: Any = None) -> StatusEvent:
+    if not message_id:
+        raise DLRParseError(f"{provider} receipt without a message id")
+    status = str(raw_status) if raw_status is not None else None
+    return StatusEvent(
+        provider, str(message_id), DeliveryStatus.normalize(status).value,
+        recipient=str(recipient) if recipient else None,
+        error=str(error) if error else None, raw_status=status,
+    )
+
+
+def parse_twilio(payload: Mapping) -> List[StatusEvent]:
+    """Twilio status callback (form-encoded)."""
+    error = payload.get("ErrorCode")
+    if error and payload.get("ErrorMessage"):
+        error = f"{error}: {payload['ErrorMessage']}"
+    return [_event("twilio", payload.get("MessageSid") or payload.get("SmsSid"),
+                   payload.get("MessageStatus") or payload.get("SmsStatus"), payload.get("To"), error)]
+
+
+def parse_telnyx(payload: Mapping) -> List[StatusEvent]:
+    """Telnyx ``message.sent`` / ``message.finalized`` webhook (JSON)."""
+    data = payload.get("data") or {}
+    message = data.get("payload") or {}
+    errors = message.get("errors") or []
+    error = "; ".join(str(e.get("detail") or e.get("title") or e.get("code")) for e in errors) or None
+    recipients = message.get("to") or []
+    if not recipients:
+        return [_event("telnyx", message.get("id"), None, error=error)]
+    return [
+        _event("telnyx", message.get("id"), to.get("status"), to.get("phone_number"), error)
+        for to in recipients
+    ]
+
+
+def parse_vonage(payload: Mapping) -> List[StatusEvent]:
+    """Vonage SMS API delivery receipt (query string, form or JSON)."""
+    error = payload.get("err-code")
+    if error in ("0", 0):
+        error = None
+    return [_event("vonage", payload.get("messageId"), payload.get("status"), payload.get("msisdn"), error)]
+
+
+def parse_messagebird(payload: Mapping) -> List[StatusEvent]:
+    """MessageBird status report (query string or JSON)."""
+    return [_event("messagebird", payload.get("id"), payload.get("status"),
+                   payload.get("recipient"), payload.get("statusErrorCode"))]
+
+
+def parse_aliyun(payload: Any) -> List[StatusEvent]:
+    """Aliyun SmsReport HTTP push: a JSON list of reports."""
+    reports = payload if isinstance(payload, list) else [payload]
+    events = []
+    for report in reports:
+        ok = report.get("success")
+        state = "delivered" if ok in (True, "true") else "undelivered"
+        error = None if state == "delivered" else report.get("err_msg") or report.get("err_code")
+        events.append(_event("aliyun", report.get("biz_id"), state, report.get("phone_number"), error))
+    return events
+
+
+PARSERS: Dict[str, Callable[[Any], List[StatusEvent]]] = {
+    "twilio": parse_twilio,
+    "telnyx": parse_telnyx,
+    "vonage": parse_vonage,
+    "messagebird": parse_messagebird,
+    "aliyun": parse_aliyun,
+}
+
+
+def parse(provider: str, payload: Any) -> List[StatusEvent]:
+    """Normalise one webhook payload; raises KeyError for unknown providers."""
+    parser = PARSERS[provider]
+    try:
+        return parser(payload)
+    except (AttributeError, TypeError) as e:
+        raise DLRParseError(f"Malformed {provider} receipt: {e}") from None
+
+
+class DLRIngestor:
+    """Buffers status events and applies them to a status store in batches.
+
+    ``submit`` only appends to a buffer, so webhook handlers return at
+    once. A background task applies the buffer every ``flush_interval``
+    seconds, or as soon as ``batch_size`` events are waiting. Receipts that
+    arrive before the send result was recorded are retried with later
+    batches for up to ``orphan_ttl`` seconds.
+    """
+
+    def __init__(self, store: StatusStore, batch_size: int = 1000, flush_interval: float = 0.05,
+                 max_pending: int = 100_000, orphan_ttl: float = 60.0):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.orphan_ttl = orphan_ttl
+        self._pending: List[StatusEvent] = []
+        self._orphans: deque = deque()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"received": 0, "applied": 0, "unmatched": 0, "dropped": 0, "batches": 0}
+
+    def submit(self, events: Iterable[StatusEvent]) -> bool:
+        """Queue events; returns False (dropping them) when the buffer is full."""
+        events = list(events)
+        if len(self._pending) + len(events) > self.max_pending:
+            self._stats["dropped"] += len(events)
+            return False
+        self._pending.extend(events)
+        self._stats["received"] += len(events)
+        if len(self._pending) >= self.batch_size and self._wake is not None:
+            self._wake.set()
+        return True
+
+    def flush(self) -> int:
+        """Apply everything buffered now; returns the number of events applied."""
+        batch = self._take()
+        return self._settle(batch, self.store.apply_events(batch)) if batch else 0
+
+    async def _flush(self) -> int:
+        """:meth:`flush` with the store's disk reads kept off the event loop."""
+        batch = self._take()
+        return self._settle(batch, await self.store.apply(batch)) if batch else 0
+
+    def _take(self) -> List[StatusEvent]:
+        batch, self._pending = self._pending, []
+        batch.extend(self._orphans)
+        self._orphans.clear()
+        return batch
+
+    def _settle(self, batch: List[StatusEvent], unmatched: List[StatusEvent]) -> int:
+        applied = len(batch) - len(unmatched)
+        cutoff = time.time() - self.orphan_ttl
+        for event in unmatched:
+            if event.received_at >= cutoff:
+                self._orphans.append(event)
+            else:
+                self._stats["unmatched"] += 1
+                logger.debug(f"No request for {event.provider} message {event.message_id}")
+        self._stats["applied"] += applied
+        self._stats["batches"] += 1
+        return applied
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wake = None
+        await self._flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error(f"Applying delivery receipts failed: {e}")
+
+    @property
+    def stats(self) -> Dict:
+        return {**self._stats, "pending": len(self._pending), "orphans": len(self._orphans)}
@@ -0,0 +1,175 @@
+"""GSM-7 / UCS-2 classification, segment counting and splitting.
+
+A message is sent as GSM-7 when every character is in the GSM 03.38 basic
+set or its extension table (extension characters take two septets, an
+escape plus the character). Otherwise the whole message is UCS-2, counted
+in UTF-16 code units. Single messages hold 160 septets or 70 code units;
+concatenated parts lose room to the UDH and hold 153 or 67, and a part
+never splits an escape sequence or a surrogate pair.
+
+Classification uses precomputed tables: ASCII text (the common case) is
+checked with ``bytes.translate`` deletion tables, anything else by comparing
+its character set with the GSM-7 sets. Both run at C speed, and repeated
+bodies (bulk sends) hit a small cache.
+"""
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, NamedTuple
+
+GSM7 = "GSM-7"
+UCS2 = "UCS-2"
+
+GSM7_BASIC = (
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENSION = "\f^{}\\[~]|€"
+
+SINGLE_LIMITS = {GSM7: 160, UCS2: 70}
+MULTIPART_LIMITS = {GSM7: 153, UCS2: 67}
+
+_BASIC_CHARS = frozenset(GSM7_BASIC)
+_EXTENSION_CHARS = frozenset(GSM7_EXTENSION)
+_GSM7_CHARS = _BASIC_CHARS | _EXTENSION_CHARS
+_ASCII_BASIC = bytes(c for c in range(128) if chr(c) in _BASIC_CHARS)
+_ASCII_EXTENSION = bytes(c for c in range(128) if chr(c) in _EXTENSION_CHARS)
+
+# Common characters outside GSM-7 and their closest GSM-7 spelling.
+TRANSLITERATIONS: Dict[str, str] = {
+    "‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'", "`": "'",
+    "“": '"', "”": '"', "„": '"', "‟": '"', "″": '"',
+    "«": '"', "»": '"',
+    "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-", "―": "-",
+    "−": "-", "…": "...", "•": "*", "·": ".",
+    " ": " ", " ": " ", " ": " ", " ": " ", "​": "",
+    "\t": " ", "ç": "Ç", "ª": "a", "º": "o",
+    "©": "(c)", "®": "(R)", "™": "TM",
+}
+_TRANSLITERATE = str.maketrans(TRANSLITERATIONS)
+
+
+class SegmentInfo(NamedTuple):
+    encoding: str
+    units: int
+    segments: int
+
+    @property
+    def per_segment(self) -> int:
+        """Units that fit in each segment for this message."""
+        if self.segments <= 1:
+            return SINGLE_LIMITS[self.encoding]
+        return MULTIPART_LIMITS[self.encoding]
+
+
+def is_gsm7(text: str) -> bool:
+    return _GSM7_CHARS.issuperset(text)
+
+
+@lru_cache(maxsize=4096)
+def segment_info(text: str) -> SegmentInfo:
+    """Encoding, length in septets/code units and exact segment count."""
+    if text.isascii():
+        rest = text.encode("ascii").translate(None, _ASCII_BASIC)
+        gsm7 = not rest or not rest.translate(None, _ASCII_EXTENSION)
+        # Extension characters take an escape septet as well.
+        extended = len(rest)
+    else:
+        chars = set(text)
+        gsm7 = chars <= _GSM7_CHARS
+        extended = gsm7 and sum(text.count(c) for c in chars & _EXTENSION_CHARS)
+    if gsm7:
+        units = len(text) + extended
+        if units <= SINGLE_LIMITS[GSM7]:
+            return SegmentInfo(GSM7, units, 1 if units else 0)
+        return SegmentInfo(GSM7, units, _multipart_count(text, GSM7, units, bool(extended)))
+    units = len(text.encode("utf-16-le")) // 2
+    if units <= SINGLE_LIMITS[UCS2]:
+        return SegmentInfo(UCS2, units, 1)
+    return SegmentInfo(UCS2, units, _multipart_count(text, UCS2, units, units != len(text)))
+
+
+def _multipart_count(text: str, encoding: str, units: int, wide: bool) -> int:
+    """Segments for a multipart message of ``units`` units.
+
+    Only two-unit characters (``wide``) can push a part boundary back, and
+    by at most one unit per part, so the exact split is needed only when
+    the bounds with and without that loss disagree.
+    """
+    limit = MULTIPART_LIMITS[encoding]
+    fewest = -(-units // limit)
+    if not wide or fewest == -(-units // (limit - 1)):
+        return fewest
+    return len(_split_units(text, encoding))
+
+
+def segment_count(text: str) -> int:
+    """Number of SMS segments ``text`` is billed and rate limited as."""
+    return segment_info(text).segments
+
+
+def _units(text: str, encoding: str) -> int:
+    if encoding == GSM7:
+        if text.isascii():
+            return len(text) + len(text.encode("ascii").translate(None, _ASCII_BASIC))
+        return len(text) + sum(text.count(c) for c in _EXTENSION_CHARS.intersection(text))
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _split_units(text: str, encoding: str) -> List[str]:
+    """Greedy split into parts of at most the multipart limit.
+
+    Every character takes one or two units, so a window of ``limit``
+    characters is an upper bound; while it is too long it shrinks by at
+    least the number of characters the excess must contain. A part never
+    ends between the two units of one character.
+    """
+    limit = MULTIPART_LIMITS[encoding]
+    parts: List[str] = []
+    start, length = 0, len(text)
+    while start < length:
+        n = min(limit, length - start)
+        while True:
+            excess = _units(text[start:start + n], encoding) - limit
+            if excess <= 0:
+                break
+            n -= (excess + 1) // 2
+        parts.append(text[start:start + n])
+        start += n
+    return parts
+
+
+def split(text: str) -> List[str]:
+    """Split ``text`` into the parts a carrier would concatenate.
+
+    A message that fits in one segment is returned as a single part.
+    """
+    info = segment_info(text)
+    if info.segments <= 1:
+        return [text]
+    return _split_units(text, info.encoding)
+
+
+def transliterate(text: str, replacement: str = None) -> str:
+    """Rewrite ``text`` to stay within GSM-7 where possible.
+
+    Typographic punctuation is mapped to ASCII equivalents and accented
+    letters outside GSM-7 lose their accents. Characters with no GSM-7
+    equivalent are kept (so the message stays UCS-2) unless a
+    ``replacement`` such as ``"?"`` is given.
+    """
+    text = text.translate(_TRANSLITERATE)
+    if is_gsm7(text):
+        return text
+    out = []
+    for char in text:
+        if char in _GSM7_CHARS:
+            out.append(char)
+            continue
+        base = "".join(c for c in unicodedata.normalize("NFKD", char) if not unicodedata.combining(c))
+        if base and all(c in _GSM7_CHARS for c in base):
+            out.append(base)
+        elif replacement is not None:
+            out.append(replacement)
+        else:
+            out.append(char)
+    return "".join(out)
@@ -1,9 +1,20 @@
 """Main SMS Gateway class with multi-provider support."""
 import asyncio
 import logging
-from typing import Dict, List, Optional
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
 from dataclasses import dataclass, field
-from .providers.base import BaseProvider, SMSMessage, SMSResult
+from .providers.base import BaseProvider, DeliveryStatus, SMSMessage, SMSResult
+from .status import StatusStore, FINAL_STATES, QUEUED, SENDING, SENT, FAILED
+from .ratelimit import RateLimiter, RateLimitExceeded
+from .circuit import BreakerConfig, CircuitBreaker
+from .hedge import HedgeBudget, HedgeConfig
+from .routing import Router, RoutingPolicy
+from .bulk import BulkProgress, BulkResults, MessageSource, bounded_map, group_by_key
+from .encoding import segment_count
+from .metrics import SEND_LATENCY, SENDS, error_class
+from .reconcile import StatusReconciler
+from .retry import DelayQueue, RetryPolicy, is_retryable_exception
 
 logger = logging.getLogger(__name__)
 
@@ -14,67 +25,587 @@ class GatewayConfig:
     timeout: float = 30.0
     rate_limit_per_second: float = 10.0
     failover_enabled: bool = True
+    circuit_breaker: Optional[BreakerConfig] = field(default_factory=BreakerConfig)
+    routing_policy: str = RoutingPolicy.PRIORITY.value
+    hedging: HedgeConfig = field(default_factory=HedgeConfig)
+    # Longest rate-limit wait slept inside a send whose caller schedules retries
+    # (the send queue); longer waits come back as a retryable result instead.
+    max_limiter_wait: float = 1.0
 
 class SMSGateway:
     """Multi-provider SMS gateway with automatic failover and load balancing."""
     
-    def __init__(self, config: Optional[GatewayConfig] = None):
+    def __init__(
+        self,
+        config: Optional[GatewayConfig] = None,
+        status_store: Optional[StatusStore] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+    ):
         self.config = config or GatewayConfig()
+        self.status = status_store or StatusStore()
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy or RetryPolicy(
+            max_retries=self.config.max_retries, backoff_base=self.config.retry_delay,
+        )
         self._providers: Dict[str, BaseProvider] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.router = Router(RoutingPolicy(self.config.routing_policy))
         self._primary_provider: Optional[str] = None
         self._stats = {"sent": 0, "failed": 0, "retried": 0}
+        self.hedge_budget = HedgeBudget(self.config.hedging)
+        self.reconciler: Optional[StatusReconciler] = None
     
-    def register_provider(self, name: str, provider: BaseProvider, primary: bool = False):
-        """Register an SMS provider."""
+    def register_provider(
+        self,
+        name: str,
+        provider: BaseProvider,
+        primary: bool = False,
+        priority: int = 0,
+        prices: Optional[Dict[str, float]] = None,
+    ):
+        """Register an SMS provider.
+        
+        ``priority`` (higher first) orders providers under the priority
+        policy; ``prices`` seeds per-country prices (``"*"`` for default)
+        for cost-aware routing until real prices are observed.
+        """
         self._providers[name] = provider
+        if self.config.circuit_breaker is not None:
+            self._breakers[name] = CircuitBreaker(name, self.config.circuit_breaker)
         if primary or not self._primary_provider:
             self._primary_provider = name
+        self.router.add_provider(name, priority=priority, primary=self._primary_provider == name)
+        for country, price in (prices or {}).items():
+            self.router.set_price(name, country, price)
         logger.info(f"Registered provider: {name} (primary={primary})")
     
-    async def send(self, to: str, message: str, from_number: Optional[str] = None) -> SMSResult:
-        """Send an SMS message with automatic failover."""
+    def enable_reconciliation(self, **options) -> StatusReconciler:
+        """Poll providers for the final status of tracked messages.
+        
+        ``options`` are passed to :class:`StatusReconciler`; the caller
+        starts and stops the returned reconciler.
+        """
+        if self.reconciler is None:
+            self.reconciler = StatusReconciler(self.status, self._providers, **options)
+        return self.reconciler
+    
+    def _reconcile(self, result: SMSResult, recipient: str) -> None:
+        if (self.reconciler is not None and result.success and result.message_id
+                and DeliveryStatus.normalize(result.status).value not in FINAL_STATES):
+            self.reconciler.track(result.provider, result.message_id, recipient, result.created)
+    
+    async def start(self):
+        """Open the connection pools of all registered providers."""
+        await asyncio.gather(*(p.start() for p in self._providers.values()))
+    
+    async def aclose(self):
+        """Close all provider connection pools."""
+        results = await asyncio.gather(
+            *(p.aclose() for p in self._providers.values()), return_exceptions=True
+        )
+        for name, result in zip(self._providers, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Error closing provider {name}: {result}")
+    
+    async def __aenter__(self) -> "SMSGateway":
+        await self.start()
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+    
+    async def send(
+        self,
+        to: str,
+        message: str,
+        from_number: Optional[str] = None,
+        provider: Optional[str] = None,
+        request_id: Optional[str] = None,
+        index: Optional[int] = None,
+        attempt: Optional[int] = None,
+        priority: int = 0,
+        hedge: Optional[bool] = None,
+    ) -> SMSResult:
+        """Send an SMS message with automatic failover.
+        
+        ``provider`` names a preferred provider that is tried first. When a
+        ``request_id`` is given (and ``index`` for a bulk recipient), the
+        outcome is recorded in the status store.
+        
+        Transient failures are retried with backoff according to
+        ``retry_policy``. A caller that schedules retries itself (e.g. the
+        send queue) passes the 1-based ``attempt`` instead; the send is then
+        made once and :meth:`retry_delay` tells when to try again. Such a
+        send also does not wait out a rate limit longer than
+        ``config.max_limiter_wait``: it fails as retryable with the wait as
+        ``retry_after`` instead of holding the caller's worker.
+        
+        Latency-critical messages (``priority`` at or above
+        ``config.hedging.min_priority`` with hedging enabled, or
+        ``hedge=True``) are hedged across two providers; see
+        :mod:`sms_gateway.hedge`.
+        """
+        options = {"attempt": attempt, "priority": priority, "hedge": hedge}
+        if attempt is not None:
+            return await self._send(to, message, from_number, provider, request_id, index, defer=True,
+                                    **options)
+        attempt = 1
+        delay = None
+        while True:
+            options["attempt"] = attempt
+            result = await self._send(to, message, from_number, provider, request_id, index, **options)
+            delay = self.retry_delay(result, attempt, delay)
+            if delay is None:
+                return result
+            await asyncio.sleep(delay)
+            attempt += 1
+    
+    def retry_delay(self, result: SMSResult, attempt: int, previous: Optional[float] = None) -> Optional[float]:
+        """Seconds to wait before retrying a failed ``result``, or None if it is final."""
+        return self.retry_policy.delay(result, attempt, previous)
+    
+    async def _send(
+        self,
+        to: str,
+        message: str,
+        from_number: Optional[str] = None,
+        provider: Optional[str] = None,
+        request_id: Optional[str] = None,
+        index: Optional[int] = None,
+        spread: bool = False,
+        attempt: Optional[int] = None,
+        priority: int = 0,
+        hedge: Optional[bool] = None,
+        defer: bool = False,
+        reserved: bool = False,
+    ) -> SMSResult:
         msg = SMSMessage(to=to, body=message, from_number=from_number)
+        if request_id is not None:
+            self.status.update(request_id, SENDING, index=index)
+        if hedge is None:
+            hedging = self.config.hedging
+            hedge = hedging.enabled and priority >= hedging.min_priority
+        max_wait = self.config.max_limiter_wait if defer else None
+        result = await self._send_with_failover(msg, provider, spread, hedge, max_wait, reserved)
+        retrying = attempt is not None and self.retry_policy.should_retry(result, attempt)
+        if not result.success:
+            self._stats["retried" if retrying else "failed"] += 1
+        if request_id is not None:
+            self.status.update(
+                request_id, SENT if result.success else QUEUED if retrying else FAILED,
+                provider=result.provider, message_id=result.message_id,
+                error=result.error, index=index,
+            )
+            self._reconcile(result, to)
+        return result
+    
+    async def _send_with_failover(
+        self, msg: SMSMessage, preferred: Optional[str] = None, spread: bool = False,
+        hedge: bool = False, max_wait: Optional[float] = None, reserved: bool = False,
+    ) -> SMSResult:
+        """Send through the routing order until a provider accepts ``msg``.
+
+        ``reserved`` means the message-level tokens (global, sender and
+        destination) were already reserved, by the batch it fell out of;
+        provider-level tokens are always charged per attempt.
+        """
+        limiter = self.rate_limiter
+        segments = max(1, segment_count(msg.body))
+        if limiter is not None and not reserved:
+            try:
+                await limiter.acquire(to=msg.to, from_number=msg.from_number, segments=segments,
+                                      max_wait=max_wait)
+            except RateLimitExceeded as e:
+                return SMSResult(success=False, error=str(e), retryable=True, retry_after=e.wait)
         
-        providers_to_try = self._get_provider_order()
-        last_error = None
+        providers_to_try = self.router.order(msg.to, preferred, spread)
+        failures: List[SMSResult] = []
+        if hedge and len(providers_to_try) > 1:
+            result = await self._send_hedged(msg, providers_to_try[0], providers_to_try[1], segments, failures,
+                                             max_wait)
+            if result is not None:
+                return result
+            providers_to_try = providers_to_try[2:]
         
         for provider_name in providers_to_try:
-            provider = self._providers[provider_name]
+            result = await self._attempt(provider_name, msg, segments, max_wait)
+            if result.success:
+                return result
+            failures.append(result)
+        
+        return _combine_failures(failures)
+    
+    async def _attempt(self, provider_name: str, msg: SMSMessage, segments: int,
+                       max_wait: Optional[float] = None) -> SMSResult:
+        """One send through one provider, with limiter, breaker and routing bookkeeping."""
+        provider = self._providers[provider_name]
+        limiter = self.rate_limiter
+        if limiter is not None:
             try:
-                result = await provider.send(msg)
-                if result.success:
-                    self._stats["sent"] += 1
-                    logger.info(f"SMS sent via {provider_name}: {to}")
-                    return result
-                last_error = result.error
+                await limiter.acquire(provider=provider_name, max_wait=max_wait)
+            except RateLimitExceeded as e:
+                return SMSResult(success=False, error=str(e), retryable=True, retry_after=e.wait)
+        breaker = self._breakers.get(provider_name)
+        if breaker is not None and not breaker.allow():
+            SENDS.inc(provider_name, "circuit_open")
+            return SMSResult(success=False, error=f"Circuit open for {provider_name}", retryable=True)
+        started = time.monotonic()
+        self.router.begin(provider_name)
+        try:
+            result = await provider.send(msg)
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.release()
+            raise
+        except Exception as e:
+            latency = time.monotonic() - started
+            SEND_LATENCY.observe(latency, provider_name)
+            SENDS.inc(provider_name, "exception")
+            if breaker is not None:
+                breaker.record(False, latency)
+            self.router.record(provider_name, latency, False)
+            logger.warning(f"Provider {provider_name} failed: {e}")
+            if not self.config.failover_enabled:
+                raise
+            return SMSResult(success=False, provider=provider_name, error=str(e),
+                             retryable=is_retryable_exception(e))
+        finally:
+            self.router.end(provider_name)
+        latency = time.monotonic() - started
+        SEND_LATENCY.observe(latency, provider_name)
+        SENDS.inc(provider_name, error_class(result))
+        if breaker is not None:
+            # A rejected message (e.g. an invalid number) says nothing about provider health.
+            breaker.record(result.success or result.retryable is False, latency)
+        self.router.record(provider_name, latency, result.success, msg.to, result.price, segments)
+        if result.success:
+            result.segments = segments
+            self._stats["sent"] += 1
+            logger.info(f"SMS sent via {provider_name}: {msg.to}")
+        return result
+    
+    def _hedge_deadline(self, provider_name: str) -> float:
+        cfg = self.config.hedging
+        p95 = self.router.latency_quantile(provider_name, cfg.z)
+        if p95 is None or self.router.samples(provider_name) < cfg.min_samples:
+            return cfg.max_delay
+        return min(cfg.max_delay, max(cfg.min_delay, p95))
+    
+    async def _send_hedged(
+        self, msg: SMSMessage, primary: str, backup: str, segments: int, failures: List[SMSResult],
+        max_wait: Optional[float] = None,
+    ) -> Optional[SMSResult]:
+        """Race ``primary`` against a delayed ``backup``; None if both failed.
+        
+        The backup starts only if the primary has not answered by its p95
+        deadline and the hedge budget allows; otherwise it is the ordinary
+        failover target. The first success wins and the other send is
+        cancelled. Failed results are appended to ``failures``.
+        """
+        budget = self.hedge_budget
+        budget.eligible()
+        first = asyncio.ensure_future(self._attempt(primary, msg, segments, max_wait))
+        outcomes = {first: "primary_won"}
+        winner: Optional[SMSResult] = None
+        try:
+            pending = {first}
+            done, _ = await asyncio.wait(pending, timeout=self._hedge_deadline(primary))
+            if not done and budget.try_hedge():
+                second = asyncio.ensure_future(self._attempt(backup, msg, segments, max_wait))
+                outcomes[second] = "hedge_won"
+                pending.add(second)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if not result.success:
+                        failures.append(result)
+                    elif winner is None:
+                        winner = result
+                        if len(outcomes) > 1:
+                            budget.record(outcomes[task])
+                    else:
+                        # Both answered in the same tick; the loser's message went out too.
+                        budget.record("both_sent")
+        finally:
+            unfinished = [task for task in outcomes if not task.done()]
+            for task in unfinished:
+                task.cancel()
+            if unfinished:
+                await asyncio.gather(*unfinished, return_exceptions=True)
+        if winner is None and len(outcomes) == 1:
+            # The primary failed without a hedge: fail over as usual.
+            result = await self._attempt(backup, msg, segments, max_wait)
+            if result.success:
+                return result
+            failures.append(result)
+        return winner
+    
+    async def send_bulk(self, messages: List[Dict], concurrency: int = 10) -> BulkResults:
+        """Send multiple SMS messages concurrently; results keep input order.
+        
+        Results come back in a columnar :class:`BulkResults`, which indexes
+        and iterates like a list of ``SMSResult``.
+        """
+        results = BulkResults(len(messages))
+        async for index, result in self.stream_bulk(messages, concurrency):
+            results[index] = result
+        return results
+    
+    async def stream_bulk(
+        self,
+        messages: MessageSource,
+        concurrency: int = 10,
+        progress: Optional[BulkProgress] = None,
+        batch: bool = True,
+    ) -> AsyncIterator[Tuple[int, SMSResult]]:
+        """Send messages from a (possibly async, possibly unbounded) iterable.
+        
+        Each message is a dict of ``send`` keyword arguments. Results are
+        yielded as ``(index, result)`` in completion order while at most
+        ``concurrency`` sends are in flight, so memory stays flat regardless
+        of campaign size. ``progress`` is updated as messages complete.
+        
+        With ``batch``, messages sharing body, sender and preferred provider
+        are grouped and sent through carrier batch APIs where a provider
+        supports them (``BaseProvider.send_batch``).
+        
+        Transiently failed messages wait on a delay queue and are sent
+        again when their backoff expires, without holding a worker; only
+        their final result is yielded.
+        """
+        progress = progress if progress is not None else BulkProgress()
+        max_batch = max((p.MAX_BATCH_SIZE for p in self._providers.values()), default=1)
+        groups = group_by_key(messages, _batch_key, max_batch if batch else 1)
+        # Jobs are (group, attempt, previous retry delay).
+        retries: DelayQueue = DelayQueue()
+        settled = asyncio.Event()
+        outstanding = 0
+        
+        async def _jobs():
+            nonlocal outstanding
+            async for group in groups:
+                for job in retries.pop_due():
+                    yield job
+                outstanding += len(group)
+                yield group, 1, None
+            while outstanding:
+                for job in retries.pop_due():
+                    yield job
+                settled.clear()
+                try:
+                    await asyncio.wait_for(settled.wait(), retries.next_in())
+                except asyncio.TimeoutError:
+                    pass
+        
+        async def _send_one(job):
+            group, attempt, _ = job
+            if attempt == 1:
+                progress.submitted += len(group)
+            try:
+                results = await self._send_group(group, attempt)
             except Exception as e:
-                last_error = str(e)
-                logger.warning(f"Provider {provider_name} failed: {e}")
-                if self.config.failover_enabled:
+                results = [(index, SMSResult(success=False, error=str(e))) for index, _ in group]
+            return job, results
+        
+        async for _, (job, results) in bounded_map(_jobs(), _send_one, concurrency):
+            group, attempt, previous = job
+            for (index, data), (_, result) in zip(group, results):
+                delay = self.retry_delay(result, attempt, previous)
+                if delay is not None:
+                    retries.push(([(index, data)], attempt + 1, delay), delay)
                     continue
-                raise
+                outstanding -= 1
+                progress.completed += 1
+                if result.success:
+                    progress.succeeded += 1
+                else:
+                    progress.failed += 1
+                yield index, result
+            settled.set()
+    
+    async def send_many(self, messages: List[Dict], attempt: Optional[int] = None) -> List[SMSResult]:
+        """Send a small set of messages as one unit, batching identical ones.
         
-        self._stats["failed"] += 1
-        return SMSResult(success=False, error=last_error or "All providers failed")
+        Failed messages are not retried here; ``attempt`` is as for :meth:`send`.
+        """
+        results: List[Optional[SMSResult]] = [None] * len(messages)
+        max_batch = max((p.MAX_BATCH_SIZE for p in self._providers.values()), default=1)
+        async for group in group_by_key(messages, _batch_key, max_batch, window=len(messages) + 1):
+            for index, result in await self._send_group(group, attempt):
+                results[index] = result
+        return results
     
-    async def send_bulk(self, messages: List[Dict], concurrency: int = 10) -> List[SMSResult]:
-        """Send multiple SMS messages concurrently."""
-        semaphore = asyncio.Semaphore(concurrency)
+    async def _send_group(
+        self, group: List[Tuple[int, Dict]], attempt: Optional[int] = None
+    ) -> List[Tuple[int, SMSResult]]:
+        """Send a group of identical messages, batching where possible.
         
-        async def _send_one(msg_data):
-            async with semaphore:
-                return await self.send(**msg_data)
+        Only the first choice of the router (the requested provider, if
+        any) is used for a batch; if it has no batch API the messages are
+        sent one by one with the normal order and failover.
+        """
+        if len(group) > 1:
+            first = group[0][1]
+            order = self.router.order(first["to"], first.get("provider"), spread=True)
+            if order and self._providers[order[0]].supports_batch:
+                name = order[0]
+                results = []
+                size = self._providers[name].MAX_BATCH_SIZE
+                for start in range(0, len(group), size):
+                    results += await self._send_batch_via(name, group[start:start + size], attempt)
+                return results
+        defer = attempt is not None
+        return [(index, await self._send(**data, spread=True, attempt=attempt, defer=defer)) for index, data in group]
+    
+    async def _send_batch_via(
+        self, name: str, chunk: List[Tuple[int, Dict]], attempt: Optional[int] = None
+    ) -> List[Tuple[int, SMSResult]]:
+        """Send one carrier batch; messages it could not deliver fall back to ``send``."""
+        provider = self._providers[name]
+        messages = [
+            SMSMessage(to=data["to"], body=data["message"], from_number=data.get("from_number"))
+            for _, data in chunk
+        ]
+        batch_results: Optional[List[SMSResult]] = None
+        breaker = self._breakers.get(name)
+        limiter = self.rate_limiter
+        segments = max(1, segment_count(messages[0].body))
+        max_wait = self.config.max_limiter_wait if attempt is not None else None
+        # Breaker first, then one all-or-nothing reservation, so a batch that is
+        # not sent leaves no tokens spent for the per-message fallback to pay again.
+        # Messages of a sent batch already paid their message-level tokens, so
+        # their fallback does not pay those again either.
+        admitted = breaker is None or breaker.allow()
+        if admitted and limiter is not None:
+            requests = [{"to": m.to, "from_number": m.from_number, "segments": segments} for m in messages]
+            requests.append({"provider": name})
+            try:
+                await limiter.acquire_many(requests, max_wait)
+            except (RateLimitExceeded, asyncio.CancelledError) as e:
+                if breaker is not None:
+                    breaker.release()
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                logger.info(f"Batch via {name} not possible now: {e}")
+                admitted = False
+        if admitted:
+            for _, data in chunk:
+                if data.get("request_id") is not None:
+                    self.status.update(data["request_id"], SENDING, index=data.get("index"))
+            started = time.monotonic()
+            self.router.begin(name)
+            try:
+                batch_results = await provider.send_batch(messages)
+            except asyncio.CancelledError:
+                if breaker is not None:
+                    breaker.release()
+                raise
+            except Exception as e:
+                logger.warning(f"Batch send via {name} failed: {e}")
+            finally:
+                self.router.end(name)
+            latency = time.monotonic() - started
+            SEND_LATENCY.observe(latency, name)
+            if batch_results is None:
+                SENDS.inc(name, "exception", amount=len(messages))
+            else:
+                for r in batch_results:
+                    SENDS.inc(name, error_class(r))
+            ok = batch_results is not None and any(r.success for r in batch_results)
+            if breaker is not None:
+                breaker.record(ok, latency)
+            price = batch_results[0].price if batch_results else None
+            self.router.record(name, latency, ok, messages[0].to, price, segments)
         
-        tasks = [_send_one(msg) for msg in messages]
-        return await asyncio.gather(*tasks)
+        results = []
+        for position, (index, data) in enumerate(chunk):
+            result = batch_results[position] if batch_results else None
+            if result is None or not result.success:
+                # Retry individually with normal failover.
+                result = await self._send(**data, spread=True, attempt=attempt, defer=attempt is not None,
+                                          reserved=admitted and limiter is not None)
+            else:
+                result.segments = segments
+                self._stats["sent"] += 1
+                if data.get("request_id") is not None:
+                    self.status.update(
+                        data["request_id"], SENT, provider=result.provider or name,
+                        message_id=result.message_id, index=data.get("index"),
+                        recipient=data["to"],
+                    )
+                    self._reconcile(result, data["to"])
+            results.append((index, result))
+        return results
     
-    def _get_provider_order(self) -> List[str]:
-        """Get providers in priority order."""
-        if self._primary_provider:
-            others = [n for n in self._providers if n != self._primary_provider]
-            return [self._primary_provider] + others
-        return list(self._providers.keys())
+    async def run_bulk(
+        self,
+        messages: MessageSource,
+        sink: Callable[[int, SMSResult], Union[None, Awaitable[None]]],
+        concurrency: int = 10,
+        progress: Optional[BulkProgress] = None,
+    ) -> BulkProgress:
+        """Stream a bulk send into ``sink`` (sync or async callback)."""
+        progress = progress if progress is not None else BulkProgress()
+        async for index, result in self.stream_bulk(messages, concurrency, progress):
+            ret = sink(index, result)
+            if asyncio.iscoroutine(ret):
+                await ret
+        return progress
+    
+    def _get_provider_order(self, preferred: Optional[str] = None, to: Optional[str] = None) -> List[str]:
+        """Get providers in the order the routing policy would try them."""
+        return self.router.order(to, preferred)
+    
+    def get_status(self, request_id: str) -> Optional[Dict]:
+        """Status of a tracked request, served from the status store."""
+        return self.status.get(request_id)
+
+    async def fetch_status(self, request_id: str) -> Optional[Dict]:
+        """:meth:`get_status` for callers on the event loop."""
+        return await self.status.fetch(request_id)
+    
+    def list_providers(self) -> List[str]:
+        """Names of the registered providers, primary first."""
+        return self._get_provider_order()
     
     @property
     def stats(self) -> Dict:
-        return self._stats.copy()
\ No newline at end of file
+        stats = self._stats.copy()
+        stats["hedging"] = self.hedge_budget.stats
+        stats["breakers"] = {name: b.stats for name, b in self._breakers.items()}
+        stats["routing"] = self.router.stats
+        return stats
+
+
+def _combine_failures(failures: List[SMSResult]) -> SMSResult:
+    """One failed result for a message that every provider failed.
+    
+    The message is retryable if any attempt failed transiently; the
+    longest ``Retry-After`` asked for is kept.
+    """
+    if not failures:
+        return SMSResult(success=False, error="All providers failed")
+    last = failures[-1]
+    retryable = last.retryable
+    retry_after = None
+    for failure in failures:
+        if failure.retryable:
+            retryable = True
+        if failure.retry_after is not None:
+            retry_after = max(retry_after or 0.0, failure.retry_after)
+    return SMSResult(
+        success=False, provider=last.provider, error=last.error or "All providers failed",
+        status=last.status, status_code=last.status_code, retryable=retryable, retry_after=retry_after,
+    )
+
+
+def _batch_key(msg_data: Dict):
+    """Messages with equal keys can share one carrier batch call."""
+    if msg_data.keys() - _BATCHABLE_FIELDS:
+        return None
+    return (msg_data["message"], msg_data.get("from_number"), msg_data.get("provider"))
+
+
+_BATCHABLE_FIELDS = frozenset({"to", "message", "from_number", "provider", "request_id", "index"})
@@ -0,0 +1,64 @@
+"""Hedged sends for latency-critical messages (OTP, verification codes).
+
+A hedged send starts on the best provider and, if that provider has not
+answered within its estimated p95 latency, starts the same message on the
+next provider; the first success wins and the other request is cancelled.
+Hedging buys tail latency with extra sends, so the share of sends that
+may hedge is capped by a token budget.
+"""
+from dataclasses import dataclass
+from typing import Dict
+
+
+@dataclass
+class HedgeConfig:
+    """When and how aggressively to hedge.
+
+    Sends with ``priority >= min_priority`` hedge when ``enabled`` (an
+    explicit ``hedge=`` argument overrides both). The hedge deadline is the
+    primary provider's latency mean plus ``z`` standard deviations (1.645
+    ~ p95), clamped to ``[min_delay, max_delay]``; ``max_delay`` is used
+    until ``min_samples`` latencies were observed. At most ``max_rate`` of
+    hedge-eligible sends actually hedge, with bursts up to ``burst``.
+    """
+    enabled: bool = False
+    min_priority: int = 7
+    z: float = 1.645
+    min_delay: float = 0.05
+    max_delay: float = 2.0
+    min_samples: int = 5
+    max_rate: float = 0.1
+    burst: float = 10.0
+
+
+class HedgeBudget:
+    """Token budget that caps the hedge rate, plus hedging counters."""
+
+    def __init__(self, config: HedgeConfig):
+        self.config = config
+        self._tokens = config.burst
+        self._stats = {"eligible": 0, "hedged": 0, "denied": 0, "primary_won": 0,
+                       "hedge_won": 0, "both_sent": 0}
+
+    def eligible(self) -> None:
+        """Count a hedge-eligible send; each one earns ``max_rate`` hedges."""
+        self._stats["eligible"] += 1
+        self._tokens = min(self.config.burst, self._tokens + self.config.max_rate)
+
+    def try_hedge(self) -> bool:
+        """Spend one hedge if the budget allows."""
+        if self._tokens < 1.0:
+            self._stats["denied"] += 1
+            return False
+        self._tokens -= 1.0
+        self._stats["hedged"] += 1
+        return True
+
+    def record(self, outcome: str) -> None:
+        """Count an outcome: ``primary_won``, ``hedge_won`` or ``both_sent``."""
+        self._stats[outcome] += 1
+
+    @property
+    def stats(self) -> Dict:
+        eligible = self._stats["eligible"]
+        return {**self._stats, "hedge_rate": self._stats["hedged"] / eligible if eligible else 0.0}
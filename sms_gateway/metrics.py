@@ -0,0 +1,252 @@
+"""Prometheus-style metrics with per-thread shards.
+
+Counters and histograms are written on hot paths (every send), so each
+thread updates its own shard without locks and :meth:`Registry.render`
+sums the shards at scrape time. An update is a thread-id lookup, a dict
+lookup and an addition. Values owned by other components (queue depth,
+breaker state, pool usage) are read on scrape by :class:`GaugeFunc`
+callbacks instead of being pushed.
+
+Processes that serve one API together (see :mod:`sms_gateway.cluster`)
+exchange :meth:`Registry.snapshot` values and render the sums from
+:func:`merge_snapshots`.
+
+Output follows the Prometheus text exposition format 0.0.4.
+"""
+import logging
+from bisect import bisect_left
+from threading import get_ident
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._shards: Dict[int, dict] = {}
+
+    def _shard(self) -> dict:
+        # First write from this thread (an empty shard also lands here, harmlessly).
+        return self._shards.setdefault(get_ident(), {})
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def collect(self) -> Dict[Labels, Any]:
+        raise NotImplementedError
+
+    def samples(self, data: Optional[Dict[Labels, Any]] = None) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic count, optionally split by label values."""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        shard = self._shards.get(get_ident()) or self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return sum(shard.get(labels, 0) for shard in list(self._shards.values()))
+
+    def collect(self) -> Dict[Labels, float]:
+        totals: Dict[Labels, float] = {}
+        for shard in list(self._shards.values()):
+            for labels, value in list(shard.items()):
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def samples(self, data: Optional[Dict[Labels, float]] = None) -> Iterator[str]:
+        data = self.collect() if data is None else data
+        for labels, value in sorted(data.items()):
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shards.get(get_ident()) or self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            # Per-bucket counts (the last is +Inf) followed by the sum.
+            entry = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def collect(self) -> Dict[Labels, List[float]]:
+        totals: Dict[Labels, List[float]] = {}
+        for shard in list(self._shards.values()):
+            for labels, entry in list(shard.items()):
+                total = totals.get(labels)
+                if total is None:
+                    totals[labels] = list(entry)
+                else:
+                    for i, v in enumerate(entry):
+                        total[i] += v
+        return totals
+
+    def count(self, *labels: str) -> int:
+        entry = self.collect().get(labels)
+        return int(sum(entry[:-1])) if entry else 0
+
+    def samples(self, data: Optional[Dict[Labels, List[float]]] = None) -> Iterator[str]:
+        data = self.collect() if data is None else data
+        bounds = self.buckets + (float("inf"),)
+        for labels, entry in sorted(data.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, entry):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}"
+            suffix = _format_labels(self.labels, labels)
+            yield f"{self.name}_sum{suffix} {_format_value(entry[-1])}"
+            yield f"{self.name}_count{suffix} {cumulative}"
+
+
+class GaugeFunc(_Metric):
+    """Gauge whose values are read from ``fn`` at scrape time.
+
+    ``fn`` returns a mapping of label-value tuples to numbers.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str],
+                 fn: Callable[[], Dict[Labels, float]]):
+        super().__init__(name, documentation, labels)
+        self.fn = fn
+
+    def samples(self, data: Optional[Dict[Labels, float]] = None) -> Iterator[str]:
+        for labels, value in sorted(self.fn().items()):
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+
+class Registry:
+    """A set of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Add ``metric``; a gauge registered again under its name replaces the old one."""
+        existing = self._metrics.get(metric.name)
+        if existing is not None and not isinstance(metric, GaugeFunc):
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str],
+              fn: Callable[[], Dict[Labels, float]]) -> GaugeFunc:
+        return self.register(GaugeFunc(name, documentation, labels, fn))
+
+    def snapshot(self) -> Dict[str, List[list]]:
+        """Counter and histogram values as JSON-friendly ``[labels, value]`` pairs."""
+        return {
+            name: [[list(labels), value] for labels, value in metric.collect().items()]
+            for name, metric in self._metrics.items() if not isinstance(metric, GaugeFunc)
+        }
+
+    def render(self, merged: Optional[Dict[str, Dict[Labels, Any]]] = None) -> str:
+        """Text exposition; ``merged`` replaces local counter and histogram values."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            data = None
+            if merged is not None and not isinstance(metric, GaugeFunc):
+                data = merged.get(metric.name, {})
+            try:
+                samples = list(metric.samples(data))
+            except Exception as e:
+                # One broken callback must not take the whole scrape down.
+                logger.warning(f"Metric {metric.name} failed to collect: {e}")
+                continue
+            lines += metric.header()
+            lines += samples
+        return "\n".join(lines) + "\n"
+
+
+def merge_snapshots(snapshots: Iterable[Dict[str, List[list]]]) -> Dict[str, Dict[Labels, Any]]:
+    """Sum :meth:`Registry.snapshot` values of several processes."""
+    merged: Dict[str, Dict[Labels, Any]] = {}
+    for snapshot in snapshots:
+        for name, pairs in snapshot.items():
+            totals = merged.setdefault(name, {})
+            for labels, value in pairs:
+                labels = tuple(labels)
+                total = totals.get(labels)
+                if total is None:
+                    totals[labels] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    for i, v in enumerate(value):
+                        total[i] += v
+                else:
+                    totals[labels] = total + value
+    return merged
+
+
+REGISTRY = Registry()
+
+SEND_LATENCY = REGISTRY.histogram(
+    "sms_send_latency_seconds", "Provider send call latency.", ["provider"])
+SENDS = REGISTRY.counter(
+    "sms_sends_total", "Send attempts by provider and outcome (success or error class).",
+    ["provider", "outcome"])
+RATE_LIMITED = REGISTRY.counter(
+    "sms_rate_limited_total", "Sends and API requests rejected by a rate limit.", ["scope"])
+HTTP_LATENCY = REGISTRY.histogram(
+    "sms_http_request_duration_seconds", "API request latency.", ["method", "route", "status"])
+
+
+def error_class(result) -> str:
+    """Outcome label of a send result: ``success`` or a coarse error class."""
+    if result.success:
+        return "success"
+    if result.retryable is True:
+        return "throttled" if result.status_code == 429 else "transient"
+    if result.retryable is False:
+        return "rejected"
+    return "failed"
@@ -2,74 +2,102 @@
 
 import time
 import logging
-from typing import Callable
+from typing import Callable, Optional
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
-from collections import defaultdict
-from datetime import datetime, timedelta
+
+from .metrics import HTTP_LATENCY, RATE_LIMITED
+from .ratelimit import SlidingWindowBackend, InMemorySlidingWindow
 
 logger = logging.getLogger(__name__)
 
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Rate limiting middleware using sliding window algorithm."""
-
-    def __init__(self, app, max_requests: int = 100, window_seconds: int = 60):
+    """Per-client rate limiting using an approximate sliding window.
+
+    Counters live in ``backend``; pass a shared backend to enforce the limit
+    across several API workers. Health checks, metrics scrapes and carrier
+    delivery receipts (``exclude_paths`` and ``exclude_prefixes``) are not
+    limited: receipts arrive in bursts from a few carrier addresses.
+    """
+
+    def __init__(
+        self,
+        app,
+        max_requests: int = 100,
+        window_seconds: int = 60,
+        backend: Optional[SlidingWindowBackend] = None,
+        exclude_paths: list = None,
+        exclude_prefixes: list = None,
+    ):
         super().__init__(app)
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self._requests = defaultdict(list)
+        self.backend = backend or InMemorySlidingWindow()
+        self.exclude_paths = set(exclude_paths if exclude_paths is not None else ["/health", "/metrics"])
+        self.exclude_prefixes = tuple(exclude_prefixes if exclude_prefixes is not None else ["/api/v1/dlr/"])
 
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        client_ip = request.client.host
-        now = datetime.utcnow()
-        cutoff = now - timedelta(seconds=self.window_seconds)
-
-        self._requests[client_ip] = [
-            ts for ts in self._requests[client_ip] if ts > cutoff
-        ]
-
-        if len(self._requests[client_ip]) >= self.max_requests:
+        path = request.url.path
+        if path in self.exclude_paths or path.startswith(self.exclude_prefixes):
+            return await call_next(request)
+        client_ip = request.client.host if request.client else "unknown"
+        allowed = await self.backend.hit(client_ip, self.max_requests, self.window_seconds)
+        if not allowed:
+            RATE_LIMITED.inc("api_client")
             logger.warning(f"Rate limit exceeded for {client_ip}")
             return Response(
                 content='{"error": "Rate limit exceeded"}',
                 status_code=429,
                 media_type="application/json",
+                headers={"Retry-After": str(self.window_seconds)},
             )
-
-        self._requests[client_ip].append(now)
-        response = await call_next(request)
-        return response
+        return await call_next(request)
 
 
 class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware for logging all incoming HTTP requests."""
+    """Middleware for logging all incoming HTTP requests.
+
+    Requests are logged, and their latency recorded in
+    ``sms_http_request_duration_seconds``, by route template rather than
+    raw path: that bounds metric cardinality and keeps secrets carried in
+    the path (receipt callback tokens) out of the logs.
+    """
 
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
         start_time = time.time()
-        logger.info(f"Request: {request.method} {request.url.path}")
-
         response = await call_next(request)
 
         process_time = time.time() - start_time
-        logger.info(
-            f"Response: {request.method} {request.url.path} "
-            f"status={response.status_code} duration={process_time:.3f}s"
-        )
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_LATENCY.observe(process_time, request.method, route, str(response.status_code))
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                f"Request: {request.method} {route} "
+                f"status={response.status_code} duration={process_time:.3f}s"
+            )
         response.headers["X-Process-Time"] = str(process_time)
         return response
 
 
 class APIKeyAuthMiddleware(BaseHTTPMiddleware):
-    """Simple API key authentication middleware."""
+    """Simple API key authentication middleware.
+
+    Carrier delivery-receipt webhooks cannot send our API key, so paths under
+    ``exclude_prefixes`` (by default ``/api/v1/dlr/``) are not checked; the
+    receipt endpoint verifies carrier signatures instead.
+    """
 
-    def __init__(self, app, api_keys: list = None, exclude_paths: list = None):
+    def __init__(self, app, api_keys: list = None, exclude_paths: list = None,
+                 exclude_prefixes: list = None):
         super().__init__(app)
         self.api_keys = set(api_keys or [])
         self.exclude_paths = set(exclude_paths or ["/health", "/docs", "/openapi.json"])
+        self.exclude_prefixes = tuple(exclude_prefixes if exclude_prefixes is not None else ["/api/v1/dlr/"])
 
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        if request.url.path in self.exclude_paths:
+        path = request.url.path
+        if path in self.exclude_paths or path.startswith(self.exclude_prefixes):
             return await call_next(request)
 
         api_key = request.headers.get("X-API-Key")
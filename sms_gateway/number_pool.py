@@ -1,11 +1,19 @@
 """Phone number pool manager for one-to-one target assignment."""
 import asyncio
+import csv
+import heapq
+import itertools
+import json
 import logging
-from typing import Dict, List, Optional
-from dataclasses import dataclass, field
-from datetime import datetime, timedelta
+import os
+import time
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from datetime import datetime
 from enum import Enum
 
+from .records import SlotRecord
+
 logger = logging.getLogger(__name__)
 
 class NumberStatus(Enum):
@@ -14,100 +22,421 @@ class NumberStatus(Enum):
     COOLDOWN = "cooldown"
     DISABLED = "disabled"
 
-@dataclass
-class PhoneNumber:
-    number: str
-    provider: str
-    status: NumberStatus = NumberStatus.AVAILABLE
-    assigned_target: Optional[str] = None
-    assigned_task_id: Optional[str] = None
-    last_used: Optional[datetime] = None
-    daily_send_count: int = 0
-    total_send_count: int = 0
+class PhoneNumber(SlotRecord):
+    """One pooled number; ``last_used`` and ``cooldown_until`` are epoch seconds."""
+    
+    __slots__ = ("number", "provider", "status", "assigned_target", "assigned_task_id", "last_used",
+                 "daily_send_count", "total_send_count", "count_day", "cooldown_until")
+    
+    def __init__(self, number: str, provider: str, status: NumberStatus = NumberStatus.AVAILABLE,
+                 assigned_target: Optional[str] = None, assigned_task_id: Optional[str] = None,
+                 last_used: Optional[float] = None, daily_send_count: int = 0, total_send_count: int = 0,
+                 count_day: int = 0, cooldown_until: float = 0.0):
+        self.number = number
+        self.provider = provider
+        self.status = status
+        self.assigned_target = assigned_target
+        self.assigned_task_id = assigned_task_id
+        self.last_used = last_used
+        self.daily_send_count = daily_send_count
+        self.total_send_count = total_send_count
+        # UTC day number that ``daily_send_count`` counts sends for.
+        self.count_day = count_day
+        # When a COOLDOWN number becomes available again.
+        self.cooldown_until = cooldown_until
+    
+    @property
+    def last_used_at(self) -> Optional[datetime]:
+        return datetime.utcfromtimestamp(self.last_used) if self.last_used else None
+
+SECONDS_PER_DAY = 86400
+
+# (count day, daily_send_count, last used timestamp, entry sequence, number)
+_FreeEntry = Tuple[int, int, float, int, str]
 
 class NumberPool:
-    """Manages a pool of phone numbers for SMS sending."""
+    """Manages a pool of phone numbers for SMS sending.
+    
+    Available numbers are indexed in one min-heap per provider, ordered by
+    daily send count and then least recently used, so assignment is
+    O(log n) instead of a scan. Heap entries are invalidated lazily: each
+    number remembers the sequence of its current entry and stale entries
+    are dropped when they surface. A target -> number dict answers "does
+    this target already have a number" in O(1). Status changes must go
+    through the pool's methods to keep the indexes consistent.
+    
+    Daily counters roll over lazily: each number records the UTC day its
+    count belongs to, and a count from an earlier day reads as zero. Free
+    heap entries sort by that day first, so numbers not yet used today come
+    before today's. Numbers at their daily limit wait in a day-ordered queue
+    and return to the heaps once the day has passed. Released numbers cool
+    down for ``cooldown_hours`` in a min-heap of expiry times that is
+    drained on every access, or periodically by :meth:`start`.
     
-    def __init__(self, daily_limit: int = 20, cooldown_hours: int = 24):
+    With a ``path``, state survives restarts: :meth:`load` restores it from
+    a binary snapshot plus change log (see :mod:`sms_gateway.pool_store`),
+    every change is appended to the log, and the log is folded into a new
+    snapshot after ``compact_after`` records and on :meth:`close`.
+    """
+    
+    def __init__(self, daily_limit: int = 20, cooldown_hours: int = 24, clock=time.time,
+                 path: Optional[str] = None, compact_after: int = 100_000):
         self._numbers: Dict[str, PhoneNumber] = {}
         self.daily_limit = daily_limit
         self.cooldown_hours = cooldown_hours
         self._lock = asyncio.Lock()
+        self._free: Dict[str, List[_FreeEntry]] = {}
+        self._entries: Dict[str, int] = {}
+        self._seq = itertools.count()
+        self._by_target: Dict[str, str] = {}
+        self._status_counts: Dict[NumberStatus, int] = {status: 0 for status in NumberStatus}
+        self._clock = clock
+        self._day = int(clock() // SECONDS_PER_DAY)
+        self._cooldowns: List[Tuple[float, str]] = []
+        self._exhausted: deque = deque()
+        self._expiry_task: Optional[asyncio.Task] = None
+        self.compact_after = compact_after
+        self._store = None
+        if path is not None:
+            from .pool_store import PoolStore
+            self._store = PoolStore(path)
     
     def add_number(self, number: str, provider: str):
         """Add a phone number to the pool."""
-        self._numbers[number] = PhoneNumber(number=number, provider=provider)
+        self._add(PhoneNumber(number=number, provider=provider))
+        self._commit()
         logger.info(f"Added number to pool: {number} ({provider})")
     
-    def add_numbers_bulk(self, numbers: List[Dict[str, str]]):
-        """Add multiple numbers at once."""
+    def add_numbers_bulk(self, numbers: Union[Iterable[Dict[str, str]], str, os.PathLike],
+                         provider: Optional[str] = None) -> int:
+        """Add multiple numbers at once.
+        
+        ``numbers`` is an iterable of ``{"number", "provider"}`` dicts or the
+        path of a CSV (with a header row) or JSONL file, which is streamed
+        row by row. ``provider`` is used for rows without one. Returns the
+        number of numbers added.
+        """
+        if isinstance(numbers, (str, os.PathLike)):
+            numbers = _read_number_file(numbers)
+        count = 0
         for n in numbers:
-            self.add_number(n["number"], n["provider"])
+            self._add(PhoneNumber(number=n["number"], provider=n.get("provider") or provider))
+            count += 1
+            if count % 10_000 == 0:
+                self._commit()
+        self._commit()
+        logger.info(f"Added {count} numbers to pool")
+        return count
+    
+    def _add(self, num: PhoneNumber) -> None:
+        old = self._numbers.get(num.number)
+        if old is not None:
+            self._status_counts[old.status] -= 1
+            if old.assigned_target is not None and self._by_target.get(old.assigned_target) == old.number:
+                del self._by_target[old.assigned_target]
+            self._entries.pop(old.number, None)
+        self._numbers[num.number] = num
+        self._status_counts[num.status] += 1
+        if num.status == NumberStatus.ASSIGNED and num.assigned_target is not None:
+            self._by_target[num.assigned_target] = num.number
+        if num.status == NumberStatus.COOLDOWN:
+            heapq.heappush(self._cooldowns, (num.cooldown_until, num.number))
+        self._push_free(num)
+        self._record(num)
+    
+    def _record(self, num: PhoneNumber) -> None:
+        if self._store is not None:
+            self._store.append(num)
+    
+    def _commit(self) -> None:
+        """Flush logged changes, compacting the log when it grows large."""
+        if self._store is not None:
+            if self._store.log_records >= self.compact_after:
+                self.snapshot()
+            else:
+                self._store.flush()
+    
+    def load(self) -> int:
+        """Restore state from the snapshot and change log; returns the pool size."""
+        if self._store is None:
+            return len(self._numbers)
+        self._numbers = {num.number: num for num in self._store.load()}
+        self._reindex()
+        self._refresh()
+        return len(self._numbers)
+    
+    def snapshot(self) -> None:
+        """Write a full snapshot and truncate the change log."""
+        if self._store is not None:
+            self._store.snapshot(self._numbers.values())
+    
+    def close(self) -> None:
+        """Snapshot and close the persistent store, if any."""
+        if self._store is not None:
+            self.snapshot()
+            self._store.close()
+    
+    def _set_status(self, num: PhoneNumber, status: NumberStatus) -> None:
+        self._status_counts[num.status] -= 1
+        self._status_counts[status] += 1
+        num.status = status
+    
+    def _free_entry(self, num: PhoneNumber) -> Optional[_FreeEntry]:
+        """New free-heap entry for ``num``, or None if it cannot be assigned now."""
+        if num.status != NumberStatus.AVAILABLE:
+            self._entries.pop(num.number, None)
+            return None
+        if num.count_day >= self._day and num.daily_send_count >= self.daily_limit:
+            self._entries.pop(num.number, None)
+            self._exhausted.append((num.count_day, num.number))
+            return None
+        seq = next(self._seq)
+        self._entries[num.number] = seq
+        last_used = num.last_used or 0.0
+        return (num.count_day, num.daily_send_count, last_used, seq, num.number)
+    
+    def _push_free(self, num: PhoneNumber) -> None:
+        """Index ``num`` as assignable if it is available and under its limit."""
+        entry = self._free_entry(num)
+        if entry is not None:
+            heap = self._free.get(num.provider)
+            if heap is None:
+                heap = self._free[num.provider] = []
+            heapq.heappush(heap, entry)
     
-    async def assign_number(self, target: str, task_id: str = None) -> Optional[str]:
-        """Assign an available number to a target."""
+    def _refresh(self, now: Optional[float] = None) -> None:
+        """Apply day rollover and expired cooldowns up to ``now``."""
+        now = self._clock() if now is None else now
+        day = int(now // SECONDS_PER_DAY)
+        if day != self._day:
+            self._day = day
+            exhausted = self._exhausted
+            while exhausted and exhausted[0][0] < day:
+                num = self._numbers.get(exhausted.popleft()[1])
+                if num is not None and num.number not in self._entries:
+                    self._push_free(num)
+        cooldowns = self._cooldowns
+        while cooldowns and cooldowns[0][0] <= now:
+            until, number = heapq.heappop(cooldowns)
+            num = self._numbers.get(number)
+            if num is not None and num.status == NumberStatus.COOLDOWN and num.cooldown_until == until:
+                self._set_status(num, NumberStatus.AVAILABLE)
+                self._push_free(num)
+                self._record(num)
+    
+    def _peek(self, provider: str) -> Optional[_FreeEntry]:
+        """Best valid entry of a provider's heap, discarding stale ones."""
+        heap = self._free.get(provider)
+        while heap:
+            entry = heap[0]
+            if self._entries.get(entry[4]) == entry[3]:
+                return entry
+            heapq.heappop(heap)
+        return None
+    
+    def _take_free(self, provider: Optional[str] = None) -> Optional[PhoneNumber]:
+        """Remove and return the best assignable number."""
+        if provider is not None:
+            best = self._peek(provider)
+        else:
+            best = None
+            for name in self._free:
+                entry = self._peek(name)
+                if entry is not None and (best is None or entry < best):
+                    best, provider = entry, name
+        if best is None:
+            return None
+        heapq.heappop(self._free[provider])
+        del self._entries[best[4]]
+        return self._numbers[best[4]]
+    
+    def _assign(self, target: str, task_id: Optional[str], provider: Optional[str]) -> Optional[str]:
+        existing = self._by_target.get(target)
+        if existing is not None:
+            return existing
+        num = self._take_free(provider)
+        if num is None:
+            return None
+        self._set_status(num, NumberStatus.ASSIGNED)
+        num.assigned_target = target
+        num.assigned_task_id = task_id
+        num.last_used = self._clock()
+        if num.count_day != self._day:
+            num.count_day = self._day
+            num.daily_send_count = 0
+        num.daily_send_count += 1
+        num.total_send_count += 1
+        self._by_target[target] = num.number
+        self._record(num)
+        return num.number
+    
+    async def assign_number(self, target: str, task_id: str = None,
+                            provider: Optional[str] = None) -> Optional[str]:
+        """Assign an available number (optionally of one provider) to a target."""
         async with self._lock:
-            # Check if target already has an assigned number
-            for num in self._numbers.values():
-                if num.assigned_target == target and num.status == NumberStatus.ASSIGNED:
-                    return num.number
-            
-            # Find available number
-            for num in self._numbers.values():
-                if num.status == NumberStatus.AVAILABLE and num.daily_send_count < self.daily_limit:
-                    num.status = NumberStatus.ASSIGNED
-                    num.assigned_target = target
-                    num.assigned_task_id = task_id
-                    num.last_used = datetime.utcnow()
-                    num.daily_send_count += 1
-                    num.total_send_count += 1
-                    logger.info(f"Assigned {num.number} -> {target}")
-                    return num.number
-            
+            self._refresh()
+            number = self._assign(target, task_id, provider)
+            self._commit()
+        if number is None:
             logger.warning(f"No available numbers for target {target}")
-            return None
+        else:
+            logger.info(f"Assigned {number} -> {target}")
+        return number
     
     async def release_number(self, number: str, cooldown: bool = True):
         """Release a number back to the pool."""
         async with self._lock:
             if number in self._numbers:
                 num = self._numbers[number]
-                if cooldown:
-                    num.status = NumberStatus.COOLDOWN
+                if num.assigned_target is not None and self._by_target.get(num.assigned_target) == number:
+                    del self._by_target[num.assigned_target]
+                if cooldown and self.cooldown_hours > 0:
+                    self._set_status(num, NumberStatus.COOLDOWN)
+                    num.cooldown_until = self._clock() + self.cooldown_hours * 3600
+                    heapq.heappush(self._cooldowns, (num.cooldown_until, number))
                 else:
-                    num.status = NumberStatus.AVAILABLE
+                    self._set_status(num, NumberStatus.AVAILABLE)
                 num.assigned_target = None
                 num.assigned_task_id = None
+                self._push_free(num)
+                self._record(num)
+                self._commit()
     
-    async def assign_batch(self, targets: List[str], task_id: str = None) -> Dict[str, str]:
-        """Assign numbers to multiple targets (one-to-one)."""
+    async def assign_batch(self, targets: List[str], task_id: str = None,
+                           provider: Optional[str] = None) -> Dict[str, str]:
+        """Assign numbers to multiple targets (one-to-one) in one locked pass."""
         assignments = {}
-        for target in targets:
-            number = await self.assign_number(target, task_id)
-            if number:
+        async with self._lock:
+            self._refresh()
+            for target in targets:
+                number = self._assign(target, task_id, provider)
+                if number is None:
+                    logger.warning(f"Number pool exhausted after {len(assignments)} of {len(targets)} targets")
+                    break
                 assignments[target] = number
-            else:
-                break
+            self._commit()
+        logger.info(f"Assigned {len(assignments)} numbers for task {task_id}")
         return assignments
     
+    def number_for(self, target: str) -> Optional[str]:
+        """Number currently assigned to ``target``, if any."""
+        return self._by_target.get(target)
+    
+    def get(self, number: str) -> Optional[PhoneNumber]:
+        return self._numbers.get(number)
+    
     def reset_daily_counts(self):
-        """Reset daily send counts for all numbers."""
+        """Reset daily send counts and end all cooldowns now.
+        
+        Counters and cooldowns expire on their own; this is a manual
+        override, e.g. after a carrier raises its limits.
+        """
         for num in self._numbers.values():
             num.daily_send_count = 0
             if num.status == NumberStatus.COOLDOWN:
-                num.status = NumberStatus.AVAILABLE
+                self._set_status(num, NumberStatus.AVAILABLE)
+        self._reindex()
+        self.snapshot()
+    
+    def _reindex(self) -> None:
+        """Rebuild every index from ``self._numbers`` in linear time."""
+        available, assigned, cooldown = NumberStatus.AVAILABLE, NumberStatus.ASSIGNED, NumberStatus.COOLDOWN
+        counts = {status: 0 for status in NumberStatus}
+        by_target: Dict[str, str] = {}
+        entries: Dict[str, int] = {}
+        exhausted = []
+        cooldowns = []
+        free: Dict[str, List[_FreeEntry]] = {}
+        seq, day, limit = self._seq, self._day, self.daily_limit
+        free_count = assigned_count = cooldown_count = 0
+        for num in self._numbers.values():
+            status = num.status
+            if status is available:
+                free_count += 1
+                if num.count_day >= day and num.daily_send_count >= limit:
+                    exhausted.append((num.count_day, num.number))
+                    continue
+                entry = entries[num.number] = next(seq)
+                last_used = num.last_used or 0.0
+                heap = free.get(num.provider)
+                if heap is None:
+                    heap = free[num.provider] = []
+                heap.append((num.count_day, num.daily_send_count, last_used, entry, num.number))
+            elif status is assigned:
+                assigned_count += 1
+                if num.assigned_target is not None:
+                    by_target[num.assigned_target] = num.number
+            elif status is cooldown:
+                cooldown_count += 1
+                cooldowns.append((num.cooldown_until, num.number))
+        for heap in free.values():
+            heapq.heapify(heap)
+        heapq.heapify(cooldowns)
+        counts[available], counts[assigned], counts[cooldown] = free_count, assigned_count, cooldown_count
+        counts[NumberStatus.DISABLED] = len(self._numbers) - free_count - assigned_count - cooldown_count
+        self._status_counts = counts
+        self._by_target = by_target
+        self._entries = entries
+        self._free = free
+        self._cooldowns = cooldowns
+        self._exhausted = deque(sorted(exhausted))
+    
+    def expire_cooldowns(self) -> int:
+        """Return numbers whose cooldown has ended to the pool; returns how many."""
+        before = self._status_counts[NumberStatus.AVAILABLE]
+        self._refresh()
+        self._commit()
+        return self._status_counts[NumberStatus.AVAILABLE] - before
+    
+    def start(self, interval: float = 60.0) -> None:
+        """Expire cooldowns in the background every ``interval`` seconds.
+        
+        Optional: cooldowns are also expired whenever the pool is used.
+        """
+        if self._expiry_task is None:
+            self._expiry_task = asyncio.create_task(self._expiry_loop(interval))
+    
+    async def stop(self) -> None:
+        if self._expiry_task is not None:
+            self._expiry_task.cancel()
+            try:
+                await self._expiry_task
+            except asyncio.CancelledError:
+                pass
+            self._expiry_task = None
+    
+    async def _expiry_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            restored = self.expire_cooldowns()
+            if restored:
+                logger.info(f"{restored} numbers back in the pool after cooldown")
     
     @property
     def available_count(self) -> int:
-        return sum(1 for n in self._numbers.values() if n.status == NumberStatus.AVAILABLE)
+        self._refresh()
+        return self._status_counts[NumberStatus.AVAILABLE]
     
     @property
     def stats(self) -> Dict:
-        status_counts = {}
-        for num in self._numbers.values():
-            status_counts[num.status.value] = status_counts.get(num.status.value, 0) + 1
+        self._refresh()
+        status_counts = {status.value: count for status, count in self._status_counts.items() if count}
         return {
             "total": len(self._numbers),
             **status_counts,
             "daily_limit": self.daily_limit,
-        }
\ No newline at end of file
+        }
+
+
+def _read_number_file(path: Union[str, os.PathLike]) -> Iterator[Dict[str, str]]:
+    """Stream number rows from a CSV (with header) or JSONL file."""
+    path = os.fspath(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(f):
+                yield {key.strip(): (value or "").strip() for key, value in row.items() if key}
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
@@ -0,0 +1,200 @@
+"""Durable NumberPool state: columnar binary snapshot plus append-only change log.
+
+The snapshot stores the pool column by column: numeric fields as packed
+``array`` data, strings as NUL-joined UTF-8 blobs and providers as indexes
+into a small table, so loading is a handful of C-level decodes instead of
+per-record parsing. Every change after the snapshot is appended to the log
+as the full new state of one number; replaying the log over the snapshot
+is idempotent, so a crash between writing a snapshot and truncating the
+log loses nothing. A torn record at the end of the log is ignored.
+"""
+import logging
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, List
+
+from .number_pool import NumberStatus, PhoneNumber
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"NPS1"
+LOG_MAGIC = b"NPL1"
+
+_STATUSES = list(NumberStatus)
+_STATUS_CODES = {status: code for code, status in enumerate(_STATUSES)}
+
+# status, daily_send_count, total_send_count, count_day, last_used, cooldown_until
+_RECORD = struct.Struct("<BIIIdd")
+_LENGTH = struct.Struct("<I")
+_STRING = struct.Struct("<H")
+
+
+class PoolStore:
+    """Snapshot and change log files for one :class:`NumberPool`.
+
+    ``path`` is the snapshot file; the log lives next to it as
+    ``<path>.log``. Log writes are buffered and flushed after each pool
+    operation; :meth:`snapshot` and :meth:`close` also fsync.
+    """
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self.log_path = self.path + ".log"
+        self._log = None
+        self.log_records = 0
+
+    def load(self) -> List[PhoneNumber]:
+        """Read the snapshot and replay the log; returns the numbers."""
+        numbers: Dict[str, PhoneNumber] = {}
+        if os.path.exists(self.path):
+            for num in self._read_snapshot():
+                numbers[num.number] = num
+        snapshot_count = len(numbers)
+        self.log_records = 0
+        if os.path.exists(self.log_path):
+            for num in self._read_log():
+                numbers[num.number] = num
+                self.log_records += 1
+        logger.info(f"Loaded number pool: {snapshot_count} from snapshot, {self.log_records} log records")
+        return list(numbers.values())
+
+    def _open_log(self):
+        if self._log is None:
+            new = not os.path.exists(self.log_path) or os.path.getsize(self.log_path) == 0
+            self._log = open(self.log_path, "ab")
+            if new:
+                self._log.write(LOG_MAGIC)
+        return self._log
+
+    def append(self, num: PhoneNumber) -> None:
+        """Record the current state of one number."""
+        strings = b"".join(
+            _STRING.pack(len(data)) + data
+            for data in (
+                num.number.encode(), num.provider.encode(),
+                (num.assigned_target or "").encode(), (num.assigned_task_id or "").encode(),
+            )
+        )
+        body = _RECORD.pack(
+            _STATUS_CODES[num.status], num.daily_send_count, num.total_send_count,
+            num.count_day, num.last_used or 0.0, num.cooldown_until,
+        ) + strings
+        self._open_log().write(_LENGTH.pack(len(body)) + body)
+        self.log_records += 1
+
+    def flush(self) -> None:
+        if self._log is not None:
+            self._log.flush()
+
+    def _read_log(self) -> Iterable[PhoneNumber]:
+        with open(self.log_path, "rb") as f:
+            data = f.read()
+        if data[:4] != LOG_MAGIC:
+            raise ValueError(f"{self.log_path} is not a number pool log")
+        pos, end = 4, len(data)
+        while pos + 4 <= end:
+            (length,) = _LENGTH.unpack_from(data, pos)
+            if pos + 4 + length > end:
+                logger.warning(f"Ignoring truncated record at end of {self.log_path}")
+                break
+            status, daily, total, day, last_used, cooldown = _RECORD.unpack_from(data, pos + 4)
+            cursor = pos + 4 + _RECORD.size
+            fields = []
+            for _ in range(4):
+                (size,) = _STRING.unpack_from(data, cursor)
+                fields.append(data[cursor + 2:cursor + 2 + size].decode())
+                cursor += 2 + size
+            pos += 4 + length
+            yield PhoneNumber(
+                number=fields[0], provider=fields[1], status=_STATUSES[status],
+                assigned_target=fields[2] or None, assigned_task_id=fields[3] or None,
+                last_used=last_used or None, daily_send_count=daily,
+                total_send_count=total, count_day=day, cooldown_until=cooldown,
+            )
+
+    def snapshot(self, numbers: Iterable[PhoneNumber]) -> None:
+        """Write all ``numbers`` to a new snapshot and truncate the log."""
+        numbers = list(numbers)
+        providers: Dict[str, int] = {}
+        provider_index = array("H", (providers.setdefault(n.provider, len(providers)) for n in numbers))
+        sections = [
+            "\0".join(n.number for n in numbers).encode(),
+            "\0".join(providers).encode(),
+            provider_index.tobytes(),
+            bytes(_STATUS_CODES[n.status] for n in numbers),
+            "\0".join(n.assigned_target or "" for n in numbers).encode(),
+            "\0".join(n.assigned_task_id or "" for n in numbers).encode(),
+            array("d", (n.last_used or 0.0 for n in numbers)).tobytes(),
+            array("I", (n.daily_send_count for n in numbers)).tobytes(),
+            array("I", (n.total_send_count for n in numbers)).tobytes(),
+            array("I", (n.count_day for n in numbers)).tobytes(),
+            array("d", (n.cooldown_until for n in numbers)).tobytes(),
+        ]
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(b"L" if sys.byteorder == "little" else b"B")
+            f.write(_LENGTH.pack(len(numbers)))
+            for section in sections:
+                f.write(_LENGTH.pack(len(section)))
+                f.write(section)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        with open(self.log_path, "wb") as f:
+            f.write(LOG_MAGIC)
+        self.log_records = 0
+
+    def _read_snapshot(self) -> List[PhoneNumber]:
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if data[:4] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{self.path} is not a number pool snapshot")
+        swap = data[4:5] != (b"L" if sys.byteorder == "little" else b"B")
+        (count,) = _LENGTH.unpack_from(data, 5)
+        pos = 9
+        sections = []
+        while pos < len(data):
+            (length,) = _LENGTH.unpack_from(data, pos)
+            sections.append(data[pos + 4:pos + 4 + length])
+            pos += 4 + length
+        if not count:
+            return []
+
+        def strings(blob: bytes) -> List[str]:
+            return blob.decode().split("\0")
+
+        def column(typecode: str, blob: bytes) -> array:
+            values = array(typecode)
+            values.frombytes(blob)
+            if swap:
+                values.byteswap()
+            return values
+
+        provider_names = strings(sections[1])
+        columns = zip(
+            strings(sections[0]),
+            [provider_names[i] for i in column("H", sections[2])],
+            [_STATUSES[code] for code in sections[3]],
+            [t or None for t in strings(sections[4])],
+            [t or None for t in strings(sections[5])],
+            [t or None for t in column("d", sections[6])],
+            column("I", sections[7]),
+            column("I", sections[8]),
+            column("I", sections[9]),
+            column("d", sections[10]),
+        )
+        return [PhoneNumber(*row) for row in columns]
+
+    def close(self) -> None:
+        if self._log is not None:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._log.close()
+            self._log = None
+
@@ -1,6 +1,15 @@
+from .base import DeliveryStatus
 from .twilio_provider import TwilioProvider
 from .telnyx_provider import TelnyxProvider
 from .vonage_provider import VonageProvider
 from .messagebird_provider import MessageBirdProvider
+from .aliyun_provider import AliyunProvider
 
-__all__ = ["TwilioProvider", "TelnyxProvider", "VonageProvider", "MessageBirdProvider"]
\ No newline at end of file
+__all__ = [
+    "DeliveryStatus",
+    "TwilioProvider",
+    "TelnyxProvider",
+    "VonageProvider",
+    "MessageBirdProvider",
+    "AliyunProvider",
+]
\ No newline at end of file
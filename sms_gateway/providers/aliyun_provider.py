@@ -1,111 +1,139 @@
 """Aliyun (China) SMS provider integration."""
 
+import base64
 import hashlib
 import hmac
-import base64
 import json
 import logging
 import uuid
 from datetime import datetime, timezone
-from typing import Dict, Any
-from urllib.parse import quote_plus
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import httpx
 
-from .base import BaseSMSProvider, SMSResult, DeliveryStatus
+from .base import BaseProvider, DeliveryStatus, SMSMessage, SMSResult
 
 logger = logging.getLogger(__name__)
 
 
-class AliyunProvider(BaseSMSProvider):
-    """SMS provider implementation for Aliyun (China) SMS service."""
-
-    API_ENDPOINT = "https://dysmsapi.aliyuncs.com"
-
-    def __init__(self, config: Dict[str, Any]):
-        super().__init__("aliyun", config)
-        self.access_key_id = config["access_key_id"]
-        self.access_key_secret = config["access_key_secret"]
-        self.sign_name = config.get("sign_name", "")
-        self.template_code = config.get("template_code", "")
-        self._session = None
-
-    def _sign_request(self, params: Dict[str, str]) -> str:
-        sorted_params = sorted(params.items())
-        query_string = "&".join(
-            f"{quote_plus(k)}={quote_plus(v)}" for k, v in sorted_params
-        )
-        string_to_sign = f"GET&%2F&{quote_plus(query_string)}"
-        signing_key = f"{self.access_key_secret}&"
-        signature = base64.b64encode(
-            hmac.new(
-                signing_key.encode("utf-8"),
-                string_to_sign.encode("utf-8"),
-                hashlib.sha1,
-            ).digest()
-        ).decode("utf-8")
-        return signature
-
-    def _build_common_params(self) -> Dict[str, str]:
-        return {
+def _percent_encode(value: str) -> str:
+    """RFC 3986 encoding as required by Aliyun POP signatures."""
+    return quote(value, safe="~")
+
+
+class AliyunProvider(BaseProvider):
+    """SMS provider implementation for Aliyun (China) SMS service.
+
+    Aliyun sends approved templates rather than free text: the message body
+    is passed as the ``template_param`` variable of ``template_code``.
+
+    Requests are signed with HMAC-SHA1 over the sorted, percent-encoded
+    query. Everything that does not change per message (the HMAC key
+    schedule and the encoded static parameters in canonical order) is
+    prepared once; signing a message encodes only its four varying values.
+    """
+
+    BASE_URL = "https://dysmsapi.aliyuncs.com"
+    # Status lookups need the phone number and send date (see get_status).
+    SUPPORTS_STATUS = False
+    # SendSms accepts up to 1000 comma-separated PhoneNumbers per call.
+    MAX_BATCH_SIZE = 1000
+    API_VERSION = "2017-05-25"
+    # Flow control and server-side errors; everything else is a rejection.
+    RETRYABLE_ERROR_CODES = frozenset({"isv.BUSINESS_LIMIT_CONTROL", "isp.SYSTEM_ERROR", "Throttling.User"})
+
+    def __init__(self, access_key_id: str, access_key_secret: str, sign_name: str = "",
+                 template_code: str = "", template_param: str = "message", **kwargs):
+        super().__init__(api_key=access_key_id, **kwargs)
+        self.access_key_id = access_key_id
+        self.access_key_secret = access_key_secret
+        self.sign_name = sign_name
+        self.template_code = template_code
+        self.template_param = template_param
+        self._hmac = hmac.new(f"{access_key_secret}&".encode("utf-8"), digestmod=hashlib.sha1)
+        self._query_parts, self._query_slots = self._compile_query({
+            "Action": "SendSms",
             "Format": "JSON",
-            "Version": "2017-05-25",
-            "AccessKeyId": self.access_key_id,
+            "Version": self.API_VERSION,
+            "AccessKeyId": access_key_id,
             "SignatureMethod": "HMAC-SHA1",
             "SignatureVersion": "1.0",
-            "SignatureNonce": str(uuid.uuid4()),
-            "Timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
-        }
+            "SignName": sign_name,
+            "TemplateCode": template_code,
+        }, ("PhoneNumbers", "SignatureNonce", "TemplateParam", "Timestamp"))
+
+    @staticmethod
+    def _compile_query(static: Dict[str, str], dynamic: Tuple[str, ...]) -> Tuple[List[str], Dict[str, int]]:
+        """Canonical (sorted) query as encoded ``k=v`` parts with slots for ``dynamic`` keys."""
+        parts: List[str] = []
+        slots: Dict[str, int] = {}
+        for key in sorted([*static, *dynamic]):
+            if key in static:
+                parts.append(f"{_percent_encode(key)}={_percent_encode(static[key])}")
+            else:
+                slots[key] = len(parts)
+                parts.append("")
+        return parts, slots
 
-    async def send(self, phone_number: str, message: str) -> SMSResult:
-        logger.info(f"Sending SMS via Aliyun to {phone_number}")
+    def _signed_query(self, params: Dict[str, str]) -> str:
+        """Fill the per-message values, sign, and return the request query string."""
+        parts = self._query_parts[:]
+        for key, pos in self._query_slots.items():
+            parts[pos] = f"{key}={_percent_encode(params[key])}"
+        query = "&".join(parts)
+        mac = self._hmac.copy()
+        mac.update(f"GET&%2F&{_percent_encode(query)}".encode("utf-8"))
+        signature = base64.b64encode(mac.digest()).decode("ascii")
+        return f"Signature={_percent_encode(signature)}&{query}"
+
+    async def _send_sms(self, phone_numbers: str, body: str) -> Tuple[httpx.Response, Dict, Optional[str]]:
+        """Call SendSms; returns the response, its JSON body and an error (None on success)."""
+        query = self._signed_query({
+            "PhoneNumbers": phone_numbers,
+            "SignatureNonce": uuid.uuid4().hex,
+            "TemplateParam": json.dumps({self.template_param: body}, ensure_ascii=False),
+            "Timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        })
+        resp = await self.client.get(f"/?{query}")
         try:
-            import aiohttp
-            if self._session is None:
-                self._session = aiohttp.ClientSession()
-
-            params = self._build_common_params()
-            params.update({
-                "Action": "SendSms",
-                "PhoneNumbers": phone_number,
-                "SignName": self.sign_name,
-                "TemplateCode": self.template_code,
-                "TemplateParam": json.dumps({"message": message}),
-            })
-            params["Signature"] = self._sign_request(params)
-
-            async with self._session.get(
-                self.API_ENDPOINT, params=params, timeout=self._timeout
-            ) as resp:
-                data = await resp.json()
-                if data.get("Code") == "OK":
-                    return SMSResult(
-                        provider=self.name,
-                        message_id=data.get("BizId", ""),
-                        status=DeliveryStatus.SENT,
-                        phone_number=phone_number,
-                        raw_response=data,
-                    )
-                return SMSResult(
-                    provider=self.name,
-                    message_id="",
-                    status=DeliveryStatus.FAILED,
-                    phone_number=phone_number,
-                    error_message=data.get("Message", "Unknown error"),
-                    raw_response=data,
-                )
-        except Exception as e:
-            logger.error(f"Aliyun send failed: {e}")
+            data = resp.json()
+        except ValueError:
+            return resp, {}, resp.text
+        if resp.status_code == 200 and data.get("Code") == "OK":
+            return resp, data, None
+        return resp, data, f"{data.get('Code', resp.status_code)}: {data.get('Message', resp.text)}"
+
+    async def send(self, message: SMSMessage) -> SMSResult:
+        resp, data, error = await self._send_sms(message.to, message.body)
+        if error is None:
             return SMSResult(
-                provider=self.name,
-                message_id="",
-                status=DeliveryStatus.FAILED,
-                phone_number=phone_number,
-                error_message=str(e),
+                success=True,
+                message_id=data.get("BizId"),
+                provider="aliyun",
+                status=DeliveryStatus.SENT,
             )
+        logger.warning(f"Aliyun send to {message.to} failed: {error}")
+        return self._failure("aliyun", error, resp, code=data.get("Code"))
+
+    async def send_batch(self, messages: List[SMSMessage]) -> List[SMSResult]:
+        """Send one body to up to 1000 recipients in a single SendSms call."""
+        first = self._check_batch(messages, self.MAX_BATCH_SIZE)
+        resp, data, error = await self._send_sms(",".join(m.to for m in messages), first.body)
+        if error is None:
+            return [
+                SMSResult(success=True, message_id=data.get("BizId"), provider="aliyun",
+                          status=DeliveryStatus.SENT)
+                for _ in messages
+            ]
+        return [self._failure("aliyun", error, resp, code=data.get("Code")) for _ in messages]
 
-    async def check_balance(self) -> float:
+    async def get_status(self, message_id: str) -> str:
+        # QuerySendDetails needs the phone number and send date as well as
+        # the BizId, so a status cannot be looked up from the id alone.
+        logger.debug(f"Aliyun status lookup by BizId alone is not supported ({message_id})")
+        return DeliveryStatus.UNKNOWN.value
+
+    async def get_balance(self) -> float:
         logger.warning("Aliyun SMS does not provide balance API")
         return -1.0
-
-    async def query_status(self, message_id: str) -> DeliveryStatus:
-        logger.info(f"Querying Aliyun delivery status for {message_id}")
-        return DeliveryStatus.PENDING
\ No newline at end of file
@@ -1,44 +1,297 @@
 """Base provider interface and common data models."""
+import asyncio
+import logging
+import sys
+import time
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
-from typing import Optional
-from datetime import datetime
-
-@dataclass
-class SMSMessage:
-    to: str
-    body: str
-    from_number: Optional[str] = None
-    media_url: Optional[str] = None
-
-@dataclass 
-class SMSResult:
-    success: bool
-    message_id: Optional[str] = None
-    provider: Optional[str] = None
-    error: Optional[str] = None
-    timestamp: datetime = field(default_factory=datetime.utcnow)
-    price: Optional[float] = None
-    status: str = "unknown"
+from enum import Enum
+from typing import Any, Dict, List, Optional, Union
+from datetime import datetime, timezone
+
+import httpx
+
+from ..records import SlotRecord
+from ..retry import is_retryable_status, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+_EPOCH = datetime(1970, 1, 1)
+
+class DeliveryStatus(str, Enum):
+    """Provider-independent delivery state; values match the status store's."""
+    QUEUED = "queued"
+    SENDING = "sending"
+    SENT = "sent"
+    DELIVERED = "delivered"
+    FAILED = "failed"
+    UNDELIVERED = "undelivered"
+    UNKNOWN = "unknown"
+
+    @classmethod
+    def normalize(cls, raw: Optional[str]) -> "DeliveryStatus":
+        """Map a provider's status string (any case) onto a DeliveryStatus."""
+        if isinstance(raw, cls):
+            return raw
+        if not raw:
+            return cls.UNKNOWN
+        return _PROVIDER_STATUSES.get(raw.strip().lower(), cls.UNKNOWN)
+
+# Status vocabularies of Twilio, Telnyx, Vonage, MessageBird and Aliyun.
+_PROVIDER_STATUSES = {
+    **{s.value: s for s in DeliveryStatus},
+    "accepted": DeliveryStatus.QUEUED,
+    "scheduled": DeliveryStatus.QUEUED,
+    "submitted": DeliveryStatus.SENT,
+    "buffered": DeliveryStatus.SENT,
+    "delivery_unconfirmed": DeliveryStatus.SENT,
+    "1": DeliveryStatus.SENT,
+    "2": DeliveryStatus.FAILED,
+    "3": DeliveryStatus.DELIVERED,
+    "delivrd": DeliveryStatus.DELIVERED,
+    "sending_failed": DeliveryStatus.FAILED,
+    "rejected": DeliveryStatus.FAILED,
+    "canceled": DeliveryStatus.FAILED,
+    "delivery_failed": DeliveryStatus.UNDELIVERED,
+    "expired": DeliveryStatus.UNDELIVERED,
+    "undeliv": DeliveryStatus.UNDELIVERED,
+}
+
+class SMSMessage(SlotRecord):
+    __slots__ = ("to", "body", "from_number", "media_url")
+
+    def __init__(self, to: str, body: str, from_number: Optional[str] = None,
+                 media_url: Optional[str] = None):
+        self.to = to
+        self.body = body
+        self.from_number = from_number
+        self.media_url = media_url
+
+class SMSResult(SlotRecord):
+    """Outcome of one send.
+
+    ``created`` is the epoch time the result was made; ``timestamp`` gives
+    it as a naive UTC datetime (naive datetimes passed in are taken as
+    UTC, aware ones are converted). Status strings are interned so millions of
+    results share a handful of objects.
+
+    For failures, ``status_code`` is the provider's HTTP status,
+    ``retryable`` is True for transient errors, False for permanent ones
+    and None when the provider did not classify the error, and
+    ``retry_after`` is the provider's requested wait in seconds.
+    """
+
+    __slots__ = ("success", "message_id", "provider", "error", "created", "price", "status", "segments",
+                 "status_code", "retryable", "retry_after")
+
+    def __init__(self, success: bool, message_id: Optional[str] = None, provider: Optional[str] = None,
+                 error: Optional[str] = None, timestamp: Union[datetime, float, None] = None,
+                 price: Optional[float] = None, status: Union[str, DeliveryStatus] = "unknown",
+                 segments: int = 1, status_code: Optional[int] = None, retryable: Optional[bool] = None,
+                 retry_after: Optional[float] = None):
+        self.success = success
+        self.message_id = message_id
+        self.provider = provider
+        self.error = error
+        if timestamp is None:
+            self.created = time.time()
+        elif isinstance(timestamp, datetime):
+            if timestamp.tzinfo is not None:
+                self.created = timestamp.timestamp()
+            else:
+                self.created = (timestamp - _EPOCH).total_seconds()
+        else:
+            self.created = timestamp
+        self.price = price
+        if status is None:
+            status = DeliveryStatus.UNKNOWN
+        self.status = sys.intern(status.value if isinstance(status, DeliveryStatus) else status)
+        self.segments = segments
+        self.status_code = status_code
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(self.created, timezone.utc).replace(tzinfo=None)
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
 
 class BaseProvider(ABC):
-    """Abstract base class for SMS providers."""
-    
+    """Abstract base class for SMS providers.
+
+    The provider contract: ``send(SMSMessage) -> SMSResult``, optionally
+    ``send_batch``, ``get_status`` (raw provider status, normalised by
+    :meth:`get_delivery_status`) and ``get_balance``. Transport errors are
+    raised, not wrapped, so the gateway can fail over.
+
+    Each provider owns one long-lived ``httpx.AsyncClient`` so that sends,
+    status lookups and balance checks reuse pooled keep-alive connections.
+    Pool settings are read from the provider kwargs (or a ``ProviderConfig``
+    via :meth:`configure`): ``timeout``, ``max_connections``,
+    ``max_keepalive_connections``, ``keepalive_expiry``, ``http2``,
+    ``base_url`` and ``transport``.
+    """
+
+    BASE_URL = ""
+    SUPPORTS_HTTP2 = False
+    # Recipients accepted by one carrier-side batch call; 1 = no batch API.
+    MAX_BATCH_SIZE = 1
+    # Message ids looked up by one ``get_statuses`` call; 1 = no list API.
+    STATUS_BATCH_SIZE = 1
+    # False when the carrier has no status lookup; only receipts report delivery.
+    SUPPORTS_STATUS = True
+    # Provider error codes that are transient whatever the HTTP status.
+    RETRYABLE_ERROR_CODES: frozenset = frozenset()
+
     def __init__(self, api_key: str, **kwargs):
         self.api_key = api_key
         self._config = kwargs
-    
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def configure(self, config) -> None:
+        """Apply a ``ProviderConfig``'s timeout and pool options.
+
+        Must be called before the client is opened; later changes only take
+        effect after :meth:`aclose`.
+        """
+        self._config["timeout"] = config.timeout
+        self._config.update(config.options)
+
+    @property
+    def base_url(self) -> str:
+        return self._config.get("base_url", self.BASE_URL)
+
+    def _default_headers(self) -> Dict[str, str]:
+        """Headers sent with every request (e.g. precomputed auth)."""
+        return {}
+
+    def _client_options(self) -> Dict[str, Any]:
+        timeout = float(self._config.get("timeout", DEFAULT_TIMEOUT))
+        limits = httpx.Limits(
+            max_connections=int(self._config.get("max_connections", DEFAULT_MAX_CONNECTIONS)),
+            max_keepalive_connections=int(
+                self._config.get("max_keepalive_connections", DEFAULT_MAX_KEEPALIVE)
+            ),
+            keepalive_expiry=float(self._config.get("keepalive_expiry", DEFAULT_KEEPALIVE_EXPIRY)),
+        )
+        http2 = bool(self._config.get("http2", self.SUPPORTS_HTTP2))
+        if http2 and not _http2_available():
+            logger.debug(f"{type(self).__name__}: h2 not installed, falling back to HTTP/1.1")
+            http2 = False
+        options = {
+            "base_url": self.base_url,
+            "headers": self._default_headers(),
+            "timeout": httpx.Timeout(timeout, connect=min(timeout, 10.0)),
+            "limits": limits,
+            "http2": http2,
+        }
+        if "transport" in self._config:
+            options["transport"] = self._config["transport"]
+        return options
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared pooled HTTP client, opened on first use."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(**self._client_options())
+        return self._client
+
+    @property
+    def is_open(self) -> bool:
+        return self._client is not None and not self._client.is_closed
+
+    async def start(self) -> None:
+        """Open the connection pool eagerly."""
+        self.client
+
+    async def aclose(self) -> None:
+        """Close the connection pool and release its sockets."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "BaseProvider":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
     @abstractmethod
     async def send(self, message: SMSMessage) -> SMSResult:
         """Send a single SMS message."""
         pass
-    
+
+    @property
+    def supports_batch(self) -> bool:
+        return self.MAX_BATCH_SIZE > 1
+
+    async def send_batch(self, messages: List[SMSMessage]) -> List[SMSResult]:
+        """Send messages that share body and sender, one result per message.
+
+        Providers with a multi-recipient API override this to send up to
+        ``MAX_BATCH_SIZE`` recipients per HTTP call; the default sends each
+        message individually.
+        """
+        return list(await asyncio.gather(*(self.send(m) for m in messages)))
+
+    def _failure(self, provider: str, error: str, resp: Optional[httpx.Response] = None,
+                 code: Optional[Any] = None) -> SMSResult:
+        """Failed result classified as retryable or permanent."""
+        status_code = resp.status_code if resp is not None else None
+        retryable = is_retryable_status(status_code) or (
+            code is not None and str(code) in self.RETRYABLE_ERROR_CODES
+        )
+        retry_after = parse_retry_after(resp.headers.get("Retry-After")) if resp is not None else None
+        return SMSResult(success=False, provider=provider, error=error, status=DeliveryStatus.FAILED,
+                         status_code=status_code, retryable=retryable, retry_after=retry_after)
+
+    @staticmethod
+    def _check_batch(messages: List[SMSMessage], max_size: int) -> SMSMessage:
+        """Validate a batch and return its first message as the template."""
+        if not messages:
+            raise ValueError("Empty batch")
+        if len(messages) > max_size:
+            raise ValueError(f"Batch of {len(messages)} exceeds maximum of {max_size}")
+        first = messages[0]
+        for m in messages:
+            if m.body != first.body or m.from_number != first.from_number or m.media_url:
+                raise ValueError("Batched messages must share body and sender and have no media")
+        return first
+
     @abstractmethod
     async def get_status(self, message_id: str) -> str:
         """Get delivery status of a message."""
         pass
-    
+
+    async def get_statuses(self, message_ids: List[str], since: Optional[float] = None) -> Dict[str, str]:
+        """Raw statuses of several messages sent no earlier than ``since``.
+
+        Providers with a list/filter endpoint override this to look up up to
+        ``STATUS_BATCH_SIZE`` ids per call; the default asks ``get_status``
+        for each id. Ids whose status could not be found or is unknown are
+        left out.
+        """
+        statuses = await asyncio.gather(*(self.get_status(mid) for mid in message_ids))
+        return {
+            mid: status for mid, status in zip(message_ids, statuses)
+            if status != "error" and DeliveryStatus.normalize(status) is not DeliveryStatus.UNKNOWN
+        }
+
+    async def get_delivery_status(self, message_id: str) -> DeliveryStatus:
+        """Delivery status of a message, normalised across providers."""
+        return DeliveryStatus.normalize(await self.get_status(message_id))
+
     @abstractmethod
     async def get_balance(self) -> float:
         """Get account balance."""
-        pass
\ No newline at end of file
+        pass
@@ -1,18 +1,20 @@
 """MessageBird SMS provider implementation."""
-import httpx
+from typing import Dict, List, Optional
 from .base import BaseProvider, SMSMessage, SMSResult
 
 class MessageBirdProvider(BaseProvider):
     """MessageBird SMS provider."""
     
     BASE_URL = "https://rest.messagebird.com"
+    MAX_BATCH_SIZE = 50
+    STATUS_BATCH_SIZE = 200
+    # Pages of the message list read per lookup; older messages are looked up one by one.
+    MAX_STATUS_PAGES = 5
+    
+    def _default_headers(self) -> Dict[str, str]:
+        return {"Authorization": f"AccessKey {self.api_key}"}
     
     async def send(self, message: SMSMessage) -> SMSResult:
-        headers = {
-            "Authorization": f"AccessKey {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
         payload = {
             "recipients": [message.to],
             "body": message.body,
@@ -20,31 +22,86 @@ class MessageBirdProvider(BaseProvider):
         if message.from_number:
             payload["originator"] = message.from_number
         
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(f"{self.BASE_URL}/messages", headers=headers, json=payload)
-            
-            if resp.status_code in (200, 201):
-                body = resp.json()
-                return SMSResult(
-                    success=True,
-                    message_id=body.get("id"),
-                    provider="messagebird",
-                    status="sent",
-                )
-            return SMSResult(success=False, provider="messagebird", error=resp.text)
+        resp = await self.client.post("/messages", json=payload)
+        
+        if resp.status_code in (200, 201):
+            body = resp.json()
+            return SMSResult(
+                success=True,
+                message_id=body.get("id"),
+                provider="messagebird",
+                status="sent",
+            )
+        return self._failure("messagebird", resp.text, resp)
+    
+    async def send_batch(self, messages: List[SMSMessage]) -> List[SMSResult]:
+        """Send one body to up to 50 recipients in a single API call."""
+        first = self._check_batch(messages, self.MAX_BATCH_SIZE)
+        payload = {
+            "recipients": [m.to for m in messages],
+            "body": first.body,
+        }
+        if first.from_number:
+            payload["originator"] = first.from_number
+        
+        resp = await self.client.post("/messages", json=payload)
+        
+        if resp.status_code not in (200, 201):
+            return [self._failure("messagebird", resp.text, resp) for _ in messages]
+        body = resp.json()
+        items = body.get("recipients", {}).get("items", [])
+        statuses = {str(item.get("recipient")): item.get("status", "sent") for item in items}
+        results = []
+        for m in messages:
+            status = statuses.get(m.to.lstrip("+"), "sent")
+            failed = status in ("failed", "delivery_failed")
+            results.append(SMSResult(
+                success=not failed,
+                message_id=body.get("id"),
+                provider="messagebird",
+                status=status,
+                error=f"Recipient status {status}" if failed else None,
+            ))
+        return results
     
     async def get_status(self, message_id: str) -> str:
-        headers = {"Authorization": f"AccessKey {self.api_key}"}
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(f"{self.BASE_URL}/messages/{message_id}", headers=headers)
-            if resp.status_code == 200:
-                return resp.json().get("status", "unknown")
-            return "error"
+        resp = await self.client.get(f"/messages/{message_id}")
+        if resp.status_code == 200:
+            return resp.json().get("status", "unknown")
+        return "error"
+    
+    @staticmethod
+    def _message_status(item: Dict) -> str:
+        recipients = item.get("recipients", {})
+        total = recipients.get("totalCount", 0)
+        if total and recipients.get("totalDeliveredCount") == total:
+            return "delivered"
+        if total and recipients.get("totalDeliveryFailedCount") == total:
+            return "delivery_failed"
+        items = recipients.get("items") or []
+        if len(items) == 1:
+            return items[0].get("status", "sent")
+        return item.get("status", "sent")
+    
+    async def get_statuses(self, message_ids: List[str], since: Optional[float] = None) -> Dict[str, str]:
+        """Page through the most recent messages instead of one GET per message."""
+        wanted = set(message_ids)
+        statuses: Dict[str, str] = {}
+        limit = self.STATUS_BATCH_SIZE
+        for page in range(self.MAX_STATUS_PAGES):
+            resp = await self.client.get("/messages", params={"limit": limit, "offset": page * limit})
+            if resp.status_code != 200:
+                break
+            items = resp.json().get("items", [])
+            for item in items:
+                if item.get("id") in wanted:
+                    statuses[item["id"]] = self._message_status(item)
+            if len(statuses) == len(wanted) or len(items) < limit:
+                break
+        return statuses
     
     async def get_balance(self) -> float:
-        headers = {"Authorization": f"AccessKey {self.api_key}"}
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(f"{self.BASE_URL}/balance", headers=headers)
-            if resp.status_code == 200:
-                return float(resp.json().get("amount", 0))
-            return 0.0
\ No newline at end of file
+        resp = await self.client.get("/balance")
+        if resp.status_code == 200:
+            return float(resp.json().get("amount", 0))
+        return 0.0
@@ -1,22 +1,31 @@
 """Twilio SMS provider implementation."""
-import httpx
 import base64
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+
 from .base import BaseProvider, SMSMessage, SMSResult
 
 class TwilioProvider(BaseProvider):
     """Twilio SMS/MMS provider."""
     
     BASE_URL = "https://api.twilio.com/2010-04-01"
+    SUPPORTS_HTTP2 = True
+    STATUS_BATCH_SIZE = 1000
+    # Pages of the Messages list read per lookup; older messages are looked up one by one.
+    MAX_STATUS_PAGES = 5
     
     def __init__(self, account_sid: str, auth_token: str, **kwargs):
         super().__init__(api_key=auth_token, **kwargs)
         self.account_sid = account_sid
         self.auth_token = auth_token
     
-    async def send(self, message: SMSMessage) -> SMSResult:
+    def _default_headers(self) -> Dict[str, str]:
         auth = base64.b64encode(f"{self.account_sid}:{self.auth_token}".encode()).decode()
-        headers = {"Authorization": f"Basic {auth}"}
-        
+        return {"Authorization": f"Basic {auth}"}
+    
+    async def send(self, message: SMSMessage) -> SMSResult:
         data = {
             "To": message.to,
             "Body": message.body,
@@ -26,51 +35,58 @@ class TwilioProvider(BaseProvider):
         if message.media_url:
             data["MediaUrl"] = message.media_url
         
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                f"{self.BASE_URL}/Accounts/{self.account_sid}/Messages.json",
-                headers=headers,
-                data=data
+        resp = await self.client.post(
+            f"/Accounts/{self.account_sid}/Messages.json",
+            data=data
+        )
+        
+        if resp.status_code == 201:
+            body = resp.json()
+            return SMSResult(
+                success=True,
+                message_id=body.get("sid"),
+                provider="twilio",
+                status=body.get("status", "queued"),
+                price=float(body.get("price", 0) or 0),
             )
-            
-            if resp.status_code == 201:
-                body = resp.json()
-                return SMSResult(
-                    success=True,
-                    message_id=body.get("sid"),
-                    provider="twilio",
-                    status=body.get("status", "queued"),
-                    price=float(body.get("price", 0) or 0),
-                )
-            else:
-                return SMSResult(
-                    success=False,
-                    provider="twilio",
-                    error=resp.text,
-                )
+        else:
+            return self._failure("twilio", resp.text, resp)
     
     async def get_status(self, message_id: str) -> str:
-        auth = base64.b64encode(f"{self.account_sid}:{self.auth_token}".encode()).decode()
-        headers = {"Authorization": f"Basic {auth}"}
-        
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(
-                f"{self.BASE_URL}/Accounts/{self.account_sid}/Messages/{message_id}.json",
-                headers=headers
-            )
-            if resp.status_code == 200:
-                return resp.json().get("status", "unknown")
-            return "error"
+        resp = await self.client.get(
+            f"/Accounts/{self.account_sid}/Messages/{message_id}.json"
+        )
+        if resp.status_code == 200:
+            return resp.json().get("status", "unknown")
+        return "error"
+    
+    async def get_statuses(self, message_ids: List[str], since: Optional[float] = None) -> Dict[str, str]:
+        """Read the Messages list (sent since ``since``) instead of one GET per message."""
+        wanted = set(message_ids)
+        statuses: Dict[str, str] = {}
+        params = {"PageSize": 1000}
+        if since is not None:
+            # DateSent filters by UTC day; go back one day for sends just before midnight.
+            params["DateSent>"] = (datetime.utcfromtimestamp(since) - timedelta(days=1)).strftime("%Y-%m-%d")
+        url: Optional[str] = f"/Accounts/{self.account_sid}/Messages.json"
+        prefix = httpx.URL(self.base_url).path.rstrip("/")
+        for _ in range(self.MAX_STATUS_PAGES):
+            resp = await self.client.get(url, params=params)
+            if resp.status_code != 200:
+                break
+            body = resp.json()
+            for item in body.get("messages", []):
+                if item.get("sid") in wanted:
+                    statuses[item["sid"]] = item.get("status", "unknown")
+            next_uri = body.get("next_page_uri")
+            if len(statuses) == len(wanted) or not next_uri:
+                break
+            # next_page_uri is absolute from the API root and carries its own query.
+            url, params = next_uri[len(prefix):] if next_uri.startswith(prefix) else next_uri, None
+        return statuses
     
     async def get_balance(self) -> float:
-        auth = base64.b64encode(f"{self.account_sid}:{self.auth_token}".encode()).decode()
-        headers = {"Authorization": f"Basic {auth}"}
-        
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(
-                f"{self.BASE_URL}/Accounts/{self.account_sid}/Balance.json",
-                headers=headers
-            )
-            if resp.status_code == 200:
-                return float(resp.json().get("balance", 0))
-            return 0.0
\ No newline at end of file
+        resp = await self.client.get(f"/Accounts/{self.account_sid}/Balance.json")
+        if resp.status_code == 200:
+            return float(resp.json().get("balance", 0))
+        return 0.0
@@ -0,0 +1,388 @@
+"""Hierarchical token-bucket rate limiting for outgoing SMS.
+
+Limits come from ``config/rate_limiter.toml`` and are applied at four levels:
+global, per sender number, per destination number and per provider. Each
+level may have several bands (e.g. per hour and per day), each one a token
+bucket. A message that exceeds a limit is delayed until its tokens are
+available rather than failed.
+
+Buckets are reservation based: acquiring refills the bucket from the elapsed
+monotonic time and subtracts the cost, letting the balance go negative. The
+deficit divided by the refill rate is the delay the caller must wait. Each
+check is O(1), involves no locks and no awaits, so it is atomic with respect
+to the event loop. A limiter instance belongs to one event loop.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Collection, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .metrics import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE_LIMIT_PATH = Path(__file__).parent.parent / "config" / "rate_limiter.toml"
+
+
+class RateLimitExceeded(Exception):
+    """Raised when honouring a limit would delay a message beyond ``max_delay`` (or ``max_wait``)."""
+
+    def __init__(self, scope: str, wait: float):
+        super().__init__(f"Rate limit for {scope} requires waiting {wait:.1f}s")
+        self.scope = scope
+        self.wait = wait
+
+
+class Limit(NamedTuple):
+    """A token bucket band: ``rate`` tokens per second, holding ``capacity``."""
+    rate: float
+    capacity: float
+
+    @classmethod
+    def per_period(cls, count: float, seconds: float, burst: Optional[float] = None) -> "Limit":
+        return cls(count / seconds, burst if burst is not None else count)
+
+
+class TokenBucket:
+    """Single token bucket with reservation (debt) semantics."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, limit: Limit, now: float):
+        self.rate = limit.rate
+        self.capacity = limit.capacity
+        self.tokens = limit.capacity
+        self.updated = now
+
+    def refill(self, now: float) -> float:
+        tokens = self.tokens + (now - self.updated) * self.rate
+        if tokens > self.capacity:
+            tokens = self.capacity
+        self.tokens = tokens
+        self.updated = now
+        return tokens
+
+    def wait_for(self, cost: float) -> float:
+        """Seconds until ``cost`` tokens are available (after refill)."""
+        deficit = cost - self.tokens
+        return deficit / self.rate if deficit > 0 else 0.0
+
+
+def _load_toml(path: Path) -> Dict[str, Any]:
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        import tomli as tomllib
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+@dataclass
+class RateLimitConfig:
+    global_limits: List[Limit] = field(default_factory=list)
+    per_number: List[Limit] = field(default_factory=list)
+    per_destination: List[Limit] = field(default_factory=list)
+    per_provider: List[Limit] = field(default_factory=list)
+    provider_overrides: Dict[str, List[Limit]] = field(default_factory=dict)
+    max_delay: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RateLimitConfig":
+        """Build limits from the sections of ``rate_limiter.toml``."""
+        config = cls()
+        g = data.get("global", {})
+        burst = g.get("burst_size")
+        if "max_requests_per_second" in g:
+            config.global_limits.append(Limit.per_period(g["max_requests_per_second"], 1, burst))
+        if "max_requests_per_minute" in g:
+            config.global_limits.append(Limit.per_period(g["max_requests_per_minute"], 60))
+        n = data.get("per_number", {})
+        if "max_sms_per_hour" in n:
+            config.per_number.append(Limit.per_period(n["max_sms_per_hour"], 3600))
+        if "max_sms_per_day" in n:
+            config.per_number.append(Limit.per_period(n["max_sms_per_day"], 86400))
+        if n.get("cooldown_seconds"):
+            config.per_number.append(Limit.per_period(1, n["cooldown_seconds"]))
+        d = data.get("per_destination", {})
+        if "max_sms_per_number_per_hour" in d:
+            config.per_destination.append(Limit.per_period(d["max_sms_per_number_per_hour"], 3600))
+        if "max_sms_per_number_per_day" in d:
+            config.per_destination.append(Limit.per_period(d["max_sms_per_number_per_day"], 86400))
+        p = data.get("per_provider", {})
+        config.per_provider = cls._provider_limits(p)
+        for name, section in p.items():
+            if isinstance(section, dict):
+                config.provider_overrides[name] = cls._provider_limits(section)
+        config.max_delay = data.get("delay", {}).get("max_delay_seconds")
+        return config
+
+    @staticmethod
+    def _provider_limits(section: Dict[str, Any]) -> List[Limit]:
+        if "max_requests_per_second" not in section:
+            return []
+        return [Limit.per_period(section["max_requests_per_second"], 1, section.get("burst_size"))]
+
+    @classmethod
+    def from_toml(cls, path: Optional[Path] = None) -> "RateLimitConfig":
+        return cls.from_dict(_load_toml(Path(path or DEFAULT_RATE_LIMIT_PATH)))
+
+
+class RateLimiter:
+    """Global, per-number, per-destination and per-provider token buckets."""
+
+    SWEEP_INTERVAL = 60.0
+
+    def __init__(self, config: Optional[RateLimitConfig] = None, clock=time.monotonic):
+        self.config = config or RateLimitConfig()
+        self._clock = clock
+        now = clock()
+        self._global = [TokenBucket(limit, now) for limit in self.config.global_limits]
+        self._numbers: Dict[str, List[TokenBucket]] = {}
+        self._destinations: Dict[str, List[TokenBucket]] = {}
+        self._providers: Dict[str, List[TokenBucket]] = {}
+        self._next_sweep = now + self.SWEEP_INTERVAL
+        self._stats = {"acquired": 0, "delayed": 0, "rejected": 0, "deferred": 0,
+                       "delay_seconds": 0.0}
+
+    @classmethod
+    def from_toml(cls, path: Optional[Path] = None) -> "RateLimiter":
+        return cls(RateLimitConfig.from_toml(path))
+
+    def _group(self, table: Dict[str, List[TokenBucket]], key: str,
+               limits: List[Limit], now: float) -> List[TokenBucket]:
+        group = table.get(key)
+        if group is None:
+            group = table[key] = [TokenBucket(limit, now) for limit in limits]
+        return group
+
+    def reserve(self, to: Optional[str] = None, from_number: Optional[str] = None,
+                provider: Optional[str] = None, cost: float = 1.0, segments: int = 1,
+                max_wait: Optional[float] = None, levels: Optional[Collection[str]] = None) -> float:
+        """Reserve ``cost`` tokens at every applicable level (or only ``levels``).
+
+        Sender-number buckets are charged per SMS segment (``cost *
+        segments``), matching how carriers meter sender throughput; the
+        other levels count messages. Returns the delay in seconds before the
+        message may be sent. Raises :class:`RateLimitExceeded` (without
+        consuming anything) if the delay would exceed ``max_delay``, or
+        ``max_wait`` for a caller that would rather try again later than
+        wait (counted as deferred rather than rejected).
+        """
+        now = self._clock()
+        if now >= self._next_sweep:
+            self.sweep(now)
+        charges = self._charges(now, to, from_number, provider, cost, segments, levels)
+        return self._apply(charges, now, provider or to or "global", max_wait)
+
+    def reserve_many(self, requests: Sequence[Dict[str, Any]], max_wait: Optional[float] = None) -> float:
+        """Reserve for several sends at once, all or nothing.
+
+        Each request holds :meth:`reserve` keyword arguments. Charges to the
+        same bucket are added up, so a carrier batch is admitted (or
+        deferred) as a whole and never leaves tokens spent for part of it.
+        """
+        now = self._clock()
+        if now >= self._next_sweep:
+            self.sweep(now)
+        totals: Dict[int, list] = {}
+        for request in requests:
+            for bucket, charge, level in self._charges(now, **request):
+                entry = totals.get(id(bucket))
+                if entry is None:
+                    totals[id(bucket)] = [bucket, charge, level]
+                else:
+                    entry[1] += charge
+        return self._apply([tuple(entry) for entry in totals.values()], now, "batch", max_wait)
+
+    def refund(self, cost: float, provider: Optional[str] = None, level: str = "global") -> None:
+        """Give back ``cost`` tokens reserved at the global or provider ``level`` but not spent."""
+        now = self._clock()
+        for bucket, charge, _ in self._charges(now, provider=provider, cost=cost, levels=(level,)):
+            bucket.refill(now)
+            bucket.tokens = min(bucket.capacity, bucket.tokens + charge)
+
+    def _charges(self, now: float, to: Optional[str] = None, from_number: Optional[str] = None,
+                 provider: Optional[str] = None, cost: float = 1.0, segments: int = 1,
+                 levels: Optional[Collection[str]] = None) -> List[Tuple[TokenBucket, float, str]]:
+        config = self.config
+        charges = []
+        if levels is None or "global" in levels:
+            charges += [(bucket, cost, "global") for bucket in self._global]
+        if from_number and config.per_number and (levels is None or "sender" in levels):
+            number_cost = cost * segments
+            charges += [(bucket, number_cost, "sender")
+                        for bucket in self._group(self._numbers, from_number, config.per_number, now)]
+        if to and config.per_destination and (levels is None or "destination" in levels):
+            charges += [(bucket, cost, "destination")
+                        for bucket in self._group(self._destinations, to, config.per_destination, now)]
+        if provider and (levels is None or "provider" in levels):
+            limits = config.provider_overrides.get(provider, config.per_provider)
+            if limits:
+                charges += [(bucket, cost, "provider")
+                            for bucket in self._group(self._providers, provider, limits, now)]
+        return charges
+
+    def _apply(self, charges: List[Tuple[TokenBucket, float, str]], now: float, scope: str,
+               max_wait: Optional[float]) -> float:
+        wait = 0.0
+        level = "global"
+        for bucket, charge, bucket_level in charges:
+            bucket.refill(now)
+            w = bucket.wait_for(charge)
+            if w > wait:
+                wait = w
+                level = bucket_level
+        if self.config.max_delay is not None and wait > self.config.max_delay:
+            self._stats["rejected"] += 1
+            RATE_LIMITED.inc(level)
+            raise RateLimitExceeded(scope, wait)
+        if max_wait is not None and wait > max_wait:
+            self._stats["deferred"] += 1
+            raise RateLimitExceeded(scope, wait)
+        for bucket, charge, _ in charges:
+            bucket.tokens -= charge
+        self._stats["acquired"] += 1
+        if wait:
+            self._stats["delayed"] += 1
+            self._stats["delay_seconds"] += wait
+        return wait
+
+    async def acquire_many(self, requests: Sequence[Dict[str, Any]], max_wait: Optional[float] = None) -> float:
+        """:meth:`reserve_many`, then sleep until the sends may go out."""
+        wait = self.reserve_many(requests, max_wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    async def acquire(self, to: Optional[str] = None, from_number: Optional[str] = None,
+                      provider: Optional[str] = None, cost: float = 1.0, segments: int = 1,
+                      max_wait: Optional[float] = None) -> float:
+        """Reserve tokens and sleep until the message may be sent."""
+        wait = self.reserve(to=to, from_number=from_number, provider=provider, cost=cost,
+                            segments=segments, max_wait=max_wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop per-key buckets that have refilled completely.
+
+        A full bucket behaves exactly like a freshly created one, so idle
+        keys can be forgotten without changing any limit.
+        """
+        now = self._clock() if now is None else now
+        removed = 0
+        for table in (self._numbers, self._destinations, self._providers):
+            idle = [key for key, group in table.items()
+                    if all(b.refill(now) >= b.capacity for b in group)]
+            for key in idle:
+                del table[key]
+            removed += len(idle)
+        self._next_sweep = now + self.SWEEP_INTERVAL
+        return removed
+
+    @property
+    def stats(self) -> Dict:
+        return {
+            **self._stats,
+            "tracked_numbers": len(self._numbers),
+            "tracked_destinations": len(self._destinations),
+        }
+
+
+class SlidingWindowBackend:
+    """Storage for approximate sliding-window request counters.
+
+    Implementations decide whether a request identified by ``key`` is within
+    ``limit`` requests per ``window`` seconds and count it if so. Backends
+    shared between processes let several API workers enforce one limit.
+    """
+
+    async def hit(self, key: str, limit: int, window: float) -> bool:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemorySlidingWindow(SlidingWindowBackend):
+    """Per-process sliding-window counter with O(1) checks.
+
+    Each key keeps the count of the current and previous fixed windows; the
+    sliding count is approximated by weighting the previous window by the
+    fraction of it still inside the sliding window. Keys idle for two
+    windows are evicted by a periodic sweep.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._counters: Dict[str, List[float]] = {}
+        self._next_sweep = 0.0
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def check(self, key: str, limit: int, window: float) -> bool:
+        now = self._clock()
+        if now >= self._next_sweep:
+            self.sweep(window, now)
+        slot = now // window
+        counter = self._counters.get(key)
+        if counter is None:
+            self._counters[key] = [slot, 0, 1]
+            return True
+        if counter[0] != slot:
+            counter[1] = counter[2] if slot - counter[0] == 1 else 0
+            counter[2] = 0
+            counter[0] = slot
+        elapsed = now / window - slot
+        if counter[1] * (1.0 - elapsed) + counter[2] >= limit:
+            return False
+        counter[2] += 1
+        return True
+
+    async def hit(self, key: str, limit: int, window: float) -> bool:
+        return self.check(key, limit, window)
+
+    def sweep(self, window: float, now: Optional[float] = None) -> int:
+        """Evict keys with no requests in the current or previous window."""
+        now = self._clock() if now is None else now
+        oldest = now // window - 1
+        idle = [key for key, counter in self._counters.items() if counter[0] < oldest]
+        for key in idle:
+            del self._counters[key]
+        self._next_sweep = now + window
+        return len(idle)
+
+
+class RedisSlidingWindow(SlidingWindowBackend):
+    """Sliding-window counters in Redis, shared by all API workers.
+
+    Requires the optional ``redis`` package.
+    """
+
+    def __init__(self, redis_url: str, prefix: str = "sms:rl:", clock=time.time):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(redis_url)
+        self.prefix = prefix
+        self._clock = clock
+
+    async def hit(self, key: str, limit: int, window: float) -> bool:
+        now = self._clock()
+        slot = int(now // window)
+        current_key = f"{self.prefix}{key}:{slot}"
+        pipe = self._redis.pipeline()
+        pipe.get(f"{self.prefix}{key}:{slot - 1}")
+        pipe.incr(current_key)
+        pipe.expire(current_key, int(window * 2) + 1)
+        previous, current, _ = await pipe.execute()
+        elapsed = now / window - slot
+        if int(previous or 0) * (1.0 - elapsed) + current > limit:
+            await self._redis.decr(current_key)
+            return False
+        return True
+
+    async def close(self) -> None:
+        await self._redis.close()
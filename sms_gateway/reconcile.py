@@ -0,0 +1,201 @@
+"""Background status reconciliation for messages without delivery receipts.
+
+Sent messages are kept in a heap ordered by when they are next due for a
+check. Each round pops the due messages, drops those that already reached a
+final state (e.g. through a webhook receipt), groups the rest per provider
+and looks them up with ``get_statuses`` -- one list/filter call per
+``STATUS_BATCH_SIZE`` ids where the carrier has one -- under a shared
+concurrency budget. The interval between checks grows with the age of the
+message, so young messages are polled often and old ones rarely. Messages
+of providers without a status lookup (``SUPPORTS_STATUS``) are not tracked,
+and an ``unknown`` answer counts as no answer rather than a status.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .dlr import StatusEvent
+from .providers.base import BaseProvider, DeliveryStatus
+from .records import SlotRecord
+from .status import FINAL_STATES, StatusStore
+
+logger = logging.getLogger(__name__)
+
+
+class PendingMessage(SlotRecord):
+    """A sent message waiting for a final status."""
+
+    __slots__ = ("provider", "message_id", "recipient", "sent_at", "direct")
+
+    def __init__(self, provider: str, message_id: str, recipient: Optional[str], sent_at: float):
+        self.provider = provider
+        self.message_id = message_id
+        self.recipient = recipient
+        self.sent_at = sent_at
+        # Set once a list lookup missed the message; it is then looked up by id.
+        self.direct = False
+
+
+class StatusReconciler:
+    """Polls providers for the status of messages that are not final yet.
+
+    ``providers`` maps names to providers (the gateway's live registry).
+    A message is first checked ``first_check`` seconds after it was sent;
+    after that, every ``(backoff - 1) * age`` seconds, capped at
+    ``max_interval``. Messages older than ``max_age`` are given up on. At
+    most ``concurrency`` status requests run at once and at most
+    ``max_per_round`` messages are checked per round.
+    """
+
+    def __init__(self, store: StatusStore, providers: Dict[str, BaseProvider], concurrency: int = 4,
+                 first_check: float = 60.0, backoff: float = 2.0, max_interval: float = 3600.0,
+                 max_age: float = 172800.0, max_per_round: int = 10_000, max_tracked: int = 1_000_000,
+                 tick: float = 1.0, clock: Callable[[], float] = time.time):
+        self.store = store
+        self.providers = providers
+        self.concurrency = concurrency
+        self.first_check = first_check
+        self.backoff = backoff
+        self.max_interval = max_interval
+        self.max_age = max_age
+        self.max_per_round = max_per_round
+        self.max_tracked = max_tracked
+        self.tick = tick
+        self.clock = clock
+        self._heap: List[Tuple[float, int, PendingMessage]] = []
+        self._seq = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"tracked": 0, "dropped": 0, "unsupported": 0, "polled": 0, "requests": 0, "errors": 0,
+                       "updated": 0, "settled": 0, "expired": 0}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def track(self, provider: str, message_id: str, recipient: Optional[str] = None,
+              sent_at: Optional[float] = None) -> None:
+        """Start reconciling a sent message."""
+        handler = self.providers.get(provider)
+        if handler is not None and not handler.SUPPORTS_STATUS:
+            self._stats["unsupported"] += 1
+            return
+        if len(self._heap) >= self.max_tracked:
+            self._stats["dropped"] += 1
+            return
+        entry = PendingMessage(provider, message_id, recipient, sent_at if sent_at is not None else self.clock())
+        heapq.heappush(self._heap, (entry.sent_at + self.first_check, next(self._seq), entry))
+        self._stats["tracked"] += 1
+
+    def _schedule(self, entry: PendingMessage, now: float, delay: Optional[float] = None) -> None:
+        if delay is None:
+            delay = min(self.max_interval, max(self.first_check, (now - entry.sent_at) * (self.backoff - 1)))
+        heapq.heappush(self._heap, (now + delay, next(self._seq), entry))
+
+    def _take_due(self, now: float) -> List[PendingMessage]:
+        heap = self._heap
+        due = []
+        while heap and heap[0][0] <= now and len(due) < self.max_per_round:
+            due.append(heapq.heappop(heap)[2])
+        return due
+
+    async def reconcile_once(self) -> int:
+        """Check every message that is due; returns the number of statuses applied."""
+        now = self.clock()
+        groups: Dict[Tuple[str, bool], List[PendingMessage]] = {}
+        due = self._take_due(now)
+        states = await self.store.message_states([(e.provider, e.message_id, e.recipient) for e in due])
+        for entry, state in zip(due, states):
+            if state is None or state in FINAL_STATES:
+                self._stats["settled"] += 1
+            elif now - entry.sent_at > self.max_age or entry.provider not in self.providers:
+                self._stats["expired"] += 1
+            else:
+                groups.setdefault((entry.provider, entry.direct), []).append(entry)
+        if not groups:
+            return 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+        polls = []
+        for (name, direct), entries in groups.items():
+            provider = self.providers[name]
+            size = 1 if direct else provider.STATUS_BATCH_SIZE
+            by_id: Dict[str, List[PendingMessage]] = {}
+            for entry in entries:
+                by_id.setdefault(entry.message_id, []).append(entry)
+            ids = list(by_id)
+            for start in range(0, len(ids), size):
+                chunk = {mid: by_id[mid] for mid in ids[start:start + size]}
+                polls.append(self._poll(semaphore, name, provider, chunk, direct, now))
+        events: List[StatusEvent] = []
+        for batch in await asyncio.gather(*polls):
+            events.extend(batch)
+        if not events:
+            return 0
+        updated = len(events) - len(await self.store.apply(events))
+        self._stats["updated"] += updated
+        return updated
+
+    async def _poll(self, semaphore: asyncio.Semaphore, name: str, provider: BaseProvider,
+                    chunk: Dict[str, List[PendingMessage]], direct: bool, now: float) -> List[StatusEvent]:
+        async with semaphore:
+            self._stats["requests"] += 1
+            self._stats["polled"] += len(chunk)
+            try:
+                if direct:
+                    statuses = await BaseProvider.get_statuses(provider, list(chunk))
+                else:
+                    since = min(e.sent_at for entries in chunk.values() for e in entries)
+                    statuses = await provider.get_statuses(list(chunk), since)
+            except Exception as e:
+                logger.warning(f"Status lookup via {name} failed: {e}")
+                self._stats["errors"] += 1
+                for entries in chunk.values():
+                    for entry in entries:
+                        self._schedule(entry, now)
+                return []
+        events = []
+        for message_id, entries in chunk.items():
+            raw = statuses.get(message_id)
+            state = DeliveryStatus.normalize(raw).value
+            if state == DeliveryStatus.UNKNOWN.value:
+                for entry in entries:
+                    if not entry.direct and provider.STATUS_BATCH_SIZE > 1:
+                        entry.direct = True
+                        self._schedule(entry, now, delay=0.0)
+                    else:
+                        self._schedule(entry, now)
+                continue
+            for entry in entries:
+                events.append(StatusEvent(name, message_id, state, recipient=entry.recipient, raw_status=raw))
+                if state not in FINAL_STATES:
+                    self._schedule(entry, now)
+        return events
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reconcile_once()
+            except Exception as e:
+                logger.error(f"Status reconciliation failed: {e}")
+            delay = self.tick
+            if self._heap:
+                delay = min(delay, max(0.01, self._heap[0][0] - self.clock()))
+            await asyncio.sleep(delay)
+
+    @property
+    def stats(self) -> Dict:
+        return {**self._stats, "pending": len(self._heap)}
@@ -0,0 +1,22 @@
+"""Base class for memory-lean record types.
+
+Records are plain classes with ``__slots__`` instead of dataclasses, so
+instances carry no per-instance ``__dict__`` (dataclasses only gained
+``slots=True`` in Python 3.10). This base supplies the ``repr`` and
+equality a dataclass would generate.
+"""
+
+
+class SlotRecord:
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
@@ -0,0 +1,135 @@
+"""Retry policy: error classification and decorrelated-jitter backoff.
+
+A failed send is retried only when it is known to be transient: HTTP 408,
+425, 429 and 5xx responses, provider error codes listed in a provider's
+``RETRYABLE_ERROR_CODES`` (e.g. throttling reported with HTTP 200) and
+transport errors such as timeouts. Rejections like an invalid number are
+final. Retries are never slept out inside a worker: the send queue makes a
+message available again later, and bulk sends park it on a
+:class:`DelayQueue`.
+"""
+import heapq
+import itertools
+import random
+import time
+from dataclasses import dataclass
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+import httpx
+
+from .ratelimit import DEFAULT_RATE_LIMIT_PATH, _load_toml
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+def is_retryable_status(status_code: Optional[int]) -> bool:
+    return status_code in RETRYABLE_STATUS_CODES
+
+
+def is_retryable_exception(exc: BaseException) -> bool:
+    """Transport failures that may succeed on another attempt."""
+    return isinstance(exc, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds to wait from a ``Retry-After`` header (delta seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = time.time() if now is None else now
+    return max(0.0, when.timestamp() - now)
+
+
+@dataclass
+class RetryPolicy:
+    """How often and how long to wait before resending a failed message.
+
+    Delays use decorrelated jitter: each delay is drawn uniformly from
+    ``[backoff_base, 3 * previous delay]`` and capped at ``backoff_max``, so
+    retries of many messages failing together spread out instead of
+    arriving in waves. A provider's ``Retry-After`` is a lower bound.
+    """
+    max_retries: int = 3
+    backoff_base: float = 1.0
+    backoff_max: float = 60.0
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RetryPolicy":
+        """Build a policy from the ``[retry]`` section of ``rate_limiter.toml``."""
+        section = data.get("retry", {})
+        policy = cls()
+        for name in ("max_retries", "backoff_base", "backoff_max"):
+            if name in section:
+                setattr(policy, name, type(getattr(policy, name))(section[name]))
+        return policy
+
+    @classmethod
+    def from_toml(cls, path: Optional[Path] = None) -> "RetryPolicy":
+        return cls.from_dict(_load_toml(Path(path or DEFAULT_RATE_LIMIT_PATH)))
+
+    def should_retry(self, result, attempt: int) -> bool:
+        """Whether a result of attempt number ``attempt`` (1-based) is retried."""
+        return not result.success and result.retryable is True and attempt <= self.max_retries
+
+    def backoff(self, attempt: int, previous: Optional[float] = None,
+                rng: Callable[[float, float], float] = random.uniform) -> float:
+        """Jittered delay before attempt ``attempt + 1``."""
+        if previous is None:
+            # Without the previous delay, assume it was the upper bound so far.
+            previous = self.backoff_base * 3 ** (attempt - 1)
+        upper = min(self.backoff_max, max(self.backoff_base, previous * 3))
+        return min(self.backoff_max, rng(self.backoff_base, upper))
+
+    def delay(self, result, attempt: int, previous: Optional[float] = None) -> Optional[float]:
+        """Seconds to wait before retrying ``result``, or None if it is final."""
+        if not self.should_retry(result, attempt):
+            return None
+        delay = self.backoff(attempt, previous)
+        if result.retry_after is not None:
+            delay = max(delay, result.retry_after)
+        return delay
+
+
+class DelayQueue(Generic[T]):
+    """In-memory min-heap of items that become due at a given time."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._heap: List[Tuple[float, int, T]] = []
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, item: T, delay: float) -> None:
+        heapq.heappush(self._heap, (self._clock() + delay, next(self._seq), item))
+
+    def pop_due(self) -> List[T]:
+        """Remove and return every item whose time has come."""
+        now = self._clock()
+        heap = self._heap
+        due = []
+        while heap and heap[0][0] <= now:
+            due.append(heapq.heappop(heap)[2])
+        return due
+
+    def next_in(self) -> Optional[float]:
+        """Seconds until the next item is due, or None when empty."""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - self._clock())
@@ -0,0 +1,280 @@
+"""Latency- and cost-aware provider routing.
+
+The router keeps per-provider EWMA latency, EWMA success rate, per-country
+price and outstanding request counts, and turns them into provider orders
+according to a policy. Orders are precomputed into tables that are rebuilt
+at most once per ``rebuild_interval`` after new observations arrive, so the
+per-message decision is a dict lookup (plus a bisect for weighted random).
+"""
+import bisect
+import random
+import time
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+# E.164 country calling codes of one and two digits; all others have three.
+_ONE_DIGIT_CODES = frozenset({"1", "7"})
+_TWO_DIGIT_CODES = frozenset({
+    "20", "27", "30", "31", "32", "33", "34", "36", "39", "40", "41", "43", "44",
+    "45", "46", "47", "48", "49", "51", "52", "53", "54", "55", "56", "57", "58",
+    "60", "61", "62", "63", "64", "65", "66", "81", "82", "84", "86", "90", "91",
+    "92", "93", "94", "95", "98",
+})
+
+
+def country_code(number: str) -> str:
+    """Country calling code of an E.164 number, e.g. ``"44"`` for ``+4420...``."""
+    digits = number[1:] if number.startswith("+") else number
+    if digits[:1] in _ONE_DIGIT_CODES:
+        return digits[:1]
+    if digits[:2] in _TWO_DIGIT_CODES:
+        return digits[:2]
+    return digits[:3]
+
+
+def _tied(ranks: List) -> int:
+    """Number of leading entries of ``ranks`` equal to the first."""
+    count = 0
+    for rank in ranks:
+        if rank != ranks[0]:
+            break
+        count += 1
+    return count
+
+
+class RoutingPolicy(Enum):
+    PRIORITY = "priority"
+    CHEAPEST = "cheapest"
+    FASTEST = "fastest"
+    WEIGHTED = "weighted"
+    LEAST_OUTSTANDING = "least_outstanding"
+
+
+class ProviderMetrics:
+    """Observed behaviour of one provider."""
+
+    __slots__ = ("name", "priority", "primary", "latency", "latency_var", "success", "prices",
+                 "outstanding", "samples")
+
+    def __init__(self, name: str, priority: int = 0, primary: bool = False,
+                 initial_latency: float = 0.5):
+        self.name = name
+        self.priority = priority
+        self.primary = primary
+        self.latency = initial_latency
+        self.latency_var = 0.0
+        self.success = 1.0
+        self.prices: Dict[str, float] = {}
+        self.outstanding = 0
+        self.samples = 0
+
+    @property
+    def score(self) -> float:
+        """Expected cost in seconds of a successful send (lower is better)."""
+        return self.latency / max(self.success, 0.05)
+
+    def price_for(self, country: str) -> float:
+        price = self.prices.get(country)
+        if price is not None:
+            return price
+        return self.prices.get("*", float("inf"))
+
+
+class Router:
+    """Chooses the provider order for each message.
+
+    Policies:
+
+    - ``priority``: primary first, then by descending configured priority,
+      then registration order (the gateway's historical behaviour).
+    - ``cheapest``: lowest known per-segment price for the destination
+      country first.
+    - ``fastest``: lowest EWMA latency adjusted for success rate first.
+    - ``weighted``: first provider drawn at random with weight proportional
+      to success rate / latency, the rest in ``fastest`` order.
+    - ``least_outstanding``: provider with the fewest in-flight requests first.
+
+    Bulk sends spread load (see :meth:`order`) without overriding a
+    ``priority`` or ``cheapest`` ranking: there the least loaded provider
+    is only picked among those ranked equal.
+    """
+
+    def __init__(self, policy: RoutingPolicy = RoutingPolicy.PRIORITY, alpha: float = 0.2,
+                 rebuild_interval: float = 1.0, clock=time.monotonic, rng: Optional[random.Random] = None):
+        self.policy = RoutingPolicy(policy)
+        self.alpha = alpha
+        self.rebuild_interval = rebuild_interval
+        self._clock = clock
+        self._random = (rng or random.Random()).random
+        self._metrics: Dict[str, ProviderMetrics] = {}
+        self._dirty = True
+        self._next_rebuild = 0.0
+        self._static: Tuple[str, ...] = ()
+        self._fastest: Tuple[str, ...] = ()
+        self._by_country: Dict[str, Tuple[str, ...]] = {}
+        self._cheapest_default: Tuple[str, ...] = ()
+        # Length of the leading run of equally ranked providers in each order.
+        self._static_tied = 0
+        self._country_tied: Dict[str, int] = {}
+        self._cheapest_default_tied = 0
+        self._weights: List[float] = []
+        self._weighted_names: Tuple[str, ...] = ()
+
+    def add_provider(self, name: str, priority: int = 0, primary: bool = False) -> None:
+        if primary:
+            for m in self._metrics.values():
+                m.primary = False
+        metrics = self._metrics.get(name)
+        if metrics is None:
+            self._metrics[name] = ProviderMetrics(name, priority, primary)
+        else:
+            metrics.priority, metrics.primary = priority, primary
+        self._rebuild()
+
+    def set_price(self, name: str, country: str, price: float) -> None:
+        """Seed a known per-segment price; ``country`` ``"*"`` is the provider default."""
+        self._metrics[name].prices[country] = abs(price)
+        self._rebuild()
+
+    def record(self, name: str, latency: float, success: bool,
+               to: Optional[str] = None, price: Optional[float] = None, segments: int = 1) -> None:
+        """Fold one observed send into the provider's EWMAs.
+
+        ``price`` is what the whole message cost; it is normalised by
+        ``segments`` so multipart and Unicode sends compare fairly.
+        """
+        m = self._metrics.get(name)
+        if m is None:
+            return
+        a = self.alpha
+        if m.samples == 0:
+            m.latency = latency
+        else:
+            # Exponentially weighted mean and variance (West's update).
+            diff = latency - m.latency
+            incr = a * diff
+            m.latency += incr
+            m.latency_var = (1 - a) * (m.latency_var + diff * incr)
+        m.success += a * ((1.0 if success else 0.0) - m.success)
+        m.samples += 1
+        if price and to:
+            country = country_code(to)
+            old = m.prices.get(country)
+            price = abs(price) / max(segments, 1)
+            m.prices[country] = price if old is None else old + a * (price - old)
+        self._dirty = True
+
+    def latency_quantile(self, name: str, z: float = 1.645) -> Optional[float]:
+        """EWMA latency plus ``z`` standard deviations (1.645 ~ p95), or None before any sample."""
+        m = self._metrics.get(name)
+        if m is None or m.samples == 0:
+            return None
+        return m.latency + z * m.latency_var ** 0.5
+
+    def samples(self, name: str) -> int:
+        m = self._metrics.get(name)
+        return m.samples if m is not None else 0
+
+    def estimate_cost(self, name: str, to: str, segments: int = 1) -> float:
+        """Expected price of a ``segments``-part message to ``to`` via ``name``."""
+        return self._metrics[name].price_for(country_code(to)) * segments
+
+    def begin(self, name: str) -> None:
+        m = self._metrics.get(name)
+        if m is not None:
+            m.outstanding += 1
+
+    def end(self, name: str) -> None:
+        m = self._metrics.get(name)
+        if m is not None and m.outstanding > 0:
+            m.outstanding -= 1
+
+    def order(self, to: Optional[str] = None, preferred: Optional[str] = None,
+              spread: bool = False) -> List[str]:
+        """Providers to try for one message, best first.
+
+        ``preferred`` is always tried first. With ``spread`` (bulk sends) the
+        first provider is the least loaded one, so concurrent sends fan out
+        across providers instead of queuing on the policy's favourite. Under
+        ``priority`` and ``cheapest`` it is chosen only among the providers
+        ranked best (same priority, or same price for the destination), so
+        bulk traffic keeps the configured preference.
+        """
+        if self._dirty and self._clock() >= self._next_rebuild:
+            self._rebuild()
+        policy = self.policy
+        if policy is RoutingPolicy.PRIORITY:
+            base, tied = self._static, self._static_tied
+        elif policy is RoutingPolicy.CHEAPEST:
+            country = country_code(to) if to else None
+            base = self._by_country.get(country)
+            if base is None:
+                base, tied = self._cheapest_default, self._cheapest_default_tied
+            else:
+                tied = self._country_tied[country]
+        else:
+            base = self._fastest
+            tied = len(base)
+        first = None
+        if preferred in self._metrics:
+            first = preferred
+        elif spread or policy is RoutingPolicy.LEAST_OUTSTANDING:
+            first = self._least_outstanding(base, tied)
+        elif policy is RoutingPolicy.WEIGHTED and self._weights:
+            i = bisect.bisect_right(self._weights, self._random() * self._weights[-1])
+            first = self._weighted_names[min(i, len(self._weighted_names) - 1)]
+        if first is None or (base and base[0] == first):
+            return list(base)
+        return [first] + [n for n in base if n != first]
+
+    def _least_outstanding(self, base: Tuple[str, ...], count: int) -> Optional[str]:
+        """Least loaded of the first ``count`` providers of ``base``."""
+        best = None
+        best_load = None
+        for i in range(count):
+            name = base[i]
+            load = self._metrics[name].outstanding
+            if best_load is None or load < best_load:
+                best, best_load = name, load
+        return best
+
+    def _rebuild(self) -> None:
+        metrics = list(self._metrics.values())
+        ranked = sorted(enumerate(metrics), key=lambda im: (not im[1].primary, -im[1].priority, im[0]))
+        self._static = tuple(m.name for _, m in ranked)
+        self._static_tied = _tied([(not m.primary, -m.priority) for _, m in ranked])
+        self._fastest = tuple(m.name for m in sorted(metrics, key=lambda m: m.score))
+        countries = {c for m in metrics for c in m.prices if c != "*"}
+        self._by_country = {
+            c: tuple(m.name for m in sorted(metrics, key=lambda m: (m.price_for(c), m.score)))
+            for c in countries
+        }
+        self._country_tied = {
+            c: _tied([self._metrics[name].price_for(c) for name in names])
+            for c, names in self._by_country.items()
+        }
+        self._cheapest_default = tuple(
+            m.name for m in sorted(metrics, key=lambda m: (m.price_for("*"), m.score))
+        )
+        self._cheapest_default_tied = _tied([self._metrics[name].price_for("*") for name in self._cheapest_default])
+        cumulative = 0.0
+        self._weights = []
+        for m in metrics:
+            cumulative += max(m.success, 0.01) / max(m.latency, 0.001)
+            self._weights.append(cumulative)
+        self._weighted_names = tuple(m.name for m in metrics)
+        self._dirty = False
+        self._next_rebuild = self._clock() + self.rebuild_interval
+
+    @property
+    def stats(self) -> Dict:
+        return {
+            m.name: {
+                "latency": round(m.latency, 4),
+                "latency_p95": round(m.latency + 1.645 * m.latency_var ** 0.5, 4),
+                "success_rate": round(m.success, 4),
+                "outstanding": m.outstanding,
+                "prices": dict(m.prices),
+            }
+            for m in self._metrics.values()
+        }
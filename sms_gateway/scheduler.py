@@ -0,0 +1,164 @@
+"""Weighted fair scheduling of queued sends across priorities and clients.
+
+Every (priority, client) pair is a flow. Flows share the workers by
+start-time fair queuing: an item's virtual start is the later of the
+scheduler's virtual time and the virtual finish of its flow's previous
+item, its finish adds ``cost / weight``, and items are served in order of
+virtual start. A backlogged bulk flow therefore delays a newly arriving
+OTP by at most the item already in service, while the bulk itself still
+gets its weighted share of throughput and is never starved.
+
+Scheduling is not preemptive, so when every worker is busy with a bulk
+group an OTP still waits for one to finish. Consumers can therefore keep a
+few workers that only take expedited items (``priority >=
+expedite_priority``).
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Generic, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+Flow = Tuple[int, Optional[str]]
+
+
+def level_weight(priority: int) -> float:
+    """Share of priority level ``priority`` (0-9) relative to level 0."""
+    return float(priority + 1)
+
+
+class WaitStats:
+    """Wait times of recently served items of one priority level."""
+
+    __slots__ = ("recent", "served", "total")
+
+    def __init__(self, window: int = 1024):
+        self.recent: Deque[float] = deque(maxlen=window)
+        self.served = 0
+        self.total = 0.0
+
+    def add(self, wait: float) -> None:
+        self.recent.append(wait)
+        self.served += 1
+        self.total += wait
+
+    def quantile(self, q: float) -> float:
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class FairScheduler(Generic[T]):
+    """In-memory weighted fair queue of work items.
+
+    ``maxsize`` and :meth:`qsize` count cost units (messages), not items,
+    so a 50-message group fills as much of the buffer as 50 single sends.
+    """
+
+    def __init__(self, maxsize: int = 0, weight: Callable[[int], float] = level_weight,
+                 expedite_priority: int = 7, window: int = 1024,
+                 clock: Callable[[], float] = time.time):
+        self.maxsize = maxsize
+        self.weight = weight
+        self.expedite_priority = expedite_priority
+        self._window = window
+        self._clock = clock
+        # Expedited and other items in separate heaps of (start, seq, cost, enqueued_at, (priority, item)).
+        self._expedited: List[tuple] = []
+        self._normal: List[tuple] = []
+        self._getters: Deque[Tuple[asyncio.Future, bool]] = deque()
+        self._seq = itertools.count()
+        self._finish: Dict[Flow, float] = {}
+        self._vtime = 0.0
+        self._size = 0
+        self._queued: Dict[int, int] = {}
+        self._waits: Dict[int, WaitStats] = {}
+
+    def qsize(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._expedited) + len(self._normal)
+
+    def put_nowait(self, item: T, priority: int = 0, client_id: Optional[str] = None,
+                   cost: int = 1, enqueued_at: Optional[float] = None) -> None:
+        """Queue ``item``; ``enqueued_at`` (wall clock) is when its wait began."""
+        flow = (priority, client_id)
+        start = max(self._vtime, self._finish.get(flow, 0.0))
+        self._finish[flow] = start + cost / self.weight(priority)
+        enqueued_at = self._clock() if enqueued_at is None else enqueued_at
+        expedited = priority >= self.expedite_priority
+        heap = self._expedited if expedited else self._normal
+        heapq.heappush(heap, (start, next(self._seq), cost, enqueued_at, (priority, item)))
+        self._size += cost
+        self._queued[priority] = self._queued.get(priority, 0) + cost
+        self._wake(expedited)
+
+    def _wake(self, expedited: bool) -> None:
+        """Wake the first waiting getter that may take an item of this kind."""
+        for entry in self._getters:
+            future, expedited_only = entry
+            if not future.done() and (expedited or not expedited_only):
+                future.set_result(None)
+                self._getters.remove(entry)
+                return
+
+    def _next_heap(self, expedited_only: bool) -> Optional[list]:
+        if expedited_only or not self._normal:
+            return self._expedited or None
+        if self._expedited and self._expedited[0] < self._normal[0]:
+            return self._expedited
+        return self._normal
+
+    async def get(self, expedited_only: bool = False) -> T:
+        """Remove and return the next item, waiting until one is queued.
+
+        With ``expedited_only`` only items of priority ``expedite_priority``
+        or higher are taken.
+        """
+        heap = self._next_heap(expedited_only)
+        while heap is None:
+            future = asyncio.get_running_loop().create_future()
+            entry = (future, expedited_only)
+            self._getters.append(entry)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if entry in self._getters:
+                    self._getters.remove(entry)
+                elif self._expedited or self._normal:
+                    # Woken for an item but cancelled: pass the wakeup on.
+                    self._wake(bool(self._expedited))
+                raise
+            heap = self._next_heap(expedited_only)
+        start, _, cost, enqueued_at, (priority, item) = heapq.heappop(heap)
+        self._vtime = max(self._vtime, start)
+        self._size -= cost
+        self._queued[priority] -= cost
+        waits = self._waits.get(priority)
+        if waits is None:
+            waits = self._waits[priority] = WaitStats(self._window)
+        waits.add(max(0.0, self._clock() - enqueued_at))
+        if not self._expedited and not self._normal:
+            # Idle: every flow starts afresh.
+            self._finish.clear()
+        elif len(self._finish) > 4096:
+            self._finish = {f: t for f, t in self._finish.items() if t > start}
+        return item
+
+    @property
+    def stats(self) -> Dict:
+        levels = {}
+        for priority in sorted(set(self._queued) | set(self._waits), reverse=True):
+            waits = self._waits.get(priority) or WaitStats(1)
+            levels[priority] = {
+                "queued": self._queued.get(priority, 0),
+                "served": waits.served,
+                "wait_avg": round(waits.total / waits.served, 4) if waits.served else 0.0,
+                "wait_p50": round(waits.quantile(0.5), 4),
+                "wait_p99": round(waits.quantile(0.99), 4),
+            }
+        return {"queued": self._size, "levels": levels}
@@ -0,0 +1,642 @@
+"""Durable local send queue backed by an SQLite write-ahead log.
+
+Messages accepted by the API are written to an SQLite database in WAL mode
+before they are acknowledged, so a process restart never loses queued work.
+Inserts from concurrent requests are coalesced into one transaction (group
+commit) and worker coroutines drain the table into ``SMSGateway.send``.
+Workers take messages through a :class:`~sms_gateway.scheduler.FairScheduler`,
+so priorities and API clients share the gateway by weight.
+"""
+import asyncio
+import logging
+import math
+import random
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .providers.base import SMSResult
+from .scheduler import FairScheduler, Flow, level_weight
+from .status import FAILED, QUEUED
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_PATH = "sms_gateway.db"
+
+STATE_PENDING = 0
+STATE_INFLIGHT = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS send_queue (
+    id INTEGER PRIMARY KEY,
+    request_id TEXT NOT NULL,
+    to_number TEXT NOT NULL,
+    body TEXT NOT NULL,
+    from_number TEXT,
+    provider TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    seq INTEGER,
+    state INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    lease_until REAL NOT NULL DEFAULT 0,
+    client_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_send_queue_ready
+    ON send_queue (state, priority DESC, id);
+"""
+
+# Applied after _SCHEMA, once databases created before the column exist have it.
+_FLOW_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_send_queue_flow
+    ON send_queue (priority, client_id, state, id);
+"""
+
+_COLUMNS = (
+    "id, request_id, to_number, body, from_number, provider, "
+    "priority, seq, attempts, enqueued_at, client_id"
+)
+
+_READY = "((state = ? AND available_at <= ?) OR (state = ? AND lease_until < ?))"
+
+
+class QueueFullError(Exception):
+    """Raised when the queue is at capacity and cannot accept more messages."""
+    pass
+
+
+@dataclass
+class QueuedMessage:
+    id: int
+    request_id: str
+    to: str
+    body: str
+    from_number: Optional[str] = None
+    provider: Optional[str] = None
+    priority: int = 0
+    seq: Optional[int] = None
+    attempts: int = 0
+    enqueued_at: float = 0.0
+    client_id: Optional[str] = None
+
+
+def sqlite_path_from_url(url: str) -> Optional[str]:
+    """Return the filesystem path of a ``sqlite://`` URL, or None."""
+    prefix = "sqlite:///"
+    if not url.startswith(prefix):
+        return None
+    return url[len(prefix):] or ":memory:"
+
+
+class SendQueue:
+    """Persistent FIFO-by-priority queue with group commit.
+
+    All SQLite access happens on a single dedicated thread, so the event loop
+    never blocks on disk I/O and the connection is never shared between
+    threads. ``enqueue`` returns only after the row's transaction commits.
+
+    Claimed messages are leased for ``lease_seconds``; while this process
+    holds them (waiting in the consumer's scheduler or being sent) the
+    leases are renewed every third of that, so only messages of a process
+    that died or hung become claimable again.
+
+    With ``shared``, several processes drain the same database: claims are
+    already atomic (``BEGIN IMMEDIATE`` plus leases), and the per-flow
+    counts, which otherwise only see this process's writes, are reloaded
+    from the table every ``REFRESH_INTERVAL`` seconds so no flow is missed.
+    """
+
+    REFRESH_INTERVAL = 1.0
+    COMMIT_RETRY_DELAY = 1.0
+
+    def __init__(
+        self,
+        path: str = DEFAULT_QUEUE_PATH,
+        batch_size: int = 500,
+        flush_interval: float = 0.002,
+        max_depth: int = 100_000,
+        lease_seconds: float = 60.0,
+        synchronous: str = "NORMAL",
+        shared: bool = False,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_depth = max_depth
+        self.lease_seconds = lease_seconds
+        self.synchronous = synchronous
+        self.shared = shared
+        self._next_refresh = 0.0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: List[Tuple[tuple, asyncio.Future]] = []
+        self._completed: List[int] = []
+        self._retries: List[Tuple[float, int]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._committer: Optional[asyncio.Task] = None
+        self._renewer: Optional[asyncio.Task] = None
+        self._depth = 0
+        self._flows: Dict[Flow, int] = {}
+        self._inflight: Dict[int, Flow] = {}
+        self._closing = False
+
+    @classmethod
+    def from_url(cls, database_url: str, **kwargs) -> "SendQueue":
+        """Build a queue from ``GatewayConfig.database_url``.
+
+        Non-SQLite URLs (e.g. a shared PostgreSQL) fall back to a local
+        database file, since the queue must live next to the process.
+        """
+        path = sqlite_path_from_url(database_url)
+        if path is None:
+            logger.warning(
+                f"Send queue requires SQLite, got {database_url.split(':', 1)[0]}; "
+                f"using {DEFAULT_QUEUE_PATH}"
+            )
+            path = DEFAULT_QUEUE_PATH
+        return cls(path, **kwargs)
+
+    @property
+    def depth(self) -> int:
+        """Messages accepted but not yet completed."""
+        return self._depth
+
+    @property
+    def depth_by_priority(self) -> Dict[int, int]:
+        """Messages not yet completed, per priority level."""
+        levels: Dict[int, int] = {}
+        for (priority, _), count in self._flows.items():
+            if count:
+                levels[priority] = levels.get(priority, 0) + count
+        return levels
+
+    @property
+    def is_open(self) -> bool:
+        return self._conn is not None
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _connect(self) -> Dict[Flow, int]:
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.executescript(_SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(send_queue)")}
+        if "client_id" not in columns:
+            conn.execute("ALTER TABLE send_queue ADD COLUMN client_id TEXT")
+        conn.executescript(_FLOW_INDEX)
+        self._conn = conn
+        return self._count_flows()
+
+    def _count_flows(self) -> Dict[Flow, int]:
+        rows = self._conn.execute(
+            "SELECT priority, client_id, COUNT(*) FROM send_queue GROUP BY priority, client_id"
+        ).fetchall()
+        return {(priority, client_id): count for priority, client_id, count in rows}
+
+    def _recover(self) -> int:
+        cur = self._conn.execute(
+            "UPDATE send_queue SET state = ?, lease_until = 0 WHERE state = ?",
+            (STATE_PENDING, STATE_INFLIGHT),
+        )
+        return cur.rowcount
+
+    async def open(self, recover_inflight: bool = True) -> None:
+        """Open the database and start the group-commit loop.
+
+        With ``recover_inflight`` (the default for a single owning process),
+        messages that were claimed by a crashed run are made ready again
+        immediately instead of waiting for their lease to expire.
+        """
+        if self.is_open:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sms-queue")
+        self._flows = await self._run(self._connect)
+        self._depth = sum(self._flows.values())
+        if recover_inflight:
+            recovered = await self._run(self._recover)
+            if recovered:
+                logger.info(f"Recovered {recovered} in-flight messages from {self.path}")
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._committer = asyncio.create_task(self._commit_loop())
+        if self.lease_seconds > 0:
+            self._renewer = asyncio.create_task(self._renew_loop())
+        logger.info(f"Send queue opened: {self.path} (depth={self._depth})")
+
+    async def close(self) -> None:
+        """Flush outstanding writes and close the database."""
+        if not self.is_open:
+            return
+        self._closing = True
+        if self._renewer is not None:
+            self._renewer.cancel()
+            self._renewer = None
+        self._wakeup.set()
+        await self._committer
+        conn, self._conn = self._conn, None
+        await self._run(conn.close)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    async def enqueue(
+        self,
+        to: str,
+        body: str,
+        from_number: Optional[str] = None,
+        provider: Optional[str] = None,
+        priority: int = 0,
+        request_id: Optional[str] = None,
+        client_id: Optional[str] = None,
+    ) -> int:
+        """Persist one message and return its queue id once committed."""
+        ids = await self.enqueue_many(
+            [to], body, from_number=from_number, provider=provider,
+            priority=priority, request_id=request_id, client_id=client_id,
+        )
+        return ids[0]
+
+    async def enqueue_many(
+        self,
+        recipients: Sequence[str],
+        body: str,
+        from_number: Optional[str] = None,
+        provider: Optional[str] = None,
+        priority: int = 0,
+        request_id: Optional[str] = None,
+        bulk: bool = False,
+        client_id: Optional[str] = None,
+    ) -> List[int]:
+        """Persist one message per recipient in a single commit group.
+
+        With ``bulk`` each row records the recipient's position in the
+        request, so results can be attributed to a bulk status record.
+        ``client_id`` identifies the API client for fair scheduling.
+        """
+        if not self.is_open or self._closing:
+            raise RuntimeError("Send queue is not open")
+        if self._depth + len(recipients) > self.max_depth:
+            raise QueueFullError(f"Send queue is full ({self._depth}/{self.max_depth})")
+        request_id = request_id or str(uuid.uuid4())
+        now = time.time()
+        rows = [
+            (request_id, to, body, from_number, provider, priority,
+             seq if bulk else None, now, now, client_id)
+            for seq, to in enumerate(recipients)
+        ]
+        self._depth += len(rows)
+        self._count((priority, client_id), len(rows))
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((rows, future))
+        self._wakeup.set()
+        return await future
+
+    def _count(self, flow: Flow, delta: int) -> None:
+        count = self._flows.get(flow, 0) + delta
+        if count > 0:
+            self._flows[flow] = count
+        else:
+            self._flows.pop(flow, None)
+
+    async def claim(self, limit: int = 100,
+                    weight: Optional[Callable[[int], float]] = None) -> List[QueuedMessage]:
+        """Lease up to ``limit`` ready messages, highest priority first.
+
+        Without ``weight`` lower priorities only get what higher ones leave.
+        With it, ``limit`` is split between (priority, client) flows in
+        proportion to ``weight(priority)``, and a share a flow cannot use
+        passes on to the next, so no flow is starved. Messages whose lease
+        expired (e.g. claimed by a worker that died) are eligible again.
+        """
+        if not self.is_open:
+            raise RuntimeError("Send queue is not open")
+        if self.shared and time.monotonic() >= self._next_refresh:
+            self._next_refresh = time.monotonic() + self.REFRESH_INTERVAL
+            self._flows = await self._run(self._count_flows)
+            self._depth = sum(self._flows.values())
+        flows = None
+        if weight is not None:
+            flows = [(flow, weight(flow[0])) for flow in self._flows]
+            # Random order within a weight, so no client is always served last.
+            random.shuffle(flows)
+            flows.sort(key=lambda f: -f[1])
+        # Rows whose lease this process renews are never taken twice, even if renewal lagged.
+        messages = await self._run(self._claim, limit, time.time(), flows, self._held())
+        for message in messages:
+            self._inflight[message.id] = (message.priority, message.client_id)
+        return messages
+
+    def _select_fair(self, limit: int, now: float, flows: List[Tuple[Flow, float]]) -> list:
+        rows = []
+        remaining = limit
+        total = sum(w for _, w in flows)
+        for (priority, client_id), w in flows:
+            if remaining <= 0:
+                break
+            quota = math.ceil(remaining * w / total)
+            total -= w
+            found = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM send_queue "
+                f"WHERE priority = ? AND client_id IS ? AND {_READY} ORDER BY id LIMIT ?",
+                (priority, client_id, STATE_PENDING, now, STATE_INFLIGHT, now, quota),
+            ).fetchall()
+            rows += found
+            remaining -= len(found)
+        return rows
+
+    def _claim(self, limit: int, now: float, flows: Optional[List[Tuple[Flow, float]]] = None,
+               held: frozenset = frozenset()) -> List[QueuedMessage]:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if flows is None:
+                rows = conn.execute(
+                    f"SELECT {_COLUMNS} FROM send_queue WHERE {_READY} "
+                    "ORDER BY priority DESC, id LIMIT ?",
+                    (STATE_PENDING, now, STATE_INFLIGHT, now, limit),
+                ).fetchall()
+            else:
+                rows = self._select_fair(limit, now, flows)
+            rows = [row for row in rows if row[0] not in held]
+            if rows:
+                conn.executemany(
+                    "UPDATE send_queue SET state = ?, lease_until = ?, attempts = attempts + 1 "
+                    "WHERE id = ?",
+                    [(STATE_INFLIGHT, now + self.lease_seconds, row[0]) for row in rows],
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return [
+            QueuedMessage(
+                id=row[0], request_id=row[1], to=row[2], body=row[3],
+                from_number=row[4], provider=row[5], priority=row[6],
+                seq=row[7], attempts=row[8] + 1, enqueued_at=row[9], client_id=row[10],
+            )
+            for row in rows
+        ]
+
+    def complete(self, message_id: int) -> None:
+        """Mark a claimed message as finished; removed on the next commit."""
+        flow = self._inflight.pop(message_id, None)
+        if flow is None:
+            # Not held (already completed or released): counting it again would skew the depth.
+            return
+        self._completed.append(message_id)
+        self._depth -= 1
+        self._count(flow, -1)
+        self._wakeup.set()
+
+    def retry(self, message_id: int, delay: float) -> None:
+        """Release a claimed message to be claimed again after ``delay`` seconds."""
+        if self._inflight.pop(message_id, None) is None:
+            return
+        self._retries.append((time.time() + delay, message_id))
+        self._wakeup.set()
+
+    def _held(self) -> set:
+        """Ids leased by this process, including finished ones not yet committed."""
+        held = set(self._inflight)
+        held.update(self._completed)
+        held.update(i for _, i in self._retries)
+        return held
+
+    async def _renew_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            held = self._held()
+            if not held:
+                continue
+            try:
+                await self._run(self._renew, list(held), time.time() + self.lease_seconds)
+            except Exception as e:
+                logger.error(f"Send queue lease renewal failed: {e}")
+
+    def _renew(self, ids: List[int], lease_until: float) -> None:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "UPDATE send_queue SET lease_until = ? WHERE id = ? AND state = ?",
+                [(lease_until, i, STATE_INFLIGHT) for i in ids],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def _commit_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            if not self._closing and len(self._pending) < self.batch_size:
+                # Give concurrent producers a moment to join this commit group.
+                await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            pending, self._pending = self._pending, []
+            completed, self._completed = self._completed, []
+            retries, self._retries = self._retries, []
+            if pending or completed or retries:
+                try:
+                    first_ids = await self._run(self._write, pending, completed, retries)
+                except Exception as e:
+                    logger.error(f"Send queue commit failed: {e}")
+                    for rows, future in pending:
+                        self._depth -= len(rows)
+                        self._count((rows[0][5], rows[0][9]), -len(rows))
+                        if not future.done():
+                            future.set_exception(e)
+                    if self._closing:
+                        if completed or retries:
+                            logger.error(f"Send queue closed with {len(completed) + len(retries)} results "
+                                         f"unrecorded; those messages are claimed again after restart")
+                        return
+                    # Keep the results for the next commit, or delivered messages would be sent again.
+                    self._completed[:0] = completed
+                    self._retries[:0] = retries
+                    await asyncio.sleep(self.COMMIT_RETRY_DELAY)
+                    self._wakeup.set()
+                else:
+                    for (rows, future), first_id in zip(pending, first_ids):
+                        if not future.done():
+                            future.set_result(list(range(first_id, first_id + len(rows))))
+            if self._closing and not self._pending and not self._completed and not self._retries:
+                return
+
+    def _write(self, pending: List[Tuple[list, asyncio.Future]], completed: List[int],
+               retries: Sequence[Tuple[float, int]] = ()) -> List[int]:
+        conn = self._conn
+        first_ids = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for rows, _ in pending:
+                conn.executemany(
+                    "INSERT INTO send_queue (request_id, to_number, body, from_number, "
+                    "provider, priority, seq, enqueued_at, available_at, client_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                # A single writer inside one transaction gets contiguous rowids.
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                first_ids.append(last_id - len(rows) + 1)
+            if completed:
+                conn.executemany(
+                    "DELETE FROM send_queue WHERE id = ?", [(i,) for i in completed]
+                )
+            if retries:
+                conn.executemany(
+                    "UPDATE send_queue SET state = ?, available_at = ?, lease_until = 0 WHERE id = ?",
+                    [(STATE_PENDING, available_at, i) for available_at, i in retries],
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return first_ids
+
+
+class QueueConsumer:
+    """Worker coroutines that drain a :class:`SendQueue` into a gateway.
+
+    A transiently failed message is released back to the queue with the
+    gateway's retry delay rather than retried in the worker, so the retry
+    survives a restart and never holds a worker slot. Claimed messages wait
+    in a :class:`FairScheduler`, so an OTP claimed behind a large bulk is
+    still sent next; ``weight`` maps a priority level to its share. Besides
+    the ``concurrency`` workers, ``reserved`` workers only send messages of
+    ``expedite_priority`` or higher, so those never wait for a bulk group.
+    With a ``deduplicator``, a message that finally fails releases its
+    content fingerprint, so the client can send it again at once.
+    """
+
+    CLAIM_RETRY_DELAY = 1.0
+
+    def __init__(self, queue: SendQueue, gateway, concurrency: int = 50,
+                 poll_interval: float = 0.05, group_size: int = 50,
+                 weight: Callable[[int], float] = level_weight,
+                 reserved: int = 2, expedite_priority: int = 7, deduplicator=None):
+        self.queue = queue
+        self.gateway = gateway
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.group_size = group_size
+        self.weight = weight
+        self.reserved = reserved
+        self.expedite_priority = expedite_priority
+        self.deduplicator = deduplicator
+        self._ready: Optional[FairScheduler] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stats: Dict[str, int] = {"processed": 0, "errors": 0, "retried": 0, "claim_errors": 0}
+
+    async def start(self) -> None:
+        self._ready = FairScheduler(maxsize=self.concurrency * 2 * self.group_size, weight=self.weight,
+                                    expedite_priority=self.expedite_priority)
+        self._tasks = [asyncio.create_task(self._dispatch())]
+        self._tasks += [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        self._tasks += [asyncio.create_task(self._work(expedited_only=True)) for _ in range(self.reserved)]
+
+    async def stop(self) -> None:
+        """Cancel workers; unfinished messages are retried after restart."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _dispatch(self) -> None:
+        while True:
+            free = self._ready.maxsize - self._ready.qsize()
+            try:
+                batch = await self.queue.claim(free, weight=self.weight) if free > 0 else []
+            except Exception as e:
+                # E.g. "database is locked" under write contention; keep dispatching.
+                self._stats["claim_errors"] += 1
+                logger.error(f"Claiming queued messages failed: {e}")
+                await asyncio.sleep(self.CLAIM_RETRY_DELAY)
+                continue
+            for group in self._group(batch):
+                first = group[0]
+                self._ready.put_nowait(group, first.priority, first.client_id, cost=len(group),
+                                       enqueued_at=min(m.enqueued_at for m in group))
+            if len(batch) < max(free, 1):
+                await asyncio.sleep(self.poll_interval)
+
+    def _group(self, batch: List[QueuedMessage]) -> List[List[QueuedMessage]]:
+        """Group rows of the same bulk request so they can share carrier batches."""
+        groups: Dict[tuple, List[QueuedMessage]] = {}
+        singles = []
+        for message in batch:
+            if message.seq is None:
+                singles.append([message])
+                continue
+            key = (message.request_id, message.body, message.from_number, message.provider, message.attempts)
+            group = groups.setdefault(key, [])
+            group.append(message)
+            if len(group) >= self.group_size:
+                singles.append(groups.pop(key))
+        return singles + list(groups.values())
+
+    async def _work(self, expedited_only: bool = False) -> None:
+        while True:
+            group = await self._ready.get(expedited_only)
+            if len(group) == 1:
+                results = [await self._handle_one(group[0])]
+            else:
+                try:
+                    results = await self.handle_group(group)
+                except Exception as e:
+                    logger.error(f"Queued group {[m.id for m in group]} failed, sending one by one: {e}")
+                    results = await asyncio.gather(*(self._handle_one(m) for m in group))
+            for message, result in zip(group, results):
+                delay = self.gateway.retry_delay(result, message.attempts)
+                if delay is None:
+                    self.queue.complete(message.id)
+                    if not result.success and self.deduplicator is not None:
+                        self.deduplicator.release_message(message.to, message.body, message.from_number)
+                else:
+                    # Back to the queue instead of sleeping here, so the worker stays free.
+                    self.queue.retry(message.id, delay)
+                    self._stats["retried"] += 1
+            self._stats["processed"] += len(group)
+
+    async def _handle_one(self, message: QueuedMessage) -> SMSResult:
+        """:meth:`handle`, with an exception treated as a transient failure of this message."""
+        try:
+            return await self.handle(message)
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.error(f"Queued message {message.id} failed: {e}")
+            result = SMSResult(success=False, error=str(e), retryable=True)
+            retrying = self.gateway.retry_policy.should_retry(result, message.attempts)
+            self.gateway.status.update(message.request_id, QUEUED if retrying else FAILED,
+                                       error=result.error, index=message.seq)
+            return result
+
+    async def handle(self, message: QueuedMessage):
+        return await self.gateway.send(
+            message.to, message.body,
+            from_number=message.from_number, provider=message.provider,
+            request_id=message.request_id, index=message.seq, attempt=message.attempts,
+            priority=message.priority,
+        )
+
+    async def handle_group(self, messages: List[QueuedMessage]):
+        return await self.gateway.send_many([
+            {
+                "to": m.to, "message": m.body, "from_number": m.from_number,
+                "provider": m.provider, "request_id": m.request_id, "index": m.seq,
+            }
+            for m in messages
+        ], attempt=messages[0].attempts)
+
+    @property
+    def stats(self) -> Dict:
+        stats = {**self._stats, "depth": self.queue.depth, "depth_by_priority": self.queue.depth_by_priority}
+        if self._ready is not None:
+            stats["scheduler"] = self._ready.stats
+        return stats
@@ -0,0 +1,187 @@
+"""Authentication of carrier delivery-receipt webhooks.
+
+Receipts cannot carry our API key, so each one is checked against the
+carrier's own webhook signature:
+
+* Twilio: ``X-Twilio-Signature``, HMAC-SHA1 of the URL and form fields
+  keyed with the account's auth token.
+* Telnyx: ``telnyx-signature-ed25519`` over ``timestamp|body``, checked
+  with the account's public key (base64). Needs ``cryptography``, which
+  :class:`ReceiptVerifier` checks for when a Telnyx key is configured.
+* Vonage: the ``sig`` parameter of signed SMS webhooks. The secret is the
+  signature secret, optionally prefixed with the account's signing method
+  (``md5hash`` by default, or ``md5``, ``sha1``, ``sha256``, ``sha512``),
+  e.g. ``sha256:secret``.
+* MessageBird: the ``MessageBird-Signature-JWT`` header, an HS256 token
+  keyed with the signing key that hashes the URL and body.
+
+Carriers that cannot sign (e.g. Aliyun) are authenticated with a shared
+token in the callback URL, ``/api/v1/dlr/{provider}/{token}``, which can
+also be required on top of a signature. A provider with neither a secret
+nor a token is rejected, so receipts are never accepted unauthenticated.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import importlib
+import json
+import logging
+import time
+from typing import Callable, Dict, Mapping, Optional
+
+from .records import SlotRecord
+
+logger = logging.getLogger(__name__)
+
+# Seconds a signed timestamp may be off from our clock.
+SIGNATURE_TOLERANCE = 300.0
+
+
+class WebhookRequest(SlotRecord):
+    """The parts of a receipt request that signatures cover.
+
+    ``headers`` has lower-case names; ``payload`` is the parsed receipt and
+    ``form`` is True when it came from a form-encoded body.
+    """
+
+    __slots__ = ("url", "headers", "body", "payload", "form")
+
+    def __init__(self, url: str, headers: Mapping[str, str], body: bytes = b"",
+                 payload: Optional[Mapping] = None, form: bool = False):
+        self.url = url
+        self.headers = headers
+        self.body = body
+        self.payload = payload if payload is not None else {}
+        self.form = form
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def verify_twilio(secret: str, request: WebhookRequest, now: float) -> bool:
+    signature = request.headers.get("x-twilio-signature")
+    if not signature:
+        return False
+    data = request.url
+    if request.form:
+        data += "".join(f"{k}{v}" for k, v in sorted(request.payload.items()))
+    expected = base64.b64encode(hmac.new(secret.encode(), data.encode(), hashlib.sha1).digest()).decode()
+    return hmac.compare_digest(signature, expected)
+
+
+def verify_telnyx(secret: str, request: WebhookRequest, now: float) -> bool:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+    signature = request.headers.get("telnyx-signature-ed25519")
+    timestamp = request.headers.get("telnyx-timestamp")
+    if not signature or not timestamp:
+        return False
+    try:
+        if abs(now - int(timestamp)) > SIGNATURE_TOLERANCE:
+            return False
+        key = Ed25519PublicKey.from_public_bytes(base64.b64decode(secret))
+        key.verify(base64.b64decode(signature), timestamp.encode() + b"|" + request.body)
+    except (ValueError, binascii.Error, InvalidSignature):
+        return False
+    return True
+
+
+def vonage_signature(secret: str, params: Mapping) -> str:
+    """``sig`` of a signed Vonage SMS webhook; ``secret`` as in the module docs."""
+    method, _, key = secret.rpartition(":")
+    method = method or "md5hash"
+    if method == "md5hash":
+        hasher = hashlib.md5()
+    else:
+        hasher = hmac.new(key.encode(), digestmod=method)
+    for name in sorted(params):
+        if name == "sig":
+            continue
+        value = str(params[name]).replace("&", "_").replace("=", "_")
+        hasher.update(f"&{name}={value}".encode())
+    if method == "md5hash":
+        hasher.update(key.encode())
+    return hasher.hexdigest()
+
+
+def verify_vonage(secret: str, request: WebhookRequest, now: float) -> bool:
+    params = request.payload
+    if not isinstance(params, Mapping):
+        return False
+    signature = str(params.get("sig") or "")
+    try:
+        if not signature or abs(now - int(params.get("timestamp"))) > SIGNATURE_TOLERANCE:
+            return False
+        expected = vonage_signature(secret, params)
+    except (TypeError, ValueError):
+        return False
+    return hmac.compare_digest(signature.lower(), expected)
+
+
+def verify_messagebird(secret: str, request: WebhookRequest, now: float) -> bool:
+    token = request.headers.get("messagebird-signature-jwt")
+    if not token:
+        return False
+    try:
+        header, claims, signature = token.split(".")
+        if json.loads(_b64decode(header)).get("alg") != "HS256":
+            return False
+        expected = hmac.new(secret.encode(), f"{header}.{claims}".encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(_b64decode(signature), expected):
+            return False
+        claims = json.loads(_b64decode(claims))
+    except (ValueError, binascii.Error):
+        return False
+    if claims.get("nbf", 0) > now + SIGNATURE_TOLERANCE or claims.get("exp", now) < now - SIGNATURE_TOLERANCE:
+        return False
+    if claims.get("url_hash") != hashlib.sha256(request.url.encode()).hexdigest():
+        return False
+    payload_hash = claims.get("payload_hash")
+    if request.body:
+        return payload_hash == hashlib.sha256(request.body).hexdigest()
+    return payload_hash is None
+
+
+VERIFIERS: Dict[str, Callable[[str, WebhookRequest, float], bool]] = {
+    "twilio": verify_twilio,
+    "telnyx": verify_telnyx,
+    "vonage": verify_vonage,
+    "messagebird": verify_messagebird,
+}
+
+
+class ReceiptVerifier:
+    """Decides whether a receipt webhook is from the carrier it names.
+
+    ``secrets`` maps a provider to its signing secret (see the module docs)
+    and ``tokens`` to a shared token expected in the callback URL. Every
+    check configured for the provider must pass.
+    """
+
+    def __init__(self, secrets: Optional[Dict[str, str]] = None, tokens: Optional[Dict[str, str]] = None,
+                 clock: Callable[[], float] = time.time):
+        self.secrets = dict(secrets or {})
+        self.tokens = dict(tokens or {})
+        self.clock = clock
+        unsigned = set(self.secrets) - set(VERIFIERS)
+        if unsigned:
+            raise ValueError(f"No receipt signature scheme for {', '.join(sorted(unsigned))}; use a token")
+        if "telnyx" in self.secrets:
+            try:
+                importlib.import_module("cryptography")
+            except ImportError:
+                raise ValueError("Telnyx receipt signatures need the cryptography package "
+                                 "(pip install cloud-sms-gateway[telnyx])") from None
+
+    def verify(self, provider: str, request: WebhookRequest, token: Optional[str] = None) -> bool:
+        secret = self.secrets.get(provider)
+        expected = self.tokens.get(provider)
+        if secret is None and expected is None:
+            logger.warning(f"Rejected {provider} receipt: no webhook secret or token configured")
+            return False
+        if expected is not None and not (token and hmac.compare_digest(token, expected)):
+            return False
+        return secret is None or VERIFIERS[provider](secret, request, self.clock())
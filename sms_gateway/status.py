@@ -0,0 +1,611 @@
+"""Request status tracking for queued and sent messages.
+
+Maps an API ``request_id`` to the provider, provider ``message_id`` and the
+state transitions of the message, so status polling never has to call the
+carrier. Records live in a bounded in-memory LRU with a TTL; an optional
+SQLite tier keeps records that were evicted from memory or written before a
+restart. A bulk request is one compact record (a state byte per recipient)
+instead of one record per recipient. All SQLite access runs on one
+dedicated thread, so the event loop never waits on disk I/O.
+
+A reverse index from (provider, provider message id) to the request lets
+delivery receipts pushed by carriers be applied without polling.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+DELIVERED = "delivered"
+FAILED = "failed"
+UNDELIVERED = "undelivered"
+UNKNOWN = "unknown"
+
+STATES = (QUEUED, SENDING, SENT, DELIVERED, FAILED, UNDELIVERED, UNKNOWN)
+FINAL_STATES = frozenset({DELIVERED, FAILED, UNDELIVERED})
+_STATE_CODES = {state: code for code, state in enumerate(STATES)}
+_FINAL_CODES = frozenset(_STATE_CODES[s] for s in FINAL_STATES)
+_SENT_CODE = _STATE_CODES[SENT]
+
+# (provider, message id, recipient) -> (request id, bulk index, indexed at)
+MessageKey = Tuple[str, str, str]
+
+
+def _iso(ts: float) -> str:
+    return datetime.utcfromtimestamp(ts).isoformat()
+
+
+class StatusRecord:
+    """Status of a single-recipient request."""
+
+    __slots__ = ("request_id", "provider", "message_id", "state", "error",
+                 "history", "created_at", "updated_at")
+
+    def __init__(self, request_id: str, state: str = QUEUED, created_at: Optional[float] = None):
+        now = created_at or time.time()
+        self.request_id = request_id
+        self.provider: Optional[str] = None
+        self.message_id: Optional[str] = None
+        self.state = state
+        self.error: Optional[str] = None
+        self.history: List[Tuple[str, float]] = [(state, now)]
+        self.created_at = now
+        self.updated_at = now
+
+    def transition(self, state: str, now: float, provider: Optional[str] = None,
+                   message_id: Optional[str] = None, error: Optional[str] = None) -> None:
+        if provider is not None:
+            self.provider = provider
+        if message_id is not None:
+            self.message_id = message_id
+        if error is not None:
+            self.error = error
+        if state != self.state:
+            self.state = state
+            self.history.append((state, now))
+        self.updated_at = now
+
+    def to_dict(self) -> Dict:
+        return {
+            "request_id": self.request_id,
+            "status": self.state,
+            "provider": self.provider,
+            "message_id": self.message_id,
+            "error": self.error,
+            "history": [{"status": s, "timestamp": _iso(ts)} for s, ts in self.history],
+            "created_at": _iso(self.created_at),
+            "updated_at": _iso(self.updated_at),
+        }
+
+    def dump(self) -> Dict:
+        return {"kind": "single", "request_id": self.request_id, "provider": self.provider,
+                "message_id": self.message_id, "state": self.state, "error": self.error,
+                "history": self.history, "created_at": self.created_at,
+                "updated_at": self.updated_at}
+
+    @classmethod
+    def load(cls, data: Dict) -> "StatusRecord":
+        record = cls(data["request_id"], data["state"], data["created_at"])
+        record.provider = data["provider"]
+        record.message_id = data["message_id"]
+        record.error = data["error"]
+        record.history = [tuple(h) for h in data["history"]]
+        record.updated_at = data["updated_at"]
+        return record
+
+
+class BulkStatusRecord:
+    """Status of a bulk request, stored as one state byte per recipient.
+
+    Per-recipient provider message ids are kept in a list indexed by the
+    recipient's position in the request; aggregate counts are maintained
+    incrementally so reads are O(number of states).
+    """
+
+    __slots__ = ("request_id", "states", "message_ids", "providers", "counts",
+                 "created_at", "updated_at")
+
+    def __init__(self, request_id: str, total: int, created_at: Optional[float] = None):
+        now = created_at or time.time()
+        self.request_id = request_id
+        self.states = bytearray([_STATE_CODES[QUEUED]]) * total
+        self.message_ids: List[Optional[str]] = [None] * total
+        self.providers: Dict[str, int] = {}
+        self.counts = [0] * len(STATES)
+        self.counts[_STATE_CODES[QUEUED]] = total
+        self.created_at = now
+        self.updated_at = now
+
+    @property
+    def total(self) -> int:
+        return len(self.states)
+
+    @property
+    def state(self) -> str:
+        pending = sum(self.counts[_STATE_CODES[s]] for s in (QUEUED, SENDING))
+        return "processing" if pending else "completed"
+
+    def transition(self, index: int, state: str, now: float, provider: Optional[str] = None,
+                   message_id: Optional[str] = None) -> None:
+        code = _STATE_CODES[state]
+        old = self.states[index]
+        if old != code:
+            self.counts[old] -= 1
+            self.counts[code] += 1
+            self.states[index] = code
+        if message_id is not None:
+            self.message_ids[index] = message_id
+        if provider is not None and code == _SENT_CODE and old != code:
+            # Counted once per recipient, when it is sent; failed attempts
+            # and retries that name a provider do not count.
+            self.providers[provider] = self.providers.get(provider, 0) + 1
+        self.updated_at = now
+
+    def to_dict(self) -> Dict:
+        return {
+            "request_id": self.request_id,
+            "status": self.state,
+            "total": self.total,
+            "counts": {s: c for s, c in zip(STATES, self.counts) if c},
+            "providers": dict(self.providers),
+            "created_at": _iso(self.created_at),
+            "updated_at": _iso(self.updated_at),
+        }
+
+    def dump(self) -> Dict:
+        return {"kind": "bulk", "request_id": self.request_id, "states": self.states.hex(),
+                "message_ids": self.message_ids, "providers": self.providers,
+                "created_at": self.created_at, "updated_at": self.updated_at}
+
+    @classmethod
+    def load(cls, data: Dict) -> "BulkStatusRecord":
+        states = bytearray.fromhex(data["states"])
+        record = cls(data["request_id"], 0, data["created_at"])
+        record.states = states
+        record.message_ids = data["message_ids"]
+        record.providers = data["providers"]
+        record.counts = [0] * len(STATES)
+        for code in states:
+            record.counts[code] += 1
+        record.updated_at = data["updated_at"]
+        return record
+
+
+def _recipient_key(recipient: Optional[str]) -> str:
+    return recipient.lstrip("+") if recipient else ""
+
+
+def _load_record(blob: str):
+    data = json.loads(blob)
+    if data["kind"] == "bulk":
+        return BulkStatusRecord.load(data)
+    return StatusRecord.load(data)
+
+
+def _log_write_error(future: Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Status store write failed: {future.exception()}")
+
+
+class StatusStore:
+    """Two-tier request status store.
+
+    Lookups are O(1) dict hits on the memory tier. Records are dropped after
+    ``ttl`` seconds of inactivity; when more than ``max_entries`` records are
+    held, the least recently used one is spilled to the disk tier (if
+    ``path`` is set) or discarded.
+
+    Changed records are handed to the disk thread without waiting for the
+    write. :meth:`fetch`, :meth:`apply` and :meth:`message_states` read
+    memory misses from disk without blocking the event loop; the
+    synchronous :meth:`get`, :meth:`apply_events` and :meth:`flush` wait
+    for the disk thread and are meant for callers off the loop.
+    """
+
+    def __init__(self, max_entries: int = 100_000, ttl: float = 86400.0, path: Optional[str] = None,
+                 max_message_ids: int = 1_000_000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.max_message_ids = max_message_ids
+        self._records: "OrderedDict[str, object]" = OrderedDict()
+        self._dirty: Dict[str, object] = {}
+        self._message_ids: "OrderedDict[MessageKey, Tuple[str, Optional[int], float]]" = OrderedDict()
+        self._dirty_ids: Dict[MessageKey, Tuple[str, Optional[int], float]] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._loads: set = set()
+        if path:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sms-status")
+            self._call(self._open)
+
+    def _open(self) -> None:
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sms_status ("
+            "request_id TEXT PRIMARY KEY, record TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sms_message_ids ("
+            "provider TEXT NOT NULL, message_id TEXT NOT NULL, recipient TEXT NOT NULL, "
+            "request_id TEXT NOT NULL, idx INTEGER, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (provider, message_id, recipient))"
+        )
+        self._conn = conn
+
+    def _call(self, fn, *args):
+        """Run ``fn`` on the disk thread and wait for it."""
+        return self._executor.submit(fn, *args).result()
+
+    async def _run(self, fn, *args):
+        """Run ``fn`` on the disk thread without blocking the event loop."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _submit(self, fn, *args) -> None:
+        """Queue ``fn`` on the disk thread; failures are logged."""
+        self._executor.submit(fn, *args).add_done_callback(_log_write_error)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def track(self, request_id: str) -> StatusRecord:
+        """Start tracking a single-recipient request in the queued state."""
+        record = StatusRecord(request_id)
+        self._put(request_id, record)
+        return record
+
+    def track_bulk(self, request_id: str, total: int) -> BulkStatusRecord:
+        """Start tracking a bulk request with ``total`` recipients."""
+        record = BulkStatusRecord(request_id, total)
+        self._put(request_id, record)
+        return record
+
+    def discard(self, request_id: str) -> None:
+        """Forget a request, e.g. when it could not be queued."""
+        self._records.pop(request_id, None)
+        self._dirty.pop(request_id, None)
+        if self._conn is not None:
+            self._submit(self._delete, request_id)
+
+    def _delete(self, request_id: str) -> None:
+        self._conn.execute("DELETE FROM sms_status WHERE request_id = ?", (request_id,))
+
+    def update(self, request_id: str, state: str, provider: Optional[str] = None,
+               message_id: Optional[str] = None, error: Optional[str] = None,
+               index: Optional[int] = None, recipient: Optional[str] = None) -> None:
+        """Record a state transition; ``index`` addresses a bulk recipient.
+
+        A ``provider`` and ``message_id`` are also indexed for delivery
+        receipts; pass ``recipient`` when the id is shared by a whole
+        carrier batch.
+        """
+        now = time.time()
+        if provider is not None and message_id is not None:
+            self._index_message(provider, message_id, recipient, request_id, index, now)
+        args = (state, provider, message_id, error, index)
+        record = self._lookup(request_id, now, disk=False)
+        if record is None and self._conn is not None:
+            if _loop_running():
+                # Evicted or from before a restart: load it off the loop.
+                task = asyncio.ensure_future(self._update_later(request_id, now, args))
+                self._loads.add(task)
+                task.add_done_callback(self._loads.discard)
+                return
+            record = self._lookup(request_id, now)
+        self._transition(request_id, record, now, *args)
+
+    async def _update_later(self, request_id: str, now: float, args: Tuple) -> None:
+        blob = await self._run(self._select_record, request_id, now - self.ttl)
+        record = self._lookup(request_id, now, disk=False)
+        if record is None and blob is not None:
+            record = _load_record(blob)
+            self._put(request_id, record)
+        self._transition(request_id, record, now, *args)
+
+    def _transition(self, request_id: str, record, now: float, state: str, provider: Optional[str],
+                    message_id: Optional[str], error: Optional[str], index: Optional[int]) -> None:
+        if index is not None:
+            if not isinstance(record, BulkStatusRecord) or index >= record.total:
+                logger.warning(f"Status update for unknown bulk item {request_id}[{index}]")
+                return
+            record.transition(index, state, now, provider, message_id)
+        else:
+            if record is None:
+                record = StatusRecord(request_id, state, now)
+                self._put(request_id, record)
+            record.transition(state, now, provider, message_id, error)
+        if self._conn is not None:
+            self._dirty[request_id] = record
+
+    def _index_message(self, provider: str, message_id: str, recipient: Optional[str],
+                       request_id: str, index: Optional[int], now: float) -> None:
+        key = (provider, message_id, _recipient_key(recipient))
+        entry = (request_id, index, now)
+        self._remember_id(key, entry)
+        if self._conn is not None:
+            self._dirty_ids[key] = entry
+            if len(self._dirty_ids) >= 10_000:
+                self._flush_later()
+
+    def _remember_id(self, key: MessageKey, entry: Tuple[str, Optional[int], float]) -> None:
+        ids = self._message_ids
+        ids[key] = entry
+        ids.move_to_end(key)
+        while len(ids) > self.max_message_ids:
+            ids.popitem(last=False)
+
+    def resolve(self, provider: str, message_id: str,
+                recipient: Optional[str] = None) -> Optional[Tuple[str, Optional[int]]]:
+        """Request id and bulk index that a provider message id belongs to."""
+        return self._resolve(provider, message_id, recipient, disk=True)
+
+    def _resolve(self, provider: str, message_id: str, recipient: Optional[str],
+                 disk: bool) -> Optional[Tuple[str, Optional[int]]]:
+        for key in _message_keys(provider, message_id, recipient):
+            entry = self._message_ids.get(key) or self._dirty_ids.get(key)
+            if entry is None and disk and self._conn is not None:
+                entry = self._call(self._select_id, key)
+            if entry is not None:
+                return entry[0], entry[1]
+        return None
+
+    def message_state(self, provider: str, message_id: str, recipient: Optional[str] = None) -> Optional[str]:
+        """Current state of a provider message, or None if it is not tracked."""
+        return self._message_state(provider, message_id, recipient, disk=True)
+
+    async def message_states(self, messages: Sequence[Tuple[str, str, Optional[str]]]) -> List[Optional[str]]:
+        """:meth:`message_state` for many ``(provider, message_id, recipient)``
+        tuples, reading memory misses from disk in one trip off the loop."""
+        await self._preload(messages)
+        return [self._message_state(p, m, r, disk=False) for p, m, r in messages]
+
+    def _message_state(self, provider: str, message_id: str, recipient: Optional[str],
+                       disk: bool) -> Optional[str]:
+        target = self._resolve(provider, message_id, recipient, disk)
+        record = self._lookup(target[0], time.time(), disk) if target is not None else None
+        if record is None:
+            return None
+        index = target[1]
+        if index is None:
+            return record.state
+        if not isinstance(record, BulkStatusRecord) or index >= record.total:
+            return None
+        return STATES[record.states[index]]
+
+    def apply_events(self, events: Iterable) -> List:
+        """Apply delivery events in one pass; returns the ones not matched.
+
+        Each event needs ``provider``, ``message_id``, ``recipient``,
+        ``state`` and ``error`` attributes (see :class:`~sms_gateway.dlr.StatusEvent`).
+        A receipt never moves a message out of a final state into a
+        non-final one, so late or reordered receipts are harmless.
+        """
+        unmatched = self._apply_events(events, disk=True)
+        self.flush()
+        return unmatched
+
+    async def apply(self, events: Iterable) -> List:
+        """:meth:`apply_events` with disk reads done off the event loop."""
+        events = list(events)
+        await self._preload([(e.provider, e.message_id, e.recipient) for e in events])
+        unmatched = self._apply_events(events, disk=False)
+        self._flush_later()
+        return unmatched
+
+    def _apply_events(self, events: Iterable, disk: bool) -> List:
+        now = time.time()
+        unmatched = []
+        for event in events:
+            target = self._resolve(event.provider, event.message_id, event.recipient, disk)
+            record = self._lookup(target[0], now, disk) if target is not None else None
+            if record is None:
+                unmatched.append(event)
+                continue
+            request_id, index = target
+            new_code = _STATE_CODES.get(event.state, _STATE_CODES[UNKNOWN])
+            if index is not None:
+                if not isinstance(record, BulkStatusRecord) or index >= record.total:
+                    continue
+                if record.states[index] in _FINAL_CODES and new_code not in _FINAL_CODES:
+                    continue
+                record.transition(index, STATES[new_code], now)
+            else:
+                if record.state in FINAL_STATES and STATES[new_code] not in FINAL_STATES:
+                    continue
+                record.transition(STATES[new_code], now, error=event.error)
+            if self._conn is not None:
+                self._dirty[request_id] = record
+        return unmatched
+
+    def get(self, request_id: str) -> Optional[Dict]:
+        """Return the public status view of a request, or None."""
+        record = self._lookup(request_id, time.time())
+        return record.to_dict() if record is not None else None
+
+    async def fetch(self, request_id: str) -> Optional[Dict]:
+        """:meth:`get` that reads a memory miss from disk off the event loop."""
+        now = time.time()
+        record = self._lookup(request_id, now, disk=False)
+        if record is None and self._conn is not None:
+            blob = await self._run(self._select_record, request_id, now - self.ttl)
+            # The record may have been created or loaded while we waited.
+            record = self._lookup(request_id, now, disk=False)
+            if record is None and blob is not None:
+                record = _load_record(blob)
+                self._put(request_id, record)
+        return record.to_dict() if record is not None else None
+
+    async def _preload(self, messages: Sequence[Tuple[str, str, Optional[str]]]) -> None:
+        """Load the index entries and records ``messages`` need into memory."""
+        if self._conn is None:
+            return
+        keys = []
+        request_ids = set()
+        for provider, message_id, recipient in messages:
+            for key in _message_keys(provider, message_id, recipient):
+                entry = self._message_ids.get(key) or self._dirty_ids.get(key)
+                if entry is None:
+                    keys.append(key)
+                elif entry[0] not in self._records and entry[0] not in self._dirty:
+                    request_ids.add(entry[0])
+        if not keys and not request_ids:
+            return
+        found, blobs = await self._run(self._select_many, keys, request_ids, time.time() - self.ttl)
+        for key, entry in found.items():
+            if key not in self._message_ids and key not in self._dirty_ids:
+                self._remember_id(key, entry)
+        for request_id, blob in blobs.items():
+            if request_id not in self._records and request_id not in self._dirty:
+                self._put(request_id, _load_record(blob))
+
+    def _put(self, request_id: str, record) -> None:
+        self._records[request_id] = record
+        self._records.move_to_end(request_id)
+        if self._conn is not None:
+            self._dirty[request_id] = record
+        while len(self._records) > self.max_entries:
+            old_id, old = self._records.popitem(last=False)
+            if self._conn is not None:
+                self._dirty[old_id] = old
+        if len(self._dirty) >= 1000:
+            self._flush_later()
+
+    def _lookup(self, request_id: str, now: float, disk: bool = True):
+        record = self._records.get(request_id)
+        if record is not None:
+            if now - record.updated_at > self.ttl:
+                del self._records[request_id]
+                return None
+            self._records.move_to_end(request_id)
+            return record
+        if self._conn is None:
+            return None
+        record = self._dirty.get(request_id)
+        if record is None:
+            blob = self._call(self._select_record, request_id, now - self.ttl) if disk else None
+            if blob is None:
+                return None
+            record = _load_record(blob)
+        self._put(request_id, record)
+        return record
+
+    def _select_record(self, request_id: str, cutoff: float) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT record FROM sms_status WHERE request_id = ? AND updated_at >= ?",
+            (request_id, cutoff),
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def _select_id(self, key: MessageKey) -> Optional[Tuple[str, Optional[int], float]]:
+        row = self._conn.execute(
+            "SELECT request_id, idx, updated_at FROM sms_message_ids "
+            "WHERE provider = ? AND message_id = ? AND recipient = ?", key,
+        ).fetchone()
+        return tuple(row) if row is not None else None
+
+    def _select_many(self, keys: List[MessageKey], request_ids: set, cutoff: float):
+        found = {}
+        for key in keys:
+            entry = self._select_id(key)
+            if entry is not None:
+                found[key] = entry
+                request_ids.add(entry[0])
+        blobs = {}
+        for request_id in request_ids:
+            blob = self._select_record(request_id, cutoff)
+            if blob is not None:
+                blobs[request_id] = blob
+        return found, blobs
+
+    def flush(self) -> None:
+        """Write changed records to the disk tier and wait for the write."""
+        batch = self._take_dirty()
+        if batch is not None:
+            self._call(self._write, *batch)
+
+    def _flush_later(self) -> None:
+        """Hand changed records to the disk thread without waiting."""
+        batch = self._take_dirty()
+        if batch is not None:
+            self._submit(self._write, *batch)
+
+    def _take_dirty(self) -> Optional[Tuple[List, List]]:
+        if self._conn is None or not (self._dirty or self._dirty_ids):
+            return None
+        dirty, self._dirty = self._dirty, {}
+        dirty_ids, self._dirty_ids = self._dirty_ids, {}
+        # Serialized here: records keep changing on the loop after hand-off.
+        rows = [(rid, json.dumps(rec.dump()), rec.updated_at) for rid, rec in dirty.items()]
+        return rows, [key + entry for key, entry in dirty_ids.items()]
+
+    def _write(self, rows: List, id_rows: List) -> None:
+        """Write records and message ids in one transaction."""
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sms_status (request_id, record, updated_at) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sms_message_ids "
+                "(provider, message_id, recipient, request_id, idx, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                id_rows,
+            )
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def purge_expired(self) -> int:
+        """Drop records idle for longer than the TTL from both tiers."""
+        cutoff = time.time() - self.ttl
+        expired = [rid for rid, rec in self._records.items() if rec.updated_at < cutoff]
+        for rid in expired:
+            del self._records[rid]
+        ids = self._message_ids
+        while ids:
+            key, entry = next(iter(ids.items()))
+            if entry[2] >= cutoff:
+                break
+            del ids[key]
+        if self._conn is not None:
+            self._submit(self._purge, cutoff)
+        return len(expired)
+
+    def _purge(self, cutoff: float) -> None:
+        self._conn.execute("DELETE FROM sms_status WHERE updated_at < ?", (cutoff,))
+        self._conn.execute("DELETE FROM sms_message_ids WHERE updated_at < ?", (cutoff,))
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self.flush()
+            self._call(self._conn.close)
+            self._conn = None
+            self._executor.shutdown()
+            self._executor = None
+
+
+def _loop_running() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _message_keys(provider: str, message_id: str, recipient: Optional[str]) -> List[MessageKey]:
+    keys = [(provider, message_id, "")]
+    if recipient:
+        keys.append((provider, message_id, _recipient_key(recipient)))
+    return keys
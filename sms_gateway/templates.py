@@ -4,9 +4,11 @@ Supports variable interpolation, locale-aware formatting, and template validatio
 """
 
 import re
-from typing import Dict, Optional, Any
+from typing import Dict, Iterable, List, Optional, Any, Tuple
 from datetime import datetime
 
+from .encoding import segment_count
+
 
 class TemplateError(Exception):
     """Raised when template rendering fails."""
@@ -14,7 +16,13 @@ class TemplateError(Exception):
 
 
 class NotificationTemplate:
-    """SMS notification template with variable substitution."""
+    """SMS notification template with variable substitution.
+    
+    The body is compiled once into a render plan: a list of literal
+    segments with placeholders at the slot positions. Rendering copies the
+    list, fills the slots and joins once, so the cost is linear in the
+    output size regardless of how many variables the template has.
+    """
     
     VAR_PATTERN = re.compile(r'\{\{(\w+)\}\}')
     MAX_SMS_LENGTH = 160
@@ -24,6 +32,25 @@ class NotificationTemplate:
         self.body = body
         self.locale = locale
         self._validate_syntax()
+        self._compile()
+    
+    def _compile(self) -> None:
+        """Split the body into literal segments and variable slots."""
+        parts: List[str] = []
+        slots: List[Tuple[int, str]] = []
+        pos = 0
+        for match in self.VAR_PATTERN.finditer(self.body):
+            if match.start() > pos:
+                parts.append(self.body[pos:match.start()])
+            slots.append((len(parts), match.group(1)))
+            parts.append('')
+            pos = match.end()
+        if pos < len(self.body):
+            parts.append(self.body[pos:])
+        self._parts = parts
+        self._slots = slots
+        self._variables = [name for _, name in slots]
+        self._required = frozenset(self._variables)
     
     def _validate_syntax(self) -> None:
         """Check for unclosed variable tags."""
@@ -35,35 +62,34 @@ class NotificationTemplate:
     @property
     def variables(self) -> list:
         """Extract all variable names from the template."""
-        return self.VAR_PATTERN.findall(self.body)
+        return list(self._variables)
     
     def render(self, context: Dict[str, Any]) -> str:
         """Render template with provided context variables."""
-        missing = set(self.variables) - set(context.keys())
-        if missing:
-            raise TemplateError(f"Missing variables: {missing}")
-        
-        result = self.body
-        for key, value in context.items():
-            result = result.replace('{{' + key + '}}', str(value))
-        
-        return result
+        parts = self._parts[:]
+        try:
+            for pos, var in self._slots:
+                parts[pos] = str(context[var])
+        except KeyError:
+            missing = set(self._required - context.keys())
+            raise TemplateError(f"Missing variables: {missing}") from None
+        return ''.join(parts)
     
     def render_safe(self, context: Dict[str, Any], default: str = '') -> str:
         """Render template, replacing missing variables with default."""
-        result = self.body
-        for var in self.variables:
-            value = context.get(var, default)
-            result = result.replace('{{' + var + '}}', str(value))
-        return result
+        parts = self._parts[:]
+        for pos, var in self._slots:
+            parts[pos] = str(context.get(var, default))
+        return ''.join(parts)
     
     @property
     def segment_count(self) -> int:
-        """Estimate SMS segment count (without variables filled)."""
-        length = len(self.body)
-        if length <= self.MAX_SMS_LENGTH:
-            return 1
-        return (length + 152) // 153  # multipart: 153 chars per segment
+        """SMS segment count of the body with variables left unfilled."""
+        return max(1, segment_count(self.body))
+    
+    def segments_for(self, context: Dict[str, Any]) -> int:
+        """Exact SMS segment count of the message rendered for ``context``."""
+        return segment_count(self.render(context))
 
 
 class TemplateRegistry:
@@ -80,10 +106,18 @@ class TemplateRegistry:
         return self._templates.get(f"{name}:{locale}")
     
     def render(self, name: str, context: Dict[str, Any], locale: str = 'en') -> str:
+        return self._require(name, locale).render(context)
+    
+    def render_many(self, name: str, contexts: Iterable[Dict[str, Any]], locale: str = 'en') -> List[str]:
+        """Render one template for many contexts, reusing its compiled plan."""
+        render = self._require(name, locale).render
+        return [render(context) for context in contexts]
+    
+    def _require(self, name: str, locale: str) -> NotificationTemplate:
         tpl = self.get(name, locale)
         if not tpl:
             raise TemplateError(f"Template '{name}' not found for locale '{locale}'")
-        return tpl.render(context)
+        return tpl
     
     def list_templates(self) -> list:
         return list(self._templates.keys())
@@ -4,12 +4,18 @@ import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from fastapi.testclient import TestClient
 
+from sms_gateway import api
 from sms_gateway.api import app
+from sms_gateway.dedup import Deduplicator
+from sms_gateway.send_queue import SendQueue
 
 
 @pytest.fixture
-def client():
-    return TestClient(app)
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "send_queue", SendQueue(str(tmp_path / "queue.db")))
+    monkeypatch.setattr(api, "deduplicator", Deduplicator())
+    with TestClient(app) as test_client:
+        yield test_client
 
 
 class TestHealthEndpoint:
@@ -48,6 +54,21 @@ class TestSendSMSEndpoint:
         response = client.post("/api/v1/sms/send", json=payload)
         assert response.status_code == 422
 
+    def test_idempotency_key_replays_response(self, client):
+        payload = {"phone_number": "+8613812345678", "message": "Your code is 1234"}
+        headers = {"Idempotency-Key": "order-42"}
+        first = client.post("/api/v1/sms/send", json=payload, headers=headers)
+        again = client.post("/api/v1/sms/send", json=payload, headers=headers)
+        assert again.status_code == 200
+        assert again.json() == first.json()
+
+    def test_duplicate_message_rejected(self, client):
+        payload = {"phone_number": "+8613812345678", "message": "Same text"}
+        request_id = client.post("/api/v1/sms/send", json=payload).json()["request_id"]
+        response = client.post("/api/v1/sms/send", json=payload)
+        assert response.status_code == 409
+        assert request_id in response.json()["detail"]
+
     def test_send_sms_with_priority(self, client):
         payload = {
             "phone_number": "+8613812345678",
@@ -69,10 +90,51 @@ class TestBulkSMSEndpoint:
         data = response.json()
         assert data["status"] == "bulk_queued"
 
+    def test_bulk_skips_duplicate_recipients(self, client):
+        client.post("/api/v1/sms/send", json={"phone_number": "+8613812345678", "message": "Sale"})
+        payload = {"phone_numbers": ["+8613812345678", "+8613987654321", "+8613987654321"], "message": "Sale"}
+        data = client.post("/api/v1/sms/bulk", json=payload).json()
+        assert data["message"] == "1 messages queued, 2 duplicates skipped"
+        assert client.get(f"/api/v1/sms/status/{data['request_id']}").json()["total"] == 1
+        assert client.post("/api/v1/sms/bulk", json=payload).status_code == 409
+
+    def test_failed_enqueue_releases_key_and_fingerprint(self, client):
+        payload = {"phone_number": "+8613812345678", "message": "Your code is 1234"}
+        headers = {"Idempotency-Key": "order-43"}
+        broken = AsyncMock(side_effect=RuntimeError("disk I/O error"))
+        with patch.object(api.send_queue, "enqueue", broken), patch.object(api.send_queue, "enqueue_many", broken):
+            with pytest.raises(RuntimeError):
+                client.post("/api/v1/sms/send", json=payload, headers=headers)
+            with pytest.raises(RuntimeError):
+                client.post("/api/v1/sms/bulk", json={"phone_numbers": ["+8613987654321"], "message": "Sale"})
+        retry = client.post("/api/v1/sms/send", json=payload, headers=headers)
+        assert retry.status_code == 200
+        assert client.get(f"/api/v1/sms/status/{retry.json()['request_id']}").status_code == 200
+        bulk = client.post("/api/v1/sms/bulk", json={"phone_numbers": ["+8613987654321"], "message": "Sale"})
+        assert bulk.status_code == 200
+
 
 class TestProvidersEndpoint:
     def test_list_providers(self, client):
         response = client.get("/api/v1/providers")
         assert response.status_code == 200
         data = response.json()
-        assert "providers" in data
\ No newline at end of file
+        assert "providers" in data
+
+class TestStatusEndpoint:
+    def test_status_of_queued_request(self, client):
+        payload = {"phone_number": "+8613812345678", "message": "Track me"}
+        request_id = client.post("/api/v1/sms/send", json=payload).json()["request_id"]
+        response = client.get(f"/api/v1/sms/status/{request_id}")
+        assert response.status_code == 200
+        assert response.json()["request_id"] == request_id
+
+    def test_status_of_bulk_request(self, client):
+        payload = {"phone_numbers": ["+8613812345678", "+8613987654321"], "message": "Bulk"}
+        request_id = client.post("/api/v1/sms/bulk", json=payload).json()["request_id"]
+        data = client.get(f"/api/v1/sms/status/{request_id}").json()
+        assert data["total"] == 2
+
+    def test_status_unknown_request(self, client):
+        response = client.get("/api/v1/sms/status/does-not-exist")
+        assert response.status_code == 404
@@ -0,0 +1,178 @@
+"""Tests for streaming bulk sends."""
+import pytest
+from sms_gateway import SMSGateway
+from sms_gateway.bulk import BulkProgress, BulkResults, bounded_map
+from sms_gateway.providers.base import SMSResult
+from sms_gateway.ratelimit import Limit, RateLimitConfig, RateLimiter
+from tests.test_gateway import MockProvider
+
+def make_gateway():
+    gw = SMSGateway()
+    gw.register_provider("mock", MockProvider(), primary=True)
+    return gw
+
+async def async_messages(count):
+    for i in range(count):
+        yield {"to": f"+1202555{i:04d}", "message": f"Msg {i}"}
+
+@pytest.mark.asyncio
+async def test_stream_bulk_from_async_iterator():
+    gw = make_gateway()
+    progress = BulkProgress()
+    seen = set()
+    async for index, result in gw.stream_bulk(async_messages(50), concurrency=5, progress=progress):
+        assert result.success
+        seen.add(index)
+        assert progress.in_flight <= 5
+    assert seen == set(range(50))
+    assert progress.as_dict()["succeeded"] == 50
+
+@pytest.mark.asyncio
+async def test_stream_bulk_from_generator_is_lazy():
+    gw = make_gateway()
+    pulled = []
+    
+    def messages():
+        for i in range(1000):
+            pulled.append(i)
+            yield {"to": f"+1202555{i:04d}", "message": "hi"}
+    
+    stream = gw.stream_bulk(messages(), concurrency=4)
+    await stream.__anext__()
+    await stream.aclose()
+    assert len(pulled) < 50
+
+@pytest.mark.asyncio
+async def test_run_bulk_with_callback_sink():
+    gw = make_gateway()
+    collected = []
+    progress = await gw.run_bulk(async_messages(20), lambda i, r: collected.append(i), concurrency=3)
+    assert sorted(collected) == list(range(20))
+    assert progress.completed == 20
+
+@pytest.mark.asyncio
+async def test_bounded_map_propagates_source_errors():
+    def broken():
+        yield 1
+        raise ValueError("bad source")
+    
+    async def identity(x):
+        return x
+    
+    with pytest.raises(ValueError):
+        async for _ in bounded_map(broken(), identity, 2):
+            pass
+
+class BatchProvider(MockProvider):
+    MAX_BATCH_SIZE = 3
+    
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+    
+    async def send_batch(self, messages):
+        self._check_batch(messages, self.MAX_BATCH_SIZE)
+        self.batches.append([m.to for m in messages])
+        return [SMSResult(success=True, message_id="batch-1", provider="mock") for _ in messages]
+
+@pytest.mark.asyncio
+async def test_bulk_groups_identical_bodies_into_batches():
+    gw = SMSGateway()
+    provider = BatchProvider()
+    gw.register_provider("batch", provider, primary=True)
+    messages = [{"to": f"+1202555{i:04d}", "message": "same"} for i in range(7)]
+    messages.append({"to": "+12025559999", "message": "different"})
+    results = await gw.send_bulk(messages)
+    assert all(r.success for r in results)
+    assert [len(b) for b in provider.batches] == [3, 3]
+    assert len(provider.sent_messages) == 2  # leftover "same" and "different"
+    assert gw.stats["sent"] == 8
+
+@pytest.mark.asyncio
+async def test_bulk_without_batch_support_sends_individually():
+    gw = make_gateway()
+    messages = [{"to": f"+1202555{i:04d}", "message": "same"} for i in range(5)]
+    results = await gw.send_bulk(messages)
+    assert len(results) == 5
+    assert len(gw._providers["mock"].sent_messages) == 5
+
+@pytest.mark.asyncio
+async def test_send_many_records_bulk_status():
+    gw = SMSGateway()
+    gw.register_provider("batch", BatchProvider(), primary=True)
+    gw.status.track_bulk("bulk-1", 3)
+    await gw.send_many([
+        {"to": f"+1202555000{i}", "message": "same", "request_id": "bulk-1", "index": i}
+        for i in range(3)
+    ])
+    assert gw.get_status("bulk-1")["counts"] == {"sent": 3}
+
+@pytest.mark.asyncio
+async def test_batching_keeps_requested_provider():
+    gw = SMSGateway()
+    single, batch = MockProvider(), BatchProvider()
+    gw.register_provider("single", single, primary=True)
+    gw.register_provider("batch", batch)
+    await gw.send_many([{"to": f"+1202555000{i}", "message": "same", "provider": "single"} for i in range(3)])
+    assert len(single.sent_messages) == 3
+    assert batch.batches == [] and batch.sent_messages == []
+
+@pytest.mark.asyncio
+async def test_batch_not_sent_spends_no_tokens():
+    limiter = RateLimiter(RateLimitConfig(global_limits=[Limit(0.001, 10)]))
+    gw = SMSGateway(rate_limiter=limiter)
+    provider = BatchProvider()
+    gw.register_provider("batch", provider, primary=True)
+    gw._breakers["batch"].allow = lambda: False
+    results = await gw.send_many([{"to": f"+1202555000{i}", "message": "same"} for i in range(3)])
+    assert provider.batches == []
+    # Only the per-message fallbacks were charged (message and provider level).
+    assert limiter._global[0].tokens == pytest.approx(4, abs=0.01)
+    assert all(not r.success for r in results)
+
+class PartialBatchProvider(BatchProvider):
+    async def send_batch(self, messages):
+        results = await super().send_batch(messages)
+        results[1] = SMSResult(success=False, error="Carrier rejected", provider="mock", retryable=True)
+        return results
+
+@pytest.mark.asyncio
+async def test_batch_fallback_is_not_charged_twice():
+    limiter = RateLimiter(RateLimitConfig(global_limits=[Limit(0.001, 10)], per_destination=[Limit(0.001, 1)],
+                                           max_delay=5))
+    gw = SMSGateway(rate_limiter=limiter)
+    provider = PartialBatchProvider()
+    gw.register_provider("batch", provider, primary=True)
+    results = await gw.send_many([{"to": f"+1202555000{i}", "message": "same"} for i in range(3)])
+    assert all(r.success for r in results)
+    assert [m.to for m in provider.sent_messages] == ["+12025550001"]
+    # The batch paid 3 messages plus its provider request; the fallback only its provider request.
+    assert limiter._global[0].tokens == pytest.approx(5, abs=0.01)
+    assert limiter.stats["rejected"] == 0
+
+def test_bulk_results_round_trip():
+    results = BulkResults(3)
+    ok = SMSResult(success=True, message_id="m1", provider="mock", price=0.01, status="queued", segments=2)
+    results[0] = ok
+    results[2] = SMSResult(success=False, error="boom")
+    assert results[0] == ok
+    assert results[-1].error == "boom" and results[-1].price is None
+    assert results[1].success is False and results[1].status == "unknown"
+    assert results.succeeded == 1 and results.failed_indexes() == [1, 2]
+    assert [r.message_id for r in results[:2]] == ["m1", None]
+    with pytest.raises(IndexError):
+        results[3]
+
+
+def test_bulk_results_hold_many_names_and_compare_to_lists():
+    results = BulkResults(600)
+    expected = []
+    for i in range(600):
+        result = SMSResult(success=bool(i % 2), message_id=f"m{i}", provider=f"p{i}", status=f"s{i}",
+                           error=None if i % 2 else "boom", timestamp=1000.0 + i)
+        results[i] = result
+        expected.append(result)
+    assert results[599].provider == "p599" and results[599].status == "s599"
+    assert results == expected
+    assert expected == results
+    assert results != expected[:-1]
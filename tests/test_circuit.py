@@ -0,0 +1,70 @@
+"""Tests for provider circuit breakers."""
+import pytest
+from sms_gateway import SMSGateway
+from sms_gateway.gateway import GatewayConfig
+from sms_gateway.circuit import BreakerConfig, BreakerState, CircuitBreaker
+from tests.test_gateway import MockProvider
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+def test_opens_on_error_rate():
+    breaker = CircuitBreaker("p", BreakerConfig(min_requests=4, failure_rate=0.5), clock=FakeClock())
+    for ok in (True, True, False, False):
+        assert breaker.allow()
+        breaker.record(ok, 0.1)
+    assert breaker.state is BreakerState.OPEN
+    assert not breaker.allow()
+    assert breaker.stats["rejected"] == 1
+
+def test_half_open_probes_are_rate_limited_and_close():
+    clock = FakeClock()
+    config = BreakerConfig(min_requests=1, open_seconds=10, probe_interval=1, close_after_successes=2)
+    breaker = CircuitBreaker("p", config, clock=clock)
+    breaker.record(False, 0.1)
+    clock.now += 10
+    assert breaker.allow()
+    assert breaker.state is BreakerState.HALF_OPEN
+    assert not breaker.allow()  # one probe in flight
+    breaker.record(True, 0.1)
+    assert not breaker.allow()  # probe interval not elapsed
+    clock.now += 1
+    assert breaker.allow()
+    breaker.record(True, 0.1)
+    assert breaker.state is BreakerState.CLOSED
+
+def test_failed_probe_reopens_with_longer_period():
+    clock = FakeClock()
+    breaker = CircuitBreaker("p", BreakerConfig(min_requests=1, open_seconds=10), clock=clock)
+    breaker.record(False, 0.1)
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state is BreakerState.OPEN
+    clock.now += 15
+    assert not breaker.allow()
+
+def test_slow_calls_open_breaker():
+    config = BreakerConfig(min_requests=2, slow_call_seconds=1.0, slow_call_rate=0.5)
+    breaker = CircuitBreaker("p", config, clock=FakeClock())
+    breaker.record(True, 2.0)
+    breaker.record(True, 2.0)
+    assert breaker.state is BreakerState.OPEN
+
+@pytest.mark.asyncio
+async def test_gateway_skips_open_provider():
+    gw = SMSGateway(GatewayConfig(circuit_breaker=BreakerConfig(min_requests=2)))
+    failing = MockProvider(should_fail=True)
+    working = MockProvider()
+    gw.register_provider("failing", failing, primary=True)
+    gw.register_provider("working", working)
+    for _ in range(4):
+        assert (await gw.send("+12025551234", "Hello!")).success
+    breakers = gw.stats["breakers"]
+    assert breakers["failing"]["state"] == "open"
+    assert breakers["failing"]["rejected"] == 2
+    assert breakers["working"]["state"] == "closed"
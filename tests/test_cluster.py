@@ -0,0 +1,210 @@
+"""Tests for state shared between API workers through the coordinator."""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from pydantic import BaseModel
+from sms_gateway.cluster import (
+    Coordinator, CoordinatorClient, SharedDeduplicator, SharedNumberPool, SharedRateLimiter,
+    SharedSlidingWindow, SharedStatusStore,
+)
+from sms_gateway.dedup import Deduplicator
+from sms_gateway.dlr import StatusEvent
+from sms_gateway.middleware import RateLimitMiddleware
+from sms_gateway.number_pool import NumberPool
+from sms_gateway.ratelimit import Limit, RateLimitConfig, RateLimiter, RateLimitExceeded
+from sms_gateway.send_queue import SendQueue
+from sms_gateway.status import SENT, StatusStore
+
+class Reply(BaseModel):
+    request_id: str
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+LIMITS = RateLimitConfig(global_limits=[Limit(1, 20)], per_number=[Limit(1, 1)], max_delay=0.5)
+
+@pytest_asyncio.fixture
+async def coordinator(tmp_path):
+    clock = Clock()
+    coordinator = Coordinator(rate_limiter=RateLimiter(LIMITS, clock=clock), status=StatusStore(),
+                              deduplicator=Deduplicator(),
+                              number_pool=NumberPool(path=str(tmp_path / "pool.jsonl")))
+    coordinator.clock = clock
+    await coordinator.start(str(tmp_path / "coordinator.sock"))
+    clients = [CoordinatorClient(coordinator.path), CoordinatorClient(coordinator.path)]
+    yield coordinator, clients
+    for client in clients:
+        await client.close()
+    await coordinator.stop()
+
+@pytest.mark.asyncio
+async def test_sends_spend_leased_tokens_locally(coordinator):
+    coord, (a, _) = coordinator
+    limiter = SharedRateLimiter(a, LIMITS, clock=coord.clock)
+    for i in range(3):
+        assert await limiter.acquire(to=f"+1202555000{i}") == 0
+    # One lease of 2 tokens (a tenth of the bucket), then one more.
+    assert coord.rate_limiter.stats["acquired"] == 2
+    assert coord.rate_limiter._global[0].tokens == 16
+    limiter.return_leases()
+    await a.call("limiter.stats")
+    assert coord.rate_limiter._global[0].tokens == 17
+
+@pytest.mark.asyncio
+async def test_rate_limit_is_global_across_workers(coordinator):
+    coord, (a, b) = coordinator
+    first, second = SharedRateLimiter(a, LIMITS, clock=coord.clock), SharedRateLimiter(b, LIMITS, clock=coord.clock)
+    assert await first.acquire(from_number="+12025550100") == 0
+    with pytest.raises(RateLimitExceeded) as exc:
+        await second.acquire(from_number="+12025550100")
+    assert exc.value.wait > 0.5
+    # The failed send gives its leased global token back to the worker.
+    assert second._leases[("global", None)].tokens == 2
+    assert coord.rate_limiter.stats["rejected"] == 1
+    with pytest.raises(NotImplementedError):
+        first.reserve(to="+12025550001")
+
+@pytest.mark.asyncio
+async def test_deferral_leases_only_what_is_needed(coordinator):
+    coord, (a, _) = coordinator
+    coord.rate_limiter.config = RateLimitConfig(global_limits=[Limit(1, 20)])
+    coord.rate_limiter._global[0].tokens = 1
+    limiter = SharedRateLimiter(a, LIMITS, clock=coord.clock)
+    assert await limiter.acquire(max_wait=0.1) == 0
+    with pytest.raises(RateLimitExceeded):
+        await limiter.acquire(max_wait=0.1)
+    # The whole chunk, then the one token needed; the second send gets neither.
+    assert coord.rate_limiter.stats["deferred"] == 3
+
+@pytest.mark.asyncio
+async def test_calls_are_pipelined_and_answered_in_order(coordinator):
+    _, (a, _) = coordinator
+    for i in range(5):
+        a.notify("status.track", request_id=f"req-{i}")
+    results = await asyncio.gather(*(a.call("status.fetch", request_id=f"req-{i}") for i in range(5)))
+    assert [r["request_id"] for r in results] == [f"req-{i}" for i in range(5)]
+
+@pytest.mark.asyncio
+async def test_status_is_shared(coordinator):
+    _, (a, b) = coordinator
+    first, second = SharedStatusStore(a), SharedStatusStore(b)
+    first.track("req-1")
+    assert (await first.fetch("req-1"))["status"] == "queued"
+    second.update("req-1", SENT, provider="mock", message_id="m-1")
+    unmatched = await second.apply([StatusEvent("mock", "m-1", "delivered"),
+                                    StatusEvent("mock", "m-2", "delivered")])
+    assert [e.message_id for e in unmatched] == ["m-2"]
+    assert await first.message_states([("mock", "m-1", None)]) == ["delivered"]
+    assert (await first.fetch("req-1"))["status"] == "delivered"
+
+@pytest.mark.asyncio
+async def test_duplicates_are_caught_across_workers(coordinator):
+    _, (a, b) = coordinator
+    first, second = SharedDeduplicator(a), SharedDeduplicator(b)
+    assert await first.claim("client", "key-1", Reply(request_id="req-1")) is None
+    assert await second.claim("client", "key-1", Reply(request_id="req-2")) == {"request_id": "req-1"}
+    assert await first.check(["+12025550001", "+12025550002"], "hi", "req-1") == [None, None]
+    assert await second.check(["+12025550001", "+12025550003"], "hi", "req-2") == ["req-1", None]
+    second.release_message("+12025550001", "hi")
+    assert await first.check(["+12025550001"], "hi", "req-3") == [None]
+
+@pytest.mark.asyncio
+async def test_number_pool_is_served_and_persisted_by_coordinator(coordinator, tmp_path):
+    coord, (a, b) = coordinator
+    first, second = SharedNumberPool(a), SharedNumberPool(b)
+    first.add_number("+12025550100", "mock")
+    first.add_number("+12025550101", "mock")
+    assert (await first.refresh())["total"] == 2
+    assert await second.assign_number("+447700900001") is not None
+    batch = await first.assign_batch(["+447700900002", "+447700900003"])
+    assert list(batch) == ["+447700900002"]
+    assert (await second.refresh())["assigned"] == 2
+    reloaded = NumberPool(path=str(tmp_path / "pool.jsonl"))
+    assert reloaded.load() == 2
+    assert reloaded.number_for("+447700900002") == batch["+447700900002"]
+    reloaded.close()
+
+@pytest.mark.asyncio
+async def test_api_client_limit_is_shared_by_worker_middleware(coordinator):
+    _, clients = coordinator
+    workers = []
+    for client in clients:
+        app = FastAPI()
+        app.add_api_route("/ping", lambda: {"ok": True})
+        app.add_middleware(RateLimitMiddleware, max_requests=3, window_seconds=60,
+                           backend=SharedSlidingWindow(client))
+        workers.append(httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test"))
+    codes = [(await workers[i % 2].get("/ping")).status_code for i in range(5)]
+    assert codes == [200, 200, 200, 429, 429]
+    for worker in workers:
+        await worker.aclose()
+
+@pytest.mark.asyncio
+async def test_metrics_are_merged_across_workers(coordinator):
+    _, (a, b) = coordinator
+    snapshot = {"sms_sends_total": [[["cluster-test", "success"], 2]]}
+    a.notify("metrics.push", pid=1, snapshot=snapshot)
+    await a.call("limiter.stats")
+    merged = await b.call("metrics.exchange", pid=2, snapshot=snapshot)
+    assert [["cluster-test", "success"], 4] in merged["sms_sends_total"]
+
+@pytest.mark.asyncio
+async def test_shared_queue_sees_flows_enqueued_elsewhere(tmp_path):
+    path = str(tmp_path / "q.db")
+    producer, worker = SendQueue(path), SendQueue(path, shared=True)
+    await producer.open()
+    await worker.open(recover_inflight=False)
+    await producer.enqueue("+12025550001", "hi", client_id="client-1")
+    claimed = await worker.claim(10, weight=lambda priority: 1.0)
+    assert [m.client_id for m in claimed] == ["client-1"]
+    await worker.close()
+    await producer.close()
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def test_workers_share_limits_and_status(tmp_path):
+    pytest.importorskip("uvicorn")
+    port = _free_port()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'queue.db'}",
+               NUMBER_POOL_PATH=str(tmp_path / "pool.jsonl"), API_RATE_LIMIT_PER_MINUTE="60")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "sms_gateway.cluster", "--workers", "2", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"{base}/health", timeout=1).raise_for_status()
+                break
+            except httpx.HTTPError:
+                assert time.monotonic() < deadline and process.poll() is None, "cluster did not start"
+                time.sleep(0.2)
+        sent = httpx.post(f"{base}/api/v1/sms/send", json={"phone_number": "+12025550001", "message": "hi"})
+        request_id = sent.json()["request_id"]
+        # Fresh connections land on either worker; both must know the request.
+        codes = [httpx.get(f"{base}/api/v1/sms/status/{request_id}").status_code for _ in range(10)]
+        assert codes == [200] * 10
+        # 60 requests a minute per client, counted across both workers; health checks are free.
+        codes += [httpx.get(f"{base}/api/v1/providers").status_code for _ in range(60)]
+        assert codes.count(200) <= 59
+        assert codes[-1] == 429
+    finally:
+        process.terminate()
+        process.wait(30)
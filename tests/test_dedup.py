@@ -0,0 +1,66 @@
+"""Tests for idempotency keys and duplicate-message suppression."""
+from sms_gateway.dedup import (
+    UNKNOWN, BloomFilter, DedupCache, DedupConfig, Deduplicator, fingerprint, message_fingerprint,
+)
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_fingerprint_is_stable_and_normalises_plus():
+    assert fingerprint("a", "b") == fingerprint("a", "b") != fingerprint("ab", "")
+    assert message_fingerprint("+12025550001", "hi") == message_fingerprint("12025550001", "hi")
+    assert message_fingerprint("+12025550001", "hi") != message_fingerprint("+12025550001", "hi", "+1555")
+
+def test_entries_expire_with_their_slice():
+    clock = FakeClock(0.0)
+    cache = DedupCache(window=60, slices=6, clock=clock)
+    assert cache.add(1, "req-1") is None
+    assert cache.add(1, "req-2") == "req-1"
+    clock.now = 55.0
+    assert cache.get(1) == "req-1"
+    clock.now = 60.0
+    assert cache.get(1) is None
+    assert len(cache) == 0
+
+def test_evicted_keys_are_still_recognised_by_bloom_filter():
+    clock = FakeClock(0.0)
+    cache = DedupCache(window=60, slices=6, max_entries=100, bloom_capacity=6000, clock=clock)
+    for key in range(100):
+        cache.add(fingerprint(str(key)), key)
+    clock.now = 10.0
+    assert cache.add(fingerprint("new"), "new") is None
+    assert len(cache) == 1
+    assert cache.get(fingerprint("7")) is UNKNOWN
+    assert cache.get(fingerprint("new")) == "new"
+    false_hits = sum(cache.get(fingerprint(f"other-{i}")) is not None for i in range(2000))
+    assert false_hits <= 10
+    assert cache.stats["evicted"] == 100
+
+def test_bloom_filter_size_and_error_rate():
+    bloom = BloomFilter(100_000, error_rate=0.001)
+    assert len(bloom.bits) / 100_000 < 2
+    for i in range(100_000):
+        bloom.add(fingerprint(str(i)))
+    assert all(fingerprint(str(i)) in bloom for i in range(0, 100_000, 997))
+    false_hits = sum(fingerprint(f"x{i}") in bloom for i in range(20_000))
+    assert false_hits < 60
+
+def test_config_reads_duplicate_check_window():
+    config = DedupConfig.from_toml()
+    assert config.window == 3600.0 and config.idempotency_ttl == 86400.0
+    assert DedupConfig.from_dict({"per_destination": {"duplicate_check_window": 0}}).window == 0
+    dedup = Deduplicator(DedupConfig(window=0))
+    assert dedup.check_message("+12025550001", "hi", "req-1") is None
+    assert dedup.check_message("+12025550001", "hi", "req-2") is None
+
+def test_idempotency_keys_are_scoped_per_client():
+    dedup = Deduplicator()
+    assert dedup.claim_key("a", "k1", "resp-a") is None
+    assert dedup.claim_key("b", "k1", "resp-b") is None
+    assert dedup.claim_key("a", "k1", "resp-x") == "resp-a"
+    dedup.release_key("a", "k1")
+    assert dedup.claim_key("a", "k1", "resp-y") is None
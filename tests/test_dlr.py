@@ -0,0 +1,122 @@
+"""Tests for delivery-receipt parsing and ingestion."""
+import base64
+import hashlib
+import hmac
+import pytest
+from fastapi.testclient import TestClient
+
+from sms_gateway import api
+from sms_gateway.dlr import DLRIngestor, DLRParseError, StatusEvent, parse
+from sms_gateway.send_queue import SendQueue
+from sms_gateway.signatures import ReceiptVerifier
+from sms_gateway.status import StatusStore, DELIVERED, SENT, UNDELIVERED
+
+def test_parse_twilio_form():
+    [event] = parse("twilio", {"MessageSid": "SM1", "MessageStatus": "delivered", "To": "+15550001"})
+    assert (event.provider, event.message_id, event.state, event.recipient) == ("twilio", "SM1", DELIVERED, "+15550001")
+
+def test_parse_telnyx_per_recipient():
+    payload = {"data": {"event_type": "message.finalized", "payload": {
+        "id": "tx-1",
+        "to": [{"phone_number": "+15550001", "status": "delivered"},
+               {"phone_number": "+15550002", "status": "delivery_failed"}],
+        "errors": [{"code": "40001", "title": "Not routable"}],
+    }}}
+    events = parse("telnyx", payload)
+    assert [(e.recipient, e.state) for e in events] == [("+15550001", DELIVERED), ("+15550002", UNDELIVERED)]
+    assert events[1].error == "Not routable"
+
+def test_parse_vonage_and_messagebird():
+    [vonage] = parse("vonage", {"messageId": "v-1", "msisdn": "15550001", "status": "expired", "err-code": "0"})
+    assert vonage.state == UNDELIVERED and vonage.error is None
+    [bird] = parse("messagebird", {"id": "mb-1", "recipient": "15550001", "status": "delivery_failed",
+                                   "statusErrorCode": "5"})
+    assert bird.state == UNDELIVERED and bird.error == "5"
+
+def test_parse_rejects_missing_id():
+    with pytest.raises(DLRParseError):
+        parse("twilio", {"MessageStatus": "delivered"})
+    with pytest.raises(KeyError):
+        parse("nope", {})
+
+def test_ingestor_applies_single_and_bulk_receipts():
+    store = StatusStore()
+    store.track("req-1")
+    store.update("req-1", SENT, provider="twilio", message_id="SM1")
+    store.track_bulk("bulk-1", 3)
+    for i, to in enumerate(["+15550001", "+15550002", "+15550003"]):
+        store.update("bulk-1", SENT, provider="aliyun", message_id="biz-9", index=i, recipient=to)
+    ingestor = DLRIngestor(store)
+    ingestor.submit([StatusEvent("twilio", "SM1", DELIVERED)])
+    ingestor.submit([StatusEvent("aliyun", "biz-9", DELIVERED, recipient="15550001"),
+                     StatusEvent("aliyun", "biz-9", UNDELIVERED, recipient="+15550003")])
+    assert ingestor.flush() == 3
+    assert store.get("req-1")["status"] == DELIVERED
+    assert store.get("bulk-1")["counts"] == {DELIVERED: 1, SENT: 1, UNDELIVERED: 1}
+
+def test_final_state_is_not_regressed():
+    store = StatusStore()
+    store.track("req-1")
+    store.update("req-1", SENT, provider="vonage", message_id="v-1")
+    store.apply_events([StatusEvent("vonage", "v-1", DELIVERED)])
+    store.apply_events([StatusEvent("vonage", "v-1", SENT)])
+    assert store.get("req-1")["status"] == DELIVERED
+
+def test_unmatched_receipts_are_retried_then_dropped():
+    store = StatusStore()
+    ingestor = DLRIngestor(store, orphan_ttl=60)
+    ingestor.submit([StatusEvent("twilio", "SM-early", DELIVERED)])
+    assert ingestor.flush() == 0
+    assert ingestor.stats["orphans"] == 1
+    store.track("req-1")
+    store.update("req-1", SENT, provider="twilio", message_id="SM-early")
+    assert ingestor.flush() == 1
+    assert store.get("req-1")["status"] == DELIVERED
+    ingestor.submit([StatusEvent("twilio", "SM-gone", DELIVERED, received_at=1.0)])
+    ingestor.flush()
+    assert ingestor.stats["orphans"] == 0 and ingestor.stats["unmatched"] == 1
+
+def test_ingestor_signals_overload():
+    ingestor = DLRIngestor(StatusStore(), max_pending=1)
+    assert ingestor.submit([StatusEvent("twilio", "SM1", DELIVERED)])
+    assert not ingestor.submit([StatusEvent("twilio", "SM2", DELIVERED)])
+    assert ingestor.stats["dropped"] == 1
+
+def test_persisted_index_resolves_after_restart(tmp_path):
+    path = str(tmp_path / "status.db")
+    store = StatusStore(path=path)
+    store.track("req-1")
+    store.update("req-1", SENT, provider="telnyx", message_id="tx-1")
+    store.close()
+    reopened = StatusStore(path=path)
+    assert reopened.apply_events([StatusEvent("telnyx", "tx-1", DELIVERED)]) == []
+    assert reopened.get("req-1")["status"] == DELIVERED
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "send_queue", SendQueue(str(tmp_path / "queue.db")))
+    with TestClient(api.app) as test_client:
+        yield test_client
+
+def test_dlr_webhook_endpoint(client, monkeypatch):
+    monkeypatch.setattr(api, "receipt_verifier", ReceiptVerifier({"twilio": "auth"}, {"vonage": "t0ken"}))
+    api.gateway.status.track("req-dlr")
+    api.gateway.status.update("req-dlr", SENT, provider="twilio", message_id="SM-api")
+    form = {"MessageSid": "SM-api", "MessageStatus": "delivered"}
+    data = "http://testserver/api/v1/dlr/twilio" + "".join(k + v for k, v in sorted(form.items()))
+    signature = base64.b64encode(hmac.new(b"auth", data.encode(), hashlib.sha1).digest()).decode()
+    assert client.post("/api/v1/dlr/twilio", data=form).status_code == 401
+    response = client.post("/api/v1/dlr/twilio", data=form, headers={"X-Twilio-Signature": signature})
+    assert response.status_code == 200
+    assert response.json() == {"accepted": 1}
+    params = {"messageId": "v-api", "status": "delivered"}
+    assert client.get("/api/v1/dlr/vonage", params=params).status_code == 401
+    assert client.get("/api/v1/dlr/vonage/wrong", params=params).status_code == 401
+    response = client.get("/api/v1/dlr/vonage/t0ken", params=params)
+    assert response.status_code == 200
+    assert client.post("/api/v1/dlr/aliyun", json=[]).status_code == 401
+    api.dlr_ingestor.flush()
+    assert api.gateway.status.get("req-dlr")["status"] == DELIVERED
+    assert client.post("/api/v1/dlr/unknown", json={}).status_code == 404
+    monkeypatch.setattr(api, "receipt_verifier", ReceiptVerifier(tokens={"messagebird": "t"}))
+    assert client.post("/api/v1/dlr/messagebird/t", json={"status": "delivered"}).status_code == 400
@@ -0,0 +1,89 @@
+"""Tests for GSM-7/UCS-2 classification and segment counting."""
+import pytest
+from sms_gateway import SMSGateway
+from sms_gateway.encoding import GSM7, UCS2, is_gsm7, segment_count, segment_info, split, transliterate
+from sms_gateway.ratelimit import Limit, RateLimitConfig, RateLimiter
+from sms_gateway.templates import NotificationTemplate
+from tests.test_gateway import MockProvider
+
+@pytest.mark.parametrize("text,encoding,units,segments", [
+    ("", GSM7, 0, 0),
+    ("a" * 160, GSM7, 160, 1),
+    ("a" * 161, GSM7, 161, 2),
+    ("a" * 306, GSM7, 306, 2),
+    ("a" * 307, GSM7, 307, 3),
+    ("€" * 80, GSM7, 160, 1),
+    ("€" * 81, GSM7, 162, 2),
+    ("é" * 70, GSM7, 70, 1),
+    ("ж" * 70, UCS2, 70, 1),
+    ("ж" * 71, UCS2, 71, 2),
+    ("ж" * 134, UCS2, 134, 2),
+    ("ж" * 135, UCS2, 135, 3),
+    ("😀" * 35, UCS2, 70, 1),
+])
+def test_segment_info(text, encoding, units, segments):
+    assert segment_info(text) == (encoding, units, segments)
+
+def test_one_unicode_char_switches_whole_message():
+    assert is_gsm7("Hello [world] ~ {ok}")
+    assert not is_gsm7("Hello 👋")
+    assert segment_count("a" * 100 + "ç") == 2
+
+def test_split_keeps_escape_pairs_together():
+    text = "a" * 152 + "€" + "b" * 10
+    parts = split(text)
+    assert parts == ["a" * 152, "€" + "b" * 10]
+    assert segment_count(text) == len(parts)
+
+def test_split_keeps_surrogate_pairs_together():
+    text = "x" * 66 + "😀" + "y" * 10
+    parts = split(text)
+    assert parts == ["x" * 66, "😀" + "y" * 10]
+    assert "".join(split("ж" * 200)) == "ж" * 200
+    assert split("short") == ["short"]
+
+def test_transliterate():
+    assert transliterate("It’s “quoted” — ok…") == 'It\'s "quoted" - ok...'
+    assert transliterate("façade naïve") == "faÇade naive"
+    assert transliterate("Привет") == "Привет"
+    assert transliterate("Привет", replacement="?") == "??????"
+    assert is_gsm7(transliterate("São Tomé"))
+
+def test_template_segments_use_rendered_text():
+    tpl = NotificationTemplate("t", "Привет {{name}}")
+    assert tpl.segment_count == 1
+    assert tpl.segments_for({"name": "ж" * 70}) == 2
+
+def test_number_limit_charged_per_segment():
+    limiter = RateLimiter(RateLimitConfig(per_number=[Limit(1, 3)]), clock=lambda: 0.0)
+    assert limiter.reserve(from_number="+1", segments=3) == 0.0
+    assert limiter.reserve(from_number="+1") == pytest.approx(1.0)
+    assert limiter.reserve(to="+2", segments=5) == 0.0
+
+@pytest.mark.asyncio
+async def test_gateway_bills_segments():
+    gw = SMSGateway()
+    gw.register_provider("mock", MockProvider(), primary=True)
+    result = await gw.send("+447700900000", "ж" * 100)
+    assert result.segments == 2
+    gw.router.record("mock", 0.1, True, "+447700900000", price=0.08, segments=2)
+    assert gw.router.estimate_cost("mock", "+447700900000", 3) == pytest.approx(0.12)
+
+def _reference_count(text, single, limit, wide):
+    if sum(2 if char in wide else 1 for char in text) <= single:
+        return 1
+    parts, used = 1, 0
+    for char in text:
+        size = 2 if char in wide else 1
+        if used + size > limit:
+            parts, used = parts + 1, 0
+        used += size
+    return parts
+
+@pytest.mark.parametrize("filler,wide_char,single,limit", [("a", "€", 160, 153), ("ж", "😀", 70, 67)])
+def test_segment_count_matches_greedy_split(filler, wide_char, single, limit):
+    for n in range(limit, 3 * limit):
+        for step in (3, 7, 50):
+            text = "".join(wide_char if i % step == 0 else filler for i in range(n))
+            expected = _reference_count(text, single, limit, {wide_char})
+            assert segment_count(text) == expected == len(split(text)), (n, step)
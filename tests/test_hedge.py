@@ -0,0 +1,102 @@
+"""Tests for hedged sends of latency-critical messages."""
+import asyncio
+import pytest
+from sms_gateway import SMSGateway
+from sms_gateway.gateway import GatewayConfig
+from sms_gateway.hedge import HedgeBudget, HedgeConfig
+from sms_gateway.providers.base import BaseProvider, SMSMessage, SMSResult
+from sms_gateway.routing import Router
+
+class SlowProvider(BaseProvider):
+    """Answers after ``delay`` seconds; remembers cancelled sends."""
+
+    def __init__(self, name, delay=0.0, success=True):
+        super().__init__(api_key=name)
+        self.name = name
+        self.delay = delay
+        self.success = success
+        self.calls = 0
+        self.cancelled = 0
+
+    async def send(self, message: SMSMessage) -> SMSResult:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if not self.success:
+            return SMSResult(success=False, provider=self.name, error="down", retryable=False)
+        return SMSResult(success=True, message_id=f"{self.name}-{self.calls}", provider=self.name)
+
+    async def get_status(self, message_id: str) -> str:
+        return "delivered"
+
+    async def get_balance(self) -> float:
+        return 0.0
+
+def hedging_gateway(primary, backup, **options):
+    hedging = HedgeConfig(enabled=True, min_priority=5, min_delay=0.01, max_delay=0.02, **options)
+    gw = SMSGateway(config=GatewayConfig(hedging=hedging))
+    gw.register_provider(primary.name, primary, primary=True)
+    gw.register_provider(backup.name, backup, priority=1)
+    return gw
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_cancelled():
+    primary, backup = SlowProvider("a", delay=1.0), SlowProvider("b")
+    gw = hedging_gateway(primary, backup)
+    result = await gw.send("+12025551234", "Your code is 1234", priority=9)
+    assert result.success and result.provider == "b"
+    assert primary.cancelled == 1 and backup.calls == 1
+    hedging = gw.stats["hedging"]
+    assert (hedging["eligible"], hedging["hedged"], hedging["hedge_won"]) == (1, 1, 1)
+    assert gw.stats["sent"] == 1
+    assert gw.stats["routing"]["a"]["outstanding"] == 0
+
+@pytest.mark.asyncio
+async def test_fast_primary_and_low_priority_are_not_hedged():
+    primary, backup = SlowProvider("a"), SlowProvider("b")
+    gw = hedging_gateway(primary, backup)
+    assert (await gw.send("+12025551234", "code", priority=9)).provider == "a"
+    slow = SlowProvider("c", delay=0.05)
+    gw = hedging_gateway(slow, SlowProvider("d"))
+    assert (await gw.send("+12025551234", "newsletter", priority=0)).provider == "c"
+    assert backup.calls == 0 and gw.stats["hedging"]["eligible"] == 0
+
+@pytest.mark.asyncio
+async def test_failed_primary_falls_over_to_backup():
+    primary, backup = SlowProvider("a", success=False), SlowProvider("b")
+    gw = hedging_gateway(primary, backup)
+    result = await gw.send("+12025551234", "code", hedge=True)
+    assert result.success and result.provider == "b"
+    assert gw.stats["hedging"]["hedged"] == 0
+
+@pytest.mark.asyncio
+async def test_budget_caps_hedge_rate():
+    primary, backup = SlowProvider("a", delay=0.05), SlowProvider("b")
+    gw = hedging_gateway(primary, backup, max_rate=0.5, burst=1.0)
+    for _ in range(4):
+        assert (await gw.send("+12025551234", "code", priority=9)).success
+    hedging = gw.stats["hedging"]
+    assert hedging["hedged"] == 2 and hedging["denied"] == 2
+    assert hedging["hedge_rate"] == 0.5
+
+def test_budget_refills_per_eligible_send():
+    budget = HedgeBudget(HedgeConfig(max_rate=0.25, burst=1.0))
+    spent = []
+    for _ in range(8):
+        budget.eligible()
+        spent.append(budget.try_hedge())
+    assert spent == [True, False, False, False, True, False, False, False]
+
+def test_latency_quantile_tracks_spread():
+    router = Router()
+    router.add_provider("a")
+    assert router.latency_quantile("a") is None
+    for latency in [0.1, 0.3] * 20:
+        router.record("a", latency, True)
+    assert router.samples("a") == 40
+    p95 = router.latency_quantile("a")
+    assert 0.3 < p95 < 0.45
+    assert router.latency_quantile("a", z=0.0) < p95
@@ -0,0 +1,88 @@
+"""Tests for the metrics registry and gateway instrumentation."""
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from sms_gateway import SMSGateway, api
+from sms_gateway.metrics import SEND_LATENCY, SENDS, Counter, Registry, merge_snapshots
+from sms_gateway.send_queue import SendQueue
+from tests.test_gateway import MockProvider
+
+def test_counter_shards_are_summed_on_scrape():
+    counter = Counter("jobs_total", "Jobs.", ["kind"])
+    barrier = threading.Barrier(4)
+
+    def work():
+        for _ in range(1000):
+            counter.inc("a")
+        barrier.wait()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    counter.inc("b", amount=2)
+    assert len(counter._shards) == 5
+    assert counter.collect() == {("a",): 4000, ("b",): 2}
+
+def test_render_text_format():
+    registry = Registry()
+    counter = registry.counter("sends_total", "Sends.", ["provider"])
+    histogram = registry.histogram("latency_seconds", "Latency.", ["provider"], buckets=(0.1, 1.0))
+    registry.gauge("depth", "Depth.", [], lambda: {(): 3})
+    registry.gauge("broken", "Broken.", [], lambda: 1 / 0)
+    counter.inc('we"ird')
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, "a")
+    assert registry.render().splitlines() == [
+        "# HELP sends_total Sends.",
+        "# TYPE sends_total counter",
+        'sends_total{provider="we\\"ird"} 1',
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{provider="a",le="0.1"} 1',
+        'latency_seconds_bucket{provider="a",le="1.0"} 2',
+        'latency_seconds_bucket{provider="a",le="+Inf"} 3',
+        'latency_seconds_sum{provider="a"} 5.55',
+        'latency_seconds_count{provider="a"} 3',
+        "# HELP depth Depth.",
+        "# TYPE depth gauge",
+        "depth 3",
+    ]
+    assert registry.counter("sends_total", "Again.") is counter
+
+def test_render_merged_snapshots():
+    registry = Registry()
+    counter = registry.counter("sends_total", "Sends.", ["provider"])
+    histogram = registry.histogram("latency_seconds", "Latency.", [], buckets=(1.0,))
+    registry.gauge("depth", "Depth.", [], lambda: {(): 3})
+    counter.inc("a")
+    histogram.observe(0.5)
+    other = {"sends_total": [[["a"], 2], [["b"], 1]], "latency_seconds": [[[], [0, 1, 2.0]]]}
+    merged = merge_snapshots([registry.snapshot(), other])
+    assert merged["sends_total"] == {("a",): 3, ("b",): 1}
+    assert merged["latency_seconds"] == {(): [1, 1, 2.5]}
+    lines = registry.render(merged).splitlines()
+    assert 'sends_total{provider="a"} 3' in lines
+    assert 'latency_seconds_count 2' in lines
+    assert "depth 3" in lines
+
+@pytest.mark.asyncio
+async def test_gateway_sends_are_instrumented():
+    gw = SMSGateway()
+    gw.register_provider("mock", MockProvider(), primary=True)
+    before = SENDS.value("mock", "success"), SEND_LATENCY.count("mock")
+    await gw.send("+12025551234", "Hello!")
+    await gw.send_bulk([{"to": "+12025551235", "message": "hi"}, {"to": "+12025551236", "message": "hi"}])
+    assert SENDS.value("mock", "success") == before[0] + 3
+    assert SEND_LATENCY.count("mock") >= before[1] + 2
+
+def test_metrics_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "send_queue", SendQueue(str(tmp_path / "queue.db")))
+    with TestClient(api.app) as client:
+        client.post("/api/v1/sms/send", json={"phone_number": "+8613812345678", "message": "Metrics"})
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'sms_queue_depth{priority="0"} 1' in response.text
+    assert "# TYPE sms_send_latency_seconds histogram" in response.text
@@ -0,0 +1,54 @@
+"""Tests for API middleware."""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from sms_gateway.middleware import RateLimitMiddleware, RequestLoggingMiddleware
+
+
+def make_client(max_requests):
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware, max_requests=max_requests, window_seconds=60)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return TestClient(app)
+
+
+class TestRateLimitMiddleware:
+    def test_allows_requests_under_limit(self):
+        client = make_client(max_requests=3)
+        assert all(client.get("/ping").status_code == 200 for _ in range(3))
+
+    def test_rejects_over_limit(self):
+        client = make_client(max_requests=2)
+        client.get("/ping")
+        client.get("/ping")
+        response = client.get("/ping")
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
+
+    def test_health_metrics_and_receipts_are_not_limited(self):
+        app = FastAPI()
+        app.add_middleware(RateLimitMiddleware, max_requests=1, window_seconds=60)
+        for path in ("/health", "/metrics", "/api/v1/dlr/aliyun/token"):
+            app.add_api_route(path, lambda: {"ok": True})
+        client = TestClient(app)
+        for path in ("/health", "/metrics", "/api/v1/dlr/aliyun/token"):
+            assert all(client.get(path).status_code == 200 for _ in range(3))
+
+
+class TestRequestLoggingMiddleware:
+    def test_logs_route_template_not_path(self, caplog):
+        app = FastAPI()
+        app.add_middleware(RequestLoggingMiddleware)
+
+        @app.post("/api/v1/dlr/{provider}/{token}")
+        async def receipt(provider: str, token: str):
+            return {"ok": True}
+
+        with caplog.at_level("INFO", logger="sms_gateway.middleware"):
+            assert TestClient(app).post("/api/v1/dlr/aliyun/s3cret-token").status_code == 200
+        assert "/api/v1/dlr/{provider}/{token}" in caplog.text
+        assert "s3cret-token" not in caplog.text
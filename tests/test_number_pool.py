@@ -40,4 +40,134 @@ async def test_reset_daily():
     
     pool.reset_daily_counts()
     result = await pool.assign_number("+12025552222")
-    assert result == "+14377846365"  # Should work after reset
\ No newline at end of file
+    assert result == "+14377846365"  # Should work after reset
+
+@pytest.mark.asyncio
+async def test_target_keeps_its_number():
+    pool = NumberPool(daily_limit=20)
+    pool.add_numbers_bulk([{"number": f"+1437784000{i}", "provider": "telnyx"} for i in range(3)])
+    first = await pool.assign_number("+12025551234")
+    assert await pool.assign_number("+12025551234") == first
+    assert pool.number_for("+12025551234") == first
+    assert pool.available_count == 2
+    await pool.release_number(first, cooldown=False)
+    assert pool.number_for("+12025551234") is None
+    assert pool.stats["available"] == 3
+
+@pytest.mark.asyncio
+async def test_least_used_number_first():
+    pool = NumberPool(daily_limit=20)
+    pool.add_number("+14377846365", "telnyx")
+    pool.add_number("+14377847068", "telnyx")
+    a = await pool.assign_number("+12025551111")
+    await pool.release_number(a, cooldown=False)
+    b = await pool.assign_number("+12025552222")
+    assert b != a
+
+@pytest.mark.asyncio
+async def test_assign_batch_by_provider():
+    pool = NumberPool(daily_limit=20)
+    pool.add_numbers_bulk(
+        [{"number": f"+1437784{i:04d}", "provider": "telnyx" if i % 2 else "twilio"} for i in range(10)]
+    )
+    targets = [f"+1202555{i:04d}" for i in range(8)]
+    assignments = await pool.assign_batch(targets, task_id="t1", provider="twilio")
+    assert len(assignments) == 5
+    assert len(set(assignments.values())) == 5
+    assert all(pool.get(n).provider == "twilio" for n in assignments.values())
+    assert pool.get(assignments[targets[0]]).assigned_task_id == "t1"
+    rest = await pool.assign_batch(targets[5:])
+    assert len(rest) == 3 and pool.available_count == 2
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+    
+    def __call__(self):
+        return self.now
+
+@pytest.mark.asyncio
+async def test_cooldown_expires_on_its_own():
+    clock = FakeClock()
+    pool = NumberPool(daily_limit=20, cooldown_hours=2, clock=clock)
+    pool.add_number("+14377846365", "telnyx")
+    number = await pool.assign_number("+12025551111")
+    await pool.release_number(number)
+    assert pool.available_count == 0
+    assert await pool.assign_number("+12025552222") is None
+    clock.now += 2 * 3600
+    assert pool.available_count == 1
+    assert await pool.assign_number("+12025552222") == number
+
+@pytest.mark.asyncio
+async def test_daily_count_rolls_over_lazily():
+    clock = FakeClock()
+    pool = NumberPool(daily_limit=1, cooldown_hours=0, clock=clock)
+    pool.add_number("+14377846365", "telnyx")
+    number = await pool.assign_number("+12025551111")
+    await pool.release_number(number)
+    assert await pool.assign_number("+12025552222") is None
+    clock.now += 86400
+    assert await pool.assign_number("+12025552222") == number
+    assert pool.get(number).daily_send_count == 1
+    assert pool.get(number).total_send_count == 2
+
+@pytest.mark.asyncio
+async def test_background_expiry():
+    clock = FakeClock()
+    pool = NumberPool(cooldown_hours=1, clock=clock)
+    pool.add_number("+14377846365", "telnyx")
+    await pool.release_number("+14377846365")
+    pool.start(interval=0.01)
+    clock.now += 3600
+    await asyncio.sleep(0.05)
+    await pool.stop()
+    assert pool._status_counts[NumberStatus.AVAILABLE] == 1
+
+@pytest.mark.asyncio
+async def test_state_survives_restart(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "pool.snap")
+    pool = NumberPool(daily_limit=5, cooldown_hours=1, clock=clock, path=path)
+    pool.load()
+    pool.add_numbers_bulk([{"number": f"+1437784000{i}", "provider": "telnyx"} for i in range(3)])
+    pool.snapshot()
+    first = await pool.assign_number("+12025551111", task_id="t1")
+    second = await pool.assign_number("+12025552222")
+    await pool.release_number(second)
+    # No close(): the changes since the snapshot come back from the log.
+    restored = NumberPool(daily_limit=5, cooldown_hours=1, clock=clock, path=path)
+    assert restored.load() == 3
+    assert restored.number_for("+12025551111") == first
+    assert restored.get(first).assigned_task_id == "t1"
+    assert restored.get(first).daily_send_count == 1
+    assert restored.stats["cooldown"] == 1
+    clock.now += 3600
+    assert restored.available_count == 2
+    restored.close()
+    again = NumberPool(daily_limit=5, cooldown_hours=1, clock=clock, path=path)
+    assert again.load() == 3
+    assert again.get(second).total_send_count == 1
+    assert again.available_count == 2
+
+def test_truncated_log_record_is_ignored(tmp_path):
+    path = str(tmp_path / "pool.snap")
+    pool = NumberPool(path=path)
+    pool.add_number("+14377846365", "telnyx")
+    pool.add_number("+14377847068", "telnyx")
+    with open(path + ".log", "r+b") as f:
+        f.truncate(f.seek(0, 2) - 3)
+    restored = NumberPool(path=path)
+    assert restored.load() == 1
+
+def test_streaming_import(tmp_path):
+    csv_path = tmp_path / "numbers.csv"
+    csv_path.write_text("number,provider\n+14377846365,telnyx\n+14377847068,\n")
+    jsonl_path = tmp_path / "numbers.jsonl"
+    jsonl_path.write_text('{"number": "+14377840001", "provider": "twilio"}\n\n')
+    pool = NumberPool()
+    assert pool.add_numbers_bulk(csv_path, provider="vonage") == 2
+    assert pool.add_numbers_bulk(str(jsonl_path)) == 1
+    assert pool.get("+14377847068").provider == "vonage"
+    assert pool.get("+14377840001").provider == "twilio"
+    assert pool.available_count == 3
@@ -0,0 +1,138 @@
+"""Tests for provider HTTP client lifecycle."""
+import pytest
+import httpx
+from sms_gateway import SMSGateway
+from sms_gateway.config import ProviderConfig
+from sms_gateway.providers import TwilioProvider, TelnyxProvider, MessageBirdProvider
+from sms_gateway.providers.base import SMSMessage, SMSResult
+
+def make_transport(requests):
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(201, json={"sid": "SM123", "status": "queued", "price": "-0.0075"})
+    return httpx.MockTransport(handler)
+
+@pytest.mark.asyncio
+async def test_client_is_reused_across_sends():
+    requests = []
+    provider = TwilioProvider("AC123", "token", transport=make_transport(requests))
+    await provider.send(SMSMessage(to="+12025551234", body="one"))
+    client = provider.client
+    await provider.send(SMSMessage(to="+12025551234", body="two"))
+    assert provider.client is client
+    assert len(requests) == 2
+    assert requests[0].url.path == "/2010-04-01/Accounts/AC123/Messages.json"
+    assert requests[0].headers["Authorization"].startswith("Basic ")
+    await provider.aclose()
+    assert not provider.is_open
+
+@pytest.mark.asyncio
+async def test_configure_applies_timeout_and_options():
+    provider = TelnyxProvider(api_key="key")
+    provider.configure(ProviderConfig(name="telnyx", timeout=5, options={"max_connections": 7}))
+    options = provider._client_options()
+    assert options["timeout"].read == 5
+    assert options["limits"].max_connections == 7
+
+@pytest.mark.asyncio
+async def test_gateway_lifecycle_opens_and_closes_pools():
+    requests = []
+    provider = TwilioProvider("AC123", "token", transport=make_transport(requests))
+    gw = SMSGateway()
+    gw.register_provider("twilio", provider, primary=True)
+    async with gw:
+        assert provider.is_open
+        result = await gw.send("+12025551234", "Hello!")
+        assert result.success
+    assert not provider.is_open
+
+@pytest.mark.asyncio
+async def test_messagebird_batch_uses_one_request():
+    requests = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(201, json={
+            "id": "mb-1",
+            "recipients": {"items": [
+                {"recipient": 12025550001, "status": "sent"},
+                {"recipient": 12025550002, "status": "failed"},
+            ]},
+        })
+    
+    provider = MessageBirdProvider(api_key="key", transport=httpx.MockTransport(handler))
+    messages = [SMSMessage(to=f"+1202555000{i}", body="alert") for i in (1, 2)]
+    results = await provider.send_batch(messages)
+    assert len(requests) == 1
+    assert [r.success for r in results] == [True, False]
+    assert results[0].message_id == "mb-1"
+    with pytest.raises(ValueError):
+        await provider.send_batch([SMSMessage(to="+1", body="a"), SMSMessage(to="+2", body="b")])
+
+def test_result_records_are_slotted():
+    import sys
+    from datetime import datetime, timedelta, timezone
+    result = SMSResult(success=True, status="".join(["que", "ued"]))
+    assert not hasattr(result, "__dict__")
+    assert result.status is sys.intern("queued")
+    assert abs((datetime.now(timezone.utc).replace(tzinfo=None) - result.timestamp).total_seconds()) < 5
+    assert SMSResult(success=True, timestamp=datetime(2024, 1, 1)).created == 1704067200.0
+    aware = datetime(2024, 1, 1, 8, tzinfo=timezone(timedelta(hours=8)))
+    assert SMSResult(success=True, timestamp=aware).timestamp == datetime(2024, 1, 1)
+    assert SMSResult(success=False, status=None).status == "unknown"
+    assert SMSMessage(to="+1", body="hi") == SMSMessage(to="+1", body="hi")
+
+
+def _reference_signature(secret, params):
+    from urllib.parse import quote
+    import base64, hashlib, hmac
+    enc = lambda v: quote(v, safe="~")
+    query = "&".join(f"{enc(k)}={enc(v)}" for k, v in sorted(params.items()))
+    digest = hmac.new(f"{secret}&".encode(), f"GET&%2F&{enc(query)}".encode(), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode()
+
+def aliyun_transport(requests, code="OK"):
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json={"Code": code, "Message": "OK" if code == "OK" else "bad", "BizId": "biz-1"})
+    return httpx.MockTransport(handler)
+
+@pytest.mark.asyncio
+async def test_aliyun_send_is_signed():
+    from urllib.parse import parse_qsl
+    from sms_gateway import AliyunProvider
+    requests = []
+    provider = AliyunProvider("key-id", "secret", sign_name="Acme", template_code="SMS_1",
+                              transport=aliyun_transport(requests))
+    result = await provider.send(SMSMessage(to="13800000000", body="验证码 1234 *~"))
+    assert result.success and result.message_id == "biz-1" and result.status == "sent"
+    params = dict(parse_qsl(requests[0].url.query.decode()))
+    signature = params.pop("Signature")
+    assert params["Action"] == "SendSms" and params["PhoneNumbers"] == "13800000000"
+    assert signature == _reference_signature("secret", params)
+
+@pytest.mark.asyncio
+async def test_aliyun_batch_and_gateway_registration():
+    from urllib.parse import parse_qsl
+    from sms_gateway import AliyunProvider
+    requests = []
+    provider = AliyunProvider("key-id", "secret", transport=aliyun_transport(requests))
+    gw = SMSGateway()
+    gw.register_provider("aliyun", provider, primary=True)
+    results = await gw.send_bulk([{"to": f"1380000{i:04d}", "message": "hi"} for i in range(5)])
+    assert results.succeeded == 5
+    assert len(requests) == 1
+    assert dict(parse_qsl(requests[0].url.query.decode()))["PhoneNumbers"].count(",") == 4
+    failing = AliyunProvider("key-id", "secret", transport=aliyun_transport([], code="isv.BUSINESS_LIMIT_CONTROL"))
+    result = await failing.send(SMSMessage(to="13800000000", body="hi"))
+    assert not result.success and result.error.startswith("isv.BUSINESS_LIMIT_CONTROL")
+    await gw.aclose()
+
+def test_delivery_status_normalize():
+    from sms_gateway import DeliveryStatus
+    assert DeliveryStatus.normalize("DELIVERED") is DeliveryStatus.DELIVERED
+    assert DeliveryStatus.normalize("delivery_failed") is DeliveryStatus.UNDELIVERED
+    assert DeliveryStatus.normalize("submitted") is DeliveryStatus.SENT
+    assert DeliveryStatus.normalize("weird") is DeliveryStatus.UNKNOWN
+    assert DeliveryStatus.normalize(None) is DeliveryStatus.UNKNOWN
+    assert SMSResult(success=True, status=DeliveryStatus.SENT).status == "sent"
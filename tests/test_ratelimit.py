@@ -0,0 +1,122 @@
+"""Tests for the token-bucket rate limiting engine."""
+import pytest
+from sms_gateway import SMSGateway
+from sms_gateway.ratelimit import (
+    Limit, RateLimitConfig, RateLimiter, RateLimitExceeded, InMemorySlidingWindow,
+)
+from tests.test_gateway import MockProvider
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+def test_load_default_toml():
+    config = RateLimitConfig.from_toml()
+    assert config.global_limits[0] == Limit(100, 50)
+    assert len(config.per_number) == 3
+    assert config.per_destination[0] == Limit(5 / 3600, 5)
+    assert config.max_delay == 900
+
+def test_burst_then_delay():
+    clock = FakeClock()
+    limiter = RateLimiter(RateLimitConfig(global_limits=[Limit(10, 5)]), clock=clock)
+    waits = [limiter.reserve() for _ in range(7)]
+    assert waits[:5] == [0.0] * 5
+    assert waits[5] == pytest.approx(0.1)
+    assert waits[6] == pytest.approx(0.2)
+    clock.now += 1.0
+    assert limiter.reserve() == 0.0
+
+def test_levels_are_independent_per_key():
+    clock = FakeClock()
+    config = RateLimitConfig(per_destination=[Limit.per_period(1, 60)])
+    limiter = RateLimiter(config, clock=clock)
+    assert limiter.reserve(to="+12025550001") == 0.0
+    assert limiter.reserve(to="+12025550002") == 0.0
+    assert limiter.reserve(to="+12025550001") == pytest.approx(60.0)
+
+def test_max_delay_rejects_without_consuming():
+    clock = FakeClock()
+    config = RateLimitConfig(per_number=[Limit.per_period(1, 3600)], max_delay=10)
+    limiter = RateLimiter(config, clock=clock)
+    limiter.reserve(from_number="+14377846365")
+    with pytest.raises(RateLimitExceeded):
+        limiter.reserve(from_number="+14377846365")
+    assert limiter.stats["rejected"] == 1
+    clock.now += 3600
+    assert limiter.reserve(from_number="+14377846365") == 0.0
+
+def test_reserve_many_is_all_or_nothing():
+    clock = FakeClock()
+    config = RateLimitConfig(per_number=[Limit.per_period(3, 3600)], max_delay=10)
+    limiter = RateLimiter(config, clock=clock)
+    batch = [{"to": f"+1202555000{i}", "from_number": "+14377846365"} for i in range(4)]
+    with pytest.raises(RateLimitExceeded):
+        limiter.reserve_many(batch)
+    assert limiter.reserve_many(batch[:3]) == 0.0
+    with pytest.raises(RateLimitExceeded):
+        limiter.reserve(from_number="+14377846365")
+
+def test_sweep_forgets_idle_keys():
+    clock = FakeClock()
+    limiter = RateLimiter(RateLimitConfig(per_destination=[Limit(1, 1)]), clock=clock)
+    limiter.reserve(to="+12025550001")
+    assert limiter.sweep() == 0
+    clock.now += 2
+    assert limiter.sweep() == 1
+
+@pytest.mark.asyncio
+async def test_gateway_fails_over_when_provider_limit_exceeded():
+    config = RateLimitConfig(provider_overrides={"slow": [Limit.per_period(1, 3600)]}, max_delay=1)
+    gw = SMSGateway(rate_limiter=RateLimiter(config))
+    slow, fast = MockProvider(), MockProvider()
+    gw.register_provider("slow", slow, primary=True)
+    gw.register_provider("fast", fast)
+    await gw.send("+12025551234", "one")
+    await gw.send("+12025551234", "two")
+    assert len(slow.sent_messages) == 1
+    assert len(fast.sent_messages) == 1
+
+@pytest.mark.asyncio
+async def test_queued_send_defers_long_waits_instead_of_sleeping():
+    config = RateLimitConfig(per_destination=[Limit.per_period(1, 600)], max_delay=900)
+    limiter = RateLimiter(config)
+    gw = SMSGateway(rate_limiter=limiter)
+    provider = MockProvider()
+    gw.register_provider("mock", provider, primary=True)
+    gw.status.track("req-2")
+    assert (await gw.send("+12025551234", "one", attempt=1)).success
+    acquired = limiter.stats["acquired"]
+    result = await gw.send("+12025551234", "two", request_id="req-2", attempt=1)
+    assert not result.success and result.retryable
+    assert 590 < result.retry_after <= 600
+    assert gw.retry_delay(result, 1) >= result.retry_after
+    assert gw.status.get("req-2")["status"] == "queued"
+    assert limiter.stats["deferred"] == 1
+    assert limiter.stats["acquired"] == acquired
+    assert len(provider.sent_messages) == 1
+
+def test_sliding_window_limits_and_recovers():
+    clock = FakeClock()
+    clock.now = 600.0
+    window = InMemorySlidingWindow(clock=clock)
+    assert all(window.check("10.0.0.1", 3, 60) for _ in range(3))
+    assert not window.check("10.0.0.1", 3, 60)
+    assert window.check("10.0.0.2", 3, 60)
+    # Halfway into the next window half of the previous count still applies.
+    clock.now = 690.0
+    assert window.check("10.0.0.1", 3, 60)
+    assert window.check("10.0.0.1", 3, 60)
+    assert not window.check("10.0.0.1", 3, 60)
+
+def test_sliding_window_evicts_idle_keys():
+    clock = FakeClock()
+    window = InMemorySlidingWindow(clock=clock)
+    for i in range(100):
+        window.check(f"10.0.{i}.1", 10, 60)
+    clock.now += 180
+    window.check("10.1.0.1", 10, 60)
+    assert len(window) == 1
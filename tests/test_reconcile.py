@@ -0,0 +1,154 @@
+"""Tests for the status reconciliation poller."""
+import httpx
+import pytest
+from sms_gateway import SMSGateway
+from sms_gateway.providers import TwilioProvider, VonageProvider
+from sms_gateway.reconcile import StatusReconciler
+from sms_gateway.status import StatusStore, DELIVERED, SENT
+from tests.test_gateway import MockProvider
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class ListProvider(MockProvider):
+    STATUS_BATCH_SIZE = 100
+
+    def __init__(self, statuses):
+        super().__init__()
+        self.statuses = statuses
+        self.list_calls = []
+        self.single_calls = []
+
+    async def get_statuses(self, message_ids, since=None):
+        self.list_calls.append(list(message_ids))
+        return {mid: self.statuses[mid] for mid in message_ids if mid in self.statuses and not mid.startswith("old")}
+
+    async def get_status(self, message_id):
+        self.single_calls.append(message_id)
+        return self.statuses.get(message_id, "error")
+
+def tracked_store(ids, provider="list"):
+    store = StatusStore()
+    for mid in ids:
+        store.track(f"req-{mid}")
+        store.update(f"req-{mid}", SENT, provider=provider, message_id=mid)
+    return store
+
+@pytest.mark.asyncio
+async def test_messages_are_coalesced_per_provider():
+    ids = [f"m{i}" for i in range(250)]
+    provider = ListProvider({mid: "delivered" for mid in ids})
+    store = tracked_store(ids)
+    clock = FakeClock()
+    reconciler = StatusReconciler(store, {"list": provider}, clock=clock)
+    for mid in ids:
+        reconciler.track("list", mid, sent_at=clock.now)
+    assert await reconciler.reconcile_once() == 0
+    clock.now += 60
+    assert await reconciler.reconcile_once() == 250
+    assert [len(call) for call in provider.list_calls] == [100, 100, 50]
+    assert store.get("req-m7")["status"] == DELIVERED
+    assert len(reconciler) == 0
+
+@pytest.mark.asyncio
+async def test_interval_grows_with_age():
+    provider = ListProvider({"m1": "sent"})
+    store = tracked_store(["m1"])
+    clock = FakeClock()
+    reconciler = StatusReconciler(store, {"list": provider}, first_check=60, max_interval=600, clock=clock)
+    reconciler.track("list", "m1", sent_at=clock.now)
+    polled_at = []
+    for _ in range(2000):
+        clock.now += 10
+        calls = len(provider.list_calls)
+        await reconciler.reconcile_once()
+        if len(provider.list_calls) > calls:
+            polled_at.append(clock.now - 1_000_000.0)
+    assert polled_at[:4] == [60, 120, 240, 480]
+    assert polled_at[5] - polled_at[4] == 600
+
+@pytest.mark.asyncio
+async def test_final_messages_are_not_polled():
+    provider = ListProvider({"m1": "delivered"})
+    store = tracked_store(["m1"])
+    clock = FakeClock()
+    reconciler = StatusReconciler(store, {"list": provider}, clock=clock)
+    reconciler.track("list", "m1", sent_at=clock.now)
+    store.update("req-m1", DELIVERED)
+    clock.now += 60
+    await reconciler.reconcile_once()
+    assert provider.list_calls == []
+    assert reconciler.stats["settled"] == 1
+
+@pytest.mark.asyncio
+async def test_list_miss_falls_back_to_direct_lookup():
+    provider = ListProvider({"old1": "delivered"})
+    store = tracked_store(["old1"])
+    clock = FakeClock()
+    reconciler = StatusReconciler(store, {"list": provider}, clock=clock)
+    reconciler.track("list", "old1", sent_at=clock.now)
+    clock.now += 60
+    await reconciler.reconcile_once()
+    assert provider.single_calls == []
+    await reconciler.reconcile_once()
+    assert provider.single_calls == ["old1"]
+    assert store.get("req-old1")["status"] == DELIVERED
+
+@pytest.mark.asyncio
+async def test_gateway_tracks_sent_messages():
+    gw = SMSGateway()
+    gw.register_provider("mock", MockProvider(), primary=True)
+    clock = FakeClock()
+    reconciler = gw.enable_reconciliation(clock=clock)
+    gw.status.track("req-1")
+    await gw.send("+12025551234", "Hello!", request_id="req-1")
+    assert len(reconciler) == 1
+    clock.now += 1e12
+    reconciler.max_age = 1e13
+    assert await reconciler.reconcile_once() == 1
+    assert gw.get_status("req-1")["status"] == DELIVERED
+
+@pytest.mark.asyncio
+async def test_twilio_get_statuses_pages_the_message_list():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if "PageToken" in str(request.url):
+            return httpx.Response(200, json={"messages": [{"sid": "SM2", "status": "undelivered"}],
+                                             "next_page_uri": None})
+        return httpx.Response(200, json={
+            "messages": [{"sid": "SM1", "status": "delivered"}, {"sid": "SMx", "status": "sent"}],
+            "next_page_uri": "/2010-04-01/Accounts/AC1/Messages.json?PageSize=1000&PageToken=PA1",
+        })
+
+    provider = TwilioProvider("AC1", "token", transport=httpx.MockTransport(handler))
+    statuses = await provider.get_statuses(["SM1", "SM2"], since=1_700_000_000.0)
+    assert statuses == {"SM1": "delivered", "SM2": "undelivered"}
+    assert len(requests) == 2
+    assert requests[0].url.params["DateSent>"] == "2023-11-13"
+    assert requests[1].url.path == "/2010-04-01/Accounts/AC1/Messages.json"
+
+@pytest.mark.asyncio
+async def test_providers_without_status_api_are_not_tracked():
+    reconciler = StatusReconciler(StatusStore(), {"vonage": VonageProvider("key", "secret")})
+    reconciler.track("vonage", "m1")
+    assert len(reconciler) == 0
+    assert reconciler.stats["unsupported"] == 1
+
+@pytest.mark.asyncio
+async def test_unknown_status_does_not_overwrite_sent():
+    provider = ListProvider({"m1": "unknown"})
+    provider.STATUS_BATCH_SIZE = 1
+    store = tracked_store(["m1"])
+    clock = FakeClock()
+    reconciler = StatusReconciler(store, {"list": provider}, clock=clock)
+    reconciler.track("list", "m1", sent_at=clock.now)
+    clock.now += 60
+    assert await reconciler.reconcile_once() == 0
+    assert store.get("req-m1")["status"] == SENT
+    assert len(reconciler) == 1
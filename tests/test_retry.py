@@ -0,0 +1,137 @@
+"""Tests for retry classification, backoff and delayed resends."""
+import asyncio
+import httpx
+import pytest
+from sms_gateway import SMSGateway
+from sms_gateway.circuit import BreakerConfig
+from sms_gateway.gateway import GatewayConfig
+from sms_gateway.providers import TwilioProvider, VonageProvider
+from sms_gateway.providers.base import BaseProvider, SMSMessage, SMSResult
+from sms_gateway.retry import RetryPolicy, parse_retry_after
+from sms_gateway.send_queue import SendQueue, QueueConsumer
+from sms_gateway.status import FAILED, QUEUED, SENT
+
+class FlakyProvider(BaseProvider):
+    """Fails the first ``failures`` sends with the given classification."""
+
+    def __init__(self, failures=2, retryable=True, retry_after=None):
+        super().__init__(api_key="flaky")
+        self.failures = failures
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.calls = 0
+
+    async def send(self, message: SMSMessage) -> SMSResult:
+        self.calls += 1
+        if self.calls <= self.failures:
+            return SMSResult(success=False, provider="flaky", error="busy", status_code=503,
+                             retryable=self.retryable, retry_after=self.retry_after)
+        return SMSResult(success=True, message_id=f"f-{self.calls}", provider="flaky")
+
+    async def get_status(self, message_id: str) -> str:
+        return "delivered"
+
+    async def get_balance(self) -> float:
+        return 0.0
+
+def fast_policy(**kwargs):
+    return RetryPolicy(backoff_base=0.001, backoff_max=0.005, **kwargs)
+
+def test_parse_retry_after():
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:10 GMT", now=1445412480.0) == 10.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+def test_policy_from_toml_and_jitter_bounds():
+    policy = RetryPolicy.from_toml()
+    assert (policy.max_retries, policy.backoff_base, policy.backoff_max) == (3, 2.0, 60.0)
+    previous = None
+    for attempt in range(1, 20):
+        previous = policy.backoff(attempt, previous)
+        assert 2.0 <= previous <= 60.0
+    assert policy.backoff(1, 10.0, rng=lambda lo, hi: hi) == 30.0
+    assert policy.backoff(1, 50.0, rng=lambda lo, hi: hi) == 60.0
+    failed = SMSResult(success=False, retryable=True, retry_after=90.0)
+    assert policy.delay(failed, 1) == 90.0
+    assert policy.delay(failed, 4) is None
+    assert policy.delay(SMSResult(success=False, retryable=False), 1) is None
+
+@pytest.mark.asyncio
+async def test_provider_failures_are_classified():
+    def twilio(request):
+        if b"Body=throttle" in request.content:
+            return httpx.Response(429, headers={"Retry-After": "5"}, json={"code": 20429})
+        return httpx.Response(400, json={"code": 21211, "message": "Invalid 'To' Phone Number"})
+
+    provider = TwilioProvider("AC1", "token", transport=httpx.MockTransport(twilio))
+    throttled = await provider.send(SMSMessage(to="+12025550001", body="throttle"))
+    assert (throttled.status_code, throttled.retryable, throttled.retry_after) == (429, True, 5.0)
+    invalid = await provider.send(SMSMessage(to="+1", body="hello"))
+    assert (invalid.status_code, invalid.retryable) == (400, False)
+
+    def vonage(request):
+        return httpx.Response(200, json={"messages": [{"status": "1", "error-text": "Throttled"}]})
+
+    vonage_provider = VonageProvider("key", "secret", transport=httpx.MockTransport(vonage))
+    result = await vonage_provider.send(SMSMessage(to="+12025550001", body="hi"))
+    assert result.retryable is True and not result.success
+
+@pytest.mark.asyncio
+async def test_send_retries_transient_failures():
+    gw = SMSGateway(retry_policy=fast_policy())
+    provider = FlakyProvider(failures=2)
+    gw.register_provider("flaky", provider, primary=True)
+    gw.status.track("req-1")
+    result = await gw.send("+12025551234", "Hello!", request_id="req-1")
+    assert result.success and provider.calls == 3
+    assert gw.stats["retried"] == 2 and gw.stats["failed"] == 0
+    history = [h["status"] for h in gw.get_status("req-1")["history"]]
+    assert history == [QUEUED, "sending", QUEUED, "sending", QUEUED, "sending", SENT]
+
+@pytest.mark.asyncio
+async def test_permanent_failures_are_not_retried_or_held_against_provider():
+    config = GatewayConfig(circuit_breaker=BreakerConfig(min_requests=2))
+    gw = SMSGateway(config=config, retry_policy=fast_policy())
+    provider = FlakyProvider(failures=10, retryable=False)
+    gw.register_provider("flaky", provider, primary=True)
+    for _ in range(3):
+        result = await gw.send("+12025551234", "Hello!")
+        assert not result.success and result.retryable is False
+    assert provider.calls == 3
+    assert gw.stats["failed"] == 3 and gw.stats["retried"] == 0
+    assert gw.stats["breakers"]["flaky"]["state"] == "closed"
+
+@pytest.mark.asyncio
+async def test_bulk_retries_go_through_delay_queue():
+    gw = SMSGateway(retry_policy=fast_policy(max_retries=1))
+    provider = FlakyProvider(failures=3)
+    gw.register_provider("flaky", provider, primary=True)
+    messages = [{"to": f"+1202555{i:04d}", "message": f"m{i}"} for i in range(6)]
+    results = await gw.send_bulk(messages, concurrency=2)
+    assert results.succeeded == 6
+    assert provider.calls == 9
+    assert gw.stats["retried"] == 3
+
+@pytest.mark.asyncio
+async def test_consumer_requeues_retryable_failures(tmp_path):
+    gw = SMSGateway(retry_policy=fast_policy())
+    provider = FlakyProvider(failures=1, retry_after=0.05)
+    gw.register_provider("flaky", provider, primary=True)
+    queue = SendQueue(str(tmp_path / "q.db"))
+    await queue.open()
+    await queue.enqueue("+12025550001", "hello", request_id="req-q")
+    gw.status.track("req-q")
+    consumer = QueueConsumer(queue, gw, concurrency=2, poll_interval=0.01)
+    await consumer.start()
+    for _ in range(200):
+        if queue.depth == 0:
+            break
+        await asyncio.sleep(0.01)
+    await consumer.stop()
+    await queue.close()
+    assert provider.calls == 2
+    assert consumer.stats["retried"] == 1
+    assert gw.get_status("req-q")["status"] == SENT
+    history = [h["status"] for h in gw.get_status("req-q")["history"]]
+    assert QUEUED in history[1:] and FAILED not in history
@@ -0,0 +1,109 @@
+"""Tests for the provider routing engine."""
+import asyncio
+import random
+import pytest
+from sms_gateway import SMSGateway
+from sms_gateway.gateway import GatewayConfig
+from sms_gateway.routing import Router, RoutingPolicy, country_code
+from tests.test_gateway import MockProvider
+
+class SlowProvider(MockProvider):
+    async def send(self, message):
+        await asyncio.sleep(0.01)
+        return await super().send(message)
+
+def make_router(policy, **kwargs):
+    router = Router(policy, rebuild_interval=0, **kwargs)
+    router.add_provider("a", primary=True)
+    router.add_provider("b", priority=5)
+    router.add_provider("c", priority=1)
+    return router
+
+def test_country_code():
+    assert country_code("+12025551234") == "1"
+    assert country_code("+447700900123") == "44"
+    assert country_code("+8613812345678") == "86"
+    assert country_code("+353861234567") == "353"
+
+def test_priority_policy_keeps_primary_first():
+    router = make_router(RoutingPolicy.PRIORITY)
+    assert router.order("+12025551234") == ["a", "b", "c"]
+    assert router.order("+12025551234", preferred="c") == ["c", "a", "b"]
+
+def test_cheapest_policy_uses_country_prices():
+    router = make_router(RoutingPolicy.CHEAPEST)
+    router.set_price("a", "*", 0.05)
+    router.set_price("b", "44", 0.01)
+    router.set_price("c", "*", 0.02)
+    assert router.order("+447700900123")[0] == "b"
+    assert router.order("+12025551234")[0] == "c"
+
+def test_fastest_policy_tracks_latency_and_success():
+    router = make_router(RoutingPolicy.FASTEST)
+    for _ in range(5):
+        router.record("a", 0.5, True)
+        router.record("b", 0.1, True)
+        router.record("c", 0.05, False)
+    assert router.order()[0] == "b"
+
+def test_weighted_policy_prefers_faster_provider():
+    router = make_router(RoutingPolicy.WEIGHTED, rng=random.Random(1))
+    router.record("a", 0.1, True)
+    router.record("b", 1.0, True)
+    router.record("c", 1.0, True)
+    firsts = [router.order()[0] for _ in range(1000)]
+    assert firsts.count("a") > 700
+
+def test_spread_picks_least_outstanding():
+    router = make_router(RoutingPolicy.FASTEST)
+    router.begin("a")
+    router.begin("b")
+    assert router.order(spread=True) == ["c", "a", "b"]
+    router.end("a")
+    assert router.order(spread=True)[0] == "a"
+
+def test_spread_keeps_priority_and_cheapest_rankings():
+    router = make_router(RoutingPolicy.PRIORITY)
+    router.begin("a")
+    assert router.order(spread=True)[0] == "a"
+    router = Router(RoutingPolicy.PRIORITY, rebuild_interval=0)
+    router.add_provider("x", priority=5)
+    router.add_provider("y", priority=5)
+    router.add_provider("z")
+    router.begin("x")
+    assert router.order(spread=True) == ["y", "x", "z"]
+
+    router = make_router(RoutingPolicy.CHEAPEST)
+    router.set_price("a", "*", 0.05)
+    router.set_price("b", "44", 0.01)
+    router.set_price("c", "44", 0.01)
+    router.begin("b")
+    router.begin("c")
+    router.begin("c")
+    assert router.order("+447700900123", spread=True) == ["b", "c", "a"]
+    router.set_price("b", "44", 0.005)
+    router.begin("b")
+    router.begin("b")
+    assert router.order("+447700900123", spread=True)[0] == "b"
+
+@pytest.mark.asyncio
+async def test_gateway_bulk_spreads_across_providers():
+    gw = SMSGateway(GatewayConfig(routing_policy="fastest"))
+    first, second = SlowProvider(), SlowProvider()
+    gw.register_provider("first", first, primary=True)
+    gw.register_provider("second", second)
+    messages = [{"to": f"+1202555{i:04d}", "message": "hi"} for i in range(20)]
+    await gw.send_bulk(messages, concurrency=10)
+    assert len(first.sent_messages) + len(second.sent_messages) == 20
+    assert len(second.sent_messages) >= 5
+
+@pytest.mark.asyncio
+async def test_gateway_bulk_keeps_cheapest_ordering():
+    gw = SMSGateway(GatewayConfig(routing_policy="cheapest"))
+    pricey, cheap = SlowProvider(), SlowProvider()
+    gw.register_provider("pricey", pricey, primary=True, prices={"*": 0.05})
+    gw.register_provider("cheap", cheap, prices={"*": 0.01})
+    messages = [{"to": f"+1202555{i:04d}", "message": f"hi {i}"} for i in range(20)]
+    await gw.send_bulk(messages, concurrency=10)
+    assert len(cheap.sent_messages) == 20
+    assert pricey.sent_messages == []
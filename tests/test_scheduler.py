@@ -0,0 +1,65 @@
+"""Tests for weighted fair scheduling of queued sends."""
+import asyncio
+import pytest
+from sms_gateway.scheduler import FairScheduler, level_weight
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.mark.asyncio
+async def test_new_flow_jumps_backlog():
+    scheduler = FairScheduler()
+    for i in range(100):
+        scheduler.put_nowait(f"bulk-{i}", priority=0, client_id="a", cost=50)
+    assert await scheduler.get() == "bulk-0"
+    scheduler.put_nowait("otp", priority=9, client_id="b")
+    assert await scheduler.get() == "otp"
+    assert await scheduler.get() == "bulk-1"
+    assert scheduler.qsize() == 98 * 50
+
+@pytest.mark.asyncio
+async def test_backlogged_flows_share_by_weight():
+    scheduler = FairScheduler()
+    for i in range(100):
+        scheduler.put_nowait(("low", i), priority=0)
+        scheduler.put_nowait(("high", i), priority=1)
+        scheduler.put_nowait(("other", i), priority=1, client_id="other")
+    served = [(await scheduler.get())[0] for _ in range(50)]
+    assert abs(served.count("high") - 2 * served.count("low")) <= 2
+    assert abs(served.count("high") - served.count("other")) <= 1
+    assert level_weight(9) == 10 * level_weight(0)
+
+@pytest.mark.asyncio
+async def test_wait_metrics_per_level():
+    clock = FakeClock()
+    scheduler = FairScheduler(clock=clock)
+    scheduler.put_nowait("b", priority=9)
+    scheduler.put_nowait("a", priority=0, enqueued_at=clock.now - 3.0)
+    clock.now += 1.0
+    await scheduler.get()
+    stats = scheduler.stats
+    assert stats["queued"] == 1
+    assert stats["levels"][9]["wait_p99"] == 1.0
+    assert stats["levels"][0] == {"queued": 1, "served": 0, "wait_avg": 0.0, "wait_p50": 0.0, "wait_p99": 0.0}
+    await scheduler.get()
+    assert scheduler.stats["levels"][0]["wait_avg"] == 4.0
+
+@pytest.mark.asyncio
+async def test_reserved_getter_only_takes_expedited_items():
+    scheduler = FairScheduler(expedite_priority=7)
+    scheduler.put_nowait("bulk", priority=0)
+    reserved = asyncio.ensure_future(scheduler.get(expedited_only=True))
+    await asyncio.sleep(0)
+    assert not reserved.done()
+    scheduler.put_nowait("otp", priority=9)
+    assert await asyncio.wait_for(reserved, 1.0) == "otp"
+    assert await scheduler.get() == "bulk"
+    waiting = asyncio.ensure_future(scheduler.get())
+    await asyncio.sleep(0)
+    waiting.cancel()
+    scheduler.put_nowait("later", priority=0)
+    assert await scheduler.get() == "later"
@@ -0,0 +1,278 @@
+"""Tests for the durable send queue."""
+import asyncio
+import sqlite3
+import pytest
+from sms_gateway import SMSGateway
+from sms_gateway.dedup import Deduplicator
+from sms_gateway.retry import RetryPolicy
+from sms_gateway.scheduler import level_weight
+from sms_gateway.send_queue import SendQueue, QueueConsumer, QueueFullError, sqlite_path_from_url
+from tests.test_gateway import MockProvider
+
+@pytest.mark.asyncio
+async def test_enqueue_and_claim(tmp_path):
+    queue = SendQueue(str(tmp_path / "q.db"))
+    await queue.open()
+    low = await queue.enqueue("+12025550001", "low")
+    high = await queue.enqueue("+12025550002", "high", priority=9)
+    claimed = await queue.claim(10)
+    assert [m.id for m in claimed] == [high, low]
+    assert claimed[0].attempts == 1
+    assert await queue.claim(10) == []
+    await queue.close()
+
+@pytest.mark.asyncio
+async def test_concurrent_enqueues_share_commit_group(tmp_path):
+    queue = SendQueue(str(tmp_path / "q.db"))
+    await queue.open()
+    ids = await asyncio.gather(*(queue.enqueue(f"+1202555{i:04d}", "hi") for i in range(200)))
+    bulk = await queue.enqueue_many(["+12025550001", "+12025550002"], "bulk", request_id="req-1")
+    assert len(set(ids)) == 200
+    assert bulk == [bulk[0], bulk[0] + 1]
+    assert queue.depth == 202
+    await queue.close()
+
+@pytest.mark.asyncio
+async def test_backpressure(tmp_path):
+    queue = SendQueue(str(tmp_path / "q.db"), max_depth=2)
+    await queue.open()
+    await queue.enqueue_many(["+12025550001", "+12025550002"], "hi")
+    with pytest.raises(QueueFullError):
+        await queue.enqueue("+12025550003", "hi")
+    await queue.close()
+
+@pytest.mark.asyncio
+async def test_committed_messages_survive_crash(tmp_path):
+    path = str(tmp_path / "q.db")
+    queue = SendQueue(path)
+    await queue.open()
+    await queue.enqueue("+12025550001", "one")
+    await queue.enqueue("+12025550002", "two")
+    claimed = await queue.claim(1)
+    assert len(claimed) == 1
+    # Simulate a crash: abandon the queue without completing or closing.
+    queue._committer.cancel()
+
+    recovered = SendQueue(path)
+    await recovered.open()
+    assert recovered.depth == 2
+    messages = await recovered.claim(10)
+    assert sorted(m.body for m in messages) == ["one", "two"]
+    assert max(m.attempts for m in messages) == 2
+    await recovered.close()
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_reclaimed(tmp_path):
+    queue = SendQueue(str(tmp_path / "q.db"), lease_seconds=0.0)
+    other = SendQueue(str(tmp_path / "q.db"))
+    await queue.open()
+    await other.open(recover_inflight=False)
+    await queue.enqueue("+12025550001", "one")
+    first = await queue.claim(1)
+    assert await queue.claim(1) == []
+    second = await other.claim(1)
+    assert first[0].id == second[0].id
+    await other.close()
+    await queue.close()
+
+class SlowProvider(MockProvider):
+    async def send(self, message):
+        await asyncio.sleep(0.6)
+        return await super().send(message)
+
+@pytest.mark.asyncio
+async def test_leases_are_renewed_while_sending(tmp_path):
+    gw = SMSGateway()
+    provider = SlowProvider()
+    gw.register_provider("mock", provider, primary=True)
+    queue = SendQueue(str(tmp_path / "q.db"), lease_seconds=0.2)
+    other = SendQueue(str(tmp_path / "q.db"))
+    await queue.open()
+    await other.open(recover_inflight=False)
+    await queue.enqueue("+12025550001", "slow")
+    consumer = QueueConsumer(queue, gw, concurrency=2, poll_interval=0.01)
+    await consumer.start()
+    await asyncio.sleep(0.4)
+    assert await other.claim(10) == []
+    for _ in range(100):
+        if consumer.stats["processed"] == 1:
+            break
+        await asyncio.sleep(0.01)
+    # Long enough for a duplicate claim to have been sent as well.
+    await asyncio.sleep(0.7)
+    await consumer.stop()
+    assert len(provider.sent_messages) == 1
+    assert queue.depth == 0
+    await other.close()
+    await queue.close()
+
+@pytest.mark.asyncio
+async def test_consumer_drains_into_gateway(tmp_path):
+    gw = SMSGateway()
+    provider = MockProvider()
+    gw.register_provider("mock", provider, primary=True)
+    queue = SendQueue(str(tmp_path / "q.db"))
+    await queue.open()
+    await queue.enqueue_many([f"+1202555{i:04d}" for i in range(20)], "hello")
+    consumer = QueueConsumer(queue, gw, concurrency=4, poll_interval=0.01)
+    await consumer.start()
+    for _ in range(100):
+        if consumer.stats["processed"] == 20:
+            break
+        await asyncio.sleep(0.01)
+    await consumer.stop()
+    await queue.close()
+    assert len(provider.sent_messages) == 20
+    reopened = SendQueue(str(tmp_path / "q.db"))
+    await reopened.open()
+    assert reopened.depth == 0
+    await reopened.close()
+
+def test_sqlite_path_from_url():
+    assert sqlite_path_from_url("sqlite:///sms_gateway.db") == "sms_gateway.db"
+    assert sqlite_path_from_url("postgresql://localhost/db") is None
+
+@pytest.mark.asyncio
+async def test_weighted_claim_does_not_starve_low_priority(tmp_path):
+    queue = SendQueue(str(tmp_path / "q.db"))
+    await queue.open()
+    await queue.enqueue_many([f"+1202555{i:04d}" for i in range(100)], "bulk", client_id="a")
+    await queue.enqueue_many([f"+1303555{i:04d}" for i in range(100)], "otp", priority=9, client_id="b")
+    assert queue.depth_by_priority == {0: 100, 9: 100}
+    claimed = await queue.claim(22, weight=level_weight)
+    assert [m.priority for m in claimed] == [9] * 20 + [0] * 2
+    assert claimed[-1].client_id == "a"
+    for message in claimed:
+        queue.complete(message.id)
+    assert queue.depth_by_priority == {0: 98, 9: 80}
+    assert [m.priority for m in await queue.claim(22)] == [9] * 22
+    await queue.close()
+
+@pytest.mark.asyncio
+async def test_queue_without_client_column_is_migrated(tmp_path):
+    path = str(tmp_path / "q.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE send_queue (id INTEGER PRIMARY KEY, request_id TEXT NOT NULL, "
+        "to_number TEXT NOT NULL, body TEXT NOT NULL, from_number TEXT, provider TEXT, "
+        "priority INTEGER NOT NULL DEFAULT 0, seq INTEGER, state INTEGER NOT NULL DEFAULT 0, "
+        "attempts INTEGER NOT NULL DEFAULT 0, enqueued_at REAL NOT NULL, "
+        "available_at REAL NOT NULL, lease_until REAL NOT NULL DEFAULT 0);"
+        "INSERT INTO send_queue (request_id, to_number, body, priority, enqueued_at, available_at) "
+        "VALUES ('req-1', '+12025550001', 'old', 3, 0, 0);"
+    )
+    conn.close()
+    queue = SendQueue(path)
+    await queue.open()
+    assert queue.depth_by_priority == {3: 1}
+    await queue.enqueue("+12025550002", "new", client_id="c")
+    claimed = await queue.claim(10, weight=level_weight)
+    assert sorted((m.body, m.client_id) for m in claimed) == [("new", "c"), ("old", None)]
+    await queue.close()
+
+async def _wait_processed(consumer, count):
+    for _ in range(200):
+        if consumer.stats["processed"] >= count:
+            return
+        await asyncio.sleep(0.01)
+
+@pytest.mark.asyncio
+async def test_dispatcher_survives_claim_errors(tmp_path, monkeypatch):
+    gw = SMSGateway()
+    provider = MockProvider()
+    gw.register_provider("mock", provider, primary=True)
+    queue = SendQueue(str(tmp_path / "q.db"))
+    await queue.open()
+    claim = queue.claim
+    failures = [sqlite3.OperationalError("database is locked")]
+
+    async def flaky_claim(*args, **kwargs):
+        if failures:
+            raise failures.pop()
+        return await claim(*args, **kwargs)
+
+    monkeypatch.setattr(queue, "claim", flaky_claim)
+    await queue.enqueue("+12025550001", "hi")
+    consumer = QueueConsumer(queue, gw, concurrency=1, poll_interval=0.01)
+    consumer.CLAIM_RETRY_DELAY = 0.01
+    await consumer.start()
+    await _wait_processed(consumer, 1)
+    await consumer.stop()
+    await queue.close()
+    assert consumer.stats["claim_errors"] == 1
+    assert len(provider.sent_messages) == 1
+
+@pytest.mark.asyncio
+async def test_failed_commit_keeps_completions(tmp_path, monkeypatch):
+    queue = SendQueue(str(tmp_path / "q.db"))
+    queue.COMMIT_RETRY_DELAY = 0.01
+    await queue.open()
+    await queue.enqueue("+12025550001", "hi")
+    [message] = await queue.claim(1)
+    write = queue._write
+    failures = [sqlite3.OperationalError("disk I/O error")]
+
+    def flaky_write(*args):
+        if failures:
+            raise failures.pop()
+        return write(*args)
+
+    monkeypatch.setattr(queue, "_write", flaky_write)
+    queue.complete(message.id)
+    await asyncio.sleep(0.1)
+    await queue.close()
+    reopened = SendQueue(str(tmp_path / "q.db"))
+    await reopened.open()
+    assert reopened.depth == 0
+    await reopened.close()
+
+class ExplodingProvider(MockProvider):
+    async def send(self, message):
+        if message.to.endswith("2"):
+            raise RuntimeError("boom")
+        return await super().send(message)
+
+@pytest.mark.asyncio
+async def test_worker_exception_fails_messages_individually(tmp_path, monkeypatch):
+    gw = SMSGateway(retry_policy=RetryPolicy(max_retries=0))
+    gw.config.failover_enabled = False
+    provider = ExplodingProvider()
+    gw.register_provider("mock", provider, primary=True)
+
+    async def broken_send_many(*args, **kwargs):
+        raise RuntimeError("batch path broken")
+
+    monkeypatch.setattr(gw, "send_many", broken_send_many)
+    queue = SendQueue(str(tmp_path / "q.db"))
+    await queue.open()
+    gw.status.track_bulk("req-1", 3)
+    await queue.enqueue_many(["+12025550001", "+12025550002", "+12025550003"], "hi",
+                             request_id="req-1", bulk=True)
+    consumer = QueueConsumer(queue, gw, concurrency=1, poll_interval=0.01)
+    await consumer.start()
+    await _wait_processed(consumer, 3)
+    await consumer.stop()
+    await queue.close()
+    assert sorted(m.to for m in provider.sent_messages) == ["+12025550001", "+12025550003"]
+    status = gw.status.get("req-1")
+    assert status["counts"] == {"sent": 2, "failed": 1}
+    assert queue.depth == 0
+
+@pytest.mark.asyncio
+async def test_final_failure_releases_fingerprint(tmp_path):
+    gw = SMSGateway(retry_policy=RetryPolicy(max_retries=0))
+    gw.config.failover_enabled = False
+    gw.register_provider("mock", ExplodingProvider(), primary=True)
+    dedup = Deduplicator()
+    queue = SendQueue(str(tmp_path / "q.db"))
+    await queue.open()
+    for number in ("+12025550001", "+12025550002"):
+        assert dedup.check_message(number, "hi", f"req-{number}") is None
+        await queue.enqueue(number, "hi", request_id=f"req-{number}")
+    consumer = QueueConsumer(queue, gw, concurrency=1, poll_interval=0.01, deduplicator=dedup)
+    await consumer.start()
+    await _wait_processed(consumer, 2)
+    await consumer.stop()
+    await queue.close()
+    assert dedup.check_message("+12025550002", "hi", "retry") is None
+    assert dedup.check_message("+12025550001", "hi", "again") == "req-+12025550001"
@@ -0,0 +1,81 @@
+"""Tests for delivery-receipt webhook authentication."""
+import base64
+import hashlib
+import hmac
+import json
+import sys
+import pytest
+from sms_gateway.signatures import ReceiptVerifier, WebhookRequest, vonage_signature
+
+NOW = 1_700_000_000.0
+
+def _verifier(**secrets):
+    return ReceiptVerifier(secrets, clock=lambda: NOW)
+
+def test_twilio_signature_covers_url_and_form():
+    url = "https://sms.example.com/api/v1/dlr/twilio"
+    payload = {"MessageSid": "SM1", "MessageStatus": "delivered"}
+    data = url + "MessageSidSM1MessageStatusdelivered"
+    signature = base64.b64encode(hmac.new(b"token", data.encode(), hashlib.sha1).digest()).decode()
+    verifier = _verifier(twilio="token")
+    good = WebhookRequest(url, {"x-twilio-signature": signature}, payload=payload, form=True)
+    assert verifier.verify("twilio", good)
+    forged = WebhookRequest(url, {"x-twilio-signature": signature}, payload={**payload, "MessageStatus": "failed"},
+                            form=True)
+    assert not verifier.verify("twilio", forged)
+    assert not verifier.verify("twilio", WebhookRequest(url, {}, payload=payload, form=True))
+
+def test_telnyx_ed25519_signature():
+    ed25519 = pytest.importorskip("cryptography.hazmat.primitives.asymmetric.ed25519")
+    private = ed25519.Ed25519PrivateKey.generate()
+    public = base64.b64encode(private.public_key().public_bytes_raw()).decode()
+    body = b'{"data": {}}'
+    timestamp = str(int(NOW))
+    signature = base64.b64encode(private.sign(timestamp.encode() + b"|" + body)).decode()
+    headers = {"telnyx-signature-ed25519": signature, "telnyx-timestamp": timestamp}
+    verifier = _verifier(telnyx=public)
+    assert verifier.verify("telnyx", WebhookRequest("https://x/", headers, body))
+    assert not verifier.verify("telnyx", WebhookRequest("https://x/", headers, b'{"data": 1}'))
+    stale = {**headers, "telnyx-timestamp": str(int(NOW) - 3600)}
+    assert not verifier.verify("telnyx", WebhookRequest("https://x/", stale, body))
+
+def test_vonage_signed_webhook():
+    params = {"messageId": "v1", "status": "delivered", "timestamp": str(int(NOW))}
+    for secret in ("secret", "sha256:secret"):
+        signed = {**params, "sig": vonage_signature(secret, params).upper()}
+        verifier = _verifier(vonage=secret)
+        assert verifier.verify("vonage", WebhookRequest("https://x/", {}, payload=signed))
+        assert not verifier.verify("vonage", WebhookRequest("https://x/", {}, payload={**signed, "status": "failed"}))
+    assert not _verifier(vonage="secret").verify("vonage", WebhookRequest("https://x/", {}, payload=params))
+    assert not _verifier(vonage="secret").verify("vonage", WebhookRequest("https://x/", {}, payload=[signed]))
+
+def _jwt(key: bytes, claims: dict) -> str:
+    def enc(data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+    head = enc(json.dumps({"alg": "HS256", "typ": "JWT"}).encode()) + "." + enc(json.dumps(claims).encode())
+    return head + "." + enc(hmac.new(key, head.encode(), hashlib.sha256).digest())
+
+def test_messagebird_jwt_signature():
+    url = "https://x/api/v1/dlr/messagebird?id=m1&status=delivered"
+    claims = {"iss": "MessageBird", "nbf": NOW - 1, "exp": NOW + 60,
+              "url_hash": hashlib.sha256(url.encode()).hexdigest()}
+    verifier = _verifier(messagebird="key")
+    token = _jwt(b"key", claims)
+    assert verifier.verify("messagebird", WebhookRequest(url, {"messagebird-signature-jwt": token}))
+    assert not verifier.verify("messagebird", WebhookRequest(url + "x", {"messagebird-signature-jwt": token}))
+    assert not verifier.verify("messagebird", WebhookRequest(url, {"messagebird-signature-jwt": _jwt(b"bad", claims)}))
+
+def test_tokens_and_unconfigured_providers():
+    verifier = ReceiptVerifier(tokens={"aliyun": "t0ken"})
+    request = WebhookRequest("https://x/", {})
+    assert verifier.verify("aliyun", request, "t0ken")
+    assert not verifier.verify("aliyun", request, "wrong")
+    assert not verifier.verify("aliyun", request)
+    assert not verifier.verify("twilio", request, "t0ken")
+    with pytest.raises(ValueError):
+        ReceiptVerifier({"aliyun": "secret"})
+
+def test_telnyx_key_without_cryptography_is_a_config_error(monkeypatch):
+    monkeypatch.setitem(sys.modules, "cryptography", None)
+    with pytest.raises(ValueError, match="cryptography"):
+        ReceiptVerifier({"telnyx": "a2V5"})
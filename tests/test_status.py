@@ -0,0 +1,97 @@
+"""Tests for the request status store."""
+import asyncio
+import threading
+import pytest
+from sms_gateway import SMSGateway
+from sms_gateway.dlr import StatusEvent
+from sms_gateway.status import StatusStore, QUEUED, SENDING, SENT, DELIVERED, FAILED
+from tests.test_gateway import MockProvider
+
+def test_single_record_transitions():
+    store = StatusStore()
+    store.track("req-1")
+    store.update("req-1", SENDING)
+    store.update("req-1", SENT, provider="twilio", message_id="SM1")
+    status = store.get("req-1")
+    assert status["status"] == SENT
+    assert status["message_id"] == "SM1"
+    assert [h["status"] for h in status["history"]] == [QUEUED, SENDING, SENT]
+
+def test_bulk_record_is_aggregated():
+    store = StatusStore()
+    store.track_bulk("bulk-1", 1000)
+    for i in range(1000):
+        store.update("bulk-1", SENT if i % 4 else FAILED, provider="mock", message_id=f"m{i}", index=i)
+    status = store.get("bulk-1")
+    assert status["status"] == "completed"
+    assert status["counts"] == {SENT: 750, FAILED: 250}
+    assert len(store) == 1
+
+def test_lru_spills_to_disk_tier(tmp_path):
+    store = StatusStore(max_entries=2, path=str(tmp_path / "status.db"))
+    for i in range(5):
+        store.track(f"req-{i}")
+    assert len(store) == 2
+    assert store.get("req-0")["status"] == QUEUED
+    store.close()
+    reopened = StatusStore(path=str(tmp_path / "status.db"))
+    assert reopened.get("req-4")["request_id"] == "req-4"
+
+def test_ttl_expiry():
+    store = StatusStore(ttl=0)
+    store.track("req-1")
+    store._records["req-1"].updated_at -= 1
+    assert store.get("req-1") is None
+
+@pytest.mark.asyncio
+async def test_gateway_records_send_outcome():
+    gw = SMSGateway()
+    gw.register_provider("mock", MockProvider(), primary=True)
+    gw.status.track("req-1")
+    await gw.send("+12025551234", "Hello!", request_id="req-1")
+    status = gw.get_status("req-1")
+    assert status["status"] == SENT
+    assert status["message_id"] == "mock-123"
+
+
+def test_bulk_provider_counted_once_per_recipient():
+    store = StatusStore()
+    store.track_bulk("bulk-1", 2)
+    store.update("bulk-1", QUEUED, provider="twilio", error="timeout", index=0)
+    store.update("bulk-1", SENT, provider="telnyx", message_id="m0", index=0)
+    store.update("bulk-1", SENT, provider="telnyx", message_id="m1", index=1)
+    store.update("bulk-1", SENT, provider="telnyx", message_id="m1", index=1)
+    assert store.get("bulk-1")["providers"] == {"telnyx": 2}
+
+def test_discard_removes_flushed_record(tmp_path):
+    store = StatusStore(path=str(tmp_path / "status.db"))
+    store.track("req-1")
+    store.flush()
+    store.discard("req-1")
+    store.close()
+    assert StatusStore(path=str(tmp_path / "status.db")).get("req-1") is None
+
+@pytest.mark.asyncio
+async def test_disk_reads_stay_off_the_event_loop(tmp_path, monkeypatch):
+    store = StatusStore(max_entries=1, path=str(tmp_path / "status.db"))
+    store.track("req-0")
+    store.update("req-0", SENT, provider="mock", message_id="m0")
+    store.track("req-1")
+    store.flush()
+    loop_thread = threading.get_ident()
+    select = store._select_record
+
+    def off_loop(*args):
+        assert threading.get_ident() != loop_thread
+        return select(*args)
+    monkeypatch.setattr(store, "_select_record", off_loop)
+    assert (await store.fetch("req-0"))["status"] == SENT
+    store.track("req-2")
+    assert await store.apply([StatusEvent("mock", "m0", DELIVERED)]) == []
+    assert await store.message_states([("mock", "m0", None)]) == [DELIVERED]
+    store.track("req-3")
+    store.update("req-0", FAILED, error="late")
+    while store._loads:
+        await asyncio.sleep(0.01)
+    assert (await store.fetch("req-0"))["status"] == FAILED
+    store.close()
@@ -0,0 +1,33 @@
+"""Tests for the notification template engine."""
+import pytest
+from sms_gateway.templates import NotificationTemplate, TemplateRegistry, TemplateError, DEFAULT_TEMPLATES
+
+def test_render_fills_all_slots():
+    tpl = NotificationTemplate("welcome", DEFAULT_TEMPLATES["welcome"])
+    assert tpl.render({"app_name": "Acme", "user_name": "Ann"}) == "Welcome to Acme, Ann! Your account is ready."
+    assert tpl.variables == ["app_name", "user_name"]
+
+def test_render_repeated_variable_and_edges():
+    tpl = NotificationTemplate("t", "{{a}}-{{b}}-{{a}}")
+    assert tpl.render({"a": 1, "b": "x"}) == "1-x-1"
+
+def test_render_missing_variable():
+    tpl = NotificationTemplate("t", "Code {{code}} for {{app}}")
+    with pytest.raises(TemplateError, match="app"):
+        tpl.render({"code": 123})
+
+def test_render_does_not_expand_values():
+    tpl = NotificationTemplate("t", "{{a}} {{b}}")
+    assert tpl.render({"a": "{{b}}", "b": "x"}) == "{{b}} x"
+
+def test_render_safe_uses_default():
+    tpl = NotificationTemplate("t", "Hi {{name}}!")
+    assert tpl.render_safe({}, default="there") == "Hi there!"
+
+def test_render_many():
+    registry = TemplateRegistry()
+    registry.register("otp", DEFAULT_TEMPLATES["otp"])
+    rendered = registry.render_many("otp", [{"code": i, "app_name": "Acme"} for i in range(3)])
+    assert rendered[2] == "2 is your one-time password for Acme. Do not share."
+    with pytest.raises(TemplateError):
+        registry.render_many("missing", [{}])